@@ -3,7 +3,7 @@
 # -*- coding: UTF-8 -*-
 
 from .models import ActivityComment, ActivityNoticeSeed, ActivityManager, ActivityNotice, ActivityPost, \
-    NOTICE_ACTIVITY_POST_SEED, \
+    ACTIVITY_NOTICE_FAN_OUT_CHUNK_SIZE, NOTICE_ACTIVITY_POST_SEED, \
     NOTICE_CAMPAIGNX_FRIEND_HAS_SUPPORTED, \
     NOTICE_CAMPAIGNX_NEWS_ITEM, NOTICE_CAMPAIGNX_NEWS_ITEM_AUTHORED, NOTICE_CAMPAIGNX_NEWS_ITEM_SEED, \
     NOTICE_CAMPAIGNX_SUPER_SHARE_ITEM_AUTHORED, NOTICE_CAMPAIGNX_SUPER_SHARE_ITEM_SEED, \
@@ -28,6 +28,13 @@ from wevote_functions.functions import is_voter_device_id_valid, positive_value_
 logger = wevote_functions.admin.get_logger(__name__)
 
 WE_VOTE_SERVER_ROOT_URL = get_environment_variable("WE_VOTE_SERVER_ROOT_URL")
+# Saved with bulk_update for each chunk of ActivityNotice entries sent by schedule_activity_notices_from_seed
+ACTIVITY_NOTICE_SENT_FIELD_NAMES = ['scheduled_to_email', 'sent_to_email', 'scheduled_to_sms', 'sent_to_sms']
+# Like the update_or_create_voter_daily_summary_seed this replaced, update_or_create_voter_daily_summary_seeds_from_seed
+#  only passes speaker_organization_we_vote_id in serialized form, so create_activity_notice_seeds_in_bulk turns every
+#  seed away with ACTIVITY_NOTICE_SEED_MISSING_SPEAKER. The daily summary emails and SMS aren't being sent yet, so
+#  the seeds aren't built until they are.
+CREATE_VOTER_DAILY_SUMMARY_SEEDS = False
 
 
 def delete_activity_comments_for_voter(voter_to_delete_we_vote_id, from_organization_we_vote_id):
@@ -947,6 +954,91 @@ def notice_voter_daily_summary_send(  # NOTICE_VOTER_DAILY_SUMMARY
     return results
 
 
+def fan_out_activity_notices(
+        activity_notice_seed=None,
+        lookup_values={},
+        create_values={},
+        update_values={},
+        update_only_positive_values=True,
+        recipient_list=[],
+        when_process_must_stop=None):
+    """
+    Create or update the ActivityNotice for each recipient of activity_notice_seed, ACTIVITY_NOTICE_FAN_OUT_CHUNK_SIZE
+    recipients at a time, with one query to find the notices each chunk already has and bulk writes for the rest.
+    Since recipients who already have a notice are only updated, a fan-out which stops at when_process_must_stop
+    is finished by running it again from the next batch process.
+    :param activity_notice_seed:
+    :param lookup_values: Filters which find a recipient's existing notice, in addition to the recipient and speaker
+    :param create_values: Field values for new notices, in addition to the seed and speaker values
+    :param update_values: Field values written to existing notices
+    :param update_only_positive_values: Leave existing values alone where the update value is empty
+    :param recipient_list: A dict with recipient_voter_we_vote_id, send_to_email and send_to_sms for each recipient
+    :param when_process_must_stop:
+    :return:
+    """
+    status = ''
+    success = True
+    activity_notice_count = 0
+    fan_out_complete = True
+    activity_manager = ActivityManager()
+
+    # Found the same way as retrieve_recent_activity_notice_from_speaker_and_recipient
+    lookup_values = dict(lookup_values)
+    if positive_value_exists(activity_notice_seed.speaker_organization_we_vote_id):
+        lookup_values['speaker_organization_we_vote_id__iexact'] = activity_notice_seed.speaker_organization_we_vote_id
+    elif positive_value_exists(activity_notice_seed.speaker_voter_we_vote_id):
+        lookup_values['speaker_voter_we_vote_id__iexact'] = activity_notice_seed.speaker_voter_we_vote_id
+    else:
+        results = {
+            'success':                  False,
+            'status':                   "FAN_OUT_ACTIVITY_NOTICES_SPEAKER_MISSING ",
+            'activity_notice_count':    activity_notice_count,
+            'fan_out_complete':         fan_out_complete,
+        }
+        return results
+
+    create_values = dict({
+        'activity_notice_seed_id':          activity_notice_seed.id,
+        'date_of_notice':                   now(),
+        'kind_of_seed':                     activity_notice_seed.kind_of_seed,
+        'number_of_comments':               0,
+        'number_of_likes':                  0,
+        'speaker_name':                     activity_notice_seed.speaker_name,
+        'speaker_organization_we_vote_id':  activity_notice_seed.speaker_organization_we_vote_id,
+        'speaker_voter_we_vote_id':         activity_notice_seed.speaker_voter_we_vote_id,
+        'speaker_profile_image_url_medium': activity_notice_seed.speaker_profile_image_url_medium,
+        'speaker_profile_image_url_tiny':   activity_notice_seed.speaker_profile_image_url_tiny,
+    }, **create_values)
+    if update_only_positive_values:
+        update_values = {field_name: value for field_name, value in update_values.items()
+                         if positive_value_exists(value)}
+
+    for start in range(0, len(recipient_list), ACTIVITY_NOTICE_FAN_OUT_CHUNK_SIZE):
+        if when_process_must_stop is not None and when_process_must_stop < now():
+            fan_out_complete = False
+            status += "FAN_OUT_ACTIVITY_NOTICES_STOPPED_AT_RECIPIENT " + str(start) + " "
+            break
+        recipient_chunk = recipient_list[start:start + ACTIVITY_NOTICE_FAN_OUT_CHUNK_SIZE]
+        results = activity_manager.update_or_create_activity_notices_in_bulk(
+            lookup_values=lookup_values,
+            create_values=create_values,
+            update_values=update_values,
+            recipient_list=recipient_chunk)
+        if results['success']:
+            activity_notice_count += len(recipient_chunk)
+        else:
+            success = False
+            status += results['status']
+
+    results = {
+        'success':                  success,
+        'status':                   status,
+        'activity_notice_count':    activity_notice_count,
+        'fan_out_complete':         fan_out_complete,
+    }
+    return results
+
+
 def process_activity_notice_seeds_triggered_by_batch_process():
     """
     We assume only one of this function is running at any time.
@@ -1023,7 +1115,8 @@ def process_activity_notice_seeds_triggered_by_batch_process():
 
                 if update_activity_notices:
                     # Update the activity drop down in each voter touched (friends of the voter acting)
-                    update_results = update_or_create_activity_notices_from_seed(activity_notice_seed)
+                    update_results = update_or_create_activity_notices_from_seed(
+                        activity_notice_seed, when_process_must_stop=when_process_must_stop)
                     status += update_results['status']  # Show all status for now
                     # if not update_results['success']:
                     #     status += update_results['status']
@@ -1054,7 +1147,8 @@ def process_activity_notice_seeds_triggered_by_batch_process():
             status += "] "
 
             # Create the activity drop down in each voter's header for each voter touched (friends of the voter acting)
-            create_results = update_or_create_activity_notices_from_seed(activity_notice_seed)
+            create_results = update_or_create_activity_notices_from_seed(
+                activity_notice_seed, when_process_must_stop=when_process_must_stop)
             # activity_notice_seed.activity_notices_created = True  # Marked in function immediately above
             activity_notice_count += create_results['activity_notice_count']
 
@@ -1087,38 +1181,43 @@ def process_activity_notice_seeds_triggered_by_batch_process():
             # Create the seeds (one for each voter touched) which will be used to send a daily summary
             #  to each voter touched. So we end up with new NOTICE_VOTER_DAILY_SUMMARY_SEED entries for the friends
             #  of the creators of these seeds: NOTICE_ACTIVITY_POST_SEED, NOTICE_FRIEND_ENDORSEMENTS_SEED
-            update_results = update_or_create_voter_daily_summary_seeds_from_seed(activity_notice_seed)
+            update_results = update_or_create_voter_daily_summary_seeds_from_seed(
+                activity_notice_seed, when_process_must_stop=when_process_must_stop)
             # if not update_results['success']:
             status += update_results['status']
         else:
             continue_retrieving_to_be_added_to_voter_summary = False
 
     # Send email notifications (notices_to_be_scheduled=True)
-    continue_retrieving_notices_to_be_scheduled = True
-    activity_notice_seed_id_already_reviewed_list = []  # Reset
-    safety_valve_count = 0
-    while continue_retrieving_notices_to_be_scheduled and safety_valve_count < 1000 and when_process_must_stop > now():
-        safety_valve_count += 1
-        results = activity_manager.retrieve_next_activity_notice_seed_to_process(
-            notices_to_be_scheduled=True,
-            activity_notice_seed_id_already_reviewed_list=activity_notice_seed_id_already_reviewed_list)
-        if results['activity_notice_seed_found']:
-            # We retrieve from these seed types:
-            #  NOTICE_CAMPAIGNX_NEWS_ITEM_SEED
-            #  NOTICE_CAMPAIGNX_SUPER_SHARE_ITEM_SEED
-            #  NOTICE_CAMPAIGNX_SUPPORTER_INITIAL_RESPONSE_SEED
-            #  NOTICE_FRIEND_ENDORSEMENTS_SEED
-            #  NOTICE_VOTER_DAILY_SUMMARY_SEED
-            activity_notice_seed = results['activity_notice_seed']
-            activity_notice_seed_id_already_reviewed_list.append(activity_notice_seed.id)
-            # activity_notice_seed_count += 1
-            schedule_results = schedule_activity_notices_from_seed(activity_notice_seed)
-            # activity_notice_seed.activity_notices_scheduled = True  # Marked in function immediately above
-            # if not schedule_results['success']:
-            status += schedule_results['status']
-            # activity_notice_count += create_results['activity_notice_count']
-        else:
-            continue_retrieving_notices_to_be_scheduled = False
+    # The emails are queued as they are scheduled, and sent together over reused connections at the end
+    from email_outbound.models import DeferScheduledEmailSending
+    with DeferScheduledEmailSending():
+        continue_retrieving_notices_to_be_scheduled = True
+        activity_notice_seed_id_already_reviewed_list = []  # Reset
+        safety_valve_count = 0
+        while continue_retrieving_notices_to_be_scheduled and safety_valve_count < 1000 \
+                and when_process_must_stop > now():
+            safety_valve_count += 1
+            results = activity_manager.retrieve_next_activity_notice_seed_to_process(
+                notices_to_be_scheduled=True,
+                activity_notice_seed_id_already_reviewed_list=activity_notice_seed_id_already_reviewed_list)
+            if results['activity_notice_seed_found']:
+                # We retrieve from these seed types:
+                #  NOTICE_CAMPAIGNX_NEWS_ITEM_SEED
+                #  NOTICE_CAMPAIGNX_SUPER_SHARE_ITEM_SEED
+                #  NOTICE_CAMPAIGNX_SUPPORTER_INITIAL_RESPONSE_SEED
+                #  NOTICE_FRIEND_ENDORSEMENTS_SEED
+                #  NOTICE_VOTER_DAILY_SUMMARY_SEED
+                activity_notice_seed = results['activity_notice_seed']
+                activity_notice_seed_id_already_reviewed_list.append(activity_notice_seed.id)
+                # activity_notice_seed_count += 1
+                schedule_results = schedule_activity_notices_from_seed(activity_notice_seed)
+                # activity_notice_seed.activity_notices_scheduled = True  # Marked in function immediately above
+                # if not schedule_results['success']:
+                status += schedule_results['status']
+                # activity_notice_count += create_results['activity_notice_count']
+            else:
+                continue_retrieving_notices_to_be_scheduled = False
 
     results = {
         'success':                      success,
@@ -1129,10 +1228,17 @@ def process_activity_notice_seeds_triggered_by_batch_process():
     return results
 
 
-def update_or_create_activity_notices_from_seed(activity_notice_seed):
+def update_or_create_activity_notices_from_seed(activity_notice_seed, when_process_must_stop=None):
+    """
+    Create or update the ActivityNotice entries (for the header drop-down) which come from one seed
+    :param activity_notice_seed:
+    :param when_process_must_stop: Stop fanning out at this time, and leave the seed to be finished later
+    :return:
+    """
     status = ''
     success = True
     activity_notice_count = 0
+    fan_out_complete = True
     from campaign.models import CampaignXManager
     campaignx_manager = CampaignXManager()
     activity_manager = ActivityManager()
@@ -1213,6 +1319,7 @@ def update_or_create_activity_notices_from_seed(activity_notice_seed):
         status += retrieve_current_friends_as_voters_results['status']
         if retrieve_current_friends_as_voters_results['friend_list_found']:
             current_friend_list = retrieve_current_friends_as_voters_results['friend_list']
+            fan_out_results = None
             if activity_notice_seed.kind_of_seed == NOTICE_ACTIVITY_POST_SEED:
                 # Pop the last activity_tidbit_we_vote_id
                 activity_tidbit_we_vote_id = ''
@@ -1231,56 +1338,66 @@ def update_or_create_activity_notices_from_seed(activity_notice_seed):
                     number_of_comments = activity_manager.fetch_number_of_comments(
                         parent_we_vote_id=activity_tidbit_we_vote_id)
                     number_of_likes = reaction_manager.fetch_number_of_likes(activity_tidbit_we_vote_id)
-                    kind_of_notice = NOTICE_FRIEND_ACTIVITY_POSTS
-                    for friend_voter in current_friend_list:
-                        # ###########################
-                        # NOTE: We call update_or_create_voter_daily_summary_seeds_from_seed from the same place
-                        #  (process_activity_notice_seeds_triggered_by_batch_process) we call the function
-                        #  we are currently in. We don't do it here.
-
-                        # ###########################
-                        # This is the entry that goes in the header drop-down
-                        activity_results = update_or_create_activity_notice_for_friend_posts(
-                            activity_notice_seed_id=activity_notice_seed.id,
-                            activity_tidbit_we_vote_id=activity_tidbit_we_vote_id,
-                            kind_of_seed=activity_notice_seed.kind_of_seed,
-                            kind_of_notice=kind_of_notice,
-                            number_of_comments=number_of_comments,
-                            number_of_likes=number_of_likes,
-                            recipient_voter_we_vote_id=friend_voter.we_vote_id,
-                            send_to_email=False,
-                            send_to_sms=False,
-                            speaker_name=activity_notice_seed.speaker_name,
-                            speaker_organization_we_vote_id=activity_notice_seed.speaker_organization_we_vote_id,
-                            speaker_voter_we_vote_id=activity_notice_seed.speaker_voter_we_vote_id,
-                            speaker_profile_image_url_medium=activity_notice_seed.speaker_profile_image_url_medium,
-                            speaker_profile_image_url_tiny=activity_notice_seed.speaker_profile_image_url_tiny,
-                            statement_text_preview=activity_notice_seed.statement_text_preview)
-                        if activity_results['success']:
-                            activity_notice_count += 1
-                        else:
-                            status += activity_results['status']
+                    # ###########################
+                    # NOTE: We call update_or_create_voter_daily_summary_seeds_from_seed from the same place
+                    #  (process_activity_notice_seeds_triggered_by_batch_process) we call the function
+                    #  we are currently in. We don't do it here.
+
+                    # ###########################
+                    # These are the entries that go in the header drop-down
+                    fan_out_results = fan_out_activity_notices(
+                        activity_notice_seed=activity_notice_seed,
+                        lookup_values={
+                            'activity_notice_seed_id':      activity_notice_seed.id,
+                            'campaignx_we_vote_id':         None,
+                            'kind_of_notice':               NOTICE_FRIEND_ACTIVITY_POSTS,
+                        },
+                        create_values={
+                            'activity_tidbit_we_vote_id':   activity_tidbit_we_vote_id,
+                            'kind_of_notice':               NOTICE_FRIEND_ACTIVITY_POSTS,
+                            'number_of_comments':           number_of_comments,
+                            'number_of_likes':              number_of_likes,
+                            'statement_text_preview':       activity_notice_seed.statement_text_preview,
+                        },
+                        update_values={
+                            'activity_tidbit_we_vote_id':   activity_tidbit_we_vote_id,
+                            'number_of_comments':           number_of_comments,
+                            'number_of_likes':              number_of_likes,
+                            'speaker_name':                 activity_notice_seed.speaker_name,
+                            'statement_text_preview':       activity_notice_seed.statement_text_preview,
+                        },
+                        recipient_list=[{
+                            'recipient_voter_we_vote_id':   friend_voter.we_vote_id,
+                            'send_to_email':                False,
+                            'send_to_sms':                  False,
+                        } for friend_voter in current_friend_list],
+                        when_process_must_stop=when_process_must_stop)
             elif activity_notice_seed.kind_of_seed == NOTICE_CAMPAIGNX_SUPPORTER_INITIAL_RESPONSE_SEED:
                 if positive_value_exists(activity_notice_seed.campaignx_we_vote_id):
                     # #########
                     # Notices (and emails) to the creator's friends
                     kind_of_notice = NOTICE_CAMPAIGNX_FRIEND_HAS_SUPPORTED
                     twelve_hours_of_seconds = 12 * 60 * 60
-                    for friend_voter in current_friend_list:
-                        # Has the friend already signed this campaign? If so, don't send another email.
-                        is_voter_campaignx_supporter = campaignx_manager.is_voter_campaignx_supporter(
+                    friend_we_vote_id_list = [friend_voter.we_vote_id for friend_voter in current_friend_list]
+                    # Which friends have already signed this campaign? Don't send them another email.
+                    campaignx_supporter_we_vote_id_set = \
+                        campaignx_manager.fetch_campaignx_supporter_voter_we_vote_id_set(
                             campaignx_we_vote_id=activity_notice_seed.campaignx_we_vote_id,
-                            voter_we_vote_id=friend_voter.we_vote_id)
-                        # Has the friend already received an email about this supporter signing a campaign recently?
-                        # If so, don't email any more notices for twelve_hours_of_seconds
-                        activity_notice_count = activity_manager.fetch_activity_notice_count(
+                            voter_we_vote_id_list=friend_we_vote_id_list)
+                    # Which friends have already received an email about this supporter signing a campaign recently?
+                    # Don't email them any more notices for twelve_hours_of_seconds
+                    recently_emailed_we_vote_id_set = \
+                        activity_manager.fetch_recipient_voter_we_vote_id_set_with_activity_notices(
                             activity_in_last_x_seconds=twelve_hours_of_seconds,
                             kind_of_notice=kind_of_notice,
-                            recipient_voter_we_vote_id=friend_voter.we_vote_id,
+                            recipient_voter_we_vote_id_list=friend_we_vote_id_list,
                             send_to_email=True,
                             speaker_voter_we_vote_id=activity_notice_seed.speaker_voter_we_vote_id,
                         )
-                        if is_voter_campaignx_supporter or activity_notice_count > 0:
+                    recipient_list = []
+                    for friend_voter in current_friend_list:
+                        if friend_voter.we_vote_id.lower() in campaignx_supporter_we_vote_id_set or \
+                                friend_voter.we_vote_id.lower() in recently_emailed_we_vote_id_set:
                             send_to_email = False
                             send_to_sms = False
                         else:
@@ -1294,27 +1411,33 @@ def update_or_create_activity_notices_from_seed(activity_notice_seed):
                             # NOTIFICATION_FRIEND_OPINIONS_OTHER_REGIONS_SMS
                             send_to_sms = friend_voter.is_notification_status_flag_set(
                                 NOTIFICATION_FRIEND_OPINIONS_OTHER_REGIONS_SMS)
+                        recipient_list.append({
+                            'recipient_voter_we_vote_id':   friend_voter.we_vote_id,
+                            'send_to_email':                send_to_email,
+                            'send_to_sms':                  send_to_sms,
+                        })
 
-                        # ###########################
-                        # This is the entry that goes in the header drop-down
-                        activity_results = update_or_create_activity_notice_for_friend_campaignx_support(
-                            activity_notice_seed_id=activity_notice_seed.id,
-                            campaignx_we_vote_id=activity_notice_seed.campaignx_we_vote_id,
-                            kind_of_seed=activity_notice_seed.kind_of_seed,
-                            kind_of_notice=kind_of_notice,
-                            recipient_voter_we_vote_id=friend_voter.we_vote_id,
-                            send_to_email=send_to_email,
-                            send_to_sms=send_to_sms,
-                            speaker_name=activity_notice_seed.speaker_name,
-                            speaker_organization_we_vote_id=activity_notice_seed.speaker_organization_we_vote_id,
-                            speaker_voter_we_vote_id=activity_notice_seed.speaker_voter_we_vote_id,
-                            speaker_profile_image_url_medium=activity_notice_seed.speaker_profile_image_url_medium,
-                            speaker_profile_image_url_tiny=activity_notice_seed.speaker_profile_image_url_tiny,
-                            statement_text_preview=activity_notice_seed.statement_text_preview)
-                        if activity_results['success']:
-                            activity_notice_count += 1
-                        else:
-                            status += activity_results['status']
+                    # ###########################
+                    # These are the entries that go in the header drop-down
+                    fan_out_results = fan_out_activity_notices(
+                        activity_notice_seed=activity_notice_seed,
+                        lookup_values={
+                            'activity_notice_seed_id':      activity_notice_seed.id,
+                            'campaignx_we_vote_id':         activity_notice_seed.campaignx_we_vote_id,
+                            'kind_of_notice':               kind_of_notice,
+                        },
+                        create_values={
+                            'campaignx_we_vote_id':         activity_notice_seed.campaignx_we_vote_id,
+                            'kind_of_notice':               kind_of_notice,
+                            'statement_text_preview':       activity_notice_seed.statement_text_preview,
+                        },
+                        update_values={
+                            'campaignx_we_vote_id':         activity_notice_seed.campaignx_we_vote_id,
+                            'speaker_name':                 activity_notice_seed.speaker_name,
+                            'statement_text_preview':       activity_notice_seed.statement_text_preview,
+                        },
+                        recipient_list=recipient_list,
+                        when_process_must_stop=when_process_must_stop)
             elif activity_notice_seed.kind_of_seed == NOTICE_FRIEND_ENDORSEMENTS_SEED:
                 kind_of_notice = NOTICE_FRIEND_ENDORSEMENTS
                 # Names for quick summaries
@@ -1342,41 +1465,53 @@ def update_or_create_activity_notices_from_seed(activity_notice_seed):
                     position_we_vote_id_list += position_we_vote_id_list_for_public
                 position_we_vote_id_list_serialized = json.dumps(position_we_vote_id_list)
 
-                for friend_voter in current_friend_list:
-                    # Add switch for NOTICE_FRIEND_ACTIVITY_POSTS here
+                # Add switch for NOTICE_FRIEND_ACTIVITY_POSTS here
 
-                    # Decide whether to send email or sms based on friend's notification settings
-                    # We will need to figure out if this endorsement is on this voter's ballot
-                    # NOTIFICATION_FRIEND_OPINIONS_OTHER_REGIONS_EMAIL
-                    # NOTIFICATION_FRIEND_OPINIONS_YOUR_BALLOT_EMAIL
-                    send_to_email = friend_voter.is_notification_status_flag_set(
-                        NOTIFICATION_FRIEND_OPINIONS_OTHER_REGIONS_EMAIL)
-                    # NOTIFICATION_FRIEND_OPINIONS_YOUR_BALLOT_SMS
-                    # NOTIFICATION_FRIEND_OPINIONS_OTHER_REGIONS_SMS
-                    send_to_sms = friend_voter.is_notification_status_flag_set(
-                        NOTIFICATION_FRIEND_OPINIONS_OTHER_REGIONS_SMS)
+                # Decide whether to send email or sms based on friend's notification settings
+                # We will need to figure out if this endorsement is on this voter's ballot
+                # NOTIFICATION_FRIEND_OPINIONS_OTHER_REGIONS_EMAIL
+                # NOTIFICATION_FRIEND_OPINIONS_YOUR_BALLOT_EMAIL
+                # NOTIFICATION_FRIEND_OPINIONS_YOUR_BALLOT_SMS
+                # NOTIFICATION_FRIEND_OPINIONS_OTHER_REGIONS_SMS
+                recipient_list = [{
+                    'recipient_voter_we_vote_id':   friend_voter.we_vote_id,
+                    'send_to_email':                friend_voter.is_notification_status_flag_set(
+                        NOTIFICATION_FRIEND_OPINIONS_OTHER_REGIONS_EMAIL),
+                    'send_to_sms':                  friend_voter.is_notification_status_flag_set(
+                        NOTIFICATION_FRIEND_OPINIONS_OTHER_REGIONS_SMS),
+                } for friend_voter in current_friend_list]
 
-                    # ###########################
-                    # This is the entry that goes in the header drop-down
-                    activity_results = update_or_create_activity_notice_for_friend_endorsements(
-                        activity_notice_seed_id=activity_notice_seed.id,
-                        activity_tidbit_we_vote_id=activity_notice_seed.we_vote_id,
-                        kind_of_seed=activity_notice_seed.kind_of_seed,
-                        kind_of_notice=kind_of_notice,
-                        position_name_list_serialized=position_name_list_serialized,
-                        position_we_vote_id_list_serialized=position_we_vote_id_list_serialized,
-                        recipient_voter_we_vote_id=friend_voter.we_vote_id,
-                        send_to_email=send_to_email,
-                        send_to_sms=send_to_sms,
-                        speaker_name=activity_notice_seed.speaker_name,
-                        speaker_organization_we_vote_id=activity_notice_seed.speaker_organization_we_vote_id,
-                        speaker_voter_we_vote_id=activity_notice_seed.speaker_voter_we_vote_id,
-                        speaker_profile_image_url_medium=activity_notice_seed.speaker_profile_image_url_medium,
-                        speaker_profile_image_url_tiny=activity_notice_seed.speaker_profile_image_url_tiny)
-                    if activity_results['success']:
-                        activity_notice_count += 1
-                    else:
-                        status += activity_results['status']
+                # ###########################
+                # These are the entries that go in the header drop-down
+                # Combine friends and public into single position_we_vote_id_list_serialized
+                update_values = {
+                    'position_name_list_serialized':        position_name_list_serialized,
+                    'position_we_vote_id_list_serialized':  position_we_vote_id_list_serialized,
+                }
+                if positive_value_exists(activity_notice_seed.we_vote_id):
+                    update_values['activity_tidbit_we_vote_id'] = activity_notice_seed.we_vote_id
+                fan_out_results = fan_out_activity_notices(
+                    activity_notice_seed=activity_notice_seed,
+                    lookup_values={
+                        'activity_notice_seed_id':      activity_notice_seed.id,
+                        'campaignx_we_vote_id':         None,
+                        'kind_of_notice':               kind_of_notice,
+                    },
+                    create_values={
+                        'activity_tidbit_we_vote_id':           activity_notice_seed.we_vote_id,
+                        'kind_of_notice':                       kind_of_notice,
+                        'position_name_list_serialized':        position_name_list_serialized,
+                        'position_we_vote_id_list_serialized':  position_we_vote_id_list_serialized,
+                    },
+                    update_values=update_values,
+                    update_only_positive_values=False,
+                    recipient_list=recipient_list,
+                    when_process_must_stop=when_process_must_stop)
+            if fan_out_results is not None:
+                activity_notice_count += fan_out_results['activity_notice_count']
+                if not fan_out_results['success']:
+                    status += fan_out_results['status']
+                fan_out_complete = fan_out_results['fan_out_complete']
         else:
             status += "CREATE_ACTIVITY_NOTICES_FROM_SEED_NO_FRIENDS "
 
@@ -1394,169 +1529,99 @@ def update_or_create_activity_notices_from_seed(activity_notice_seed):
             )
             if results['supporter_list_found']:
                 campaignx_supporter_list = results['supporter_list']
-            for campaignx_supporter in campaignx_supporter_list:
-                if positive_value_exists(campaignx_supporter.is_subscribed_by_email):
-                    send_to_email = True
-                    send_to_sms = False
-                else:
-                    send_to_email = False
-                    send_to_sms = False
 
-                # ###########################
-                # This is the entry that goes in the header drop-down
-                activity_results = update_or_create_activity_notice_for_campaignx_news_item(
-                    activity_notice_seed_id=activity_notice_seed.id,
-                    campaignx_news_item_we_vote_id=activity_notice_seed.campaignx_news_item_we_vote_id,
-                    campaignx_we_vote_id=activity_notice_seed.campaignx_we_vote_id,
-                    kind_of_seed=activity_notice_seed.kind_of_seed,
-                    kind_of_notice=kind_of_notice,
-                    recipient_voter_we_vote_id=campaignx_supporter.voter_we_vote_id,
-                    send_to_email=send_to_email,
-                    send_to_sms=send_to_sms,
-                    speaker_name=activity_notice_seed.speaker_name,
-                    speaker_organization_we_vote_id=activity_notice_seed.speaker_organization_we_vote_id,
-                    speaker_voter_we_vote_id=activity_notice_seed.speaker_voter_we_vote_id,
-                    speaker_profile_image_url_medium=activity_notice_seed.speaker_profile_image_url_medium,
-                    speaker_profile_image_url_tiny=activity_notice_seed.speaker_profile_image_url_tiny,
-                    statement_subject=activity_notice_seed.statement_subject,
-                    statement_text_preview=activity_notice_seed.statement_text_preview)
-                if activity_results['success']:
-                    activity_notice_count += 1
-                else:
-                    status += activity_results['status']
+            # ###########################
+            # These are the entries that go in the header drop-down
+            fan_out_results = fan_out_activity_notices(
+                activity_notice_seed=activity_notice_seed,
+                lookup_values={
+                    'campaignx_news_item_we_vote_id':   activity_notice_seed.campaignx_news_item_we_vote_id,
+                    'campaignx_we_vote_id':             activity_notice_seed.campaignx_we_vote_id,
+                    'kind_of_notice':                   kind_of_notice,
+                },
+                create_values={
+                    'campaignx_news_item_we_vote_id':   activity_notice_seed.campaignx_news_item_we_vote_id,
+                    'campaignx_we_vote_id':             activity_notice_seed.campaignx_we_vote_id,
+                    'kind_of_notice':                   kind_of_notice,
+                    'statement_subject':                activity_notice_seed.statement_subject,
+                    'statement_text_preview':           activity_notice_seed.statement_text_preview,
+                },
+                update_values={
+                    'campaignx_we_vote_id':             activity_notice_seed.campaignx_we_vote_id,
+                    'speaker_name':                     activity_notice_seed.speaker_name,
+                    'speaker_profile_image_url_medium': activity_notice_seed.speaker_profile_image_url_medium,
+                    'speaker_profile_image_url_tiny':   activity_notice_seed.speaker_profile_image_url_tiny,
+                    'statement_subject':                activity_notice_seed.statement_subject,
+                    'statement_text_preview':           activity_notice_seed.statement_text_preview,
+                },
+                recipient_list=[{
+                    'recipient_voter_we_vote_id':   campaignx_supporter.voter_we_vote_id,
+                    'send_to_email':                positive_value_exists(campaignx_supporter.is_subscribed_by_email),
+                    'send_to_sms':                  False,
+                } for campaignx_supporter in campaignx_supporter_list],
+                when_process_must_stop=when_process_must_stop)
+            activity_notice_count += fan_out_results['activity_notice_count']
+            if not fan_out_results['success']:
+                status += fan_out_results['status']
+            fan_out_complete = fan_out_results['fan_out_complete']
 
     # Note: We don't create notices for: NOTICE_VOTER_DAILY_SUMMARY_SEED
 
-    try:
-        activity_notice_seed.activity_notices_created = True
-        activity_notice_seed.save()
-        status += "CREATE_ACTIVITY_NOTICES_FROM_SEED_MARKED_CREATED "
-    except Exception as e:
-        status += "CREATE_ACTIVITY_NOTICES_FROM_SEED_CANNOT_MARK_NOTICES_CREATED: " + str(e) + " "
-        success = False
+    if not fan_out_complete:
+        # Leave activity_notices_created False, so the next batch process picks up where this one stopped
+        status += "CREATE_ACTIVITY_NOTICES_FROM_SEED_TO_BE_CONTINUED "
+    else:
+        try:
+            activity_notice_seed.activity_notices_created = True
+            activity_notice_seed.save()
+            status += "CREATE_ACTIVITY_NOTICES_FROM_SEED_MARKED_CREATED "
+        except Exception as e:
+            status += "CREATE_ACTIVITY_NOTICES_FROM_SEED_CANNOT_MARK_NOTICES_CREATED: " + str(e) + " "
+            success = False
 
     results = {
         'success':                  success,
         'status':                   status,
         'activity_notice_count':    activity_notice_count,
+        'fan_out_complete':         fan_out_complete,
     }
     return results
 
 
-def update_or_create_voter_daily_summary_seed(
-        recipient_name='',
-        recipient_voter_we_vote_id='',
-        send_to_email=False,
-        send_to_sms=False,
-        speaker_organization_we_vote_id='',
-        speaker_voter_we_vote_id='',
-        update_only=False):
-    """
-
-    :param recipient_name:
-    :param recipient_voter_we_vote_id:
-    :param send_to_email:
-    :param send_to_sms:
-    :param speaker_organization_we_vote_id: The person's organization who has done something
-    :param speaker_voter_we_vote_id: The person who has done something
-    :param update_only:
-    :return:
-    """
-    status = ''
-    success = True
-    activity_manager = ActivityManager()
-
-    results = activity_manager.retrieve_recent_activity_notice_seed_from_listener(
-        kind_of_seed=NOTICE_VOTER_DAILY_SUMMARY_SEED,
-        recipient_voter_we_vote_id=recipient_voter_we_vote_id,
-    )
-    if results['activity_notice_seed_found']:
-        status += "WE_DO_NOT_NEED_TO_UPDATE_NOTICE_VOTER_DAILY_SUMMARY_SEED "
-        # activity_notice_seed = results['activity_notice_seed']
-        # change_detected = False
-        # try:
-        #     # DALE Sept 6, 2020: I'm not 100% sure we need to update NOTICE_VOTER_DAILY_SUMMARY_SEED with this data
-        #     #  since when we generate the daily summary email we are just querying against activity since the last
-        #     #  summary was sent.
-        #     if positive_value_exists(speaker_organization_we_vote_id):
-        #         speaker_organization_we_vote_ids = []
-        #         if positive_value_exists(activity_notice_seed.speaker_organization_we_vote_ids_serialized):
-        #             # Deserialize
-        #             speaker_organization_we_vote_ids = \
-        #                 json.loads(activity_notice_seed.speaker_organization_we_vote_ids_serialized)
-        #         if speaker_organization_we_vote_id not in speaker_organization_we_vote_ids:
-        #             speaker_organization_we_vote_ids.append(speaker_organization_we_vote_id)
-        #             change_detected = True
-        #         # Then serialize
-        #         speaker_organization_we_vote_ids_serialized = json.dumps(speaker_organization_we_vote_ids)
-        #         activity_notice_seed.speaker_organization_we_vote_ids_serialized = \
-        #             speaker_organization_we_vote_ids_serialized
-        #
-        #     if positive_value_exists(speaker_voter_we_vote_id):
-        #         speaker_voter_we_vote_ids = []
-        #         if positive_value_exists(activity_notice_seed.speaker_voter_we_vote_ids_serialized):
-        #             # Deserialize
-        #             speaker_voter_we_vote_ids = json.loads(activity_notice_seed.speaker_voter_we_vote_ids_serialized)
-        #         if speaker_voter_we_vote_id not in speaker_voter_we_vote_ids:
-        #             speaker_voter_we_vote_ids.append(speaker_voter_we_vote_id)
-        #             change_detected = True
-        #         # Then serialize
-        #         speaker_voter_we_vote_ids_serialized = json.dumps(speaker_voter_we_vote_ids)
-        #         activity_notice_seed.speaker_voter_we_vote_ids_serialized = speaker_voter_we_vote_ids_serialized
-        #
-        #     if activity_notice_seed.recipient_name != recipient_name:
-        #         activity_notice_seed.recipient_name = recipient_name
-        #         change_detected = True
-        #     if positive_value_exists(change_detected):
-        #         activity_notice_seed.save()
-        # except Exception as e:
-        #     status += "COULD_NOT_UPDATE_ACTIVITY_NOTICE_SEED_FOR_POSTS: " + str(e) + " "
-        # status += results['status']
-    elif update_only:
-        status += "DID_NOT_CREATE_SEED-UPDATE_ONLY_MODE "
-    elif results['success']:
-        if positive_value_exists(send_to_email) or positive_value_exists(send_to_sms):
-            date_of_notice = now()
-            speaker_organization_we_vote_ids = [speaker_organization_we_vote_id]
-            speaker_organization_we_vote_ids_serialized = json.dumps(speaker_organization_we_vote_ids)
-            speaker_voter_we_vote_ids = [speaker_voter_we_vote_id]
-            speaker_voter_we_vote_ids_serialized = json.dumps(speaker_voter_we_vote_ids)
-
-            create_results = activity_manager.create_activity_notice_seed(
-                date_of_notice=date_of_notice,
-                kind_of_seed=NOTICE_VOTER_DAILY_SUMMARY_SEED,
-                recipient_name=recipient_name,
-                recipient_voter_we_vote_id=recipient_voter_we_vote_id,
-                send_to_email=send_to_email,
-                send_to_sms=send_to_sms,
-                speaker_organization_we_vote_ids_serialized=speaker_organization_we_vote_ids_serialized,
-                speaker_voter_we_vote_ids_serialized=speaker_voter_we_vote_ids_serialized)
-            status += create_results['status']
-        else:
-            status += "NOT_SENDING-NEITHER_SEND_TO_EMAIL_NOR_SMS_SET "
-    else:
-        status += results['status']
-
-    results = {
-        'success':              success,
-        'status':               status,
-    }
-    return results
-
-
-def update_or_create_voter_daily_summary_seeds_from_seed(activity_notice_seed):
+def update_or_create_voter_daily_summary_seeds_from_seed(activity_notice_seed, when_process_must_stop=None):
     """
     Take in seeds like NOTICE_ACTIVITY_POST_SEED and create a NOTICE_VOTER_DAILY_SUMMARY_SEED for
     each of the speaker_voter's friends
     :param activity_notice_seed:
+    :param when_process_must_stop: Stop fanning out at this time, and leave the seed to be finished later
     :return:
     """
     status = ''
     success = True
     activity_notice_count = 0
+    fan_out_complete = True
+    activity_manager = ActivityManager()
     friend_manager = FriendManager()
     seed_types_that_always_cause_the_creation_of_voter_daily_summary_seed = [NOTICE_ACTIVITY_POST_SEED]
 
+    if not CREATE_VOTER_DAILY_SUMMARY_SEEDS:
+        # Skip the friend lookups and the recent seed queries, since none of the seeds would be created
+        status += "VOTER_DAILY_SUMMARY_SEEDS_NOT_CREATED "
+        try:
+            activity_notice_seed.added_to_voter_daily_summary = True
+            activity_notice_seed.save()
+            status += "MARKED_ADDED_TO_VOTER_DAILY_SUMMARY "
+        except Exception as e:
+            status += "ADDED_TO_VOTER_DAILY_SUMMARY-CANNOT_MARK_CREATED: " + str(e) + " "
+            success = False
+        results = {
+            'success':                  success,
+            'status':                   status,
+            'activity_notice_count':    activity_notice_count,
+            'fan_out_complete':         fan_out_complete,
+        }
+        return results
+
     # Who needs to see a notice?
     audience = 'FRIENDS'
     # audience = 'ONE_FRIEND'
@@ -1570,21 +1635,19 @@ def update_or_create_voter_daily_summary_seeds_from_seed(activity_notice_seed):
         status += retrieve_current_friends_as_voters_results['status']
         if retrieve_current_friends_as_voters_results['friend_list_found']:
             current_friend_list = retrieve_current_friends_as_voters_results['friend_list']
+            recipient_seed_values_dict = {}
             for friend_voter in current_friend_list:
                 create_voter_daily_summary_seed_for_this_voter = False
-                update_only = False
                 if activity_notice_seed.kind_of_seed == NOTICE_FRIEND_ENDORSEMENTS_SEED:
                     # Add friend endorsements to a daily summary of activity: NOTICE_VOTER_DAILY_SUMMARY
                     #  if a NOTICE_VOTER_DAILY_SUMMARY has already been created
                     #  OR if this voter has this notification setting turned off
-                    create_voter_daily_summary_seed_for_this_voter = True
-                    opinions_email_turned_on = friend_voter.is_notification_status_flag_set(
-                        NOTIFICATION_FRIEND_OPINIONS_OTHER_REGIONS_EMAIL)
-                    if positive_value_exists(opinions_email_turned_on):
-                        # Since the friend_voter is already getting a notice about the speaker_voter's endorsements
-                        #  don't create a VOTER_DAILY_SUMMARY *just* for NOTICE_FRIEND_ENDORSEMENTS
-                        #  but updating is ok.
-                        update_only = True
+                    # Since a friend_voter with opinions email turned on is already getting a notice about the
+                    #  speaker_voter's endorsements, don't create a VOTER_DAILY_SUMMARY *just* for
+                    #  NOTICE_FRIEND_ENDORSEMENTS
+                    create_voter_daily_summary_seed_for_this_voter = \
+                        not friend_voter.is_notification_status_flag_set(
+                            NOTIFICATION_FRIEND_OPINIONS_OTHER_REGIONS_EMAIL)
                 elif activity_notice_seed.kind_of_seed \
                         in seed_types_that_always_cause_the_creation_of_voter_daily_summary_seed:
                     create_voter_daily_summary_seed_for_this_voter = True
@@ -1595,32 +1658,63 @@ def update_or_create_voter_daily_summary_seeds_from_seed(activity_notice_seed):
                 send_to_sms = friend_voter.is_notification_status_flag_set(
                     NOTIFICATION_VOTER_DAILY_SUMMARY_SMS)
 
-                if create_voter_daily_summary_seed_for_this_voter:
-                    results = update_or_create_voter_daily_summary_seed(
-                        recipient_name=friend_voter.get_full_name(real_name_only=True),
-                        recipient_voter_we_vote_id=friend_voter.we_vote_id,
-                        send_to_email=send_to_email,
-                        send_to_sms=send_to_sms,
-                        speaker_organization_we_vote_id=activity_notice_seed.speaker_organization_we_vote_id,
-                        speaker_voter_we_vote_id=activity_notice_seed.speaker_voter_we_vote_id,
-                        update_only=update_only,
-                    )
-                    status += results['status']
+                if create_voter_daily_summary_seed_for_this_voter and (send_to_email or send_to_sms):
+                    speaker_organization_we_vote_id = activity_notice_seed.speaker_organization_we_vote_id
+                    speaker_voter_we_vote_id = activity_notice_seed.speaker_voter_we_vote_id
+                    recipient_seed_values_dict[friend_voter.we_vote_id.lower()] = {
+                        'date_of_notice':                               now(),
+                        'kind_of_seed':                                 NOTICE_VOTER_DAILY_SUMMARY_SEED,
+                        'recipient_name':                               friend_voter.get_full_name(real_name_only=True),
+                        'recipient_voter_we_vote_id':                   friend_voter.we_vote_id,
+                        'send_to_email':                                send_to_email,
+                        'send_to_sms':                                  send_to_sms,
+                        'speaker_organization_we_vote_ids_serialized':  json.dumps([speaker_organization_we_vote_id]),
+                        'speaker_voter_we_vote_id':                     speaker_voter_we_vote_id,
+                        'speaker_voter_we_vote_ids_serialized':         json.dumps([speaker_voter_we_vote_id]),
+                    }
+
+            # Friends who already have a NOTICE_VOTER_DAILY_SUMMARY_SEED are left alone. When we generate the daily
+            #  summary email we query against activity since the last summary was sent, so it doesn't need updating.
+            recipient_seed_values_list = list(recipient_seed_values_dict.items())
+            for start in range(0, len(recipient_seed_values_list), ACTIVITY_NOTICE_FAN_OUT_CHUNK_SIZE):
+                if when_process_must_stop is not None and when_process_must_stop < now():
+                    fan_out_complete = False
+                    status += "DAILY_SUMMARY_SEEDS_STOPPED_AT_RECIPIENT " + str(start) + " "
+                    break
+                recipient_seed_values_chunk = \
+                    recipient_seed_values_list[start:start + ACTIVITY_NOTICE_FAN_OUT_CHUNK_SIZE]
+                existing_recipient_set = activity_manager.fetch_recipient_voter_we_vote_id_set_with_recent_seeds(
+                    kind_of_seed=NOTICE_VOTER_DAILY_SUMMARY_SEED,
+                    recipient_voter_we_vote_id_list=[
+                        recipient_voter_we_vote_id for recipient_voter_we_vote_id, seed_values
+                        in recipient_seed_values_chunk])
+                results = activity_manager.create_activity_notice_seeds_in_bulk(
+                    activity_notice_seed_values_list=[
+                        seed_values for recipient_voter_we_vote_id, seed_values in recipient_seed_values_chunk
+                        if recipient_voter_we_vote_id not in existing_recipient_set])
+                status += results['status']
+                if not results['success']:
+                    success = False
         else:
             status += "CREATE_DAILY_SUMMARY_FROM_SEED_NO_FRIENDS "
 
-    try:
-        activity_notice_seed.added_to_voter_daily_summary = True
-        activity_notice_seed.save()
-        status += "MARKED_ADDED_TO_VOTER_DAILY_SUMMARY "
-    except Exception as e:
-        status += "ADDED_TO_VOTER_DAILY_SUMMARY-CANNOT_MARK_CREATED: " + str(e) + " "
-        success = False
+    if not fan_out_complete:
+        # Leave added_to_voter_daily_summary False, so the next batch process picks up where this one stopped
+        status += "DAILY_SUMMARY_SEEDS_FROM_SEED_TO_BE_CONTINUED "
+    else:
+        try:
+            activity_notice_seed.added_to_voter_daily_summary = True
+            activity_notice_seed.save()
+            status += "MARKED_ADDED_TO_VOTER_DAILY_SUMMARY "
+        except Exception as e:
+            status += "ADDED_TO_VOTER_DAILY_SUMMARY-CANNOT_MARK_CREATED: " + str(e) + " "
+            success = False
 
     results = {
         'success':                  success,
         'status':                   status,
         'activity_notice_count':    activity_notice_count,
+        'fan_out_complete':         fan_out_complete,
     }
     return results
 
@@ -1693,43 +1787,44 @@ def schedule_activity_notices_from_seed(activity_notice_seed):
                 success = False
             elif results['activity_notice_list_found']:
                 activity_notice_list = results['activity_notice_list']
-                for activity_notice in activity_notice_list:
-                    send_results = campaignx_news_item_send(
-                        campaignx_news_item_we_vote_id=activity_notice_seed.campaignx_news_item_we_vote_id,
-                        campaigns_root_url_verified=campaigns_root_url_verified,
-                        campaignx_title=campaignx_title,
-                        campaignx_url=campaignx_url,
-                        campaignx_we_vote_id=activity_notice_seed.campaignx_we_vote_id,
-                        politician_count=politician_count,
-                        politician_full_sentence_string=politician_full_sentence_string,
-                        recipient_voter_we_vote_id=activity_notice.recipient_voter_we_vote_id,
-                        speaker_voter_name=speaker_voter_name,
-                        speaker_voter_we_vote_id=activity_notice.speaker_voter_we_vote_id,
-                        statement_subject=activity_notice_seed.statement_subject,
-                        statement_text_preview=activity_notice_seed.statement_text_preview,
-                        we_vote_hosted_campaign_photo_large_url=we_vote_hosted_campaign_photo_large_url,
-                    )
-                    activity_notice_id_already_reviewed_list.append(activity_notice.id)
-                    try:
+                sent_activity_notice_list = []
+                try:
+                    for activity_notice in activity_notice_list:
+                        send_results = campaignx_news_item_send(
+                            campaignx_news_item_we_vote_id=activity_notice_seed.campaignx_news_item_we_vote_id,
+                            campaigns_root_url_verified=campaigns_root_url_verified,
+                            campaignx_title=campaignx_title,
+                            campaignx_url=campaignx_url,
+                            campaignx_we_vote_id=activity_notice_seed.campaignx_we_vote_id,
+                            politician_count=politician_count,
+                            politician_full_sentence_string=politician_full_sentence_string,
+                            recipient_voter_we_vote_id=activity_notice.recipient_voter_we_vote_id,
+                            speaker_voter_name=speaker_voter_name,
+                            speaker_voter_we_vote_id=activity_notice.speaker_voter_we_vote_id,
+                            statement_subject=activity_notice_seed.statement_subject,
+                            statement_text_preview=activity_notice_seed.statement_text_preview,
+                            we_vote_hosted_campaign_photo_large_url=we_vote_hosted_campaign_photo_large_url,
+                        )
+                        activity_notice_id_already_reviewed_list.append(activity_notice.id)
                         activity_notice.scheduled_to_email = True
-                        activity_notice.save()
-                    except Exception as e:
-                        status += "FAILED_SAVING_ACTIVITY_NOTICE_CAMPAIGNX_NEWS_ITEM_SCHEDULED: " + str(e) + " "
-                        success = False
-                    if send_results['success']:
-                        try:
+                        if send_results['success']:
                             activity_notice.sent_to_email = True
                             activity_notice.scheduled_to_sms = True
                             activity_notice.sent_to_sms = True
-                            activity_notice.save()
                             activity_notice_count += 1
                             # We'll want to create a routine that connects up to the SendGrid API to tell us
                             #  when the message was received or bounced
-                        except Exception as e:
-                            status += "FAILED_SAVING_ACTIVITY_NOTICE_CAMPAIGNX_NEWS_ITEM: " + str(e) + " "
+                        else:
+                            status += send_results['status']
                             success = False
-                    else:
-                        status += send_results['status']
+                        sent_activity_notice_list.append(activity_notice)
+                finally:
+                    # Save this chunk's progress together, even if a send raised part way through, so the
+                    #  notices already sent aren't sent again
+                    try:
+                        ActivityNotice.objects.bulk_update(sent_activity_notice_list, ACTIVITY_NOTICE_SENT_FIELD_NAMES)
+                    except Exception as e:
+                        status += "FAILED_SAVING_ACTIVITY_NOTICE_CAMPAIGNX_NEWS_ITEM: " + str(e) + " "
                         success = False
             else:
                 continue_retrieving = False
@@ -1792,27 +1887,33 @@ def schedule_activity_notices_from_seed(activity_notice_seed):
                 success = False
             elif results['activity_notice_list_found']:
                 activity_notice_list = results['activity_notice_list']
-                for activity_notice in activity_notice_list:
-                    send_results = campaignx_friend_has_supported_send(
-                        campaignx_we_vote_id=activity_notice_seed.campaignx_we_vote_id,
-                        recipient_voter_we_vote_id=activity_notice.recipient_voter_we_vote_id,
-                        speaker_voter_we_vote_id=activity_notice.speaker_voter_we_vote_id)
-                    activity_notice_id_already_reviewed_list.append(activity_notice.id)
-                    if send_results['success']:
-                        try:
+                sent_activity_notice_list = []
+                try:
+                    for activity_notice in activity_notice_list:
+                        send_results = campaignx_friend_has_supported_send(
+                            campaignx_we_vote_id=activity_notice_seed.campaignx_we_vote_id,
+                            recipient_voter_we_vote_id=activity_notice.recipient_voter_we_vote_id,
+                            speaker_voter_we_vote_id=activity_notice.speaker_voter_we_vote_id)
+                        activity_notice_id_already_reviewed_list.append(activity_notice.id)
+                        if send_results['success']:
                             activity_notice.scheduled_to_email = True
                             activity_notice.sent_to_email = True
                             activity_notice.scheduled_to_sms = True
                             activity_notice.sent_to_sms = True
-                            activity_notice.save()
-                            activity_notice_count += 1
+                            sent_activity_notice_list.append(activity_notice)
                             # We'll want to create a routine that connects up to the SendGrid API to tell us
                             #  when the message was received or bounced
-                        except Exception as e:
-                            status += "FAILED_SAVING_ACTIVITY_NOTICE_CAMPAIGNX_FRIEND_HAS_SUPPORTED: " + str(e) + " "
+                        else:
+                            status += send_results['status']
                             success = False
-                    else:
-                        status += send_results['status']
+                finally:
+                    # Save this chunk's progress together, even if a send raised part way through, so the
+                    #  notices already sent aren't sent again
+                    try:
+                        ActivityNotice.objects.bulk_update(sent_activity_notice_list, ACTIVITY_NOTICE_SENT_FIELD_NAMES)
+                        activity_notice_count += len(sent_activity_notice_list)
+                    except Exception as e:
+                        status += "FAILED_SAVING_ACTIVITY_NOTICE_CAMPAIGNX_FRIEND_HAS_SUPPORTED: " + str(e) + " "
                         success = False
             else:
                 continue_retrieving = False
@@ -1861,28 +1962,34 @@ def schedule_activity_notices_from_seed(activity_notice_seed):
                     position_name_list += position_name_list_for_public
 
                 activity_notice_list = results['activity_notice_list']
-                for activity_notice in activity_notice_list:
-                    send_results = notice_friend_endorsements_send(
-                        speaker_voter_we_vote_id=activity_notice.speaker_voter_we_vote_id,
-                        recipient_voter_we_vote_id=activity_notice.recipient_voter_we_vote_id,
-                        activity_tidbit_we_vote_id=activity_notice_seed.we_vote_id,
-                        position_name_list=position_name_list)
-                    activity_notice_id_already_reviewed_list.append(activity_notice.id)
-                    if send_results['success']:
-                        try:
+                sent_activity_notice_list = []
+                try:
+                    for activity_notice in activity_notice_list:
+                        send_results = notice_friend_endorsements_send(
+                            speaker_voter_we_vote_id=activity_notice.speaker_voter_we_vote_id,
+                            recipient_voter_we_vote_id=activity_notice.recipient_voter_we_vote_id,
+                            activity_tidbit_we_vote_id=activity_notice_seed.we_vote_id,
+                            position_name_list=position_name_list)
+                        activity_notice_id_already_reviewed_list.append(activity_notice.id)
+                        if send_results['success']:
                             activity_notice.scheduled_to_email = True
                             activity_notice.sent_to_email = True
                             activity_notice.scheduled_to_sms = True
                             activity_notice.sent_to_sms = True
-                            activity_notice.save()
-                            activity_notice_count += 1
+                            sent_activity_notice_list.append(activity_notice)
                             # We'll want to create a routine that connects up to the SendGrid API to tell us
                             #  when the message was received or bounced
-                        except Exception as e:
-                            status += "FAILED_SAVING_ACTIVITY_NOTICE: " + str(e) + " "
-                    else:
-                        status += send_results['status']
-                        success = False
+                        else:
+                            status += send_results['status']
+                            success = False
+                finally:
+                    # Save this chunk's progress together, even if a send raised part way through, so the
+                    #  notices already sent aren't sent again
+                    try:
+                        ActivityNotice.objects.bulk_update(sent_activity_notice_list, ACTIVITY_NOTICE_SENT_FIELD_NAMES)
+                        activity_notice_count += len(sent_activity_notice_list)
+                    except Exception as e:
+                        status += "FAILED_SAVING_ACTIVITY_NOTICE: " + str(e) + " "
             else:
                 continue_retrieving = False
         try:
@@ -2231,240 +2338,6 @@ def update_or_create_activity_notice_for_campaignx_supporter_initial_response(
     return results
 
 
-def update_or_create_activity_notice_for_friend_campaignx_support(
-        activity_notice_seed_id=0,
-        campaignx_we_vote_id='',
-        kind_of_seed='',
-        kind_of_notice='',
-        number_of_comments=0,
-        number_of_likes=0,
-        recipient_voter_we_vote_id='',
-        send_to_email=False,
-        send_to_sms=False,
-        speaker_name='',
-        speaker_organization_we_vote_id='',
-        speaker_voter_we_vote_id='',
-        speaker_profile_image_url_medium='',
-        speaker_profile_image_url_tiny='',
-        statement_text_preview=''):
-    status = ''
-    success = True
-    activity_manager = ActivityManager()
-
-    results = activity_manager.retrieve_recent_activity_notice_from_speaker_and_recipient(
-        activity_notice_seed_id=activity_notice_seed_id,
-        campaignx_we_vote_id=campaignx_we_vote_id,
-        kind_of_notice=kind_of_notice,
-        recipient_voter_we_vote_id=recipient_voter_we_vote_id,
-        speaker_organization_we_vote_id=speaker_organization_we_vote_id,
-        speaker_voter_we_vote_id=speaker_voter_we_vote_id,
-    )
-    if results['activity_notice_found']:
-        try:
-            activity_notice = results['activity_notice']
-            change_found = False
-            if positive_value_exists(campaignx_we_vote_id) and \
-                    campaignx_we_vote_id != activity_notice.campaignx_we_vote_id:
-                activity_notice.campaignx_we_vote_id = campaignx_we_vote_id
-                change_found = True
-            if positive_value_exists(number_of_comments) and number_of_comments != activity_notice.number_of_comments:
-                activity_notice.number_of_comments = number_of_comments
-                change_found = True
-            if positive_value_exists(number_of_likes) and number_of_likes != activity_notice.number_of_likes:
-                activity_notice.number_of_likes = number_of_likes
-                change_found = True
-            if positive_value_exists(speaker_name) and speaker_name != activity_notice.speaker_name:
-                activity_notice.speaker_name = speaker_name
-                change_found = True
-            if positive_value_exists(statement_text_preview) and \
-                    statement_text_preview != activity_notice.statement_text_preview:
-                activity_notice.statement_text_preview = statement_text_preview
-                change_found = True
-            if change_found:
-                activity_notice.save()
-        except Exception as e:
-            status += "FAILED_ACTIVITY_NOTICE_SAVE: " + str(e) + ' '
-        status += results['status']
-    elif results['success']:
-        date_of_notice = now()
-        create_results = activity_manager.create_activity_notice(
-            activity_notice_seed_id=activity_notice_seed_id,
-            campaignx_we_vote_id=campaignx_we_vote_id,
-            date_of_notice=date_of_notice,
-            kind_of_notice=kind_of_notice,
-            kind_of_seed=kind_of_seed,
-            number_of_comments=number_of_comments,
-            number_of_likes=number_of_likes,
-            recipient_voter_we_vote_id=recipient_voter_we_vote_id,
-            send_to_email=send_to_email,
-            send_to_sms=send_to_sms,
-            speaker_name=speaker_name,
-            speaker_organization_we_vote_id=speaker_organization_we_vote_id,
-            speaker_voter_we_vote_id=speaker_voter_we_vote_id,
-            speaker_profile_image_url_medium=speaker_profile_image_url_medium,
-            speaker_profile_image_url_tiny=speaker_profile_image_url_tiny,
-            statement_text_preview=statement_text_preview)
-        status += create_results['status']
-    else:
-        status += results['status']
-
-    results = {
-        'success':              success,
-        'status':               status,
-    }
-    return results
-
-
-def update_or_create_activity_notice_for_friend_endorsements(
-        activity_notice_seed_id=0,
-        activity_tidbit_we_vote_id='',
-        kind_of_seed='',
-        kind_of_notice='',
-        position_name_list_serialized='',
-        position_we_vote_id_list_serialized='',
-        recipient_voter_we_vote_id='',
-        send_to_email=False,
-        send_to_sms=False,
-        speaker_name='',
-        speaker_organization_we_vote_id='',
-        speaker_voter_we_vote_id='',
-        speaker_profile_image_url_medium='',
-        speaker_profile_image_url_tiny=''):
-    status = ''
-    success = True
-    activity_manager = ActivityManager()
-
-    results = activity_manager.retrieve_recent_activity_notice_from_speaker_and_recipient(
-        activity_notice_seed_id=activity_notice_seed_id,
-        kind_of_notice=kind_of_notice,
-        recipient_voter_we_vote_id=recipient_voter_we_vote_id,
-        speaker_organization_we_vote_id=speaker_organization_we_vote_id,
-        speaker_voter_we_vote_id=speaker_voter_we_vote_id,
-    )
-    # Combine friends and public into single position_we_vote_id_list_serialized
-    if results['activity_notice_found']:
-        try:
-            activity_notice = results['activity_notice']
-            activity_notice.position_name_list_serialized = position_name_list_serialized
-            activity_notice.position_we_vote_id_list_serialized = position_we_vote_id_list_serialized
-            if positive_value_exists(activity_tidbit_we_vote_id):
-                activity_notice.activity_tidbit_we_vote_id = activity_tidbit_we_vote_id
-            activity_notice.save()
-        except Exception as e:
-            status += "FAILED_ACTIVITY_NOTICE_SAVE: " + str(e) + ' '
-        status += results['status']
-    elif results['success']:
-        date_of_notice = now()
-        create_results = activity_manager.create_activity_notice(
-            activity_notice_seed_id=activity_notice_seed_id,
-            activity_tidbit_we_vote_id=activity_tidbit_we_vote_id,
-            date_of_notice=date_of_notice,
-            kind_of_notice=kind_of_notice,
-            kind_of_seed=kind_of_seed,
-            position_name_list_serialized=position_name_list_serialized,
-            position_we_vote_id_list_serialized=position_we_vote_id_list_serialized,
-            recipient_voter_we_vote_id=recipient_voter_we_vote_id,
-            send_to_email=send_to_email,
-            send_to_sms=send_to_sms,
-            speaker_name=speaker_name,
-            speaker_organization_we_vote_id=speaker_organization_we_vote_id,
-            speaker_voter_we_vote_id=speaker_voter_we_vote_id,
-            speaker_profile_image_url_medium=speaker_profile_image_url_medium,
-            speaker_profile_image_url_tiny=speaker_profile_image_url_tiny)
-        status += create_results['status']
-    else:
-        status += results['status']
-
-    results = {
-        'success':              success,
-        'status':               status,
-    }
-    return results
-
-
-def update_or_create_activity_notice_for_friend_posts(
-        activity_notice_seed_id=0,
-        activity_tidbit_we_vote_id='',
-        kind_of_seed='',
-        kind_of_notice='',
-        number_of_comments=0,
-        number_of_likes=0,
-        recipient_voter_we_vote_id='',
-        send_to_email=False,
-        send_to_sms=False,
-        speaker_name='',
-        speaker_organization_we_vote_id='',
-        speaker_voter_we_vote_id='',
-        speaker_profile_image_url_medium='',
-        speaker_profile_image_url_tiny='',
-        statement_text_preview=''):
-    status = ''
-    success = True
-    activity_manager = ActivityManager()
-
-    results = activity_manager.retrieve_recent_activity_notice_from_speaker_and_recipient(
-        activity_notice_seed_id=activity_notice_seed_id,
-        kind_of_notice=kind_of_notice,
-        recipient_voter_we_vote_id=recipient_voter_we_vote_id,
-        speaker_organization_we_vote_id=speaker_organization_we_vote_id,
-        speaker_voter_we_vote_id=speaker_voter_we_vote_id,
-    )
-    if results['activity_notice_found']:
-        try:
-            activity_notice = results['activity_notice']
-            change_found = False
-            if positive_value_exists(activity_tidbit_we_vote_id) and \
-                    activity_tidbit_we_vote_id != activity_notice.activity_tidbit_we_vote_id:
-                activity_notice.activity_tidbit_we_vote_id = activity_tidbit_we_vote_id
-                change_found = True
-            if positive_value_exists(number_of_comments) and number_of_comments != activity_notice.number_of_comments:
-                activity_notice.number_of_comments = number_of_comments
-                change_found = True
-            if positive_value_exists(number_of_likes) and number_of_likes != activity_notice.number_of_likes:
-                activity_notice.number_of_likes = number_of_likes
-                change_found = True
-            if positive_value_exists(speaker_name) and speaker_name != activity_notice.speaker_name:
-                activity_notice.speaker_name = speaker_name
-                change_found = True
-            if positive_value_exists(statement_text_preview) and \
-                    statement_text_preview != activity_notice.statement_text_preview:
-                activity_notice.statement_text_preview = statement_text_preview
-                change_found = True
-            if change_found:
-                activity_notice.save()
-        except Exception as e:
-            status += "FAILED_ACTIVITY_NOTICE_SAVE: " + str(e) + ' '
-        status += results['status']
-    elif results['success']:
-        date_of_notice = now()
-        create_results = activity_manager.create_activity_notice(
-            activity_notice_seed_id=activity_notice_seed_id,
-            activity_tidbit_we_vote_id=activity_tidbit_we_vote_id,
-            date_of_notice=date_of_notice,
-            kind_of_notice=kind_of_notice,
-            kind_of_seed=kind_of_seed,
-            number_of_comments=number_of_comments,
-            number_of_likes=number_of_likes,
-            recipient_voter_we_vote_id=recipient_voter_we_vote_id,
-            send_to_email=send_to_email,
-            send_to_sms=send_to_sms,
-            speaker_name=speaker_name,
-            speaker_organization_we_vote_id=speaker_organization_we_vote_id,
-            speaker_voter_we_vote_id=speaker_voter_we_vote_id,
-            speaker_profile_image_url_medium=speaker_profile_image_url_medium,
-            speaker_profile_image_url_tiny=speaker_profile_image_url_tiny,
-            statement_text_preview=statement_text_preview)
-        status += create_results['status']
-    else:
-        status += results['status']
-
-    results = {
-        'success':              success,
-        'status':               status,
-    }
-    return results
-
-
 def update_or_create_activity_notice_seed_for_activity_posts(
         activity_post_we_vote_id='',
         visibility_is_public=False,
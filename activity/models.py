@@ -4,13 +4,17 @@
 
 from django.db import models
 from django.db.models import Q
+from django.db.models.functions import Lower
 from django.utils.timezone import now
 from datetime import timedelta
 import json
 from wevote_functions.functions import convert_to_int, positive_value_exists
 from wevote_settings.models import fetch_next_we_vote_id_activity_notice_seed_integer, \
-    fetch_next_we_vote_id_activity_comment_integer, fetch_next_we_vote_id_activity_post_integer, \
-    fetch_site_unique_id_prefix
+    fetch_next_we_vote_id_activity_notice_seed_integer_list, fetch_next_we_vote_id_activity_comment_integer, \
+    fetch_next_we_vote_id_activity_post_integer, fetch_site_unique_id_prefix
+
+# Number of recipients whose ActivityNotice entries are looked up and saved together, when a seed fans out
+ACTIVITY_NOTICE_FAN_OUT_CHUNK_SIZE = 500
 
 # Kind of Seeds (value should not exceed 50 chars)
 NOTICE_ACTIVITY_POST_SEED = 'NOTICE_ACTIVITY_POST_SEED'
@@ -257,6 +261,55 @@ class ActivityManager(models.Manager):
         }
         return results
 
+    def create_activity_notice_seeds_in_bulk(self, activity_notice_seed_values_list=[]):
+        """
+        Bulk version of create_activity_notice_seed. The we_vote_ids are reserved together, since bulk_create
+        doesn't call ActivityNoticeSeed.save().
+        :param activity_notice_seed_values_list: A dict of field values for each new ActivityNoticeSeed
+        :return:
+        """
+        status = ''
+        success = True
+        activity_notice_seeds_created = 0
+
+        activity_notice_seed_list = []
+        missing_speaker_count = 0
+        for activity_notice_seed_values in activity_notice_seed_values_list:
+            if not positive_value_exists(activity_notice_seed_values.get('speaker_organization_we_vote_id')):
+                missing_speaker_count += 1
+                continue
+            activity_notice_seed = ActivityNoticeSeed(**activity_notice_seed_values)
+            if positive_value_exists(activity_notice_seed.send_to_email):
+                activity_notice_seed.date_sent_to_email = now()
+            activity_notice_seed_list.append(activity_notice_seed)
+        if positive_value_exists(missing_speaker_count):
+            status += "ACTIVITY_NOTICE_SEED_MISSING_SPEAKER: " + str(missing_speaker_count) + " "
+
+        if len(activity_notice_seed_list):
+            try:
+                site_unique_id_prefix = fetch_site_unique_id_prefix()
+                next_integer_list = fetch_next_we_vote_id_activity_notice_seed_integer_list(
+                    len(activity_notice_seed_list))
+                for activity_notice_seed, next_integer in zip(activity_notice_seed_list, next_integer_list):
+                    activity_notice_seed.we_vote_id = "wv{site_unique_id_prefix}actseed{next_integer}".format(
+                        site_unique_id_prefix=site_unique_id_prefix,
+                        next_integer=next_integer,
+                    )
+                    activity_notice_seed.date_last_changed = now()
+                ActivityNoticeSeed.objects.bulk_create(activity_notice_seed_list)
+                activity_notice_seeds_created = len(activity_notice_seed_list)
+                status += "ACTIVITY_NOTICE_SEEDS_CREATED_IN_BULK "
+            except Exception as e:
+                success = False
+                status += "ACTIVITY_NOTICE_SEEDS_NOT_CREATED_IN_BULK: " + str(e) + ' '
+
+        results = {
+            'success':                          success,
+            'status':                           status,
+            'activity_notice_seeds_created':    activity_notice_seeds_created,
+        }
+        return results
+
     def create_activity_post(
             self,
             sender_voter_we_vote_id,
@@ -336,6 +389,69 @@ class ActivityManager(models.Manager):
 
         return activity_notice_count
 
+    def fetch_recipient_voter_we_vote_id_set_with_activity_notices(
+            self,
+            activity_in_last_x_seconds=None,
+            kind_of_notice='',
+            recipient_voter_we_vote_id_list=[],
+            send_to_email=None,
+            speaker_voter_we_vote_id=''):
+        """
+        Set-based version of fetch_activity_notice_count, for a list of recipients
+        :param activity_in_last_x_seconds:
+        :param kind_of_notice:
+        :param recipient_voter_we_vote_id_list:
+        :param send_to_email:
+        :param speaker_voter_we_vote_id:
+        :return: set of the (lower case) recipient_voter_we_vote_ids which have at least one matching notice
+        """
+        if not len(recipient_voter_we_vote_id_list):
+            return set()
+        try:
+            queryset = ActivityNotice.objects.using('readonly').annotate(
+                recipient_voter_we_vote_id_lower=Lower('recipient_voter_we_vote_id'))
+            queryset = queryset.filter(
+                deleted=False,
+                recipient_voter_we_vote_id_lower__in=[
+                    one_we_vote_id.lower() for one_we_vote_id in recipient_voter_we_vote_id_list])
+            if activity_in_last_x_seconds is not None:
+                activity_in_last_x_seconds = convert_to_int(activity_in_last_x_seconds)
+                earliest_date_of_notice = now() - timedelta(seconds=activity_in_last_x_seconds)
+                queryset = queryset.filter(date_of_notice__gte=earliest_date_of_notice)
+            if positive_value_exists(kind_of_notice):
+                queryset = queryset.filter(kind_of_notice=kind_of_notice)
+            if send_to_email is not None:
+                queryset = queryset.filter(send_to_email=positive_value_exists(send_to_email))
+            if positive_value_exists(speaker_voter_we_vote_id):
+                queryset = queryset.filter(speaker_voter_we_vote_id=speaker_voter_we_vote_id)
+            return set(queryset.values_list('recipient_voter_we_vote_id_lower', flat=True).distinct())
+        except Exception as e:
+            return set()
+
+    def fetch_recipient_voter_we_vote_id_set_with_recent_seeds(
+            self,
+            kind_of_seed='',
+            recipient_voter_we_vote_id_list=[]):
+        """
+        Set-based version of retrieve_recent_activity_notice_seed_from_listener, for a list of recipients
+        :param kind_of_seed:
+        :param recipient_voter_we_vote_id_list:
+        :return: set of the (lower case) recipient_voter_we_vote_ids which already have a recent seed
+        """
+        if not len(recipient_voter_we_vote_id_list):
+            return set()
+        lifespan_of_seed_in_seconds = get_lifespan_of_seed(kind_of_seed)  # In seconds
+        earliest_date_of_notice = now() - timedelta(seconds=lifespan_of_seed_in_seconds)
+        queryset = ActivityNoticeSeed.objects.annotate(
+            recipient_voter_we_vote_id_lower=Lower('recipient_voter_we_vote_id'))
+        queryset = queryset.filter(
+            date_of_notice__gte=earliest_date_of_notice,
+            deleted=False,
+            kind_of_seed=kind_of_seed,
+            recipient_voter_we_vote_id_lower__in=[
+                one_we_vote_id.lower() for one_we_vote_id in recipient_voter_we_vote_id_list])
+        return set(queryset.values_list('recipient_voter_we_vote_id_lower', flat=True).distinct())
+
     def fetch_number_of_comments(self, parent_we_vote_id='', parent_comment_we_vote_id=''):
         results = self.retrieve_number_of_comments(
             parent_we_vote_id=parent_we_vote_id,
@@ -1371,6 +1487,113 @@ class ActivityManager(models.Manager):
             }
         return results
 
+    def update_or_create_activity_notices_in_bulk(
+            self,
+            lookup_values={},
+            create_values={},
+            update_values={},
+            recipient_list=[]):
+        """
+        Set-based version of looking up each recipient's ActivityNotice, then saving it or calling
+        create_activity_notice. The existing notices for all the recipients are found with one query, the ones which
+        changed are saved with bulk_update and the missing ones are saved with bulk_create.
+        :param lookup_values: Filters (other than the recipient) which find the existing notices,
+         ex/ {'activity_notice_seed_id': 1, 'kind_of_notice': NOTICE_FRIEND_ENDORSEMENTS,
+         'speaker_organization_we_vote_id__iexact': 'wv02org1'}
+        :param create_values: Field values for new notices
+        :param update_values: Field values written to existing notices which don't already have them
+        :param recipient_list: A dict with recipient_voter_we_vote_id, send_to_email and send_to_sms for each recipient
+        :return:
+        """
+        status = ''
+        success = True
+        activity_notices_created = 0
+        activity_notices_updated = 0
+
+        recipient_dict = {}
+        for recipient in recipient_list:
+            if positive_value_exists(recipient['recipient_voter_we_vote_id']):
+                recipient_dict[recipient['recipient_voter_we_vote_id'].lower()] = recipient
+        if not len(recipient_dict):
+            results = {
+                'success':                      success,
+                'status':                       "ACTIVITY_NOTICES_IN_BULK_NO_RECIPIENTS ",
+                'activity_notices_created':     activity_notices_created,
+                'activity_notices_updated':     activity_notices_updated,
+            }
+            return results
+
+        # One query for the notices every recipient in this list already has
+        existing_activity_notice_list = []
+        try:
+            queryset = ActivityNotice.objects.annotate(
+                recipient_voter_we_vote_id_lower=Lower('recipient_voter_we_vote_id'))
+            queryset = queryset.filter(
+                deleted=False, recipient_voter_we_vote_id_lower__in=list(recipient_dict), **lookup_values)
+            existing_activity_notice_list = list(queryset)
+        except Exception as e:
+            success = False
+            status += "ACTIVITY_NOTICES_IN_BULK_RETRIEVE_FAILED: " + str(e) + ' '
+
+        if success:
+            changed_activity_notice_list = []
+            changed_field_set = set()
+            for activity_notice in existing_activity_notice_list:
+                recipient_dict.pop(activity_notice.recipient_voter_we_vote_id_lower, None)
+                change_found = False
+                for field_name, value in update_values.items():
+                    if getattr(activity_notice, field_name) != value:
+                        setattr(activity_notice, field_name, value)
+                        changed_field_set.add(field_name)
+                        change_found = True
+                if change_found:
+                    # bulk_update doesn't apply auto_now
+                    activity_notice.date_last_changed = now()
+                    changed_activity_notice_list.append(activity_notice)
+            if len(changed_activity_notice_list):
+                try:
+                    ActivityNotice.objects.bulk_update(
+                        changed_activity_notice_list, list(changed_field_set) + ['date_last_changed'])
+                    activity_notices_updated = len(changed_activity_notice_list)
+                except Exception as e:
+                    success = False
+                    status += "ACTIVITY_NOTICES_IN_BULK_UPDATE_FAILED: " + str(e) + ' '
+
+            # Whoever is left in recipient_dict doesn't have a notice yet
+            if len(recipient_dict):
+                if not positive_value_exists(create_values.get('speaker_organization_we_vote_id')):
+                    status += "ACTIVITY_NOTICE_MISSING_SPEAKER_ORG_ID "
+                else:
+                    new_positions_entered_count = 0
+                    if positive_value_exists(create_values.get('position_we_vote_id_list_serialized')):
+                        new_positions_entered_count = \
+                            len(json.loads(create_values['position_we_vote_id_list_serialized']))
+                    new_activity_notice_list = []
+                    for recipient in recipient_dict.values():
+                        new_activity_notice_list.append(ActivityNotice(
+                            date_last_changed=now(),
+                            new_positions_entered_count=new_positions_entered_count,
+                            recipient_voter_we_vote_id=recipient['recipient_voter_we_vote_id'],
+                            send_to_email=positive_value_exists(recipient['send_to_email']),
+                            send_to_sms=positive_value_exists(recipient['send_to_sms']),
+                            **create_values))
+                    try:
+                        ActivityNotice.objects.bulk_create(new_activity_notice_list)
+                        activity_notices_created = len(new_activity_notice_list)
+                    except Exception as e:
+                        success = False
+                        status += "ACTIVITY_NOTICES_IN_BULK_CREATE_FAILED: " + str(e) + ' '
+
+        status += "ACTIVITY_NOTICES_IN_BULK created: " + str(activity_notices_created) + \
+                  " updated: " + str(activity_notices_updated) + " "
+        results = {
+            'success':                      success,
+            'status':                       status,
+            'activity_notices_created':     activity_notices_created,
+            'activity_notices_updated':     activity_notices_updated,
+        }
+        return results
+
     def update_or_create_activity_comment(
             self,
             activity_comment_we_vote_id='',
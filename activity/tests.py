@@ -0,0 +1,133 @@
+# activity/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from datetime import timedelta
+from django.test import TestCase
+from django.utils.timezone import now
+import json
+from .controllers import fan_out_activity_notices, update_or_create_voter_daily_summary_seeds_from_seed
+from .models import ActivityManager, ActivityNotice, ActivityNoticeSeed, NOTICE_FRIEND_ACTIVITY_POSTS, \
+    NOTICE_ACTIVITY_POST_SEED, NOTICE_VOTER_DAILY_SUMMARY_SEED
+
+
+class ActivityNoticeFanOutTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        self.activity_manager = ActivityManager()
+        self.activity_notice_seed = ActivityNoticeSeed.objects.create(
+            kind_of_seed=NOTICE_ACTIVITY_POST_SEED,
+            speaker_name='Sam Speaker',
+            speaker_organization_we_vote_id='wv01org1',
+            speaker_voter_we_vote_id='wv01voter1')
+        self.recipient_list = [
+            {'recipient_voter_we_vote_id': 'wv01voter2', 'send_to_email': True, 'send_to_sms': False},
+            {'recipient_voter_we_vote_id': 'wv01voter3', 'send_to_email': False, 'send_to_sms': False},
+        ]
+
+    def fan_out(self, recipient_list, statement_text_preview='', when_process_must_stop=None):
+        return fan_out_activity_notices(
+            activity_notice_seed=self.activity_notice_seed,
+            lookup_values={
+                'activity_notice_seed_id':  self.activity_notice_seed.id,
+                'kind_of_notice':           NOTICE_FRIEND_ACTIVITY_POSTS,
+            },
+            create_values={
+                'kind_of_notice':           NOTICE_FRIEND_ACTIVITY_POSTS,
+                'statement_text_preview':   statement_text_preview,
+            },
+            update_values={
+                'statement_text_preview':   statement_text_preview,
+            },
+            recipient_list=recipient_list,
+            when_process_must_stop=when_process_must_stop)
+
+    def test_fan_out_creates_one_notice_per_recipient(self):
+        results = self.fan_out(self.recipient_list, statement_text_preview='First')
+        self.assertTrue(results['success'])
+        self.assertTrue(results['fan_out_complete'])
+        self.assertEqual(ActivityNotice.objects.count(), 2)
+        activity_notice = ActivityNotice.objects.get(recipient_voter_we_vote_id='wv01voter2')
+        self.assertTrue(activity_notice.send_to_email)
+        self.assertEqual(activity_notice.speaker_organization_we_vote_id, 'wv01org1')
+
+    def test_fan_out_again_updates_instead_of_duplicating(self):
+        self.fan_out(self.recipient_list, statement_text_preview='First')
+        # Existing notices are matched case-insensitively, like the per-recipient lookup
+        recipient_list = self.recipient_list + [
+            {'recipient_voter_we_vote_id': 'WV01VOTER3', 'send_to_email': False, 'send_to_sms': False},
+            {'recipient_voter_we_vote_id': 'wv01voter4', 'send_to_email': False, 'send_to_sms': True},
+        ]
+        results = self.fan_out(recipient_list, statement_text_preview='Edited')
+        self.assertTrue(results['success'])
+        self.assertEqual(ActivityNotice.objects.count(), 3)
+        self.assertEqual(
+            set(ActivityNotice.objects.values_list('statement_text_preview', flat=True)), {'Edited'})
+
+    def test_empty_update_value_leaves_existing_value(self):
+        self.fan_out(self.recipient_list, statement_text_preview='First')
+        self.fan_out(self.recipient_list, statement_text_preview='')
+        self.assertEqual(
+            set(ActivityNotice.objects.values_list('statement_text_preview', flat=True)), {'First'})
+
+    def test_stopped_fan_out_is_finished_by_running_again(self):
+        results = self.fan_out(self.recipient_list, when_process_must_stop=now() - timedelta(seconds=1))
+        self.assertFalse(results['fan_out_complete'])
+        self.assertEqual(ActivityNotice.objects.count(), 0)
+        results = self.fan_out(self.recipient_list)
+        self.assertTrue(results['fan_out_complete'])
+        self.assertEqual(ActivityNotice.objects.count(), 2)
+
+
+class ActivityNoticeSeedsInBulkTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        self.activity_manager = ActivityManager()
+
+    def generate_daily_summary_seed_values(self, recipient_voter_we_vote_id, speaker_organization_we_vote_id=None):
+        activity_notice_seed_values = {
+            'date_of_notice':                               now(),
+            'kind_of_seed':                                 NOTICE_VOTER_DAILY_SUMMARY_SEED,
+            'recipient_voter_we_vote_id':                   recipient_voter_we_vote_id,
+            'send_to_email':                                True,
+            'speaker_organization_we_vote_ids_serialized':  json.dumps(['wv01org1']),
+            'speaker_voter_we_vote_ids_serialized':         json.dumps(['wv01voter1']),
+        }
+        if speaker_organization_we_vote_id is not None:
+            activity_notice_seed_values['speaker_organization_we_vote_id'] = speaker_organization_we_vote_id
+        return activity_notice_seed_values
+
+    def test_seeds_get_their_own_we_vote_ids(self):
+        results = self.activity_manager.create_activity_notice_seeds_in_bulk([
+            self.generate_daily_summary_seed_values('wv01voter2', speaker_organization_we_vote_id='wv01org1'),
+            self.generate_daily_summary_seed_values('wv01voter3', speaker_organization_we_vote_id='wv01org1'),
+        ])
+        self.assertTrue(results['success'])
+        self.assertEqual(results['activity_notice_seeds_created'], 2)
+        we_vote_id_list = list(ActivityNoticeSeed.objects.values_list('we_vote_id', flat=True))
+        self.assertEqual(len(set(we_vote_id_list)), 2)
+        self.assertTrue(all('actseed' in we_vote_id for we_vote_id in we_vote_id_list))
+
+    def test_seed_without_speaker_organization_is_not_created(self):
+        # As with create_activity_notice_seed, so voter daily summary seeds (which only carry the serialized
+        #  speaker_organization_we_vote_ids) are not created
+        results = self.activity_manager.create_activity_notice_seeds_in_bulk([
+            self.generate_daily_summary_seed_values('wv01voter2'),
+        ])
+        self.assertEqual(results['activity_notice_seeds_created'], 0)
+        self.assertIn('ACTIVITY_NOTICE_SEED_MISSING_SPEAKER: 1', results['status'])
+        self.assertEqual(ActivityNoticeSeed.objects.count(), 0)
+
+    def test_seed_is_marked_without_building_daily_summary_seeds(self):
+        activity_notice_seed = ActivityNoticeSeed.objects.create(
+            kind_of_seed=NOTICE_ACTIVITY_POST_SEED,
+            speaker_organization_we_vote_id='wv01org1',
+            speaker_voter_we_vote_id='wv01voter1')
+        results = update_or_create_voter_daily_summary_seeds_from_seed(activity_notice_seed)
+        self.assertTrue(results['success'])
+        self.assertTrue(results['fan_out_complete'])
+        self.assertIn('VOTER_DAILY_SUMMARY_SEEDS_NOT_CREATED', results['status'])
+        self.assertTrue(ActivityNoticeSeed.objects.get(id=activity_notice_seed.id).added_to_voter_daily_summary)
+        self.assertEqual(ActivityNoticeSeed.objects.filter(kind_of_seed=NOTICE_VOTER_DAILY_SUMMARY_SEED).count(), 0)
@@ -3,10 +3,12 @@
 # -*- coding: UTF-8 -*-
 
 from .models import AnalyticsAction, AnalyticsCountManager, AnalyticsManager, \
-    ACTIONS_THAT_REQUIRE_ORGANIZATION_IDS
+    ACTION_BALLOT_VISIT, ACTION_VOTER_GUIDE_VISIT, ACTIONS_THAT_REQUIRE_ORGANIZATION_IDS, \
+    ANALYTICS_ACTION_ARCHIVE_DIRECTORY, ANALYTICS_ACTION_RETENTION_DAYS, ANALYTICS_ACTION_ROLLED_UP_THROUGH_SETTING, \
+    ANALYTICS_METRICS_CHUNK_SIZE
 from candidate.models import CandidateManager
 from config.base import get_environment_variable
-from datetime import date, datetime, timedelta
+from datetime import datetime, timedelta
 from django.db.models import Q
 from django.utils.timezone import localtime, now
 from exception.models import print_to_log
@@ -22,13 +24,16 @@ from import_export_batches.models import AUGMENT_ANALYTICS_ACTION_WITH_ELECTION_
 from measure.models import ContestMeasureManager
 from office.models import ContestOfficeManager
 from position.models import PositionMetricsManager
-from voter.models import VoterManager, VoterMetricsManager
+from voter.models import Voter, VoterMetricsManager
 import wevote_functions.admin
 from wevote_functions.functions import convert_date_to_date_as_integer, convert_to_int, positive_value_exists
+from wevote_settings.models import WeVoteSettingsManager
 
 logger = wevote_functions.admin.get_logger(__name__)
 
 WE_VOTE_API_KEY = get_environment_variable("WE_VOTE_API_KEY")
+# Rows fetched from the database at a time while reading one day of AnalyticsAction entries
+ANALYTICS_DAILY_SCAN_CHUNK_SIZE = 10000
 
 
 def augment_voter_analytics_action_entries_without_election_id(date_as_integer, through_date_as_integer):
@@ -701,42 +706,34 @@ def process_sitewide_voter_metrics(batch_process, batch_process_analytics_chunk)
             }
             return results
 
-    for voter_we_vote_id in voter_analytics_list:
-        analysis_success = True
-        results = calculate_sitewide_voter_metrics_for_one_voter(voter_we_vote_id)
+    voter_analytics_list = list(voter_analytics_list)
+    if len(voter_analytics_list):
+        results = calculate_sitewide_voter_metrics_for_voter_list(voter_analytics_list)
         status += results['status']
         if positive_value_exists(results['success']):
-            sitewide_voter_metrics_values = results['sitewide_voter_metrics_values']
-            sitewide_voter_metrics_values['last_calculated_date_as_integer'] = batch_process.analytics_date_as_integer
+            sitewide_voter_metrics_values_list = results['sitewide_voter_metrics_values_list']
+            for sitewide_voter_metrics_values in sitewide_voter_metrics_values_list:
+                sitewide_voter_metrics_values['last_calculated_date_as_integer'] = \
+                    batch_process.analytics_date_as_integer
 
-            analytics_manager = AnalyticsManager()
-            update_results = analytics_manager.save_sitewide_voter_metrics_values_for_one_voter(
-                sitewide_voter_metrics_values)
+            update_results = analytics_manager.bulk_save_sitewide_voter_metrics_values(
+                sitewide_voter_metrics_values_list)
             status += update_results['status']
             if positive_value_exists(update_results['success']):
-                sitewide_voter_metrics_updated += 1
+                sitewide_voter_metrics_updated += len(sitewide_voter_metrics_values_list)
+                # We save analytics_date_as_integer as today since the statistics saved are all based on today
+                # We check to see if there is an entry greater than or equal to the analytics_date_as_integer,
+                # so it doesn't re-calculate metrics that are already up-to-date
+                today = datetime.now().date()
+                today_date_as_integer = convert_date_to_date_as_integer(today)
+                results = analytics_manager.save_analytics_processed_for_voter_list(
+                    today_date_as_integer, voter_analytics_list, CALCULATE_SITEWIDE_VOTER_METRICS)
+                status += results['status']
             else:
                 status += "SAVE_SITEWIDE_VOTER_METRICS-FAILED_TO_SAVE "
-                analysis_success = False
         else:
             # So we can set a breakpoint in case of problems
             status += "SAVE_SITEWIDE_VOTER_METRICS-FAILED_TO_CALCULATE "
-            analysis_success = False
-        if analysis_success:
-            # We save analytics_date_as_integer as today since the statistics saved are all based on today
-            # We check to see if there is an entry greater than or equal to the analytics_date_as_integer,
-            # so it doesn't re-calculate metrics that are already up-to-date
-            today = datetime.now().date()
-            today_date_as_integer = convert_date_to_date_as_integer(today)
-            defaults = {
-                'analytics_date_as_integer': today_date_as_integer,
-                'voter_we_vote_id': voter_we_vote_id,
-                'kind_of_process': CALCULATE_SITEWIDE_VOTER_METRICS,
-            }
-            results = analytics_manager.save_analytics_processed(
-                analytics_date_as_integer=today_date_as_integer,
-                voter_we_vote_id=voter_we_vote_id,
-                defaults=defaults)
 
     try:
         batch_process_analytics_chunk.number_of_rows_successfully_reviewed = sitewide_voter_metrics_updated
@@ -977,163 +974,191 @@ def calculate_organization_election_metrics(google_civic_election_id, organizati
     return results
 
 
-def calculate_organization_daily_metrics(organization_we_vote_id, limit_to_one_date_as_integer):
+def aggregate_daily_metrics_for_one_date(date_as_integer):
+    """
+    Calculate the SitewideDailyMetrics for one day, and the OrganizationDailyMetrics for every organization whose voter
+    guide was visited that day, from a single pass over that day's AnalyticsAction entries.
+    Totals are carried forward from the last day calculated (retrieve_daily_metrics_checkpoint), plus the visitors
+    seen for the first time on this day. All of history is only counted when there isn't a checkpoint.
+    :param date_as_integer:
+    :return:
+    """
     status = ""
-    success = False
+    success = True
+    date_as_integer = convert_to_int(date_as_integer)
+    sitewide_daily_metrics_values = {}
+    organization_daily_metrics_values_list = []
+
+    analytics_count_manager = AnalyticsCountManager()
+    analytics_manager = AnalyticsManager()
+    follow_metrics_manager = FollowMetricsManager()
     google_civic_election_id_zero = 0
+    date_as_integer_zero = 0
     limit_to_authenticated = True
 
-    analytics_count_manager = AnalyticsCountManager()
-    follow_count_manager = FollowMetricsManager()
-    position_metrics_manager = PositionMetricsManager()
-    follow_organization_list = FollowOrganizationList()
+    checkpoint_results = analytics_manager.retrieve_daily_metrics_checkpoint(date_as_integer)
+    status += checkpoint_results['status']
+    checkpoint = checkpoint_results['sitewide_daily_metrics']
 
-    date_as_integer = convert_to_int(date)
-    visitors_total = analytics_count_manager.fetch_visitors(google_civic_election_id_zero, organization_we_vote_id)
-    authenticated_visitors_total = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id, 0, 0, limit_to_authenticated)
-
-    visitors_today = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id, limit_to_one_date_as_integer)
-    authenticated_visitors_today = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id, limit_to_one_date_as_integer, 0, limit_to_authenticated)
-
-    new_visitors_today = None
-    voter_guide_entrants_today = None
-    entrants_visiting_ballot = None
-    followers_visiting_ballot = None
-    followers_total = None
-    new_followers_today = None
-    auto_followers_total = None
-    new_auto_followers_today = None
-    issues_linked_total = None
-    organization_public_positions = None
+    try:
+        day_results = scan_analytics_actions_for_one_date(date_as_integer)
+        visitor_list = list(day_results['visitor_set'])
+        authenticated_visitor_list = list(day_results['authenticated_visitor_set'])
+        voter_guide_viewed_list = list(day_results['voter_guide_viewed_set'])
+
+        new_visitors_today = len(visitor_list) - \
+            len(analytics_count_manager.fetch_visitors_before_date(date_as_integer, visitor_list))
+        new_authenticated_visitors_today = len(authenticated_visitor_list) - \
+            len(analytics_count_manager.fetch_visitors_before_date(
+                date_as_integer, authenticated_visitor_list, limit_to_authenticated))
+        new_voter_guides_viewed_today = len(voter_guide_viewed_list) - \
+            len(analytics_count_manager.fetch_voter_guides_viewed_before_date(date_as_integer, voter_guide_viewed_list))
+
+        if checkpoint is not None:
+            visitors_total = checkpoint.visitors_total + new_visitors_today
+            authenticated_visitors_total = checkpoint.authenticated_visitors_total + new_authenticated_visitors_today
+            voter_guides_viewed_total = checkpoint.voter_guides_viewed_total + new_voter_guides_viewed_today
+        else:
+            status += "SITEWIDE_TOTALS_COUNTED_FROM_ALL_HISTORY "
+            visitors_total = analytics_count_manager.fetch_visitors(
+                google_civic_election_id_zero, '', date_as_integer_zero, date_as_integer)
+            authenticated_visitors_total = analytics_count_manager.fetch_visitors(
+                google_civic_election_id_zero, '', date_as_integer_zero, date_as_integer, limit_to_authenticated)
+            voter_guides_viewed_total = analytics_count_manager.fetch_voter_guides_viewed(
+                google_civic_election_id_zero, date_as_integer_zero, date_as_integer)
+
+        sitewide_daily_metrics_values = {
+            'date_as_integer':                          date_as_integer,
+            'visitors_total':                           visitors_total,
+            'visitors_today':                           len(visitor_list),
+            'new_visitors_today':                       new_visitors_today,
+            'voter_guide_entrants_today':               None,
+            'welcome_page_entrants_today':              None,
+            'friend_entrants_today':                    None,
+            'authenticated_visitors_total':             authenticated_visitors_total,
+            'authenticated_visitors_today':             len(authenticated_visitor_list),
+            'ballot_views_today':                       len(day_results['ballot_viewer_set']),
+            'voter_guides_viewed_total':                voter_guides_viewed_total,
+            'voter_guides_viewed_today':                len(voter_guide_viewed_list),
+            'issues_followed_total':                    follow_metrics_manager.fetch_issues_followed(
+                '', date_as_integer_zero, date_as_integer),
+            'issues_followed_today':                    follow_metrics_manager.fetch_issues_followed(
+                '', date_as_integer),
+            'organizations_followed_total':             None,
+            'organizations_followed_today':             None,
+            'organizations_auto_followed_total':        None,
+            'organizations_auto_followed_today':        None,
+            'organizations_with_linked_issues':         None,
+            'issues_linked_total':                      None,
+            'issues_linked_today':                      None,
+            'organizations_signed_in_total':            None,
+            'organizations_with_positions':             None,
+            'organizations_with_new_positions_today':   None,
+            'organization_public_positions':            None,
+            'individuals_with_positions':               None,
+            'individuals_with_public_positions':        None,
+            'individuals_with_friends_only_positions':  None,
+            'friends_only_positions':                   None,
+            'entered_full_address':                     None,
+        }
 
-    success = True
+        organization_visitor_sets = day_results['organization_visitor_sets']
+        organization_authenticated_visitor_sets = day_results['organization_authenticated_visitor_sets']
+        previous_organization_daily_metrics_dict = {}
+        if checkpoint is not None:
+            previous_organization_daily_metrics_dict = \
+                analytics_manager.retrieve_latest_organization_daily_metrics_before_date(
+                    date_as_integer, list(organization_visitor_sets))
+        returning_visitor_set = analytics_count_manager.fetch_organization_visitors_before_date(
+            date_as_integer, organization_visitor_sets)
+        returning_authenticated_visitor_set = analytics_count_manager.fetch_organization_visitors_before_date(
+            date_as_integer, organization_authenticated_visitor_sets, limit_to_authenticated)
+
+        for organization_we_vote_id, visitor_set in organization_visitor_sets.items():
+            authenticated_visitor_set = organization_authenticated_visitor_sets.get(organization_we_vote_id, set())
+            organization_new_visitors_today = len(
+                [voter_we_vote_id for voter_we_vote_id in visitor_set
+                 if (organization_we_vote_id, voter_we_vote_id) not in returning_visitor_set])
+            organization_new_authenticated_visitors_today = len(
+                [voter_we_vote_id for voter_we_vote_id in authenticated_visitor_set
+                 if (organization_we_vote_id, voter_we_vote_id) not in returning_authenticated_visitor_set])
+            previous_organization_daily_metrics = previous_organization_daily_metrics_dict.get(organization_we_vote_id)
+            if previous_organization_daily_metrics is not None and \
+                    previous_organization_daily_metrics.visitors_total is not None and \
+                    previous_organization_daily_metrics.authenticated_visitors_total is not None:
+                organization_visitors_total = \
+                    previous_organization_daily_metrics.visitors_total + organization_new_visitors_today
+                organization_authenticated_visitors_total = \
+                    previous_organization_daily_metrics.authenticated_visitors_total + \
+                    organization_new_authenticated_visitors_today
+            else:
+                # First OrganizationDailyMetrics for this organization (or no checkpoint)
+                organization_visitors_total = analytics_count_manager.fetch_visitors(
+                    google_civic_election_id_zero, organization_we_vote_id, date_as_integer_zero, date_as_integer)
+                organization_authenticated_visitors_total = analytics_count_manager.fetch_visitors(
+                    google_civic_election_id_zero, organization_we_vote_id, date_as_integer_zero, date_as_integer,
+                    limit_to_authenticated)
+
+            organization_daily_metrics_values_list.append({
+                'date_as_integer':                          date_as_integer,
+                'organization_we_vote_id':                  organization_we_vote_id,
+                'visitors_total':                           organization_visitors_total,
+                'visitors_today':                           len(visitor_set),
+                'new_visitors_today':                       organization_new_visitors_today,
+                'authenticated_visitors_total':             organization_authenticated_visitors_total,
+                'authenticated_visitors_today':             len(authenticated_visitor_set),
+                'voter_guide_entrants_today':               None,
+                'entrants_visiting_ballot':                 None,
+                'followers_visiting_ballot':                None,
+                'followers_total':                          None,
+                'new_followers_today':                      None,
+                'auto_followers_total':                     None,
+                'new_auto_followers_today':                 None,
+                'issues_linked_total':                      None,
+                'organization_public_positions':            None,
+            })
+    except Exception as e:
+        success = False
+        status += "AGGREGATE_DAILY_METRICS_FAILED (" + str(date_as_integer) + "): " + str(e) + " "
 
-    organization_daily_metrics_values = {
-        'date_as_integer':                          date_as_integer,
-        'organization_we_vote_id':                  organization_we_vote_id,
-        'visitors_total':                           visitors_total,
-        'visitors_today':                           visitors_today,
-        'new_visitors_today':                       new_visitors_today,
-        'authenticated_visitors_total':             authenticated_visitors_total,
-        'authenticated_visitors_today':             authenticated_visitors_today,
-        'voter_guide_entrants_today':               voter_guide_entrants_today,
-        'entrants_visiting_ballot':                 entrants_visiting_ballot,
-        'followers_visiting_ballot':                followers_visiting_ballot,
-        'followers_total':                          followers_total,
-        'new_followers_today':                      new_followers_today,
-        'auto_followers_total':                     auto_followers_total,
-        'new_auto_followers_today':                 new_auto_followers_today,
-        'issues_linked_total':                      issues_linked_total,
-        'organization_public_positions':            organization_public_positions,
-    }
     results = {
-        'status':                               status,
-        'success':                              success,
-        'organization_daily_metrics_values':    organization_daily_metrics_values,
+        'status':                                   status,
+        'success':                                  success,
+        'sitewide_daily_metrics_values':            sitewide_daily_metrics_values,
+        'organization_daily_metrics_values_list':   organization_daily_metrics_values_list,
     }
     return results
 
 
-def calculate_sitewide_daily_metrics(limit_to_one_date_as_integer):
+def calculate_organization_daily_metrics(organization_we_vote_id, limit_to_one_date_as_integer):
     status = ""
     success = False
+    organization_daily_metrics_values = {}
 
-    analytics_count_manager = AnalyticsCountManager()
-    follow_metrics_manager = FollowMetricsManager()
+    results = aggregate_daily_metrics_for_one_date(limit_to_one_date_as_integer)
+    status += results['status']
+    if results['success']:
+        for one_organization_daily_metrics_values in results['organization_daily_metrics_values_list']:
+            if one_organization_daily_metrics_values['organization_we_vote_id'] == organization_we_vote_id.lower():
+                organization_daily_metrics_values = one_organization_daily_metrics_values
+                success = True
+        if not success:
+            status += "ORGANIZATION_NOT_VISITED_ON_THIS_DATE "
 
-    google_civic_election_id_zero = 0
-    organization_we_vote_id_empty = ""
-    voter_we_vote_id_empty = ""
-    limit_to_authenticated = True
-    date_as_integer_zero = 0
-    limit_to_one_date_as_integer = convert_to_int(limit_to_one_date_as_integer)
-    count_through_this_date_as_integer = limit_to_one_date_as_integer
-
-    visitors_total = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id_empty, date_as_integer_zero,
-        count_through_this_date_as_integer)
-    visitors_today = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id_empty, limit_to_one_date_as_integer)
-    new_visitors_today = None
-    voter_guide_entrants_today = None
-    welcome_page_entrants_today = None
-    friend_entrants_today = None
-    authenticated_visitors_total = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id_empty,
-        date_as_integer_zero, count_through_this_date_as_integer, limit_to_authenticated)
-    authenticated_visitors_today = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id_empty,
-        limit_to_one_date_as_integer, date_as_integer_zero, limit_to_authenticated)
-    ballot_views_today = analytics_count_manager.fetch_ballot_views(
-        google_civic_election_id_zero, limit_to_one_date_as_integer)
-    voter_guides_viewed_total = analytics_count_manager.fetch_voter_guides_viewed(
-        google_civic_election_id_zero, date_as_integer_zero, count_through_this_date_as_integer)
-    voter_guides_viewed_today = analytics_count_manager.fetch_voter_guides_viewed(
-        google_civic_election_id_zero, limit_to_one_date_as_integer)
-
-    issues_followed_total = follow_metrics_manager.fetch_issues_followed(
-        voter_we_vote_id_empty, date_as_integer_zero, count_through_this_date_as_integer)
-    issues_followed_today = follow_metrics_manager.fetch_issues_followed(
-        voter_we_vote_id_empty, limit_to_one_date_as_integer)
-
-    organizations_followed_total = None
-    organizations_followed_today = None
-    organizations_auto_followed_total = None
-    organizations_auto_followed_today = None
-    organizations_with_linked_issues = None
-    issues_linked_total = None
-    issues_linked_today = None
-    organizations_signed_in_total = None
-    organizations_with_positions = None
-    organizations_with_new_positions_today = None
-    organization_public_positions = None
-    individuals_with_positions = None
-    individuals_with_public_positions = None
-    individuals_with_friends_only_positions = None
-    friends_only_positions = None
-    entered_full_address = None
+    results = {
+        'status':                               status,
+        'success':                              success,
+        'organization_daily_metrics_values':    organization_daily_metrics_values,
+    }
+    return results
 
-    success = True
 
-    sitewide_daily_metrics_values = {
-        'date_as_integer':                          limit_to_one_date_as_integer,
-        'visitors_total':                           visitors_total,
-        'visitors_today':                           visitors_today,
-        'new_visitors_today':                       new_visitors_today,
-        'voter_guide_entrants_today':               voter_guide_entrants_today,
-        'welcome_page_entrants_today':              welcome_page_entrants_today,
-        'friend_entrants_today':                    friend_entrants_today,
-        'authenticated_visitors_total':             authenticated_visitors_total,
-        'authenticated_visitors_today':             authenticated_visitors_today,
-        'ballot_views_today':                       ballot_views_today,
-        'voter_guides_viewed_total':                voter_guides_viewed_total,
-        'voter_guides_viewed_today':                voter_guides_viewed_today,
-        'issues_followed_total':                    issues_followed_total,
-        'issues_followed_today':                    issues_followed_today,
-        'organizations_followed_total':             organizations_followed_total,
-        'organizations_followed_today':             organizations_followed_today,
-        'organizations_auto_followed_total':         organizations_auto_followed_total,
-        'organizations_auto_followed_today':         organizations_auto_followed_today,
-        'organizations_with_linked_issues':         organizations_with_linked_issues,
-        'issues_linked_total':                      issues_linked_total,
-        'issues_linked_today':                      issues_linked_today,
-        'organizations_signed_in_total':            organizations_signed_in_total,
-        'organizations_with_positions':             organizations_with_positions,
-        'organizations_with_new_positions_today':   organizations_with_new_positions_today,
-        'organization_public_positions':            organization_public_positions,
-        'individuals_with_positions':               individuals_with_positions,
-        'individuals_with_public_positions':        individuals_with_public_positions,
-        'individuals_with_friends_only_positions':  individuals_with_friends_only_positions,
-        'friends_only_positions':                   friends_only_positions,
-        'entered_full_address':                     entered_full_address,
-    }
+def calculate_sitewide_daily_metrics(limit_to_one_date_as_integer):
+    results = aggregate_daily_metrics_for_one_date(limit_to_one_date_as_integer)
     results = {
-        'status':                           status,
-        'success':                          success,
-        'sitewide_daily_metrics_values':    sitewide_daily_metrics_values,
+        'status':                           results['status'],
+        'success':                          results['success'],
+        'sitewide_daily_metrics_values':    results['sitewide_daily_metrics_values'],
     }
     return results
 
@@ -1212,76 +1237,94 @@ def calculate_sitewide_voter_metrics_for_one_voter(voter_we_vote_id):
     :param voter_we_vote_id:
     :return:
     """
+    results = calculate_sitewide_voter_metrics_for_voter_list([voter_we_vote_id])
+    results = {
+        'status':                           results['status'],
+        'success':                          results['success'],
+        'sitewide_voter_metrics_values':    results['sitewide_voter_metrics_values_list'][0]
+        if results['success'] else {},
+    }
+    return results
+
+
+def calculate_sitewide_voter_metrics_for_voter_list(voter_we_vote_id_list):
+    """
+    Each voter's statistics across their entire history on We Vote. The AnalyticsAction counts for the whole list
+    come from one grouped query per chunk of voters, instead of six COUNT queries per voter.
+    :param voter_we_vote_id_list:
+    :return:
+    """
     status = ""
-    success = False
-    voter_id = 0
-    signed_in_twitter = False
-    signed_in_facebook = False
-    signed_in_with_email = False
-    signed_in_with_sms_phone_number = False
+    success = True
+    sitewide_voter_metrics_values_list = []
     analytics_count_manager = AnalyticsCountManager()
     follow_metrics_manager = FollowMetricsManager()
     position_metrics_manager = PositionMetricsManager()
     voter_metrics_manager = VoterMetricsManager()
 
-    voter_manager = VoterManager()
-    results = voter_manager.retrieve_voter_by_we_vote_id(voter_we_vote_id)
-    if results['voter_found']:
-        voter = results['voter']
-        voter_id = voter.id
-        signed_in_twitter = voter.signed_in_twitter()
-        signed_in_facebook = voter.signed_in_facebook()
-        signed_in_with_email = voter.signed_in_with_email()
-        signed_in_with_sms_phone_number = voter.signed_in_with_sms_phone_number()
-
-    actions_count = analytics_count_manager.fetch_voter_action_count(voter_we_vote_id)
-    seconds_on_site = None
-    elections_viewed = None
-    voter_guides_viewed = analytics_count_manager.fetch_voter_voter_guides_viewed(voter_we_vote_id)
-    ballot_visited = analytics_count_manager.fetch_voter_ballot_visited(voter_we_vote_id)
-    welcome_visited = analytics_count_manager.fetch_voter_welcome_visited(voter_we_vote_id)
-    entered_full_address = voter_metrics_manager.fetch_voter_entered_full_address(voter_id)
-    issues_followed = follow_metrics_manager.fetch_issues_followed(voter_we_vote_id)
-    organizations_followed = follow_metrics_manager.fetch_voter_organizations_followed(voter_id)
-    time_until_sign_in = None
-    positions_entered_friends_only = position_metrics_manager.fetch_voter_positions_entered_friends_only(
-        voter_we_vote_id)
-    positions_entered_public = position_metrics_manager.fetch_voter_positions_entered_public(voter_we_vote_id)
-    comments_entered_friends_only = position_metrics_manager.fetch_voter_comments_entered_friends_only(
-        voter_we_vote_id)
-    comments_entered_public = position_metrics_manager.fetch_voter_comments_entered_public(voter_we_vote_id)
-    days_visited = analytics_count_manager.fetch_voter_days_visited(voter_we_vote_id)
-    last_action_date = analytics_count_manager.fetch_voter_last_action_date(voter_we_vote_id)
+    voter_by_we_vote_id = {}
+    try:
+        voter_action_metrics_dict = \
+            analytics_count_manager.fetch_voter_action_metrics_for_voter_list(voter_we_vote_id_list)
+        for start in range(0, len(voter_we_vote_id_list), ANALYTICS_METRICS_CHUNK_SIZE):
+            for voter in Voter.objects.filter(
+                    we_vote_id__in=voter_we_vote_id_list[start:start + ANALYTICS_METRICS_CHUNK_SIZE]):
+                voter_by_we_vote_id[voter.we_vote_id] = voter
+    except Exception as e:
+        status += "SITEWIDE_VOTER_METRICS_COULD_NOT_BE_CALCULATED: " + str(e) + " "
+        success = False
+        results = {
+            'status':                               status,
+            'success':                              success,
+            'sitewide_voter_metrics_values_list':   sitewide_voter_metrics_values_list,
+        }
+        return results
 
-    success = True
+    for voter_we_vote_id in voter_we_vote_id_list:
+        voter_id = 0
+        signed_in_twitter = False
+        signed_in_facebook = False
+        signed_in_with_email = False
+        signed_in_with_sms_phone_number = False
+        voter = voter_by_we_vote_id.get(voter_we_vote_id)
+        if voter is not None:
+            voter_id = voter.id
+            signed_in_twitter = voter.signed_in_twitter()
+            signed_in_facebook = voter.signed_in_facebook()
+            signed_in_with_email = voter.signed_in_with_email()
+            signed_in_with_sms_phone_number = voter.signed_in_with_sms_phone_number()
+        voter_action_metrics = voter_action_metrics_dict.get(voter_we_vote_id, {})
+
+        sitewide_voter_metrics_values_list.append({
+            'voter_we_vote_id':         voter_we_vote_id,
+            'actions_count':            voter_action_metrics.get('actions_count', 0),
+            'seconds_on_site':          None,
+            'elections_viewed':         None,
+            'voter_guides_viewed':      voter_action_metrics.get('voter_guides_viewed', 0),
+            'issues_followed':          follow_metrics_manager.fetch_issues_followed(voter_we_vote_id),
+            'organizations_followed':   follow_metrics_manager.fetch_voter_organizations_followed(voter_id),
+            'ballot_visited':           voter_action_metrics.get('ballot_visited', 0),
+            'welcome_visited':          voter_action_metrics.get('welcome_visited', 0),
+            'entered_full_address':     voter_metrics_manager.fetch_voter_entered_full_address(voter_id),
+            'time_until_sign_in':       None,
+            'positions_entered_friends_only':
+                position_metrics_manager.fetch_voter_positions_entered_friends_only(voter_we_vote_id),
+            'positions_entered_public': position_metrics_manager.fetch_voter_positions_entered_public(voter_we_vote_id),
+            'comments_entered_friends_only':
+                position_metrics_manager.fetch_voter_comments_entered_friends_only(voter_we_vote_id),
+            'comments_entered_public':  position_metrics_manager.fetch_voter_comments_entered_public(voter_we_vote_id),
+            'signed_in_twitter':        signed_in_twitter,
+            'signed_in_facebook':       signed_in_facebook,
+            'signed_in_with_email':     signed_in_with_email,
+            'signed_in_with_sms_phone_number':  signed_in_with_sms_phone_number,
+            'days_visited':             voter_action_metrics.get('days_visited', 0),
+            'last_action_date':         voter_action_metrics.get('last_action_date'),
+        })
 
-    sitewide_voter_metrics_values = {
-        'voter_we_vote_id':         voter_we_vote_id,
-        'actions_count':            actions_count,
-        'seconds_on_site':          seconds_on_site,
-        'elections_viewed':         elections_viewed,
-        'voter_guides_viewed':      voter_guides_viewed,
-        'issues_followed':          issues_followed,
-        'organizations_followed':   organizations_followed,
-        'ballot_visited':           ballot_visited,
-        'welcome_visited':          welcome_visited,
-        'entered_full_address':     entered_full_address,
-        'time_until_sign_in':       time_until_sign_in,
-        'positions_entered_friends_only':   positions_entered_friends_only,
-        'positions_entered_public':         positions_entered_public,
-        'comments_entered_friends_only':    comments_entered_friends_only,
-        'comments_entered_public':          comments_entered_public,
-        'signed_in_twitter':        signed_in_twitter,
-        'signed_in_facebook':       signed_in_facebook,
-        'signed_in_with_email':     signed_in_with_email,
-        'signed_in_with_sms_phone_number':  signed_in_with_sms_phone_number,
-        'days_visited':             days_visited,
-        'last_action_date': last_action_date,
-    }
     results = {
-        'status':                           status,
-        'success':                          success,
-        'sitewide_voter_metrics_values':    sitewide_voter_metrics_values,
+        'status':                               status,
+        'success':                              success,
+        'sitewide_voter_metrics_values_list':   sitewide_voter_metrics_values_list,
     }
     return results
 
@@ -1496,6 +1539,107 @@ def retrieve_analytics_processing_next_step():
     return results
 
 
+def rollup_analytics_actions(retention_days=ANALYTICS_ACTION_RETENTION_DAYS,
+                             archive_directory=ANALYTICS_ACTION_ARCHIVE_DIRECTORY, maximum_days=0):
+    """
+    Move each day of AnalyticsAction entries older than retention_days into AnalyticsActionDailyRollup, oldest day
+    first, after archiving the entries to archive_directory. A day is only rolled up after the analytics batch
+    processes have finished with it, since they update the original entries.
+    :param retention_days:
+    :param archive_directory:
+    :param maximum_days: Stop after this many days (0 for no limit)
+    :return:
+    """
+    status = ""
+    success = True
+    dates_rolled_up = 0
+    actions_archived = 0
+    rollups_created = 0
+
+    through_date_as_integer = convert_date_to_date_as_integer(localtime(now()).date() - timedelta(days=retention_days))
+    we_vote_settings_manager = WeVoteSettingsManager()
+    analytics_date_as_integer_last_processed = \
+        convert_to_int(we_vote_settings_manager.fetch_setting('analytics_date_as_integer_last_processed'))
+    if analytics_date_as_integer_last_processed < through_date_as_integer:
+        through_date_as_integer = analytics_date_as_integer_last_processed
+    rolled_up_through_date_as_integer = \
+        convert_to_int(we_vote_settings_manager.fetch_setting(ANALYTICS_ACTION_ROLLED_UP_THROUGH_SETTING))
+
+    date_as_integer_list = []
+    try:
+        date_list_query = AnalyticsAction.objects.using('analytics').filter(
+            date_as_integer__lte=through_date_as_integer)
+        date_list_query = date_list_query.values_list('date_as_integer', flat=True).distinct()
+        date_as_integer_list = sorted(date_list_query)
+    except Exception as e:
+        status += "ROLLUP_ANALYTICS_ACTIONS-COULD_NOT_RETRIEVE_DATES: " + str(e) + " "
+        success = False
+    if positive_value_exists(maximum_days):
+        date_as_integer_list = date_as_integer_list[:maximum_days]
+
+    analytics_manager = AnalyticsManager()
+    for date_as_integer in date_as_integer_list:
+        results = analytics_manager.rollup_analytics_actions_for_one_date(date_as_integer, archive_directory)
+        if not results['success']:
+            # Stop, so every day up to ANALYTICS_ACTION_ROLLED_UP_THROUGH_SETTING stays in one table
+            status += results['status']
+            success = False
+            break
+        dates_rolled_up += 1
+        actions_archived += results['actions_archived']
+        rollups_created += results['rollups_created']
+        if date_as_integer > rolled_up_through_date_as_integer:
+            rolled_up_through_date_as_integer = date_as_integer
+            we_vote_settings_manager.save_setting(
+                ANALYTICS_ACTION_ROLLED_UP_THROUGH_SETTING, rolled_up_through_date_as_integer)
+
+    results = {
+        'success':              success,
+        'status':               status,
+        'dates_rolled_up':      dates_rolled_up,
+        'actions_archived':     actions_archived,
+        'rollups_created':      rollups_created,
+    }
+    return results
+
+
+def save_daily_metrics_for_one_date(date_as_integer):
+    """
+    Aggregate and save the SitewideDailyMetrics and OrganizationDailyMetrics for one day
+    :param date_as_integer:
+    :return:
+    """
+    status = ""
+    success = False
+    sitewide_daily_metrics_saved = False
+    organization_daily_metrics_saved_count = 0
+
+    results = aggregate_daily_metrics_for_one_date(date_as_integer)
+    status += results['status']
+    if results['success']:
+        analytics_manager = AnalyticsManager()
+        # Organizations first, so a SitewideDailyMetrics checkpoint always has its OrganizationDailyMetrics saved
+        organization_results = analytics_manager.bulk_save_organization_daily_metrics_values(
+            convert_to_int(date_as_integer), results['organization_daily_metrics_values_list'])
+        status += organization_results['status']
+        if organization_results['success']:
+            organization_daily_metrics_saved_count = \
+                organization_results['metrics_created'] + organization_results['metrics_updated']
+            update_results = analytics_manager.save_sitewide_daily_metrics_values(
+                results['sitewide_daily_metrics_values'])
+            status += update_results['status']
+            sitewide_daily_metrics_saved = update_results['sitewide_daily_metrics_saved']
+            success = update_results['success'] and sitewide_daily_metrics_saved
+
+    results = {
+        'status':                                   status,
+        'success':                                  success,
+        'sitewide_daily_metrics_saved':             sitewide_daily_metrics_saved,
+        'organization_daily_metrics_saved_count':   organization_daily_metrics_saved_count,
+    }
+    return results
+
+
 def save_organization_daily_metrics(organization_we_vote_id, date):
     status = ""
     success = False
@@ -1553,22 +1697,15 @@ def save_sitewide_daily_metrics(date_as_integer, through_date_as_integer=0):
         date_as_integer_list = date_as_integer_results['date_as_integer_list']
 
     sitewide_daily_metrics_saved_count = 0
-    for one_date_as_integer in date_as_integer_list:
-        results = calculate_sitewide_daily_metrics(one_date_as_integer)
+    # In date order, so each day carries its totals forward from the day before
+    for one_date_as_integer in sorted(date_as_integer_list):
+        results = save_daily_metrics_for_one_date(one_date_as_integer)
         status += results['status']
         if positive_value_exists(results['success']):
-            sitewide_daily_metrics_values = results['sitewide_daily_metrics_values']
-
-            analytics_manager = AnalyticsManager()
-            update_results = analytics_manager.save_sitewide_daily_metrics_values(sitewide_daily_metrics_values)
-            status += update_results['status']
-            if positive_value_exists(update_results['success']):
-                sitewide_daily_metrics_saved_count += 1
-            else:
-                status += "SAVE_SITEWIDE_DAILY_METRICS-FAILED_TO_SAVE "
-                success = False
+            sitewide_daily_metrics_saved_count += 1
         else:
-            status += "SAVE_SITEWIDE_DAILY_METRICS-FAILED_TO_CALCULATE "
+            status += "SAVE_SITEWIDE_DAILY_METRICS-FAILED_TO_SAVE "
+            success = False
 
     results = {
         'status':                           status,
@@ -1624,32 +1761,30 @@ def save_sitewide_voter_metrics(look_for_changes_since_this_date_as_integer, thr
             datetime_now.day,
         )
         last_calculated_date_as_integer = convert_to_int(day_as_string)
-        updated_voter_we_vote_id_list = []
-        for voter_we_vote_id in voter_we_vote_id_list:
-            if analytics_manager.sitewide_voter_metrics_for_this_voter_updated_this_date(
-                    voter_we_vote_id, last_calculated_date_as_integer):
-                # Don't calculate metrics for this voter
-                updated_today = True
-                pass
-            else:
-                updated_voter_we_vote_id_list.append(voter_we_vote_id)
-        voter_we_vote_id_list = updated_voter_we_vote_id_list
+        updated_results = analytics_manager.retrieve_voter_we_vote_id_list_with_voter_metrics_updated_on_date(
+            last_calculated_date_as_integer, voter_we_vote_id_list)
+        status += updated_results['status']
+        # Don't calculate metrics for these voters
+        updated_today_voter_we_vote_id_set = set(updated_results['updated_voter_we_vote_id_list'])
+        voter_we_vote_id_list = [voter_we_vote_id for voter_we_vote_id in voter_we_vote_id_list
+                                 if voter_we_vote_id not in updated_today_voter_we_vote_id_set]
         voter_we_vote_id_list_found = positive_value_exists(len(voter_we_vote_id_list))
 
     if positive_value_exists(voter_we_vote_id_list_found):
-        for voter_we_vote_id in voter_we_vote_id_list:
-            results = calculate_sitewide_voter_metrics_for_one_voter(voter_we_vote_id)
+        for start in range(0, len(voter_we_vote_id_list), ANALYTICS_METRICS_CHUNK_SIZE):
+            results = calculate_sitewide_voter_metrics_for_voter_list(
+                voter_we_vote_id_list[start:start + ANALYTICS_METRICS_CHUNK_SIZE])
             status += results['status']
             if positive_value_exists(results['success']):
-                sitewide_voter_metrics_values = results['sitewide_voter_metrics_values']
-                sitewide_voter_metrics_values['last_calculated_date_as_integer'] = last_calculated_date_as_integer
+                sitewide_voter_metrics_values_list = results['sitewide_voter_metrics_values_list']
+                for sitewide_voter_metrics_values in sitewide_voter_metrics_values_list:
+                    sitewide_voter_metrics_values['last_calculated_date_as_integer'] = last_calculated_date_as_integer
 
-                analytics_manager = AnalyticsManager()
-                update_results = analytics_manager.save_sitewide_voter_metrics_values_for_one_voter(
-                    sitewide_voter_metrics_values)
+                update_results = analytics_manager.bulk_save_sitewide_voter_metrics_values(
+                    sitewide_voter_metrics_values_list)
                 status += update_results['status']
                 if positive_value_exists(update_results['success']):
-                    sitewide_voter_metrics_updated += 1
+                    sitewide_voter_metrics_updated += len(sitewide_voter_metrics_values_list)
                 else:
                     status += "SAVE_SITEWIDE_VOTER_METRICS-FAILED_TO_SAVE "
                     success = False
@@ -1664,3 +1799,53 @@ def save_sitewide_voter_metrics(look_for_changes_since_this_date_as_integer, thr
         'sitewide_voter_metrics_updated': sitewide_voter_metrics_updated,
     }
     return results
+
+
+def scan_analytics_actions_for_one_date(date_as_integer):
+    """
+    Read one day's AnalyticsAction entries once, and collect the voters and organizations which the daily metrics
+    count. Database errors are raised to the caller.
+    :param date_as_integer:
+    :return:
+    """
+    visitor_set = set()
+    authenticated_visitor_set = set()
+    ballot_viewer_set = set()
+    voter_guide_viewed_set = set()
+    organization_visitor_sets = {}
+    organization_authenticated_visitor_sets = {}
+
+    # For a day which has been rolled up, this reads AnalyticsActionDailyRollup instead
+    analytics_count_manager = AnalyticsCountManager()
+    action_query_list = analytics_count_manager.retrieve_analytics_action_query_list(
+        Q(date_as_integer=date_as_integer), limit_to_one_date_as_integer=date_as_integer)
+    for action_query in action_query_list:
+        action_query = action_query.values_list(
+            'voter_we_vote_id', 'action_constant', 'organization_we_vote_id', 'is_signed_in')
+        for voter_we_vote_id, action_constant, organization_we_vote_id, is_signed_in in \
+                action_query.iterator(chunk_size=ANALYTICS_DAILY_SCAN_CHUNK_SIZE):
+            if not positive_value_exists(voter_we_vote_id):
+                continue
+            visitor_set.add(voter_we_vote_id)
+            if is_signed_in:
+                authenticated_visitor_set.add(voter_we_vote_id)
+            if action_constant == ACTION_BALLOT_VISIT:
+                ballot_viewer_set.add(voter_we_vote_id)
+            elif action_constant == ACTION_VOTER_GUIDE_VISIT and positive_value_exists(organization_we_vote_id):
+                voter_guide_viewed_set.add(organization_we_vote_id)
+                # Organization visits are matched case-insensitively (like organization_we_vote_id__iexact)
+                organization_we_vote_id = organization_we_vote_id.lower()
+                organization_visitor_sets.setdefault(organization_we_vote_id, set()).add(voter_we_vote_id)
+                if is_signed_in:
+                    organization_authenticated_visitor_sets.setdefault(organization_we_vote_id, set()).add(
+                        voter_we_vote_id)
+
+    results = {
+        'visitor_set':                              visitor_set,
+        'authenticated_visitor_set':                authenticated_visitor_set,
+        'ballot_viewer_set':                        ballot_viewer_set,
+        'voter_guide_viewed_set':                   voter_guide_viewed_set,
+        'organization_visitor_sets':                organization_visitor_sets,
+        'organization_authenticated_visitor_sets':  organization_authenticated_visitor_sets,
+    }
+    return results
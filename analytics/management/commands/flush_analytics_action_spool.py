@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from analytics.models import ANALYTICS_ACTION_SPOOL_DIRECTORY, replay_analytics_action_spool_files
+
+
+class Command(BaseCommand):
+    help = 'Saves the analytics actions in spool files left behind by workers which stopped before writing them ' \
+           'to AnalyticsAction, and deletes those files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--spool_directory', type=str, default=ANALYTICS_ACTION_SPOOL_DIRECTORY,
+                            help='Defaults to ANALYTICS_ACTION_SPOOL_DIRECTORY')
+
+    def handle(self, *args, **options):
+        results = replay_analytics_action_spool_files(options['spool_directory'])
+        self.stdout.write('Replayed {files} spool files, {actions} actions saved. {status}'.format(
+            files=results['spool_files_replayed'],
+            actions=results['actions_saved'],
+            status=results['status']))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from analytics.controllers import rollup_analytics_actions
+from analytics.models import ANALYTICS_ACTION_ARCHIVE_DIRECTORY, ANALYTICS_ACTION_RETENTION_DAYS
+
+
+class Command(BaseCommand):
+    help = 'Archives AnalyticsAction entries older than the retention window to gzipped files, and replaces them ' \
+           'with one AnalyticsActionDailyRollup entry per day for each voter, action, organization and election.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention_days', type=int, default=ANALYTICS_ACTION_RETENTION_DAYS,
+                            help='Defaults to ANALYTICS_ACTION_RETENTION_DAYS')
+        parser.add_argument('--archive_directory', type=str, default=ANALYTICS_ACTION_ARCHIVE_DIRECTORY,
+                            help='Defaults to ANALYTICS_ACTION_ARCHIVE_DIRECTORY')
+        parser.add_argument('--maximum_days', type=int, default=0,
+                            help='Number of days rolled up in this run (0 for all of them)')
+
+    def handle(self, *args, **options):
+        results = rollup_analytics_actions(
+            retention_days=options['retention_days'],
+            archive_directory=options['archive_directory'],
+            maximum_days=options['maximum_days'])
+        self.stdout.write('Rolled up {dates} days: {actions} actions archived, {rollups} rollups created. '
+                          '{status}'.format(
+                              dates=results['dates_rolled_up'],
+                              actions=results['actions_archived'],
+                              rollups=results['rollups_created'],
+                              status=results['status']))
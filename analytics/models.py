@@ -2,10 +2,21 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
-from django.db import models
-from django.db.models import Q
+import atexit
+from config.base import get_environment_variable_default
+from django.db import connections, models, transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import Lower
+from django.utils.dateparse import parse_datetime
 from django.utils.timezone import localtime, now
 from datetime import timedelta
+import fcntl
+import glob
+import gzip
+import json
+import os
+import threading
+import time
 from election.models import Election
 from exception.models import print_to_log
 from follow.models import FollowOrganizationList
@@ -100,8 +111,44 @@ ACTIONS_THAT_REQUIRE_ORGANIZATION_IDS = \
      ACTION_ORGANIZATION_STOP_IGNORING, ACTION_VOTER_GUIDE_VISIT]
 
 
+# saveAnalyticsAction and the other save_action callers queue actions in each worker, and a background thread writes
+#  them to AnalyticsAction with bulk_create. Set to false to go back to one INSERT per action on the request path.
+ANALYTICS_ACTION_BUFFER_ENABLED = \
+    positive_value_exists(get_environment_variable_default("ANALYTICS_ACTION_BUFFER_ENABLED", True))
+# The queue is written when it holds this many actions...
+ANALYTICS_ACTION_BUFFER_MAX_ACTIONS = \
+    convert_to_int(get_environment_variable_default("ANALYTICS_ACTION_BUFFER_MAX_ACTIONS", 200))
+# ...or when its oldest action has waited this long
+ANALYTICS_ACTION_BUFFER_FLUSH_SECONDS = \
+    convert_to_int(get_environment_variable_default("ANALYTICS_ACTION_BUFFER_FLUSH_SECONDS", 5))
+# If the analytics database can't be reached, this is the most each worker holds in memory before dropping the oldest
+ANALYTICS_ACTION_BUFFER_MAX_PENDING = \
+    convert_to_int(get_environment_variable_default("ANALYTICS_ACTION_BUFFER_MAX_PENDING", 20000))
+# Optional: a directory where queued actions are also appended, one JSON line each, until they are written to the
+#  database, so a crashed worker doesn't lose them. Blank to disable.
+ANALYTICS_ACTION_SPOOL_DIRECTORY = get_environment_variable_default("ANALYTICS_ACTION_SPOOL_DIRECTORY", "")
+ANALYTICS_ACTION_SPOOL_FILE_PREFIX = "analytics_actions_"
+# How many voters or organizations go into one IN (...) lookup, or one bulk write, when calculating metrics
+ANALYTICS_METRICS_CHUNK_SIZE = 1000
+# Days of AnalyticsAction entries kept as they came in. The rollup_analytics_actions command moves older days into
+#  AnalyticsActionDailyRollup, after writing their entries to gzipped JSON lines in ANALYTICS_ACTION_ARCHIVE_DIRECTORY
+ANALYTICS_ACTION_RETENTION_DAYS = \
+    convert_to_int(get_environment_variable_default("ANALYTICS_ACTION_RETENTION_DAYS", 180))
+ANALYTICS_ACTION_ARCHIVE_DIRECTORY = get_environment_variable_default("ANALYTICS_ACTION_ARCHIVE_DIRECTORY", "")
+ANALYTICS_ACTION_ARCHIVE_FILE_PREFIX = "analytics_action_archive_"
+ANALYTICS_ACTION_ARCHIVE_CHUNK_SIZE = 10000
+# WeVoteSetting with the last date_as_integer moved into AnalyticsActionDailyRollup
+ANALYTICS_ACTION_ROLLED_UP_THROUGH_SETTING = 'analytics_action_rolled_up_through_date_as_integer'
+# The AnalyticsAction fields kept in AnalyticsActionDailyRollup
+ANALYTICS_ACTION_ROLLUP_FIELD_NAMES = [
+    'date_as_integer', 'action_constant', 'voter_we_vote_id', 'is_signed_in', 'state_code',
+    'organization_we_vote_id', 'google_civic_election_id', 'first_visit_today']
+
 logger = wevote_functions.admin.get_logger(__name__)
 
+analytics_action_buffer = None
+analytics_action_buffer_lock = threading.Lock()
+
 
 class AnalyticsAction(models.Model):
     """
@@ -110,7 +157,8 @@ class AnalyticsAction(models.Model):
     action_constant = models.PositiveSmallIntegerField(
         verbose_name="constant representing action", null=True, unique=False, db_index=True)
 
-    exact_time = models.DateTimeField(verbose_name='date and time of action', null=False, auto_now_add=True)
+    # default=now rather than auto_now_add, so actions queued by AnalyticsActionBuffer keep the time they happened
+    exact_time = models.DateTimeField(verbose_name='date and time of action', null=False, default=now)
     # We store YYYYMMDD as an integer for very fast lookup (ex/ "20170901" for September, 1, 2017)
     date_as_integer = models.PositiveIntegerField(
         verbose_name="YYYYMMDD of the action", null=True, unique=False, db_index=True)
@@ -203,7 +251,104 @@ class AnalyticsAction(models.Model):
         return organization
 
 
+class AnalyticsActionDailyRollup(models.Model):
+    """
+    AnalyticsAction entries for days older than ANALYTICS_ACTION_RETENTION_DAYS, with one entry per day for each
+    combination of the fields below. The original entries are archived to a file and deleted from AnalyticsAction.
+    """
+    date_as_integer = models.PositiveIntegerField(
+        verbose_name="YYYYMMDD of the actions", null=True, unique=False, db_index=True)
+    action_constant = models.PositiveSmallIntegerField(
+        verbose_name="constant representing action", null=True, unique=False, db_index=True)
+    voter_we_vote_id = models.CharField(
+        verbose_name="we vote permanent id", max_length=255, default=None, null=True, blank=True, unique=False,
+        db_index=True)
+    is_signed_in = models.BooleanField(verbose_name='', default=False)
+    state_code = models.CharField(
+        verbose_name="state_code", max_length=255, null=True, blank=True, unique=False)
+    organization_we_vote_id = models.CharField(
+        verbose_name="we vote permanent id", max_length=255, null=True, blank=True, unique=False, db_index=True)
+    google_civic_election_id = models.PositiveIntegerField(
+        verbose_name="google civic election id", null=True, unique=False, db_index=True)
+    first_visit_today = models.BooleanField(verbose_name='', default=False)
+    # How many AnalyticsAction entries were rolled up into this one
+    action_count = models.PositiveIntegerField(verbose_name="number of actions", default=0)
+    first_exact_time = models.DateTimeField(verbose_name='time of the first action', null=True)
+    last_exact_time = models.DateTimeField(verbose_name='time of the last action', null=True)
+
+    @property
+    def exact_time(self):
+        return self.last_exact_time
+
+    def display_action_constant_human_readable(self):
+        return display_action_constant_human_readable(self.action_constant)
+
+
 class AnalyticsCountManager(models.Manager):
+    """
+    Counts over AnalyticsAction. Days which rollup_analytics_actions_for_one_date has archived are counted from
+    AnalyticsActionDailyRollup instead, so callers don't need to know where a day is stored.
+    """
+
+    def fetch_analytics_action_rolled_up_through_date_as_integer(self):
+        if not hasattr(self, 'rolled_up_through_date_as_integer'):
+            we_vote_settings_manager = WeVoteSettingsManager()
+            self.rolled_up_through_date_as_integer = convert_to_int(
+                we_vote_settings_manager.fetch_setting(ANALYTICS_ACTION_ROLLED_UP_THROUGH_SETTING))
+        return self.rolled_up_through_date_as_integer
+
+    def retrieve_analytics_action_query_list(self, query_filter, limit_to_one_date_as_integer=0):
+        """
+        AnalyticsAction, and AnalyticsActionDailyRollup once any days have been rolled up, filtered by query_filter.
+        When limit_to_one_date_as_integer is set, only the table which holds that day is queried.
+        :param query_filter: Q object using fields that both models have
+        :param limit_to_one_date_as_integer:
+        :return: list of querysets
+        """
+        rolled_up_through_date_as_integer = self.fetch_analytics_action_rolled_up_through_date_as_integer()
+        query_list = []
+        if not positive_value_exists(limit_to_one_date_as_integer) \
+                or limit_to_one_date_as_integer > rolled_up_through_date_as_integer:
+            query_list.append(AnalyticsAction.objects.using('analytics').filter(query_filter))
+        if positive_value_exists(rolled_up_through_date_as_integer) \
+                and (not positive_value_exists(limit_to_one_date_as_integer)
+                     or limit_to_one_date_as_integer <= rolled_up_through_date_as_integer):
+            query_list.append(AnalyticsActionDailyRollup.objects.using('analytics').filter(query_filter))
+        return query_list
+
+    def fetch_action_count(self, query_filter, limit_to_one_date_as_integer=0):
+        """
+        Number of actions matching query_filter. Database errors are raised to the caller.
+        """
+        count_result = 0
+        for count_query in self.retrieve_analytics_action_query_list(query_filter, limit_to_one_date_as_integer):
+            if count_query.model is AnalyticsActionDailyRollup:
+                count_result += count_query.aggregate(action_count=Sum('action_count'))['action_count'] or 0
+            else:
+                count_result += count_query.count()
+        return count_result
+
+    def fetch_distinct_count(self, query_filter, field_name, limit_to_one_date_as_integer=0):
+        """
+        Number of distinct values of field_name in the actions matching query_filter.
+        Database errors are raised to the caller.
+        """
+        query_list = [count_query.values_list(field_name) for count_query in
+                      self.retrieve_analytics_action_query_list(query_filter, limit_to_one_date_as_integer)]
+        if len(query_list) == 1:
+            return query_list[0].distinct().count()
+        # UNION removes the values found in both tables
+        return query_list[0].union(*query_list[1:]).count()
+
+    def fetch_distinct_values(self, query_filter, field_name):
+        """
+        Set of the distinct values of field_name in the actions matching query_filter.
+        Database errors are raised to the caller.
+        """
+        value_set = set()
+        for fetch_query in self.retrieve_analytics_action_query_list(query_filter):
+            value_set.update(fetch_query.values_list(field_name, flat=True).distinct())
+        return value_set
 
     def fetch_ballot_views(self, google_civic_election_id=0, limit_to_one_date_as_integer=0):
         """
@@ -214,14 +359,12 @@ class AnalyticsCountManager(models.Manager):
         """
         count_result = None
         try:
-            count_query = AnalyticsAction.objects.using('analytics').all()
-            count_query = count_query.filter(action_constant=ACTION_BALLOT_VISIT)
+            query_filter = Q(action_constant=ACTION_BALLOT_VISIT)
             if positive_value_exists(google_civic_election_id):
-                count_query = count_query.filter(google_civic_election_id=google_civic_election_id)
+                query_filter &= Q(google_civic_election_id=google_civic_election_id)
             if positive_value_exists(limit_to_one_date_as_integer):
-                count_query = count_query.filter(date_as_integer=limit_to_one_date_as_integer)
-            count_query = count_query.values('voter_we_vote_id').distinct()
-            count_result = count_query.count()
+                query_filter &= Q(date_as_integer=limit_to_one_date_as_integer)
+            count_result = self.fetch_distinct_count(query_filter, 'voter_we_vote_id', limit_to_one_date_as_integer)
         except Exception as e:
             pass
         return count_result
@@ -235,19 +378,17 @@ class AnalyticsCountManager(models.Manager):
 
         voters_who_visited_organization_first_simple_list = []
         try:
-            first_visit_query = AnalyticsAction.objects.using('analytics').all()
-            first_visit_query = first_visit_query.filter(Q(action_constant=ACTION_VOTER_GUIDE_VISIT) |
-                                                         Q(action_constant=ACTION_ORGANIZATION_AUTO_FOLLOW))
-            first_visit_query = first_visit_query.filter(organization_we_vote_id__iexact=organization_we_vote_id)
+            query_filter = Q(action_constant=ACTION_VOTER_GUIDE_VISIT) | \
+                Q(action_constant=ACTION_ORGANIZATION_AUTO_FOLLOW)
+            query_filter &= Q(organization_we_vote_id__iexact=organization_we_vote_id)
             if positive_value_exists(google_civic_election_id):
-                first_visit_query = first_visit_query.filter(google_civic_election_id=google_civic_election_id)
-            first_visit_query = first_visit_query.filter(first_visit_today=True)
-            first_visit_query = first_visit_query.values('voter_we_vote_id').distinct()
-            voters_who_visited_organization_first = list(first_visit_query)
+                query_filter &= Q(google_civic_election_id=google_civic_election_id)
+            query_filter &= Q(first_visit_today=True)
+            voters_who_visited_organization_first = self.fetch_distinct_values(query_filter, 'voter_we_vote_id')
 
-            for voter_dict in voters_who_visited_organization_first:
-                if positive_value_exists(voter_dict['voter_we_vote_id']):
-                    voters_who_visited_organization_first_simple_list.append(voter_dict['voter_we_vote_id'])
+            for voter_we_vote_id in voters_who_visited_organization_first:
+                if positive_value_exists(voter_we_vote_id):
+                    voters_who_visited_organization_first_simple_list.append(voter_we_vote_id)
 
         except Exception as e:
             pass
@@ -271,13 +412,11 @@ class AnalyticsCountManager(models.Manager):
 
         count_result = None
         try:
-            count_query = AnalyticsAction.objects.using('analytics').all()
-            count_query = count_query.filter(action_constant=ACTION_POSITION_TAKEN)
+            query_filter = Q(action_constant=ACTION_POSITION_TAKEN)
             if positive_value_exists(google_civic_election_id):
-                count_query = count_query.filter(google_civic_election_id=google_civic_election_id)
-            count_query = count_query.filter(voter_we_vote_id__in=voters_who_visited_organization_first_simple_list)
-            count_query = count_query.values('voter_we_vote_id').distinct()
-            count_result = count_query.count()
+                query_filter &= Q(google_civic_election_id=google_civic_election_id)
+            query_filter &= Q(voter_we_vote_id__in=voters_who_visited_organization_first_simple_list)
+            count_result = self.fetch_distinct_count(query_filter, 'voter_we_vote_id')
         except Exception as e:
             pass
         return count_result
@@ -298,13 +437,11 @@ class AnalyticsCountManager(models.Manager):
 
         count_result = None
         try:
-            count_query = AnalyticsAction.objects.using('analytics').all()
-            count_query = count_query.filter(action_constant=ACTION_BALLOT_VISIT)
+            query_filter = Q(action_constant=ACTION_BALLOT_VISIT)
             if positive_value_exists(google_civic_election_id):
-                count_query = count_query.filter(google_civic_election_id=google_civic_election_id)
-            count_query = count_query.filter(voter_we_vote_id__in=voters_who_visited_organization_first_simple_list)
-            count_query = count_query.values('voter_we_vote_id').distinct()
-            count_result = count_query.count()
+                query_filter &= Q(google_civic_election_id=google_civic_election_id)
+            query_filter &= Q(voter_we_vote_id__in=voters_who_visited_organization_first_simple_list)
+            count_result = self.fetch_distinct_count(query_filter, 'voter_we_vote_id')
         except Exception as e:
             pass
         return count_result
@@ -318,13 +455,11 @@ class AnalyticsCountManager(models.Manager):
 
         count_result = None
         try:
-            count_query = AnalyticsAction.objects.using('analytics').all()
-            count_query = count_query.filter(action_constant=ACTION_POSITION_TAKEN)
+            query_filter = Q(action_constant=ACTION_POSITION_TAKEN)
             if positive_value_exists(google_civic_election_id):
-                count_query = count_query.filter(google_civic_election_id=google_civic_election_id)
-            count_query = count_query.filter(voter_we_vote_id__in=voter_we_vote_ids_of_organization_followers)
-            count_query = count_query.values('voter_we_vote_id').distinct()
-            count_result = count_query.count()
+                query_filter &= Q(google_civic_election_id=google_civic_election_id)
+            query_filter &= Q(voter_we_vote_id__in=voter_we_vote_ids_of_organization_followers)
+            count_result = self.fetch_distinct_count(query_filter, 'voter_we_vote_id')
         except Exception as e:
             pass
         return count_result
@@ -337,13 +472,11 @@ class AnalyticsCountManager(models.Manager):
                 organization_we_vote_id, return_voter_we_vote_id)
         count_result = None
         try:
-            count_query = AnalyticsAction.objects.using('analytics').all()
-            count_query = count_query.filter(action_constant=ACTION_BALLOT_VISIT)
+            query_filter = Q(action_constant=ACTION_BALLOT_VISIT)
             if positive_value_exists(google_civic_election_id):
-                count_query = count_query.filter(google_civic_election_id=google_civic_election_id)
-            count_query = count_query.filter(voter_we_vote_id__in=voter_we_vote_ids_of_organization_followers)
-            count_query = count_query.values('voter_we_vote_id').distinct()
-            count_result = count_query.count()
+                query_filter &= Q(google_civic_election_id=google_civic_election_id)
+            query_filter &= Q(voter_we_vote_id__in=voter_we_vote_ids_of_organization_followers)
+            count_result = self.fetch_distinct_count(query_filter, 'voter_we_vote_id')
         except Exception as e:
             pass
         return count_result
@@ -353,20 +486,19 @@ class AnalyticsCountManager(models.Manager):
                        limit_to_authenticated=False):
         count_result = None
         try:
-            count_query = AnalyticsAction.objects.using('analytics').all()
+            query_filter = Q()
             if positive_value_exists(google_civic_election_id):
-                count_query = count_query.filter(google_civic_election_id=google_civic_election_id)
+                query_filter &= Q(google_civic_election_id=google_civic_election_id)
             if positive_value_exists(organization_we_vote_id):
-                count_query = count_query.filter(action_constant=ACTION_VOTER_GUIDE_VISIT)
-                count_query = count_query.filter(organization_we_vote_id__iexact=organization_we_vote_id)
+                query_filter &= Q(action_constant=ACTION_VOTER_GUIDE_VISIT)
+                query_filter &= Q(organization_we_vote_id__iexact=organization_we_vote_id)
             if positive_value_exists(limit_to_one_date_as_integer):
-                count_query = count_query.filter(date_as_integer=limit_to_one_date_as_integer)
+                query_filter &= Q(date_as_integer=limit_to_one_date_as_integer)
             elif positive_value_exists(count_through_this_date_as_integer):
-                count_query = count_query.filter(date_as_integer__lte=count_through_this_date_as_integer)
+                query_filter &= Q(date_as_integer__lte=count_through_this_date_as_integer)
             if limit_to_authenticated:
-                count_query = count_query.filter(is_signed_in=True)
-            count_query = count_query.values('voter_we_vote_id').distinct()
-            count_result = count_query.count()
+                query_filter &= Q(is_signed_in=True)
+            count_result = self.fetch_distinct_count(query_filter, 'voter_we_vote_id', limit_to_one_date_as_integer)
         except Exception as e:
             pass
         return count_result
@@ -380,14 +512,12 @@ class AnalyticsCountManager(models.Manager):
         """
         count_result = None
         try:
-            count_query = AnalyticsAction.objects.using('analytics').all()
-            count_query = count_query.filter(Q(action_constant=ACTION_VOTER_GUIDE_VISIT) |
-                                             Q(action_constant=ACTION_ORGANIZATION_AUTO_FOLLOW))
-            count_query = count_query.filter(organization_we_vote_id__iexact=organization_we_vote_id)
-            count_query = count_query.filter(google_civic_election_id=google_civic_election_id)
-            count_query = count_query.filter(first_visit_today=True)
-            count_query = count_query.values('voter_we_vote_id').distinct()
-            count_result = count_query.count()
+            query_filter = Q(action_constant=ACTION_VOTER_GUIDE_VISIT) | \
+                Q(action_constant=ACTION_ORGANIZATION_AUTO_FOLLOW)
+            query_filter &= Q(organization_we_vote_id__iexact=organization_we_vote_id)
+            query_filter &= Q(google_civic_election_id=google_civic_election_id)
+            query_filter &= Q(first_visit_today=True)
+            count_result = self.fetch_distinct_count(query_filter, 'voter_we_vote_id')
         except Exception as e:
             pass
         return count_result
@@ -400,14 +530,12 @@ class AnalyticsCountManager(models.Manager):
         """
         count_result = None
         try:
-            count_query = AnalyticsAction.objects.using('analytics').all()
-            count_query = count_query.filter(Q(action_constant=ACTION_ORGANIZATION_FOLLOW) |
-                                             Q(action_constant=ACTION_ORGANIZATION_AUTO_FOLLOW))
+            query_filter = Q(action_constant=ACTION_ORGANIZATION_FOLLOW) | \
+                Q(action_constant=ACTION_ORGANIZATION_AUTO_FOLLOW)
             if positive_value_exists(organization_we_vote_id):
-                count_query = count_query.filter(organization_we_vote_id__iexact=organization_we_vote_id)
-            count_query = count_query.filter(google_civic_election_id=google_civic_election_id)
-            count_query = count_query.values('voter_we_vote_id').distinct()
-            count_result = count_query.count()
+                query_filter &= Q(organization_we_vote_id__iexact=organization_we_vote_id)
+            query_filter &= Q(google_civic_election_id=google_civic_election_id)
+            count_result = self.fetch_distinct_count(query_filter, 'voter_we_vote_id')
         except Exception as e:
             pass
         return count_result
@@ -420,13 +548,11 @@ class AnalyticsCountManager(models.Manager):
         """
         count_result = None
         try:
-            count_query = AnalyticsAction.objects.using('analytics').all()
-            count_query = count_query.filter(action_constant=ACTION_ORGANIZATION_AUTO_FOLLOW)
+            query_filter = Q(action_constant=ACTION_ORGANIZATION_AUTO_FOLLOW)
             if positive_value_exists(organization_we_vote_id):
-                count_query = count_query.filter(organization_we_vote_id__iexact=organization_we_vote_id)
-            count_query = count_query.filter(google_civic_election_id=google_civic_election_id)
-            count_query = count_query.values('voter_we_vote_id').distinct()
-            count_result = count_query.count()
+                query_filter &= Q(organization_we_vote_id__iexact=organization_we_vote_id)
+            query_filter &= Q(google_civic_election_id=google_civic_election_id)
+            count_result = self.fetch_distinct_count(query_filter, 'voter_we_vote_id')
         except Exception as e:
             pass
         return count_result
@@ -434,9 +560,7 @@ class AnalyticsCountManager(models.Manager):
     def fetch_voter_action_count(self, voter_we_vote_id):
         count_result = None
         try:
-            count_query = AnalyticsAction.objects.using('analytics').all()
-            count_query = count_query.filter(voter_we_vote_id__iexact=voter_we_vote_id)
-            count_result = count_query.count()
+            count_result = self.fetch_action_count(Q(voter_we_vote_id__iexact=voter_we_vote_id))
         except Exception as e:
             pass
         return count_result
@@ -444,14 +568,13 @@ class AnalyticsCountManager(models.Manager):
     def fetch_voter_ballot_visited(self, voter_we_vote_id, google_civic_election_id=0, organization_we_vote_id=''):
         count_result = None
         try:
-            count_query = AnalyticsAction.objects.using('analytics').all()
-            count_query = count_query.filter(voter_we_vote_id__iexact=voter_we_vote_id)
-            count_query = count_query.filter(action_constant=ACTION_BALLOT_VISIT)
+            query_filter = Q(voter_we_vote_id__iexact=voter_we_vote_id)
+            query_filter &= Q(action_constant=ACTION_BALLOT_VISIT)
             if positive_value_exists(google_civic_election_id):
-                count_query = count_query.filter(google_civic_election_id=google_civic_election_id)
+                query_filter &= Q(google_civic_election_id=google_civic_election_id)
             if positive_value_exists(organization_we_vote_id):
-                count_query = count_query.filter(organization_we_vote_id__iexact=organization_we_vote_id)
-            count_result = count_query.count()
+                query_filter &= Q(organization_we_vote_id__iexact=organization_we_vote_id)
+            count_result = self.fetch_action_count(query_filter)
         except Exception as e:
             pass
         return count_result
@@ -459,10 +582,9 @@ class AnalyticsCountManager(models.Manager):
     def fetch_voter_welcome_visited(self, voter_we_vote_id):
         count_result = None
         try:
-            count_query = AnalyticsAction.objects.using('analytics').all()
-            count_query = count_query.filter(voter_we_vote_id__iexact=voter_we_vote_id)
-            count_query = count_query.filter(action_constant=ACTION_WELCOME_VISIT)
-            count_result = count_query.count()
+            query_filter = Q(voter_we_vote_id__iexact=voter_we_vote_id)
+            query_filter &= Q(action_constant=ACTION_WELCOME_VISIT)
+            count_result = self.fetch_action_count(query_filter)
         except Exception as e:
             pass
         return count_result
@@ -470,10 +592,7 @@ class AnalyticsCountManager(models.Manager):
     def fetch_voter_days_visited(self, voter_we_vote_id):
         count_result = None
         try:
-            count_query = AnalyticsAction.objects.using('analytics').all()
-            count_query = count_query.filter(voter_we_vote_id__iexact=voter_we_vote_id)
-            count_query = count_query.values('date_as_integer').distinct()
-            count_result = count_query.count()
+            count_result = self.fetch_distinct_count(Q(voter_we_vote_id__iexact=voter_we_vote_id), 'date_as_integer')
         except Exception as e:
             pass
         return count_result
@@ -486,8 +605,14 @@ class AnalyticsCountManager(models.Manager):
             fetch_query = fetch_query.order_by('-id')
             fetch_query = fetch_query[:1]
             fetch_result = list(fetch_query)
-            analytics_action = fetch_result.pop()
-            last_action_date = analytics_action.exact_time
+            if len(fetch_result):
+                analytics_action = fetch_result.pop()
+                last_action_date = analytics_action.exact_time
+            elif positive_value_exists(self.fetch_analytics_action_rolled_up_through_date_as_integer()):
+                # Every day still in AnalyticsAction is newer than the days rolled up
+                rollup_query = AnalyticsActionDailyRollup.objects.using('analytics')
+                rollup_query = rollup_query.filter(voter_we_vote_id__iexact=voter_we_vote_id)
+                last_action_date = rollup_query.aggregate(last_action_date=Max('last_exact_time'))['last_action_date']
         except Exception as e:
             pass
         return last_action_date
@@ -495,11 +620,9 @@ class AnalyticsCountManager(models.Manager):
     def fetch_voter_voter_guides_viewed(self, voter_we_vote_id):
         count_result = 0
         try:
-            count_query = AnalyticsAction.objects.using('analytics').all()
-            count_query = count_query.filter(voter_we_vote_id__iexact=voter_we_vote_id)
-            count_query = count_query.filter(action_constant=ACTION_VOTER_GUIDE_VISIT)
-            count_query = count_query.values('organization_we_vote_id').distinct()
-            count_result = count_query.count()
+            query_filter = Q(voter_we_vote_id__iexact=voter_we_vote_id)
+            query_filter &= Q(action_constant=ACTION_VOTER_GUIDE_VISIT)
+            count_result = self.fetch_distinct_count(query_filter, 'organization_we_vote_id')
         except Exception as e:
             pass
         return count_result
@@ -508,23 +631,524 @@ class AnalyticsCountManager(models.Manager):
             self, google_civic_election_id=0, limit_to_one_date_as_integer=0, count_through_this_date_as_integer=0):
         count_result = 0
         try:
-            count_query = AnalyticsAction.objects.using('analytics').all()
+            query_filter = Q()
             if positive_value_exists(google_civic_election_id):
-                count_query = count_query.filter(google_civic_election_id=google_civic_election_id)
-            count_query = count_query.filter(action_constant=ACTION_VOTER_GUIDE_VISIT)
+                query_filter &= Q(google_civic_election_id=google_civic_election_id)
+            query_filter &= Q(action_constant=ACTION_VOTER_GUIDE_VISIT)
             if positive_value_exists(limit_to_one_date_as_integer):
-                count_query = count_query.filter(date_as_integer=limit_to_one_date_as_integer)
+                query_filter &= Q(date_as_integer=limit_to_one_date_as_integer)
             elif positive_value_exists(count_through_this_date_as_integer):
-                count_query = count_query.filter(date_as_integer__lte=count_through_this_date_as_integer)
-            count_query = count_query.values('organization_we_vote_id').distinct()
-            count_result = count_query.count()
+                query_filter &= Q(date_as_integer__lte=count_through_this_date_as_integer)
+            count_result = self.fetch_distinct_count(
+                query_filter, 'organization_we_vote_id', limit_to_one_date_as_integer)
         except Exception as e:
             pass
         return count_result
 
+    def fetch_organization_visitors_before_date(
+            self, date_as_integer, organization_visitor_sets, limit_to_authenticated=False):
+        """
+        Which of these voter guide visitors had already visited the same organization before date_as_integer.
+        Database errors are raised to the caller.
+        :param date_as_integer:
+        :param organization_visitor_sets: dict of lower case organization_we_vote_id -> set of voter_we_vote_id
+        :param limit_to_authenticated:
+        :return: set of (lower case organization_we_vote_id, voter_we_vote_id)
+        """
+        organization_visitor_set = set()
+        organization_we_vote_id_list = list(organization_visitor_sets)
+        for start in range(0, len(organization_we_vote_id_list), ANALYTICS_METRICS_CHUNK_SIZE):
+            organization_we_vote_id_chunk = organization_we_vote_id_list[start:start + ANALYTICS_METRICS_CHUNK_SIZE]
+            voter_we_vote_id_list = list(set().union(
+                *[organization_visitor_sets[organization_we_vote_id]
+                  for organization_we_vote_id in organization_we_vote_id_chunk]))
+            for voter_start in range(0, len(voter_we_vote_id_list), ANALYTICS_METRICS_CHUNK_SIZE):
+                query_filter = Q(
+                    action_constant=ACTION_VOTER_GUIDE_VISIT,
+                    date_as_integer__lt=date_as_integer,
+                    voter_we_vote_id__in=voter_we_vote_id_list[
+                        voter_start:voter_start + ANALYTICS_METRICS_CHUNK_SIZE])
+                if limit_to_authenticated:
+                    query_filter &= Q(is_signed_in=True)
+                for visitor_query in self.retrieve_analytics_action_query_list(query_filter):
+                    # Case-insensitive, like organization_we_vote_id__iexact
+                    visitor_query = visitor_query \
+                        .annotate(organization_we_vote_id_lower=Lower('organization_we_vote_id')) \
+                        .filter(organization_we_vote_id_lower__in=organization_we_vote_id_chunk)
+                    organization_visitor_set.update(
+                        visitor_query.values_list('organization_we_vote_id_lower', 'voter_we_vote_id').distinct())
+        return organization_visitor_set
+
+    def fetch_visitors_before_date(self, date_as_integer, voter_we_vote_id_list, limit_to_authenticated=False):
+        """
+        Which of these voters had any action before date_as_integer. Database errors are raised to the caller.
+        :param date_as_integer:
+        :param voter_we_vote_id_list:
+        :param limit_to_authenticated:
+        :return: set of voter_we_vote_id
+        """
+        visitor_set = set()
+        for start in range(0, len(voter_we_vote_id_list), ANALYTICS_METRICS_CHUNK_SIZE):
+            query_filter = Q(
+                date_as_integer__lt=date_as_integer,
+                voter_we_vote_id__in=voter_we_vote_id_list[start:start + ANALYTICS_METRICS_CHUNK_SIZE])
+            if limit_to_authenticated:
+                query_filter &= Q(is_signed_in=True)
+            visitor_set.update(self.fetch_distinct_values(query_filter, 'voter_we_vote_id'))
+        return visitor_set
+
+    def fetch_voter_guides_viewed_before_date(self, date_as_integer, organization_we_vote_id_list):
+        """
+        Which of these organizations had their voter guide viewed before date_as_integer.
+        Database errors are raised to the caller.
+        :param date_as_integer:
+        :param organization_we_vote_id_list:
+        :return: set of organization_we_vote_id
+        """
+        organization_we_vote_id_set = set()
+        for start in range(0, len(organization_we_vote_id_list), ANALYTICS_METRICS_CHUNK_SIZE):
+            query_filter = Q(
+                action_constant=ACTION_VOTER_GUIDE_VISIT,
+                date_as_integer__lt=date_as_integer,
+                organization_we_vote_id__in=organization_we_vote_id_list[start:start + ANALYTICS_METRICS_CHUNK_SIZE])
+            organization_we_vote_id_set.update(self.fetch_distinct_values(query_filter, 'organization_we_vote_id'))
+        return organization_we_vote_id_set
+
+    def fetch_voter_action_metrics_for_voter_list(self, voter_we_vote_id_list):
+        """
+        The AnalyticsAction counts in SitewideVoterMetrics (the same as fetch_voter_action_count,
+        fetch_voter_voter_guides_viewed, fetch_voter_ballot_visited, fetch_voter_welcome_visited,
+        fetch_voter_days_visited and fetch_voter_last_action_date), for many voters with one grouped query per chunk.
+        Database errors are raised to the caller.
+        :param voter_we_vote_id_list:
+        :return: dict of voter_we_vote_id -> dict of counts
+        """
+        voter_action_metrics_dict = {}
+        for start in range(0, len(voter_we_vote_id_list), ANALYTICS_METRICS_CHUNK_SIZE):
+            query_filter = Q(voter_we_vote_id__in=voter_we_vote_id_list[start:start + ANALYTICS_METRICS_CHUNK_SIZE])
+            query_list = self.retrieve_analytics_action_query_list(query_filter)
+            for metrics_query in query_list:
+                if metrics_query.model is AnalyticsActionDailyRollup:
+                    metrics_query = metrics_query.values('voter_we_vote_id').annotate(
+                        actions_count=Sum('action_count'),
+                        voter_guides_viewed=Count(
+                            'organization_we_vote_id', distinct=True,
+                            filter=Q(action_constant=ACTION_VOTER_GUIDE_VISIT)),
+                        ballot_visited=Sum('action_count', filter=Q(action_constant=ACTION_BALLOT_VISIT)),
+                        welcome_visited=Sum('action_count', filter=Q(action_constant=ACTION_WELCOME_VISIT)),
+                        days_visited=Count('date_as_integer', distinct=True),
+                        last_action_date=Max('last_exact_time'),
+                    ).order_by()
+                else:
+                    metrics_query = metrics_query.values('voter_we_vote_id').annotate(
+                        actions_count=Count('id'),
+                        voter_guides_viewed=Count(
+                            'organization_we_vote_id', distinct=True,
+                            filter=Q(action_constant=ACTION_VOTER_GUIDE_VISIT)),
+                        ballot_visited=Count('id', filter=Q(action_constant=ACTION_BALLOT_VISIT)),
+                        welcome_visited=Count('id', filter=Q(action_constant=ACTION_WELCOME_VISIT)),
+                        days_visited=Count('date_as_integer', distinct=True),
+                        last_action_date=Max('exact_time'),
+                    ).order_by()
+                for voter_action_metrics in metrics_query:
+                    voter_we_vote_id = voter_action_metrics.pop('voter_we_vote_id')
+                    if voter_we_vote_id not in voter_action_metrics_dict:
+                        voter_action_metrics_dict[voter_we_vote_id] = voter_action_metrics
+                        continue
+                    # The two tables never hold the same day, so everything but voter_guides_viewed adds up
+                    combined_metrics = voter_action_metrics_dict[voter_we_vote_id]
+                    for count_name in ('actions_count', 'ballot_visited', 'welcome_visited', 'days_visited'):
+                        combined_metrics[count_name] = \
+                            (combined_metrics[count_name] or 0) + (voter_action_metrics[count_name] or 0)
+                    if combined_metrics['last_action_date'] is None or \
+                            (voter_action_metrics['last_action_date'] is not None and
+                             voter_action_metrics['last_action_date'] > combined_metrics['last_action_date']):
+                        combined_metrics['last_action_date'] = voter_action_metrics['last_action_date']
+            if len(query_list) > 1:
+                # A voter can view the same voter guide on days in both tables, so count the distinct pairs
+                voter_guide_query_list = [
+                    metrics_query.filter(action_constant=ACTION_VOTER_GUIDE_VISIT).values_list(
+                        'voter_we_vote_id', 'organization_we_vote_id') for metrics_query in query_list]
+                voter_guides_viewed_dict = {}
+                for voter_we_vote_id, organization_we_vote_id in \
+                        voter_guide_query_list[0].union(*voter_guide_query_list[1:]):
+                    if organization_we_vote_id is not None:
+                        voter_guides_viewed_dict[voter_we_vote_id] = \
+                            voter_guides_viewed_dict.get(voter_we_vote_id, 0) + 1
+                for voter_we_vote_id, voter_action_metrics in voter_action_metrics_dict.items():
+                    if voter_we_vote_id in voter_guides_viewed_dict:
+                        voter_action_metrics['voter_guides_viewed'] = voter_guides_viewed_dict[voter_we_vote_id]
+        return voter_action_metrics_dict
+
+
+class AnalyticsActionBuffer(object):
+    """
+    Queues AnalyticsAction values inside one worker process. A background thread writes them with bulk_create when
+    max_actions are waiting, or every flush_seconds, and whatever is still queued is written when the worker exits.
+    If spool_directory is set, each queued action is also appended to a spool file which this worker holds a lock on,
+    and the file is deleted once its actions are saved. Spool files left by a worker which crashed (or which couldn't
+    reach the analytics database) are replayed by the next flush, or by the flush_analytics_action_spool command.
+    Replaying is at-least-once: a worker killed between bulk_create and deleting its spool file saves those twice.
+    """
+    def __init__(self, max_actions=ANALYTICS_ACTION_BUFFER_MAX_ACTIONS,
+                 flush_seconds=ANALYTICS_ACTION_BUFFER_FLUSH_SECONDS,
+                 max_pending=ANALYTICS_ACTION_BUFFER_MAX_PENDING,
+                 spool_directory=ANALYTICS_ACTION_SPOOL_DIRECTORY):
+        self.max_actions = max(1, max_actions)
+        self.flush_seconds = max(1, flush_seconds)
+        self.max_pending = max(self.max_actions, max_pending)
+        self.spool_directory = spool_directory
+        self.process_id = os.getpid()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.flush_thread = None
+        self.pending_action_values_list = []
+        self.spool_file = None
+        self.spool_file_path = ''
+        self.spool_file_count = 0
+        # Spool files from workers which stopped before this one started are replayed by the first flush
+        self.replay_spool_needed = positive_value_exists(spool_directory)
+
+    def add_action(self, action_values):
+        """
+        Queue one action. Never touches the database, so it is safe to call on the request path.
+        :param action_values: AnalyticsAction field values, including exact_time and date_as_integer
+        :return:
+        """
+        with self.lock:
+            if self.flush_thread is None:
+                self.flush_thread = threading.Thread(
+                    target=self.run_flush_thread, name='analytics_action_buffer', daemon=True)
+                self.flush_thread.start()
+            self.pending_action_values_list.append(action_values)
+            if positive_value_exists(self.spool_directory):
+                self.write_action_to_spool(action_values)
+            elif len(self.pending_action_values_list) > self.max_pending:
+                self.drop_oldest_pending_actions()
+            flush_now = len(self.pending_action_values_list) >= self.max_actions
+        if flush_now:
+            self.wake_event.set()
+
+    def drop_oldest_pending_actions(self):
+        # Only reached when there is no spool and the analytics database has been failing for a while
+        number_to_drop = len(self.pending_action_values_list) - self.max_pending
+        del self.pending_action_values_list[:number_to_drop]
+        logger.error("AnalyticsActionBuffer dropped " + str(number_to_drop) + " unsaved actions")
+
+    def write_action_to_spool(self, action_values):
+        try:
+            if self.spool_file is None:
+                self.open_spool_file()
+            self.spool_file.write(json.dumps(serialize_analytics_action_values(action_values)) + "\n")
+            # Flushed to the operating system on every action, so the line survives this process crashing
+            self.spool_file.flush()
+        except Exception as e:
+            # The action is still queued in memory
+            logger.error("AnalyticsActionBuffer could not write to spool: " + str(e))
+
+    def open_spool_file(self):
+        self.spool_file_count += 1
+        spool_file_name = "{prefix}{process_id}_{start_time}_{count}".format(
+            prefix=ANALYTICS_ACTION_SPOOL_FILE_PREFIX,
+            process_id=self.process_id,
+            start_time=int(time.time()),
+            count=self.spool_file_count)
+        spool_file_path = os.path.join(self.spool_directory, spool_file_name + ".jsonl")
+        writing_file_path = os.path.join(self.spool_directory, spool_file_name + ".writing")
+        os.makedirs(self.spool_directory, exist_ok=True)
+        spool_file = open(writing_file_path, 'a')
+        # Lock before the file gets the name replay_analytics_action_spool_files looks for, so it is never replayed
+        #  while this worker is still writing to it
+        fcntl.flock(spool_file, fcntl.LOCK_EX)
+        os.rename(writing_file_path, spool_file_path)
+        self.spool_file = spool_file
+        self.spool_file_path = spool_file_path
+
+    def flush(self):
+        """
+        Write everything queued so far with bulk_create. Called by the flush thread, and when the worker exits.
+        :return:
+        """
+        status = ""
+        success = True
+        actions_saved = 0
+        with self.flush_lock:
+            with self.lock:
+                action_values_list = self.pending_action_values_list
+                self.pending_action_values_list = []
+                spool_file = self.spool_file
+                spool_file_path = self.spool_file_path
+                self.spool_file = None
+                self.spool_file_path = ''
+
+            if len(action_values_list):
+                results = save_analytics_action_values_list(action_values_list)
+                status += results['status']
+                success = results['success']
+                actions_saved = results['actions_saved']
+                if not success:
+                    logger.error("AnalyticsActionBuffer could not save " + str(len(action_values_list)) +
+                                 " actions: " + status)
+                    if spool_file is None:
+                        # Without a spool, keep them in memory and try again with the next flush
+                        with self.lock:
+                            self.pending_action_values_list = action_values_list + self.pending_action_values_list
+                            if len(self.pending_action_values_list) > self.max_pending:
+                                self.drop_oldest_pending_actions()
+
+            if spool_file is not None:
+                if success:
+                    try:
+                        os.remove(spool_file_path)
+                    except OSError as e:
+                        status += "COULD_NOT_REMOVE_SPOOL_FILE: " + str(e) + " "
+                else:
+                    # Closing releases the lock, so the file is picked up by the next replay
+                    self.replay_spool_needed = True
+                spool_file.close()
+
+            if success and self.replay_spool_needed:
+                replay_results = replay_analytics_action_spool_files(self.spool_directory)
+                status += replay_results['status']
+                actions_saved += replay_results['actions_saved']
+                self.replay_spool_needed = not replay_results['success']
+
+        results = {
+            'success':          success,
+            'status':           status,
+            'actions_saved':    actions_saved,
+        }
+        return results
+
+    def run_flush_thread(self):
+        while True:
+            self.wake_event.wait(self.flush_seconds)
+            self.wake_event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("AnalyticsActionBuffer flush failed: " + str(e))
+            finally:
+                # This thread only wakes every few seconds, so it doesn't hold on to an analytics database connection
+                connections['analytics'].close()
+
+
+def get_analytics_action_buffer():
+    """
+    One AnalyticsActionBuffer per process. A worker forked from a process which already used the buffer gets its own
+    queue, spool file and flush thread.
+    :return:
+    """
+    global analytics_action_buffer
+    if analytics_action_buffer is None or analytics_action_buffer.process_id != os.getpid():
+        with analytics_action_buffer_lock:
+            if analytics_action_buffer is None or analytics_action_buffer.process_id != os.getpid():
+                analytics_action_buffer = AnalyticsActionBuffer()
+    return analytics_action_buffer
+
+
+def flush_analytics_action_buffer_at_exit():
+    if analytics_action_buffer is not None and analytics_action_buffer.process_id == os.getpid():
+        analytics_action_buffer.flush()
+
+
+atexit.register(flush_analytics_action_buffer_at_exit)
+
+
+def serialize_analytics_action_values(action_values):
+    return dict(action_values, exact_time=action_values['exact_time'].isoformat())
+
+
+def deserialize_analytics_action_values(action_values):
+    return dict(action_values, exact_time=parse_datetime(action_values['exact_time']))
+
+
+def save_analytics_action_values_list(action_values_list):
+    status = ""
+    success = True
+    actions_saved = 0
+    try:
+        AnalyticsAction.objects.using('analytics').bulk_create(
+            [AnalyticsAction(**action_values) for action_values in action_values_list],
+            batch_size=ANALYTICS_ACTION_BUFFER_MAX_ACTIONS)
+        actions_saved = len(action_values_list)
+    except Exception as e:
+        status += "COULD_NOT_BULK_CREATE_ANALYTICS_ACTIONS: " + str(e) + " "
+        success = False
+
+    results = {
+        'success':          success,
+        'status':           status,
+        'actions_saved':    actions_saved,
+    }
+    return results
+
+
+def replay_analytics_action_spool_files(spool_directory=ANALYTICS_ACTION_SPOOL_DIRECTORY):
+    """
+    Save the actions in every spool file which no running worker holds a lock on, and delete those files
+    :param spool_directory:
+    :return:
+    """
+    status = ""
+    success = True
+    spool_files_replayed = 0
+    actions_saved = 0
+
+    if positive_value_exists(spool_directory):
+        spool_file_pattern = os.path.join(spool_directory, ANALYTICS_ACTION_SPOOL_FILE_PREFIX + "*.jsonl")
+        for spool_file_path in sorted(glob.glob(spool_file_pattern)):
+            try:
+                spool_file = open(spool_file_path, 'r')
+            except OSError:
+                # Already replayed by another worker
+                continue
+            try:
+                try:
+                    fcntl.flock(spool_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # Still being written by a running worker, or being replayed by another one
+                    continue
+                if not os.path.exists(spool_file_path):
+                    # Replayed and removed by another worker between glob and flock
+                    continue
+                action_values_list = []
+                for line in spool_file:
+                    try:
+                        action_values_list.append(deserialize_analytics_action_values(json.loads(line)))
+                    except (ValueError, KeyError, TypeError):
+                        # ex/ The last line, cut off when the worker crashed
+                        status += "SKIPPED_UNREADABLE_SPOOL_LINE "
+                results = save_analytics_action_values_list(action_values_list)
+                if not results['success']:
+                    status += results['status']
+                    success = False
+                    break
+                os.remove(spool_file_path)
+                spool_files_replayed += 1
+                actions_saved += results['actions_saved']
+            finally:
+                spool_file.close()
+
+    results = {
+        'success':                  success,
+        'status':                   status,
+        'spool_files_replayed':     spool_files_replayed,
+        'actions_saved':            actions_saved,
+    }
+    return results
+
 
 class AnalyticsManager(models.Manager):
 
+    def bulk_save_metrics_values(self, metrics_model, key_field_name, metrics_values_list, existing_metrics_query):
+        """
+        Insert or update many metrics entries with bulk_update and bulk_create, instead of one update_or_create each
+        :param metrics_model: OrganizationDailyMetrics or SitewideVoterMetrics
+        :param key_field_name: The field which identifies one entry within existing_metrics_query
+        :param metrics_values_list: Each dict has the same keys, including key_field_name
+        :param existing_metrics_query: The entries which these values replace
+        :return:
+        """
+        success = True
+        status = ""
+        metrics_created = 0
+        metrics_updated = 0
+        if not len(metrics_values_list):
+            results = {
+                'success':          success,
+                'status':           status,
+                'metrics_created':  metrics_created,
+                'metrics_updated':  metrics_updated,
+            }
+            return results
+
+        update_field_name_list = [field_name for field_name in metrics_values_list[0] if field_name != key_field_name]
+        try:
+            for start in range(0, len(metrics_values_list), ANALYTICS_METRICS_CHUNK_SIZE):
+                metrics_values_chunk = metrics_values_list[start:start + ANALYTICS_METRICS_CHUNK_SIZE]
+                existing_metrics_by_key = {}
+                for metrics in existing_metrics_query.filter(**{
+                        key_field_name + '__in': [metrics_values[key_field_name]
+                                                  for metrics_values in metrics_values_chunk]}):
+                    existing_metrics_by_key.setdefault(getattr(metrics, key_field_name), []).append(metrics)
+                metrics_to_create_list = []
+                metrics_to_update_list = []
+                for metrics_values in metrics_values_chunk:
+                    existing_metrics_list = existing_metrics_by_key.get(metrics_values[key_field_name], [])
+                    if not len(existing_metrics_list):
+                        metrics_to_create_list.append(metrics_model(**metrics_values))
+                    # If there are duplicate entries, keep them all up-to-date
+                    for metrics in existing_metrics_list:
+                        for field_name in update_field_name_list:
+                            setattr(metrics, field_name, metrics_values[field_name])
+                        metrics_to_update_list.append(metrics)
+                if len(metrics_to_update_list):
+                    metrics_model.objects.using('analytics').bulk_update(
+                        metrics_to_update_list, update_field_name_list)
+                    metrics_updated += len(metrics_to_update_list)
+                if len(metrics_to_create_list):
+                    metrics_model.objects.using('analytics').bulk_create(metrics_to_create_list)
+                    metrics_created += len(metrics_to_create_list)
+        except Exception as e:
+            success = False
+            status += 'BULK_SAVE_METRICS_VALUES_FAILED (' + metrics_model.__name__ + '): ' + str(e) + ' '
+
+        results = {
+            'success':          success,
+            'status':           status,
+            'metrics_created':  metrics_created,
+            'metrics_updated':  metrics_updated,
+        }
+        return results
+
+    def bulk_save_organization_daily_metrics_values(self, date_as_integer, organization_daily_metrics_values_list):
+        return self.bulk_save_metrics_values(
+            OrganizationDailyMetrics, 'organization_we_vote_id', organization_daily_metrics_values_list,
+            OrganizationDailyMetrics.objects.using('analytics').filter(date_as_integer=date_as_integer))
+
+    def bulk_save_sitewide_voter_metrics_values(self, sitewide_voter_metrics_values_list):
+        return self.bulk_save_metrics_values(
+            SitewideVoterMetrics, 'voter_we_vote_id', sitewide_voter_metrics_values_list,
+            SitewideVoterMetrics.objects.using('analytics').all())
+
+    def create_action(self, action_values, action_type):
+        """
+        Queue the action with AnalyticsActionBuffer, so it is saved with the next bulk_create, or save it right away
+        when ANALYTICS_ACTION_BUFFER_ENABLED is off
+        :param action_values: AnalyticsAction field values
+        :param action_type: ACTION_TYPE1 or ACTION_TYPE2, for the status
+        :return:
+        """
+        success = True
+        status = ""
+        action_saved = False
+        action = AnalyticsAction(**action_values)
+        action.generate_date_as_integer()
+
+        if ANALYTICS_ACTION_BUFFER_ENABLED:
+            get_analytics_action_buffer().add_action(
+                dict(action_values, exact_time=action.exact_time, date_as_integer=action.date_as_integer))
+            action_saved = True
+            status += action_type + '_QUEUED '
+        else:
+            try:
+                action.save(using='analytics')
+                action_saved = True
+                status += action_type + '_SAVED '
+            except Exception as e:
+                success = False
+                status += 'COULD_NOT_SAVE_' + action_type + ' ' + str(e) + ' '
+
+        results = {
+            'success':      success,
+            'status':       status,
+            'action_saved': action_saved,
+            'action':       action,
+        }
+        return results
+
     def create_action_type1(
             self, action_constant, voter_we_vote_id, voter_id, is_signed_in, state_code,
             organization_we_vote_id, organization_id, google_civic_election_id,
@@ -558,36 +1182,24 @@ class AnalyticsManager(models.Manager):
             }
             return results
 
-        try:
-            action = AnalyticsAction.objects.using('analytics').create(
-                action_constant=action_constant,
-                voter_we_vote_id=voter_we_vote_id,
-                voter_id=voter_id,
-                is_signed_in=is_signed_in,
-                state_code=state_code,
-                organization_we_vote_id=organization_we_vote_id,
-                organization_id=organization_id,
-                google_civic_election_id=google_civic_election_id,
-                ballot_item_we_vote_id=ballot_item_we_vote_id,
-                user_agent=user_agent_string,
-                is_bot=is_bot,
-                is_mobile=is_mobile,
-                is_desktop=is_desktop,
-                is_tablet=is_tablet
-            )
-            success = True
-            action_saved = True
-            status += 'ACTION_TYPE1_SAVED '
-        except Exception as e:
-            success = False
-            status += 'COULD_NOT_SAVE_ACTION_TYPE1 ' + str(e) + ' '
-
-        results = {
-            'success':      success,
-            'status':       status,
-            'action_saved': action_saved,
-            'action':       action,
+        action_values = {
+            'action_constant':            action_constant,
+            'voter_we_vote_id':           voter_we_vote_id,
+            'voter_id':                   voter_id,
+            'is_signed_in':               is_signed_in,
+            'state_code':                 state_code,
+            'organization_we_vote_id':    organization_we_vote_id,
+            'organization_id':            organization_id,
+            'google_civic_election_id':   google_civic_election_id,
+            'ballot_item_we_vote_id':     ballot_item_we_vote_id,
+            'user_agent':                 user_agent_string,
+            'is_bot':                     is_bot,
+            'is_mobile':                  is_mobile,
+            'is_desktop':                 is_desktop,
+            'is_tablet':                  is_tablet,
         }
+        results = self.create_action(action_values, 'ACTION_TYPE1')
+        results['status'] = status + results['status']
         return results
 
     def create_action_type2(
@@ -620,62 +1232,70 @@ class AnalyticsManager(models.Manager):
             }
             return results
 
-        try:
-            action = AnalyticsAction.objects.using('analytics').create(
-                action_constant=action_constant,
-                voter_we_vote_id=voter_we_vote_id,
-                voter_id=voter_id,
-                is_signed_in=is_signed_in,
-                state_code=state_code,
-                organization_we_vote_id=organization_we_vote_id,
-                google_civic_election_id=google_civic_election_id,
-                ballot_item_we_vote_id=ballot_item_we_vote_id,
-                user_agent=user_agent_string,
-                is_bot=is_bot,
-                is_mobile=is_mobile,
-                is_desktop=is_desktop,
-                is_tablet=is_tablet
-            )
-            success = True
-            action_saved = True
-            status += 'ACTION_TYPE2_SAVED '
-        except Exception as e:
-            success = False
-            status += 'COULD_NOT_SAVE_ACTION_TYPE2 ' + str(e) + ' '
-
-        results = {
-            'success':      success,
-            'status':       status,
-            'action_saved': action_saved,
-            'action':       action,
+        action_values = {
+            'action_constant':            action_constant,
+            'voter_we_vote_id':           voter_we_vote_id,
+            'voter_id':                   voter_id,
+            'is_signed_in':               is_signed_in,
+            'state_code':                 state_code,
+            'organization_we_vote_id':    organization_we_vote_id,
+            'google_civic_election_id':   google_civic_election_id,
+            'ballot_item_we_vote_id':     ballot_item_we_vote_id,
+            'user_agent':                 user_agent_string,
+            'is_bot':                     is_bot,
+            'is_mobile':                  is_mobile,
+            'is_desktop':                 is_desktop,
+            'is_tablet':                  is_tablet,
         }
+        results = self.create_action(action_values, 'ACTION_TYPE2')
+        results['status'] = status + results['status']
         return results
 
     def retrieve_analytics_action_list(self, voter_we_vote_id='', voter_we_vote_id_list=[], google_civic_election_id=0,
                                        organization_we_vote_id='', action_constant='', distinct_for_members=False,
                                        state_code=''):
+        """
+        Once days have been rolled up, the list also includes AnalyticsActionDailyRollup entries, which can be
+        changed and saved, or deleted, like AnalyticsAction entries
+        """
         success = True
         status = ""
         analytics_action_list = []
 
         try:
-            list_query = AnalyticsAction.objects.using('analytics').all()
-            if positive_value_exists(voter_we_vote_id):
-                list_query = list_query.filter(voter_we_vote_id__iexact=voter_we_vote_id)
-            elif len(voter_we_vote_id_list):
-                list_query = list_query.filter(voter_we_vote_id__in=voter_we_vote_id_list)
-            if positive_value_exists(google_civic_election_id):
-                list_query = list_query.filter(google_civic_election_id=google_civic_election_id)
-            if positive_value_exists(organization_we_vote_id):
-                list_query = list_query.filter(organization_we_vote_id__iexact=organization_we_vote_id)
-            if positive_value_exists(action_constant):
-                list_query = list_query.filter(action_constant=action_constant)
-            if positive_value_exists(state_code):
-                list_query = list_query.filter(state_code__iexact=state_code)
-            if positive_value_exists(distinct_for_members):
-                list_query = list_query.distinct(
-                    'google_civic_election_id', 'organization_we_vote_id', 'voter_we_vote_id')
-            analytics_action_list = list(list_query)
+            list_query_list = [AnalyticsAction.objects.using('analytics').all()]
+            analytics_count_manager = AnalyticsCountManager()
+            rolled_up_through_date_as_integer = \
+                analytics_count_manager.fetch_analytics_action_rolled_up_through_date_as_integer()
+            if positive_value_exists(rolled_up_through_date_as_integer):
+                list_query_list.append(AnalyticsActionDailyRollup.objects.using('analytics').all())
+            for list_query in list_query_list:
+                if positive_value_exists(voter_we_vote_id):
+                    list_query = list_query.filter(voter_we_vote_id__iexact=voter_we_vote_id)
+                elif len(voter_we_vote_id_list):
+                    list_query = list_query.filter(voter_we_vote_id__in=voter_we_vote_id_list)
+                if positive_value_exists(google_civic_election_id):
+                    list_query = list_query.filter(google_civic_election_id=google_civic_election_id)
+                if positive_value_exists(organization_we_vote_id):
+                    list_query = list_query.filter(organization_we_vote_id__iexact=organization_we_vote_id)
+                if positive_value_exists(action_constant):
+                    list_query = list_query.filter(action_constant=action_constant)
+                if positive_value_exists(state_code):
+                    list_query = list_query.filter(state_code__iexact=state_code)
+                if positive_value_exists(distinct_for_members):
+                    list_query = list_query.distinct(
+                        'google_civic_election_id', 'organization_we_vote_id', 'voter_we_vote_id')
+                analytics_action_list += list(list_query)
+            if positive_value_exists(distinct_for_members) and len(list_query_list) > 1:
+                members_already_found = set()
+                distinct_analytics_action_list = []
+                for analytics_action in analytics_action_list:
+                    member_key = (analytics_action.google_civic_election_id,
+                                  analytics_action.organization_we_vote_id, analytics_action.voter_we_vote_id)
+                    if member_key not in members_already_found:
+                        members_already_found.add(member_key)
+                        distinct_analytics_action_list.append(analytics_action)
+                analytics_action_list = distinct_analytics_action_list
             analytics_action_list_found = positive_value_exists(len(analytics_action_list))
         except Exception as e:
             analytics_action_list_found = False
@@ -806,6 +1426,45 @@ class AnalyticsManager(models.Manager):
         }
         return results
 
+    def save_analytics_processed_for_voter_list(self, analytics_date_as_integer, voter_we_vote_id_list,
+                                                kind_of_process):
+        """
+        Bulk version of save_analytics_processed
+        :param analytics_date_as_integer:
+        :param voter_we_vote_id_list:
+        :param kind_of_process:
+        :return:
+        """
+        success = True
+        status = ""
+        analytics_processed_saved_count = 0
+
+        try:
+            for start in range(0, len(voter_we_vote_id_list), ANALYTICS_METRICS_CHUNK_SIZE):
+                voter_we_vote_id_chunk = voter_we_vote_id_list[start:start + ANALYTICS_METRICS_CHUNK_SIZE]
+                already_processed_set = set(AnalyticsProcessed.objects.using('analytics').filter(
+                    analytics_date_as_integer=analytics_date_as_integer,
+                    kind_of_process=kind_of_process,
+                    voter_we_vote_id__in=voter_we_vote_id_chunk).values_list('voter_we_vote_id', flat=True))
+                analytics_processed_list = [
+                    AnalyticsProcessed(
+                        analytics_date_as_integer=analytics_date_as_integer,
+                        voter_we_vote_id=voter_we_vote_id,
+                        kind_of_process=kind_of_process)
+                    for voter_we_vote_id in voter_we_vote_id_chunk if voter_we_vote_id not in already_processed_set]
+                AnalyticsProcessed.objects.using('analytics').bulk_create(analytics_processed_list)
+                analytics_processed_saved_count += len(analytics_processed_list)
+        except Exception as e:
+            success = False
+            status += 'SAVE_ANALYTICS_PROCESSED_FOR_VOTER_LIST_PROBLEM: ' + str(e) + ' '
+
+        results = {
+            'success':                          success,
+            'status':                           status,
+            'analytics_processed_saved_count':  analytics_processed_saved_count,
+        }
+        return results
+
     def save_analytics_processing_status(self, analytics_date_as_integer, defaults):
         success = True
         status = ""
@@ -1144,18 +1803,81 @@ class AnalyticsManager(models.Manager):
         }
         return results
 
+    def retrieve_daily_metrics_checkpoint(self, date_as_integer):
+        """
+        The SitewideDailyMetrics of the last day with actions before date_as_integer. Daily metrics for
+        date_as_integer can carry their totals forward from this entry, and from the OrganizationDailyMetrics saved
+        with it. If there were actions on a day in between which haven't been calculated, there is no checkpoint.
+        :param date_as_integer:
+        :return:
+        """
+        success = True
+        status = ""
+        sitewide_daily_metrics = None
+        checkpoint_found = False
+
+        try:
+            sitewide_daily_metrics_list = list(SitewideDailyMetrics.objects.using('analytics')
+                                               .filter(date_as_integer__lt=date_as_integer)
+                                               .order_by('-date_as_integer')[:1])
+            if len(sitewide_daily_metrics_list):
+                sitewide_daily_metrics = sitewide_daily_metrics_list[0]
+                actions_missed = AnalyticsAction.objects.using('analytics').filter(
+                    date_as_integer__gt=sitewide_daily_metrics.date_as_integer,
+                    date_as_integer__lt=date_as_integer).exists()
+                checkpoint_found = not actions_missed and \
+                    sitewide_daily_metrics.visitors_total is not None and \
+                    sitewide_daily_metrics.authenticated_visitors_total is not None and \
+                    sitewide_daily_metrics.voter_guides_viewed_total is not None
+                if not checkpoint_found:
+                    status += "DAILY_METRICS_CHECKPOINT_NOT_USABLE "
+        except Exception as e:
+            success = False
+            status += "DAILY_METRICS_CHECKPOINT_ERROR: " + str(e) + " "
+
+        results = {
+            'success':                  success,
+            'status':                   status,
+            'checkpoint_found':         checkpoint_found,
+            'sitewide_daily_metrics':   sitewide_daily_metrics if checkpoint_found else None,
+        }
+        return results
+
+    def retrieve_latest_organization_daily_metrics_before_date(self, date_as_integer, organization_we_vote_id_list):
+        """
+        For each organization, its most recent OrganizationDailyMetrics before date_as_integer (if any).
+        Database errors are raised to the caller.
+        :param date_as_integer:
+        :param organization_we_vote_id_list: lower case organization_we_vote_ids
+        :return: dict of lower case organization_we_vote_id -> OrganizationDailyMetrics
+        """
+        organization_daily_metrics_dict = {}
+        for start in range(0, len(organization_we_vote_id_list), ANALYTICS_METRICS_CHUNK_SIZE):
+            metrics_query = OrganizationDailyMetrics.objects.using('analytics') \
+                .annotate(organization_we_vote_id_lower=Lower('organization_we_vote_id')) \
+                .filter(
+                    date_as_integer__lt=date_as_integer,
+                    organization_we_vote_id_lower__in=organization_we_vote_id_list[
+                        start:start + ANALYTICS_METRICS_CHUNK_SIZE])
+            metrics_query = metrics_query.order_by('organization_we_vote_id_lower', '-date_as_integer')
+            metrics_query = metrics_query.distinct('organization_we_vote_id_lower')
+            for organization_daily_metrics in metrics_query:
+                organization_daily_metrics_dict[organization_daily_metrics.organization_we_vote_id_lower] = \
+                    organization_daily_metrics
+        return organization_daily_metrics_dict
+
     def retrieve_list_of_dates_with_actions(self, date_as_integer, through_date_as_integer=0):
         success = False
         status = ""
         date_list = []
 
         try:
-            date_list_query = AnalyticsAction.objects.using('analytics').all()
-            date_list_query = date_list_query.filter(date_as_integer__gte=date_as_integer)
+            query_filter = Q(date_as_integer__gte=date_as_integer)
             if positive_value_exists(through_date_as_integer):
-                date_list_query = date_list_query.filter(date_as_integer__lte=through_date_as_integer)
-            date_list_query = date_list_query.values('date_as_integer').distinct()
-            date_list = list(date_list_query)
+                query_filter &= Q(date_as_integer__lte=through_date_as_integer)
+            analytics_count_manager = AnalyticsCountManager()
+            date_list = [{'date_as_integer': one_date_as_integer} for one_date_as_integer in
+                         analytics_count_manager.fetch_distinct_values(query_filter, 'date_as_integer')]
             date_list_found = True
         except Exception as e:
             date_list_found = False
@@ -1206,12 +1928,11 @@ class AnalyticsManager(models.Manager):
         voter_list = []
 
         try:
-            voter_list_query = AnalyticsAction.objects.using('analytics').all()
-            voter_list_query = voter_list_query.filter(date_as_integer__gte=date_as_integer)
-            voter_list_query = voter_list_query.filter(date_as_integer__lte=through_date_as_integer)
-            voter_list_query = voter_list_query.values('voter_we_vote_id').distinct()
-            # voter_list_query = voter_list_query[:5]  # TEMP limit to 5
-            voter_list = list(voter_list_query)
+            query_filter = Q(date_as_integer__gte=date_as_integer)
+            query_filter &= Q(date_as_integer__lte=through_date_as_integer)
+            analytics_count_manager = AnalyticsCountManager()
+            voter_list = [{'voter_we_vote_id': voter_we_vote_id} for voter_we_vote_id in
+                          analytics_count_manager.fetch_distinct_values(query_filter, 'voter_we_vote_id')]
             voter_list_found = True
         except Exception as e:
             success = False
@@ -1230,6 +1951,119 @@ class AnalyticsManager(models.Manager):
         }
         return results
 
+    def retrieve_voter_we_vote_id_list_with_voter_metrics_updated_on_date(
+            self, updated_date_integer, voter_we_vote_id_list):
+        """
+        Bulk version of sitewide_voter_metrics_for_this_voter_updated_this_date
+        :param updated_date_integer:
+        :param voter_we_vote_id_list:
+        :return:
+        """
+        success = True
+        status = ""
+        updated_voter_we_vote_id_list = []
+
+        try:
+            for start in range(0, len(voter_we_vote_id_list), ANALYTICS_METRICS_CHUNK_SIZE):
+                updated_on_date_query = SitewideVoterMetrics.objects.using('analytics').filter(
+                    last_calculated_date_as_integer=updated_date_integer,
+                    voter_we_vote_id__in=voter_we_vote_id_list[start:start + ANALYTICS_METRICS_CHUNK_SIZE])
+                updated_voter_we_vote_id_list += \
+                    list(updated_on_date_query.values_list('voter_we_vote_id', flat=True).distinct())
+        except Exception as e:
+            success = False
+            status += "VOTER_METRICS_UPDATED_ON_DATE_ERROR: " + str(e) + " "
+
+        results = {
+            'success':                          success,
+            'status':                           status,
+            'updated_voter_we_vote_id_list':    updated_voter_we_vote_id_list,
+        }
+        return results
+
+    def rollup_analytics_actions_for_one_date(
+            self, date_as_integer, archive_directory=ANALYTICS_ACTION_ARCHIVE_DIRECTORY):
+        """
+        Write one day of AnalyticsAction entries to a gzipped JSON lines file in archive_directory, then replace them
+        with AnalyticsActionDailyRollup entries. The rollup entries are created, and the AnalyticsAction entries
+        deleted, in one transaction, so a failure leaves the day as it was (apart from the archive file).
+        :param date_as_integer:
+        :param archive_directory:
+        :return:
+        """
+        status = ""
+        success = True
+        actions_archived = 0
+        rollups_created = 0
+        archive_file_path = ""
+
+        if not positive_value_exists(date_as_integer):
+            status += "ROLLUP_ANALYTICS_ACTIONS-MISSING_DATE_AS_INTEGER "
+            success = False
+        elif not positive_value_exists(archive_directory):
+            # Never delete entries we haven't archived
+            status += "ROLLUP_ANALYTICS_ACTIONS-MISSING_ARCHIVE_DIRECTORY "
+            success = False
+
+        last_action_id = None
+        if success:
+            try:
+                action_query = AnalyticsAction.objects.using('analytics').filter(date_as_integer=date_as_integer)
+                last_action_id = action_query.aggregate(last_action_id=Max('id'))['last_action_id']
+            except Exception as e:
+                status += "ROLLUP_ANALYTICS_ACTIONS-COULD_NOT_RETRIEVE_LAST_ID: " + str(e) + " "
+                success = False
+
+        if success and last_action_id is not None:
+            # Entries saved after this point (there shouldn't be any for an old day) are left for the next run
+            action_query = AnalyticsAction.objects.using('analytics').filter(
+                date_as_integer=date_as_integer, id__lte=last_action_id)
+            archive_file_path = os.path.join(
+                archive_directory,
+                "{prefix}{date_as_integer}_{last_action_id}.jsonl.gz".format(
+                    prefix=ANALYTICS_ACTION_ARCHIVE_FILE_PREFIX,
+                    date_as_integer=date_as_integer,
+                    last_action_id=last_action_id))
+            try:
+                os.makedirs(archive_directory, exist_ok=True)
+                with gzip.open(archive_file_path + ".writing", 'wt', encoding='utf-8') as archive_file:
+                    for action_values in action_query.order_by('id').values().iterator(
+                            chunk_size=ANALYTICS_ACTION_ARCHIVE_CHUNK_SIZE):
+                        archive_file.write(json.dumps(serialize_analytics_action_values(action_values)) + "\n")
+                        actions_archived += 1
+                os.replace(archive_file_path + ".writing", archive_file_path)
+            except Exception as e:
+                status += "ROLLUP_ANALYTICS_ACTIONS-COULD_NOT_WRITE_ARCHIVE: " + str(e) + " "
+                success = False
+
+            if success:
+                try:
+                    rollup_query = action_query.values(*ANALYTICS_ACTION_ROLLUP_FIELD_NAMES).annotate(
+                        action_count=Count('id'),
+                        first_exact_time=Min('exact_time'),
+                        last_exact_time=Max('exact_time'),
+                    ).order_by()
+                    with transaction.atomic(using='analytics'):
+                        rollup_list = [AnalyticsActionDailyRollup(**rollup_values) for rollup_values in rollup_query]
+                        AnalyticsActionDailyRollup.objects.using('analytics').bulk_create(
+                            rollup_list, batch_size=ANALYTICS_ACTION_ARCHIVE_CHUNK_SIZE)
+                        rollups_created = len(rollup_list)
+                        action_query.delete()
+                    status += "ANALYTICS_ACTIONS_ROLLED_UP "
+                except Exception as e:
+                    status += "ROLLUP_ANALYTICS_ACTIONS-COULD_NOT_SAVE_ROLLUP: " + str(e) + " "
+                    success = False
+
+        results = {
+            'success':              success,
+            'status':               status,
+            'date_as_integer':      date_as_integer,
+            'actions_archived':     actions_archived,
+            'rollups_created':      rollups_created,
+            'archive_file_path':    archive_file_path,
+        }
+        return results
+
     def save_action(self, action_constant="",
                     voter_we_vote_id="", voter_id=0, is_signed_in=False, state_code="",
                     organization_we_vote_id="", organization_id=0, google_civic_election_id=0,
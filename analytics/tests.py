@@ -0,0 +1,111 @@
+# analytics/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from datetime import timedelta
+from django.test import TestCase
+from django.utils.timezone import localtime, now
+import gzip
+import os
+import shutil
+import tempfile
+from unittest import mock
+from wevote_functions.functions import convert_date_to_date_as_integer
+from wevote_settings.models import WeVoteSettingsManager
+from .controllers import rollup_analytics_actions
+from .models import AnalyticsAction, AnalyticsActionDailyRollup, AnalyticsManager, \
+    serialize_analytics_action_values, ACTION_BALLOT_VISIT, ACTION_VOTER_GUIDE_VISIT, \
+    ANALYTICS_ACTION_ROLLED_UP_THROUGH_SETTING
+
+
+def date_as_integer_days_ago(days_ago):
+    return convert_date_to_date_as_integer(localtime(now()).date() - timedelta(days=days_ago))
+
+
+def create_analytics_action(date_as_integer, voter_we_vote_id='wv01voter1', action_constant=ACTION_BALLOT_VISIT,
+                            organization_we_vote_id=None):
+    return AnalyticsAction.objects.using('analytics').create(
+        action_constant=action_constant,
+        date_as_integer=date_as_integer,
+        organization_we_vote_id=organization_we_vote_id,
+        voter_we_vote_id=voter_we_vote_id)
+
+
+class AnalyticsActionRollupTestCase(TestCase):
+    databases = ["default", "readonly", "analytics"]
+
+    def setUp(self):
+        self.analytics_manager = AnalyticsManager()
+        self.archive_directory = tempfile.mkdtemp()
+        self.date_as_integer = date_as_integer_days_ago(400)
+
+    def tearDown(self):
+        shutil.rmtree(self.archive_directory, ignore_errors=True)
+
+    def test_one_rollup_per_combination_for_only_that_day(self):
+        create_analytics_action(self.date_as_integer)
+        create_analytics_action(self.date_as_integer)
+        create_analytics_action(self.date_as_integer, action_constant=ACTION_VOTER_GUIDE_VISIT,
+                                organization_we_vote_id='wv01org1')
+        next_day_action = create_analytics_action(date_as_integer_days_ago(399))
+
+        results = self.analytics_manager.rollup_analytics_actions_for_one_date(
+            self.date_as_integer, self.archive_directory)
+        self.assertTrue(results['success'])
+        self.assertEqual(results['actions_archived'], 3)
+        self.assertEqual(results['rollups_created'], 2)
+        rollup = AnalyticsActionDailyRollup.objects.using('analytics').get(action_constant=ACTION_BALLOT_VISIT)
+        self.assertEqual(rollup.action_count, 2)
+        self.assertEqual(
+            list(AnalyticsAction.objects.using('analytics').values_list('id', flat=True)), [next_day_action.id])
+        with gzip.open(results['archive_file_path'], 'rt', encoding='utf-8') as archive_file:
+            self.assertEqual(len(archive_file.readlines()), 3)
+
+    def test_action_saved_during_rollup_is_left_for_next_run(self):
+        first_action = create_analytics_action(self.date_as_integer)
+        late_actions = []
+
+        def save_late_action(action_values):
+            if not late_actions:
+                late_actions.append(create_analytics_action(self.date_as_integer, voter_we_vote_id='wv01voter2'))
+            return serialize_analytics_action_values(action_values)
+
+        with mock.patch('analytics.models.serialize_analytics_action_values', side_effect=save_late_action):
+            results = self.analytics_manager.rollup_analytics_actions_for_one_date(
+                self.date_as_integer, self.archive_directory)
+        self.assertTrue(results['success'])
+        self.assertEqual(results['actions_archived'], 1)
+        self.assertEqual(results['rollups_created'], 1)
+        self.assertTrue(results['archive_file_path'].endswith('_' + str(first_action.id) + '.jsonl.gz'))
+        self.assertEqual(
+            list(AnalyticsAction.objects.using('analytics').values_list('id', flat=True)), [late_actions[0].id])
+
+    def test_nothing_deleted_without_archive_directory(self):
+        create_analytics_action(self.date_as_integer)
+        results = self.analytics_manager.rollup_analytics_actions_for_one_date(self.date_as_integer, '')
+        self.assertFalse(results['success'])
+        self.assertIn('ROLLUP_ANALYTICS_ACTIONS-MISSING_ARCHIVE_DIRECTORY', results['status'])
+        self.assertEqual(AnalyticsAction.objects.using('analytics').count(), 1)
+        self.assertEqual(os.listdir(self.archive_directory), [])
+
+    def test_only_days_past_retention_and_already_processed_are_rolled_up(self):
+        processed_date_as_integer = date_as_integer_days_ago(300)
+        create_analytics_action(self.date_as_integer)
+        create_analytics_action(processed_date_as_integer)
+        # Past the retention window, but the analytics batch processes haven't finished with it yet
+        create_analytics_action(date_as_integer_days_ago(250))
+        # Within the retention window
+        create_analytics_action(date_as_integer_days_ago(10))
+        we_vote_settings_manager = WeVoteSettingsManager()
+        we_vote_settings_manager.save_setting('analytics_date_as_integer_last_processed', processed_date_as_integer)
+
+        results = rollup_analytics_actions(retention_days=180, archive_directory=self.archive_directory)
+        self.assertTrue(results['success'])
+        self.assertEqual(results['dates_rolled_up'], 2)
+        self.assertEqual(
+            sorted(AnalyticsActionDailyRollup.objects.using('analytics').values_list('date_as_integer', flat=True)),
+            [self.date_as_integer, processed_date_as_integer])
+        self.assertEqual(AnalyticsAction.objects.using('analytics').count(), 2)
+        self.assertEqual(
+            we_vote_settings_manager.fetch_setting(ANALYTICS_ACTION_ROLLED_UP_THROUGH_SETTING),
+            processed_date_as_integer)
@@ -2,10 +2,314 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
-from config.base import get_environment_variable
+from collections import OrderedDict
+from django.core.cache import caches
+from django.utils.timezone import now
+import hashlib
+import threading
+import time
+from config.base import get_environment_variable, get_environment_variable_default
+from wevote_functions.functions import convert_to_int, positive_value_exists
 import wevote_functions.admin
+from .models import ApiInternalCacheManager
 
 logger = wevote_functions.admin.get_logger(__name__)
 
 WE_VOTE_SERVER_ROOT_URL = get_environment_variable("WE_VOTE_SERVER_ROOT_URL")
 
+# How many (api_name, election_id_list) responses each worker holds in memory
+API_INTERNAL_CACHE_LOCAL_MAX_ENTRIES = \
+    convert_to_int(get_environment_variable_default("API_INTERNAL_CACHE_LOCAL_MAX_ENTRIES", 64))
+# How long a worker trusts its in-memory copy before asking the database (id only) if a newer entry exists
+API_INTERNAL_CACHE_REVALIDATE_SECONDS = \
+    convert_to_int(get_environment_variable_default("API_INTERNAL_CACHE_REVALIDATE_SECONDS", 60))
+# How often a worker is allowed to call schedule_refresh_of_api_internal_cache for the same key
+API_INTERNAL_CACHE_SCHEDULE_REFRESH_SECONDS = \
+    convert_to_int(get_environment_variable_default("API_INTERNAL_CACHE_SCHEDULE_REFRESH_SECONDS", 300))
+# Entries older than this are still served, but are counted as stale while the ApiRefreshRequest rebuilds them
+API_INTERNAL_CACHE_FRESH_SECONDS = 60 * 60
+# Optional shared tier: the alias of an entry in settings.CACHES (ex/ a memcached or redis cache). Blank to disable.
+API_INTERNAL_CACHE_SHARED_TIER_ALIAS = get_environment_variable_default("API_INTERNAL_CACHE_SHARED_TIER_ALIAS", "")
+API_INTERNAL_CACHE_SHARED_TIER_TIMEOUT_SECONDS = 2 * 60 * 60
+API_INTERNAL_CACHE_SHARED_TIER_KEY_PREFIX = "api_internal_cache"
+
+
+class ApiInternalCacheLocalTier(object):
+    """
+    Bounded, least-recently-used cache of serialized ApiInternalCache responses, held inside one worker process.
+    The serialized response is returned as-is, so requests share it without copying or serializing it again.
+    """
+    def __init__(self, max_entries=API_INTERNAL_CACHE_LOCAL_MAX_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        self.local_hits = 0
+        self.local_revalidated_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.stale_served = 0
+        self.evictions = 0
+        self.age_served_seconds_total = 0
+        self.age_served_seconds_max = 0
+        self.number_served = 0
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def update_entry(self, entry, **values):
+        with self.lock:
+            entry.update(values)
+
+    def record_lookup(self, counter_name):
+        # One of local_hits, local_revalidated_hits, shared_hits or misses
+        with self.lock:
+            setattr(self, counter_name, getattr(self, counter_name) + 1)
+
+    def record_served(self, age_seconds, is_stale):
+        with self.lock:
+            self.number_served += 1
+            self.age_served_seconds_total += age_seconds
+            if age_seconds > self.age_served_seconds_max:
+                self.age_served_seconds_max = age_seconds
+            if is_stale:
+                self.stale_served += 1
+
+    def statistics(self):
+        with self.lock:
+            average_age = self.age_served_seconds_total / self.number_served if self.number_served else 0
+            return {
+                'entries':                      len(self.entries),
+                'max_entries':                  self.max_entries,
+                'local_hits':                   self.local_hits,
+                'local_revalidated_hits':       self.local_revalidated_hits,
+                'shared_hits':                  self.shared_hits,
+                'misses':                       self.misses,
+                'stale_served':                 self.stale_served,
+                'evictions':                    self.evictions,
+                'average_age_served_seconds':   int(average_age),
+                'max_age_served_seconds':       int(self.age_served_seconds_max),
+            }
+
+
+api_internal_cache_local_tier = ApiInternalCacheLocalTier()
+
+
+def generate_api_internal_cache_key(api_name='', election_id_list_serialized=''):
+    # ApiInternalCacheManager matches both values with iexact
+    return str(api_name).lower(), str(election_id_list_serialized).lower()
+
+
+def get_api_internal_cache_shared_tier():
+    if not positive_value_exists(API_INTERNAL_CACHE_SHARED_TIER_ALIAS):
+        return None
+    try:
+        return caches[API_INTERNAL_CACHE_SHARED_TIER_ALIAS]
+    except Exception as e:
+        logger.error("API_INTERNAL_CACHE_SHARED_TIER_NOT_AVAILABLE: " + str(e))
+        return None
+
+
+def generate_api_internal_cache_shared_tier_key(key):
+    # Memcached does not allow spaces in keys, and election lists can be long, so use a stable hash
+    return API_INTERNAL_CACHE_SHARED_TIER_KEY_PREFIX + ":" + hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+
+def store_api_internal_cache_in_tiers(
+        api_name='',
+        election_id_list_serialized='',
+        api_internal_cache_id=0,
+        date_cached=None,
+        cached_api_response_serialized='',
+        store_in_shared_tier=True):
+    """
+    Write-through from the refresh job (or a cache miss), so other workers can pick up the new response
+    without reading it from the database.
+    :param cached_api_response_serialized: The json response, already serialized with json.dumps
+    """
+    status = ""
+    key = generate_api_internal_cache_key(api_name, election_id_list_serialized)
+    entry = {
+        'api_internal_cache_id':            api_internal_cache_id,
+        'cached_api_response_serialized':   cached_api_response_serialized,
+        'date_cached':                      date_cached if date_cached is not None else now(),
+        'date_validated':                   time.monotonic(),
+    }
+    previous_entry = api_internal_cache_local_tier.get(key)
+    if previous_entry is not None:
+        entry['date_refresh_scheduled'] = previous_entry.get('date_refresh_scheduled')
+    api_internal_cache_local_tier.set(key, entry)
+
+    shared_tier = get_api_internal_cache_shared_tier() if store_in_shared_tier else None
+    if shared_tier is not None:
+        try:
+            shared_tier.set(
+                generate_api_internal_cache_shared_tier_key(key),
+                {
+                    'api_internal_cache_id':            entry['api_internal_cache_id'],
+                    'cached_api_response_serialized':   entry['cached_api_response_serialized'],
+                    'date_cached':                      entry['date_cached'],
+                },
+                API_INTERNAL_CACHE_SHARED_TIER_TIMEOUT_SECONDS)
+            status += "API_INTERNAL_CACHE_SHARED_TIER_STORED "
+        except Exception as e:
+            status += "API_INTERNAL_CACHE_SHARED_TIER_NOT_STORED: " + str(e) + " "
+    return status
+
+
+def retrieve_api_internal_cache_from_shared_tier(key, api_internal_cache_id=0):
+    shared_tier = get_api_internal_cache_shared_tier()
+    if shared_tier is None:
+        return None
+    try:
+        shared_entry = shared_tier.get(generate_api_internal_cache_shared_tier_key(key))
+    except Exception as e:
+        logger.error("API_INTERNAL_CACHE_SHARED_TIER_GET_FAILED: " + str(e))
+        return None
+    if not shared_entry or shared_entry.get('cached_api_response_serialized') is None:
+        return None
+    if positive_value_exists(api_internal_cache_id) \
+            and shared_entry.get('api_internal_cache_id') != api_internal_cache_id:
+        # The shared tier is behind the database
+        return None
+    return shared_entry
+
+
+def retrieve_api_internal_cache_with_tiers(api_name='', election_id_list_serialized=''):
+    """
+    Return the latest cached response for this api_name and election list, checking (in order) this worker's
+    memory, the optional shared tier, and finally the ApiInternalCache table. Stale responses are served as-is
+    while schedule_refresh_of_api_internal_cache gets an ApiRefreshRequest rebuilding them in the background.
+    :param api_name:
+    :param election_id_list_serialized:
+    :return:
+    """
+    status = ""
+    api_internal_cache_manager = ApiInternalCacheManager()
+    key = generate_api_internal_cache_key(api_name, election_id_list_serialized)
+    local_tier = api_internal_cache_local_tier
+    cache_tier = ''
+
+    entry = local_tier.get(key)
+    if entry is not None and \
+            time.monotonic() - entry['date_validated'] < API_INTERNAL_CACHE_REVALIDATE_SECONDS:
+        local_tier.record_lookup('local_hits')
+        cache_tier = 'LOCAL'
+    elif entry is not None:
+        # Ask the database for the id of the latest entry only, so we don't deserialize the response again
+        results = api_internal_cache_manager.retrieve_latest_api_internal_cache_id(
+            api_name=api_name,
+            election_id_list_serialized=election_id_list_serialized)
+        if results['success'] and results['api_internal_cache_id'] == entry['api_internal_cache_id']:
+            local_tier.update_entry(entry, date_validated=time.monotonic())
+            local_tier.record_lookup('local_revalidated_hits')
+            cache_tier = 'LOCAL_REVALIDATED'
+        elif not results['success']:
+            # Keep serving what we have rather than failing the request
+            status += results['status']
+            local_tier.record_lookup('local_revalidated_hits')
+            cache_tier = 'LOCAL_REVALIDATE_FAILED'
+        else:
+            shared_entry = retrieve_api_internal_cache_from_shared_tier(key, results['api_internal_cache_id'])
+            entry = None
+            if shared_entry is not None:
+                store_api_internal_cache_in_tiers(
+                    api_name=api_name,
+                    election_id_list_serialized=election_id_list_serialized,
+                    api_internal_cache_id=shared_entry['api_internal_cache_id'],
+                    date_cached=shared_entry['date_cached'],
+                    cached_api_response_serialized=shared_entry['cached_api_response_serialized'],
+                    store_in_shared_tier=False)
+                entry = local_tier.get(key)
+                local_tier.record_lookup('shared_hits')
+                cache_tier = 'SHARED'
+    else:
+        shared_entry = retrieve_api_internal_cache_from_shared_tier(key)
+        if shared_entry is not None:
+            store_api_internal_cache_in_tiers(
+                api_name=api_name,
+                election_id_list_serialized=election_id_list_serialized,
+                api_internal_cache_id=shared_entry['api_internal_cache_id'],
+                date_cached=shared_entry['date_cached'],
+                cached_api_response_serialized=shared_entry['cached_api_response_serialized'],
+                store_in_shared_tier=False)
+            entry = local_tier.get(key)
+            local_tier.record_lookup('shared_hits')
+            cache_tier = 'SHARED'
+
+    if entry is None:
+        local_tier.record_lookup('misses')
+        results = api_internal_cache_manager.retrieve_latest_api_internal_cache(
+            api_name=api_name,
+            election_id_list_serialized=election_id_list_serialized)
+        status += results['status']
+        if results['api_internal_cache_found']:
+            api_internal_cache = results['api_internal_cache']
+            status += store_api_internal_cache_in_tiers(
+                api_name=api_name,
+                election_id_list_serialized=election_id_list_serialized,
+                api_internal_cache_id=api_internal_cache.id,
+                date_cached=api_internal_cache.date_cached,
+                cached_api_response_serialized=api_internal_cache.cached_api_response_serialized)
+            entry = local_tier.get(key)
+            cache_tier = 'DATABASE'
+
+    api_internal_cache_found = entry is not None
+    age_in_seconds = 0
+    is_stale = False
+    if api_internal_cache_found:
+        if entry['date_cached'] is not None:
+            age_in_seconds = max(0, (now() - entry['date_cached']).total_seconds())
+        is_stale = age_in_seconds > API_INTERNAL_CACHE_FRESH_SECONDS
+        local_tier.record_served(age_in_seconds, is_stale)
+
+    # Schedule the next rebuild, at most once every few minutes per worker
+    last_scheduled = entry.get('date_refresh_scheduled') if entry is not None else None
+    if last_scheduled is None or \
+            time.monotonic() - last_scheduled > API_INTERNAL_CACHE_SCHEDULE_REFRESH_SECONDS:
+        results = api_internal_cache_manager.schedule_refresh_of_api_internal_cache(
+            api_name=api_name,
+            election_id_list_serialized=election_id_list_serialized,
+            date_cached=entry['date_cached'] if entry is not None else None)
+        status += results['status']
+        if entry is not None:
+            local_tier.update_entry(entry, date_refresh_scheduled=time.monotonic())
+
+    results = {
+        'success':                          True,
+        'status':                           status,
+        'api_internal_cache_found':         api_internal_cache_found,
+        'api_internal_cache_id':            entry['api_internal_cache_id'] if api_internal_cache_found else 0,
+        'cache_tier':                       cache_tier,
+        # The serialized json, ready to return as the response body. Since it is a string, no request can
+        #  change it for the other requests sharing this worker's entry
+        'cached_api_response_serialized':
+            entry['cached_api_response_serialized'] if api_internal_cache_found else '',
+        'age_in_seconds':                   int(age_in_seconds),
+        'is_stale':                         is_stale,
+    }
+    return results
+
+
+def fetch_api_internal_cache_tier_statistics():
+    statistics = api_internal_cache_local_tier.statistics()
+    statistics['shared_tier_enabled'] = get_api_internal_cache_shared_tier() is not None
+    return statistics
@@ -285,11 +285,65 @@ class ApiInternalCacheManager(models.Manager):
         }
         return results
 
+    def retrieve_latest_api_internal_cache_id(
+            self,
+            api_name='',
+            election_id_list_serialized=''):
+        """
+        Lightweight version of retrieve_latest_api_internal_cache, which does not pull the (large) serialized response.
+        Used by the in-process cache tier to find out if a newer ApiInternalCache entry has been created.
+        :param api_name:
+        :param election_id_list_serialized:
+        :return:
+        """
+        api_internal_cache_found = False
+        api_internal_cache_id = 0
+        date_cached = None
+        status = ''
+
+        if not positive_value_exists(api_name):
+            status += "RETRIEVE_LATEST_CACHE_ID-MISSING_API_NAME "
+            results = {
+                'success':                  False,
+                'status':                   status,
+                'api_internal_cache_found': False,
+                'api_internal_cache_id':    0,
+                'date_cached':              None,
+            }
+            return results
+
+        try:
+            query = ApiInternalCache.objects.filter(
+                api_name__iexact=api_name,
+                election_id_list_serialized__iexact=election_id_list_serialized,
+                replaced=False)
+            query = query.exclude(cached_api_response_serialized='')
+            query = query.order_by('-date_cached')
+            latest = query.values('id', 'date_cached').first()
+            if latest:
+                api_internal_cache_found = True
+                api_internal_cache_id = latest['id']
+                date_cached = latest['date_cached']
+            success = True
+        except Exception as e:
+            success = False
+            status += 'RETRIEVE_LATEST_CACHE_ID_ERROR ' + str(e) + ' '
+
+        results = {
+            'success':                  success,
+            'status':                   status,
+            'api_internal_cache_found': api_internal_cache_found,
+            'api_internal_cache_id':    api_internal_cache_id,
+            'date_cached':              date_cached,
+        }
+        return results
+
     def schedule_refresh_of_api_internal_cache(
             self,
             api_name='',
             election_id_list_serialized='',
-            api_internal_cache=None):
+            api_internal_cache=None,
+            date_cached=None):
         api_internal_cache_found = False
         status = ''
         success = True
@@ -298,6 +352,10 @@ class ApiInternalCacheManager(models.Manager):
             # Work with this existing object
             api_internal_cache_found = True
             status += "API_INTERNAL_CACHE_PASSED_IN "
+        elif date_cached is not None:
+            # The caller (ex/ the in-process cache tier) already knows when the latest entry was cached
+            api_internal_cache_found = True
+            status += "API_INTERNAL_CACHE_DATE_CACHED_PASSED_IN "
         else:
             status += "API_INTERNAL_CACHE_NOT_PASSED_IN "
             results = self.retrieve_latest_api_internal_cache(
@@ -313,9 +371,11 @@ class ApiInternalCacheManager(models.Manager):
         create_entry_immediately = False
         if not api_internal_cache_found:
             create_entry_immediately = True
-        elif api_internal_cache and hasattr(api_internal_cache, 'date_cached'):
+        else:
+            if api_internal_cache and hasattr(api_internal_cache, 'date_cached'):
+                date_cached = api_internal_cache.date_cached
             sixty_minutes_ago = now() - timedelta(hours=1)
-            if api_internal_cache.date_cached < sixty_minutes_ago:
+            if date_cached is not None and date_cached < sixty_minutes_ago:
                 create_entry_immediately = True
         if create_entry_immediately:
             # We don't pass in date_refresh_is_needed, so it assumes value is "immediately"
@@ -0,0 +1,55 @@
+# api_internal_cache/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.test import SimpleTestCase
+from django.utils.timezone import now
+import json
+import time
+from .controllers import ApiInternalCacheLocalTier, api_internal_cache_local_tier, generate_api_internal_cache_key, \
+    retrieve_api_internal_cache_with_tiers
+
+
+class ApiInternalCacheLocalTierTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.local_tier = ApiInternalCacheLocalTier(max_entries=2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.local_tier.set('a', {'api_internal_cache_id': 1})
+        self.local_tier.set('b', {'api_internal_cache_id': 2})
+        # Reading 'a' makes 'b' the least recently used
+        self.local_tier.get('a')
+        self.local_tier.set('c', {'api_internal_cache_id': 3})
+        self.assertIsNone(self.local_tier.get('b'))
+        self.assertEqual(self.local_tier.get('a')['api_internal_cache_id'], 1)
+        self.assertEqual(self.local_tier.statistics()['evictions'], 1)
+
+    def test_age_counters(self):
+        self.local_tier.record_served(10, False)
+        self.local_tier.record_served(7200, True)
+        statistics = self.local_tier.statistics()
+        self.assertEqual(statistics['stale_served'], 1)
+        self.assertEqual(statistics['max_age_served_seconds'], 7200)
+        self.assertEqual(statistics['average_age_served_seconds'], 3605)
+
+    def test_key_matches_case_insensitively(self):
+        self.assertEqual(generate_api_internal_cache_key('voterGuidesUpcoming', '["4184"]'),
+                         generate_api_internal_cache_key('VOTERGUIDESUPCOMING', '["4184"]'))
+
+    def test_serialized_response_is_served_from_memory(self):
+        key = generate_api_internal_cache_key('voterGuidesUpcoming', '["4184"]')
+        cached_api_response_serialized = json.dumps({'voter_guides': [{'we_vote_id': 'wv01org1'}]})
+        api_internal_cache_local_tier.reset_statistics()
+        api_internal_cache_local_tier.set(key, {
+            'api_internal_cache_id':            1,
+            'cached_api_response_serialized':   cached_api_response_serialized,
+            'date_cached':                      now(),
+            'date_validated':                   time.monotonic(),
+            'date_refresh_scheduled':           time.monotonic(),
+        })
+        results = retrieve_api_internal_cache_with_tiers('voterGuidesUpcoming', '["4184"]')
+        self.assertEqual(results['cache_tier'], 'LOCAL')
+        self.assertIs(results['cached_api_response_serialized'], cached_api_response_serialized)
+        self.assertEqual(api_internal_cache_local_tier.statistics()['local_hits'], 1)
+        api_internal_cache_local_tier.clear()
@@ -2,7 +2,32 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse
+import json
+from admin_tools.views import redirect_to_sign_in_page
+from voter.models import voter_has_authority
 import wevote_functions.admin
+from .controllers import fetch_api_internal_cache_tier_statistics
 
 logger = wevote_functions.admin.get_logger(__name__)
 
+
+@login_required
+def api_internal_cache_statistics_view(request):
+    """
+    Hit, miss and age counters for the in-process cache tier of the worker answering this request
+    :param request:
+    :return:
+    """
+    # admin, analytics_admin, partner_organization, political_data_manager, political_data_viewer, verified_volunteer
+    authority_required = {'admin'}
+    if not voter_has_authority(request, authority_required):
+        return redirect_to_sign_in_page(request, authority_required)
+
+    json_data = {
+        'success':      True,
+        'status':       'API_INTERNAL_CACHE_STATISTICS ',
+        'statistics':   fetch_api_internal_cache_tier_statistics(),
+    }
+    return HttpResponse(json.dumps(json_data), content_type='application/json')
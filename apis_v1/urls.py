@@ -113,6 +113,8 @@ urlpatterns = [
       re_path(r'^facebookFriendsAction/', views_facebook.facebook_friends_action_view,
               name='facebookFriendsActionView'),
       re_path(r'retrieveSQLTables/', views_retrieve_tables.retrieve_sql_tables, name='retrieveSQLTables'),
+      re_path(r'retrieveSQLTablesStream/', views_retrieve_tables.retrieve_sql_tables_stream,
+              name='retrieveSQLTablesStream'),
       re_path(r'^friendInvitationByEmailSend/',
               views_friend.friend_invitation_by_email_send_view, name='friendInvitationByEmailSendView'),
       re_path(r'^friendInvitationByEmailVerify/',
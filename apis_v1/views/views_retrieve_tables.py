@@ -2,10 +2,12 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 from config.base import get_environment_variable
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 import json
-from retrieve_tables.controllers import retrieve_sql_tables_as_csv
+from retrieve_tables.controllers import allowable_tables, fetch_sql_table_max_id, retrieve_sql_tables_as_csv, \
+    stream_sql_table_as_csv
 import wevote_functions.admin
+from wevote_functions.functions import convert_to_int, positive_value_exists
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -24,3 +26,36 @@ def retrieve_sql_tables(request):  # retrieveSQLTables
     json_data = retrieve_sql_tables_as_csv(table, start, end)
     return HttpResponse(json.dumps(json_data), content_type='application/json')
 
+
+def retrieve_sql_tables_stream(request):  # retrieveSQLTablesStream
+    """
+    Stream one id range of one of the SQL tables as pipe delimited CSV (gzip compressed unless compress=none),
+    for retrieve_sql_files_from_master_server_streaming on a developer's local WeVoteServer
+    :param request:
+    :return:
+    """
+    table = request.GET.get('table', '')
+    start = convert_to_int(request.GET.get('start', 0))
+    end = convert_to_int(request.GET.get('end', 0))
+    compress = request.GET.get('compress', 'gzip') != 'none'
+    if table not in allowable_tables:
+        json_data = {
+            'success': False,
+            'status': "the table_name '" + table + "' is not in the table list, therefore no table was returned",
+        }
+        return HttpResponse(json.dumps(json_data), content_type='application/json')
+
+    if positive_value_exists(request.GET.get('max_id_only', False)):
+        # Used by sync_tables_from_master_server to plan the id ranges for this table
+        json_data = {
+            'success': True,
+            'status': 'TABLE_MAX_ID_RETRIEVED ',
+            'table_max_id': fetch_sql_table_max_id(table),
+        }
+        return HttpResponse(json.dumps(json_data), content_type='application/json')
+
+    response = StreamingHttpResponse(
+        stream_sql_table_as_csv(table, start, end, compress=compress),
+        content_type='application/gzip' if compress else 'text/csv')
+    response['X-Table-Max-Id'] = str(fetch_sql_table_max_id(table))
+    return response
@@ -6,7 +6,9 @@ import sys
 from datetime import date, datetime
 
 from django.db import models
-from django.db.models import F, Q, Count, FloatField, ExpressionWrapper, Func
+from django.db.models import Q, Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from geopy.exc import GeocoderQuotaExceeded
 from geopy.geocoders import get_geocoder_for_service
 
@@ -21,6 +23,7 @@ from polling_location.models import PollingLocationManager
 from wevote_functions.functions import convert_date_to_date_as_integer, convert_to_int, \
     extract_state_code_from_address_string, positive_value_exists, STATE_CODE_MAP
 from wevote_settings.models import fetch_next_we_vote_id_ballot_returned_integer, fetch_site_unique_id_prefix
+from .spatial_index import ballot_returned_spatial_index_cache
 
 OFFICE = 'OFFICE'
 CANDIDATE = 'CANDIDATE'
@@ -35,21 +38,10 @@ KIND_OF_BALLOT_ITEM_CHOICES = (
 
 GOOGLE_MAPS_API_KEY = get_environment_variable("GOOGLE_MAPS_API_KEY")
 GEOCODE_TIMEOUT = 10
-RADIUS_OF_EARTH_IN_MILES = 3958.756
-DEG_TO_RADS = 0.0174533
 DISTANCE_LIMIT_IN_MILES = 25
 
 logger = wevote_functions.admin.get_logger(__name__)
 
-class Sin(Func):
-    function = 'SIN'
-
-class Cos(Func):
-    function = 'COS'
-
-class ACos(Func):
-    function = 'ACOS'
-
 
 class BallotItem(models.Model):
     """
@@ -655,6 +647,77 @@ class BallotItemManager(models.Manager):
             }
         return results
 
+    def generate_ballot_item_row_entry(self, ballot_item_display_name, local_ballot_order, state_code,
+                                       google_civic_election_id, defaults):
+        """
+        Unsaved BallotItem with the same values create_ballot_item_row_entry would save, so a whole batch can be
+        written with bulk_create
+        :param ballot_item_display_name:
+        :param local_ballot_order:
+        :param state_code:
+        :param google_civic_election_id:
+        :param defaults:
+        :return:
+        """
+        if 'state_code' in defaults and positive_value_exists(defaults['state_code']):
+            state_code = defaults['state_code']
+        if positive_value_exists(state_code):
+            state_code = state_code.lower()
+        new_ballot_item = BallotItem(
+            ballot_item_display_name=ballot_item_display_name,
+            contest_measure_id=defaults['contest_measure_id'],
+            contest_measure_we_vote_id=defaults['contest_measure_we_vote_id'],
+            contest_office_id=defaults['contest_office_id'],
+            contest_office_we_vote_id=defaults['contest_office_we_vote_id'],
+            google_civic_election_id=google_civic_election_id,
+            local_ballot_order=local_ballot_order,
+            measure_subtitle=defaults['measure_subtitle'],
+            polling_location_we_vote_id=defaults['polling_location_we_vote_id'],
+            state_code=state_code)
+        if 'measure_url' in defaults:
+            new_ballot_item.measure_url = defaults['measure_url']
+        if 'yes_vote_description' in defaults:
+            new_ballot_item.yes_vote_description = defaults['yes_vote_description']
+        if 'no_vote_description' in defaults:
+            new_ballot_item.no_vote_description = defaults['no_vote_description']
+        return new_ballot_item
+
+    def update_ballot_item_row_entry_values(self, ballot_item, ballot_item_display_name, local_ballot_order, defaults):
+        """
+        Copy the values update_ballot_item_row_entry would save onto ballot_item, without saving it, so a whole batch
+        can be written with bulk_update
+        :param ballot_item:
+        :param ballot_item_display_name:
+        :param local_ballot_order:
+        :param defaults:
+        :return: True if any value changed
+        """
+        contest_office_id = defaults['contest_office_id']
+        contest_measure_id = defaults['contest_measure_id']
+        new_values = {
+            'ballot_item_display_name':     ballot_item_display_name,
+            'local_ballot_order':           local_ballot_order,
+            'contest_office_id':
+                str(contest_office_id) if positive_value_exists(contest_office_id) else None,
+            'contest_office_we_vote_id':    defaults['contest_office_we_vote_id'],
+            'contest_measure_id':
+                str(contest_measure_id) if positive_value_exists(contest_measure_id) else None,
+            'contest_measure_we_vote_id':   defaults['contest_measure_we_vote_id'],
+            'measure_subtitle':             defaults['measure_subtitle'],
+        }
+        for field_name in ['measure_url', 'yes_vote_description', 'no_vote_description']:
+            if field_name in defaults:
+                new_values[field_name] = defaults[field_name]
+        if 'state_code' in defaults and positive_value_exists(defaults['state_code']):
+            new_values['state_code'] = defaults['state_code'].lower()
+
+        change_to_save = False
+        for field_name, new_value in new_values.items():
+            if getattr(ballot_item, field_name) != new_value:
+                setattr(ballot_item, field_name, new_value)
+                change_to_save = True
+        return change_to_save
+
     def delete_ballot_item(self, ballot_item_id=0):
         status = ""
         ballot_item_found = False
@@ -2492,6 +2555,90 @@ class BallotReturnedManager(models.Manager):
         # If we got through the elections without finding any ballot_returned entries, there is no prior election
         return 0
 
+    def retrieve_closest_map_point_ballot_returned_list(
+            self,
+            latitude=None,
+            longitude=None,
+            google_civic_election_id=0,
+            state_code='',
+            number_to_return=1,
+            maximum_distance_in_miles=DISTANCE_LIMIT_IN_MILES,
+            read_only=True):
+        """
+        Find the map point ballots closest to this location, using the in-memory spatial index for the election
+        (see ballot/spatial_index.py) instead of calculating the great circle distance to every BallotReturned.
+        Each BallotReturned returned has a "distance" attribute, in miles.
+        :param latitude:
+        :param longitude:
+        :param google_civic_election_id:
+        :param state_code: Only return ballots with this normalized_state
+        :param number_to_return:
+        :param maximum_distance_in_miles:
+        :param read_only:
+        :return:
+        """
+        ballot_returned_list = []
+        status = ""
+        if latitude is None or longitude is None or not positive_value_exists(google_civic_election_id):
+            status += "CLOSEST_MAP_POINT_BALLOT_RETURNED-MISSING_LOCATION_OR_ELECTION "
+            return {
+                'success':              False,
+                'status':               status,
+                'ballot_returned_list': ballot_returned_list,
+            }
+
+        google_civic_election_id = convert_to_int(google_civic_election_id)
+        if 'test' in sys.argv:
+            ballot_returned_query = BallotReturned.objects.all()
+        elif positive_value_exists(read_only):
+            ballot_returned_query = BallotReturned.objects.using('readonly').all()
+        else:
+            ballot_returned_query = BallotReturned.objects.all()
+        # Limit this query to entries stored for map points
+        map_point_query = ballot_returned_query\
+            .filter(google_civic_election_id=google_civic_election_id)\
+            .exclude(Q(polling_location_we_vote_id__isnull=True) | Q(polling_location_we_vote_id=""))
+
+        def load_point_list():
+            return list(map_point_query
+                        .exclude(Q(latitude__isnull=True) | Q(longitude__isnull=True))
+                        .values_list('id', 'latitude', 'longitude', 'normalized_state'))
+
+        def load_fingerprint():
+            aggregate = map_point_query.aggregate(number_of_map_points=Count('id'),
+                                                  date_last_updated=Max('date_last_updated'))
+            return aggregate['number_of_map_points'], aggregate['date_last_updated']
+
+        try:
+            tree = ballot_returned_spatial_index_cache.retrieve_tree(
+                google_civic_election_id, load_point_list, load_fingerprint)
+            nearest_list = tree.find_nearest(
+                latitude, longitude,
+                number_to_return=number_to_return,
+                maximum_distance_in_miles=maximum_distance_in_miles,
+                state_code=state_code)
+            if len(nearest_list):
+                distance_by_id = dict(nearest_list)
+                ballot_returned_by_id = ballot_returned_query.in_bulk(list(distance_by_id.keys()))
+                for ballot_returned_id, distance in nearest_list:
+                    ballot_returned = ballot_returned_by_id.get(ballot_returned_id)
+                    if ballot_returned is None:
+                        # Deleted since the spatial index was built
+                        ballot_returned_spatial_index_cache.invalidate(google_civic_election_id)
+                        continue
+                    ballot_returned.distance = distance
+                    ballot_returned_list.append(ballot_returned)
+            success = True
+        except Exception as e:
+            success = False
+            status += "CLOSEST_MAP_POINT_BALLOT_RETURNED_ERROR: " + str(e) + " "
+
+        return {
+            'success':              success,
+            'status':               status,
+            'ballot_returned_list': ballot_returned_list,
+        }
+
     def find_closest_ballot_returned(self, text_for_map_search, google_civic_election_id=0, read_only=True):
         """
         We search for the closest address for this election in the ballot_returned table. We never have to worry
@@ -2613,88 +2760,49 @@ class BallotReturnedManager(models.Manager):
             address = location.address
             # address has format "line_1, state zip, USA"
 
-            if 'test' in sys.argv:
-                ballot_returned_query = BallotReturned.objects.all()
-            elif positive_value_exists(read_only):
-                ballot_returned_query = BallotReturned.objects.using('readonly').all()
-            else:
-                ballot_returned_query = BallotReturned.objects.all()
-            # Limit this query to entries stored for map points
-            ballot_returned_query = ballot_returned_query.exclude(
-                Q(polling_location_we_vote_id__isnull=True) | Q(polling_location_we_vote_id=""))
             if positive_value_exists(address) and "," in address:
                 raw_state_code = address.split(', ')
                 if positive_value_exists(raw_state_code):
                     state_code = raw_state_code[-2][:2]
-            if positive_value_exists(state_code):
-                # This search for normalized_state is NOT redundant because some elections are in many states
-                ballot_returned_query = ballot_returned_query.filter(normalized_state__iexact=state_code)
-
-            try:
-                lat_rads_ploc = location.latitude * DEG_TO_RADS
-                lon_rads_ploc = location.longitude * DEG_TO_RADS
-                ballot_returned_query = ballot_returned_query.annotate(
-                    # Calculate the approximate great circle distance between two coordinates
-                    # https://medium.com/@petehouston/calculate-distance-of-two-locations-on-earth-using-python-1501b1944d97
-                    distance=ExpressionWrapper(
-                         (RADIUS_OF_EARTH_IN_MILES * (
-                             ACos(
-                                 (Sin(F('latitude') * DEG_TO_RADS) *
-                                  Sin(lat_rads_ploc)) +
-                                 (Cos(F('latitude') * DEG_TO_RADS) *
-                                  Cos(lat_rads_ploc) *
-                                  Cos((F('longitude') * DEG_TO_RADS) - lon_rads_ploc))
-                             )
-                           )),
-                         output_field=FloatField()))
-            except Exception as e:
-                status += "EXCEPTION_IN_ANNOTATE_CALCULATION1-" + str(e) + ' '
+            # Searching by state_code is NOT redundant because some elections are in many states
 
             # Do not return ballots more than 25 miles away
-            ballot_returned_query = ballot_returned_query.filter(distance__lte=DISTANCE_LIMIT_IN_MILES)
-
-            ballot_returned_query = ballot_returned_query.order_by('distance')
-
             if positive_value_exists(google_civic_election_id):
                 status += "SEARCHING_BY_GOOGLE_CIVIC_ID "
-                ballot_returned_query = ballot_returned_query.filter(google_civic_election_id=google_civic_election_id)
-                try:
-                    ballot = ballot_returned_query.first()
-                    if ballot == None:
-                        status += "BALLOT_RETURNED_QUERY_FIRST_FAILED_HAS_LOCATION_AND_POSITIVE_GOOGLE_CIVIC_ID__BALLOT_NONE "
-                    else:
-                        status += "SUBSTITUTED_BALLOT_DISTANCE1: " + str(ballot.distance) + " "
-                        # print('===== 1 ===== ballot.distance', ballot.distance, ballot.latitude, ballot.longitude,
-                        #       text_for_map_search)
-                except Exception as e:
-                    ballot = None
-                    status += "BALLOT_RETURNED_QUERY_FIRST_FAILED_HAS_LOCATION_AND_POSITIVE_GOOGLE_CIVIC_ID: " + str(e) + ' '
-                # ballot_returned_list = list(ballot_returned_query)
-                # if len(ballot_returned_list):
-                #     ballot = ballot_returned_list[0]
+                results = self.retrieve_closest_map_point_ballot_returned_list(
+                    latitude=location.latitude,
+                    longitude=location.longitude,
+                    google_civic_election_id=google_civic_election_id,
+                    state_code=state_code,
+                    read_only=read_only)
+                ballot = results['ballot_returned_list'][0] if len(results['ballot_returned_list']) else None
+                if not results['success']:
+                    status += "BALLOT_RETURNED_QUERY_FIRST_FAILED_HAS_LOCATION_AND_POSITIVE_GOOGLE_CIVIC_ID: " + \
+                              results['status']
+                elif ballot is None:
+                    status += "BALLOT_RETURNED_QUERY_FIRST_FAILED_HAS_LOCATION_AND_POSITIVE_GOOGLE_CIVIC_ID__BALLOT_NONE "
+                else:
+                    status += "SUBSTITUTED_BALLOT_DISTANCE1: " + str(ballot.distance) + " "
             else:
                 # If we have an active election coming up, including today
                 # fetch_next_upcoming_election_in_this_state returns next election with ballot items
                 status += "FETCH_NEXT_UPCOMING_ELECTION_IN_THIS_STATE "
                 upcoming_google_civic_election_id = self.fetch_next_upcoming_election_in_this_state(state_code)
                 if positive_value_exists(upcoming_google_civic_election_id):
-                    ballot_returned_query_without_election_id = ballot_returned_query
-                    ballot_returned_query = ballot_returned_query.filter(
-                        google_civic_election_id=upcoming_google_civic_election_id)
-                    try:
-                        ballot = ballot_returned_query.first()
-                        if ballot == None:
-                            status += "BALLOT_RETURNED_QUERY_FIRST_FAILED_HAS_LOCATION_AND_POSITIVE_UPCOMING_GOOGLE_CIVIC_ID__BALLOT_NONE "
-                        else:
-                            status += "SUBSTITUTED_BALLOT_DISTANCE2: " + str(ballot.distance) + " "
-                            # print('===== 2 ===== ballot.distance', ballot.distance, ballot.latitude, ballot.longitude,
-                            #       text_for_map_search)
-                    except Exception as e:
-                        ballot = None
-                        status += "BALLOT_RETURNED_QUERY_FIRST_FAILED_HAS_LOCATION_AND_POSITIVE_UPCOMING_GOOGLE_CIVIC_ID: " + str(e) + ' '
-                    # ballot_returned_list = list(ballot_returned_query)
-                    # if len(ballot_returned_list):
-                    #     ballot = ballot_returned_list[0]
+                    results = self.retrieve_closest_map_point_ballot_returned_list(
+                        latitude=location.latitude,
+                        longitude=location.longitude,
+                        google_civic_election_id=upcoming_google_civic_election_id,
+                        state_code=state_code,
+                        read_only=read_only)
+                    ballot = results['ballot_returned_list'][0] if len(results['ballot_returned_list']) else None
+                    if not results['success']:
+                        status += "BALLOT_RETURNED_QUERY_FIRST_FAILED_HAS_LOCATION_AND_POSITIVE_UPCOMING_GOOGLE_CIVIC_ID: " + \
+                                  results['status']
+                    elif ballot is None:
+                        status += "BALLOT_RETURNED_QUERY_FIRST_FAILED_HAS_LOCATION_AND_POSITIVE_UPCOMING_GOOGLE_CIVIC_ID__BALLOT_NONE "
+                    else:
+                        status += "SUBSTITUTED_BALLOT_DISTANCE2: " + str(ballot.distance) + " "
                     # What if this is a National election, but there aren't any races in the state the voter is in?
                     # We want to find the *next* upcoming election
                     if ballot is None:
@@ -2704,28 +2812,25 @@ class BallotReturnedManager(models.Manager):
                         safety_valve_count = 0
                         while ballot_not_found and more_elections_exist and safety_valve_count < 20:
                             safety_valve_count += 1
-                            # Reset ballot_returned_query
-                            ballot_returned_query = ballot_returned_query_without_election_id
                             skip_these_elections.append(upcoming_google_civic_election_id)
                             upcoming_google_civic_election_id = self.fetch_next_upcoming_election_in_this_state(
                                 state_code, skip_these_elections)
                             if positive_value_exists(upcoming_google_civic_election_id):
-                                ballot_returned_query = ballot_returned_query.filter(
-                                    google_civic_election_id=upcoming_google_civic_election_id)
-                                try:
-                                    ballot = ballot_returned_query.first()
-                                    if ballot == None:
-                                        status += "BALLOT_RETURNED_QUERY_FIRST_FAILED_BALLOT_NONE_POSITIVE_UPCOMING_GOOGLE_CIVIC_ID__BALLOT_NONE "
-                                    else:
-                                        status += "SUBSTITUTED_BALLOT_DISTANCE3: " + str(ballot.distance) + " "
-                                        # print('===== 3 ===== ballot.distance', ballot.distance, ballot.latitude,
-                                        #       ballot.longitude, text_for_map_search)
-                                except Exception as e:
-                                    ballot = None
-                                    status += "BALLOT_RETURNED_QUERY_FIRST_FAILED_BALLOT_NONE_POSITIVE_UPCOMING_GOOGLE_CIVIC_ID: " + str(e) + ' '
-                                # ballot_returned_list = list(ballot_returned_query)
-                                # if len(ballot_returned_list):
-                                #     ballot = ballot_returned_list[0]
+                                results = self.retrieve_closest_map_point_ballot_returned_list(
+                                    latitude=location.latitude,
+                                    longitude=location.longitude,
+                                    google_civic_election_id=upcoming_google_civic_election_id,
+                                    state_code=state_code,
+                                    read_only=read_only)
+                                ballot = results['ballot_returned_list'][0] \
+                                    if len(results['ballot_returned_list']) else None
+                                if not results['success']:
+                                    status += "BALLOT_RETURNED_QUERY_FIRST_FAILED_BALLOT_NONE_POSITIVE_UPCOMING_GOOGLE_CIVIC_ID: " + \
+                                              results['status']
+                                elif ballot is None:
+                                    status += "BALLOT_RETURNED_QUERY_FIRST_FAILED_BALLOT_NONE_POSITIVE_UPCOMING_GOOGLE_CIVIC_ID__BALLOT_NONE "
+                                else:
+                                    status += "SUBSTITUTED_BALLOT_DISTANCE3: " + str(ballot.distance) + " "
                                 if ballot is not None:
                                     ballot_not_found = False
                             else:
@@ -2734,19 +2839,6 @@ class BallotReturnedManager(models.Manager):
                     ballot = None
                     status += "NOT_LOOKING_FOR_PREVIOUS_ELECTION "
                     # We no longer want to automatically return the previous election for this voter
-                    # past_google_civic_election_id = self.fetch_last_election_in_this_state(state_code)
-                    # if positive_value_exists(past_google_civic_election_id):
-                    #     # Limit the search to the most recent election with ballot items
-                    #     ballot_returned_query = ballot_returned_query.filter(
-                    #         google_civic_election_id=past_google_civic_election_id)
-                    # try:
-                    #     ballot = ballot_returned_query.first()
-                    # except Exception as e:
-                    #     ballot = None
-                    #     status += "BALLOT_RETURNED_QUERY_FIRST_FAILED_HAS_PAST_GOOGLE_CIVIC_ID: " + str(e) + ' '
-                    # # ballot_returned_list = list(ballot_returned_query)
-                    # # if len(ballot_returned_list):
-                    # #     ballot = ballot_returned_list[0]
 
         if ballot is not None:
             ballot_returned = ballot
@@ -2758,57 +2850,19 @@ class BallotReturnedManager(models.Manager):
             if location is not None and positive_value_exists(google_civic_election_id):
                 # If here, then the geocoder successfully found the address
                 status += 'GEOCODER_FOUND_LOCATION-ATTEMPT2 '
-                address = location.address
-                # address has format "line_1, state zip, USA"
-
-                if 'test' in sys.argv:
-                    ballot_returned_query = BallotReturned.objects.all()
-                elif positive_value_exists(read_only):
-                    ballot_returned_query = BallotReturned.objects.using('readonly').all()
-                else:
-                    ballot_returned_query = BallotReturned.objects.all()
-                # Limit this query to entries stored for map points
-                ballot_returned_query = ballot_returned_query.exclude(
-                    Q(polling_location_we_vote_id__isnull=True) | Q(polling_location_we_vote_id=""))
-
-                try:
-                    lat_rads_ploc = location.latitude * DEG_TO_RADS
-                    lon_rads_ploc = location.longitude * DEG_TO_RADS
-                    ballot_returned_query = ballot_returned_query.annotate(
-                        # Calculate the approximate great circle distance between two coordinates
-                        # https://medium.com/@petehouston/calculate-distance-of-two-locations-on-earth-using-python-1501b1944d97
-                        distance=ExpressionWrapper(
-                            (RADIUS_OF_EARTH_IN_MILES * (
-                                ACos(
-                                    (Sin(F('latitude') * DEG_TO_RADS) *
-                                     Sin(lat_rads_ploc)) +
-                                    (Cos(F('latitude') * DEG_TO_RADS) *
-                                     Cos(lat_rads_ploc) *
-                                     Cos((F('longitude') * DEG_TO_RADS) - lon_rads_ploc))
-                                )
-                            )),
-                            output_field=FloatField()))
-                except Exception as e:
-                    status += "EXCEPTION_IN_ANNOTATE_CALCULATION2-" + str(e) + ' '
-
-                # Do not return ballots more than 25 miles away
-                ballot_returned_query = ballot_returned_query.filter(distance__lte=DISTANCE_LIMIT_IN_MILES)
-
-                ballot_returned_query = ballot_returned_query.order_by('distance')
-
                 status += "SEARCHING_BY_GOOGLE_CIVIC_ID-ATTEMPT2 "
-                ballot_returned_query = ballot_returned_query.filter(
-                    google_civic_election_id=google_civic_election_id)
-                try:
-                    ballot_returned = ballot_returned_query.first()
+                results = self.retrieve_closest_map_point_ballot_returned_list(
+                    latitude=location.latitude,
+                    longitude=location.longitude,
+                    google_civic_election_id=google_civic_election_id,
+                    read_only=read_only)
+                ballot_returned = results['ballot_returned_list'][0] \
+                    if len(results['ballot_returned_list']) else None
+                if ballot_returned is None:
+                    status += "BALLOT_RETURNED_QUERY_FIRST_FAILED_HAS_BALLOT_LOCATION_AND_POSITIVE_GOOGLE_CIVIC_ID: " + \
+                              results['status']
+                else:
                     status += "SUBSTITUTED_BALLOT_DISTANCE4: " + str(ballot_returned.distance) + " "
-                except Exception as e:
-                    ballot_returned = None
-                    status += "BALLOT_RETURNED_QUERY_FIRST_FAILED_HAS_BALLOT_LOCATION_AND_POSITIVE_GOOGLE_CIVIC_ID: " + str(e) + ' '
-                # ballot_returned_list = list(ballot_returned_query)
-                # if len(ballot_returned_list):
-                #     ballot_returned = ballot_returned_list[0]
-                if ballot_returned is not None:
                     ballot_returned_found = True
                     status += 'BALLOT_RETURNED_FOUND-ATTEMPT2 '
 
@@ -4481,3 +4535,11 @@ def retrieve_address_fields_from_geocoder(text_for_map_search):
         'zip_long':     zip_long,
     }
     return results
+
+
+@receiver(post_save, sender=BallotReturned)
+@receiver(post_delete, sender=BallotReturned)
+def invalidate_ballot_returned_spatial_index_signal(sender, instance, **kwargs):
+    # Only map point ballots are in the spatial index
+    if positive_value_exists(instance.polling_location_we_vote_id):
+        ballot_returned_spatial_index_cache.invalidate(instance.google_civic_election_id)
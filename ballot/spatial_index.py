@@ -0,0 +1,180 @@
+# ballot/spatial_index.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+"""
+In-memory nearest-neighbor lookup of map point BallotReturned entries, one KD-tree per google_civic_election_id.
+Points are stored as (x, y, z) on the unit sphere, so straight-line (chord) distance orders points exactly the
+same way as great circle distance, and the tree never has to deal with longitude wrap-around.
+"""
+
+import heapq
+import math
+import threading
+import time
+
+RADIUS_OF_EARTH_IN_MILES = 3958.756
+
+
+def convert_latitude_longitude_to_unit_vector(latitude, longitude):
+    latitude_radians = math.radians(latitude)
+    longitude_radians = math.radians(longitude)
+    cos_latitude = math.cos(latitude_radians)
+    return (
+        cos_latitude * math.cos(longitude_radians),
+        cos_latitude * math.sin(longitude_radians),
+        math.sin(latitude_radians),
+    )
+
+
+def convert_chord_length_to_miles(chord_length):
+    return RADIUS_OF_EARTH_IN_MILES * 2 * math.asin(min(1.0, chord_length / 2))
+
+
+def convert_miles_to_chord_length(miles):
+    return 2 * math.sin(min(math.pi, miles / RADIUS_OF_EARTH_IN_MILES) / 2)
+
+
+class BallotReturnedKDTree(object):
+    """
+    Static 3-d tree stored in flat lists: each slice of node_list is split at its median, with the lower half to
+    the left and the upper half to the right. An election with ~100k map points is a handful of Python lists
+    rather than ~100k node objects.
+    """
+    def __init__(self, point_list):
+        """
+        :param point_list: list of (ballot_returned_id, latitude, longitude, state_code)
+        """
+        self.ballot_returned_id_list = []
+        self.state_code_list = []
+        self.vector_list = []
+        for ballot_returned_id, latitude, longitude, state_code in point_list:
+            if latitude is None or longitude is None:
+                continue
+            self.ballot_returned_id_list.append(ballot_returned_id)
+            self.state_code_list.append(str(state_code).upper() if state_code else '')
+            self.vector_list.append(convert_latitude_longitude_to_unit_vector(latitude, longitude))
+        # node_list holds point indexes in KD order; split_axis_list the axis used at that node
+        self.node_list = list(range(len(self.vector_list)))
+        self.split_axis_list = [0] * len(self.vector_list)
+        self._build(0, len(self.node_list), 0)
+
+    def __len__(self):
+        return len(self.node_list)
+
+    def _build(self, start, end, depth):
+        # Iterative over a stack of (start, end, depth) slices, to avoid recursion limits on large elections
+        stack = [(start, end, depth)]
+        vector_list = self.vector_list
+        while stack:
+            start, end, depth = stack.pop()
+            if end - start <= 0:
+                continue
+            axis = depth % 3
+            segment = self.node_list[start:end]
+            segment.sort(key=lambda point_index: vector_list[point_index][axis])
+            self.node_list[start:end] = segment
+            middle = (start + end) // 2
+            self.split_axis_list[middle] = axis
+            stack.append((start, middle, depth + 1))
+            stack.append((middle + 1, end, depth + 1))
+
+    def find_nearest(self, latitude, longitude, number_to_return=1, maximum_distance_in_miles=None,
+                     state_code=''):
+        """
+        :return: list of (ballot_returned_id, distance_in_miles), closest first
+        """
+        if not len(self.node_list) or number_to_return < 1:
+            return []
+        target = convert_latitude_longitude_to_unit_vector(latitude, longitude)
+        state_code = str(state_code).upper() if state_code else ''
+        if maximum_distance_in_miles is not None:
+            maximum_chord_squared = convert_miles_to_chord_length(maximum_distance_in_miles) ** 2
+        else:
+            maximum_chord_squared = float('inf')
+
+        # Max-heap (negated) of the best candidates found so far
+        best = []
+        vector_list = self.vector_list
+        node_list = self.node_list
+        split_axis_list = self.split_axis_list
+        stack = [(0, len(node_list))]
+        while stack:
+            start, end = stack.pop()
+            if end - start <= 0:
+                continue
+            middle = (start + end) // 2
+            point_index = node_list[middle]
+            point = vector_list[point_index]
+            distance_squared = \
+                (point[0] - target[0]) ** 2 + (point[1] - target[1]) ** 2 + (point[2] - target[2]) ** 2
+            bound = -best[0][0] if len(best) == number_to_return else maximum_chord_squared
+            if distance_squared <= bound and \
+                    (not state_code or self.state_code_list[point_index] == state_code):
+                heapq.heappush(best, (-distance_squared, point_index))
+                if len(best) > number_to_return:
+                    heapq.heappop(best)
+                bound = -best[0][0] if len(best) == number_to_return else maximum_chord_squared
+            axis = split_axis_list[middle]
+            difference = target[axis] - point[axis]
+            if difference < 0:
+                near, far = (start, middle), (middle + 1, end)
+            else:
+                near, far = (middle + 1, end), (start, middle)
+            # Push far side first, so the near side is explored first
+            if difference ** 2 <= bound:
+                stack.append(far)
+            stack.append(near)
+
+        best.sort(reverse=True)
+        return [(self.ballot_returned_id_list[point_index], convert_chord_length_to_miles(math.sqrt(-negative)))
+                for negative, point_index in best]
+
+
+class BallotReturnedSpatialIndexCache(object):
+    """
+    One BallotReturnedKDTree per google_civic_election_id, built on first use. Trees are dropped when map point
+    ballots for that election are saved or deleted in this process, and are re-checked against the database
+    (with a count + latest date_last_updated query) every revalidate_seconds to pick up changes made by other workers.
+    """
+    def __init__(self, revalidate_seconds=60):
+        self.revalidate_seconds = revalidate_seconds
+        self.lock = threading.Lock()
+        self.index_by_election = {}
+
+    def invalidate(self, google_civic_election_id=None):
+        with self.lock:
+            if google_civic_election_id is None:
+                self.index_by_election = {}
+            else:
+                self.index_by_election.pop(int(google_civic_election_id), None)
+
+    def retrieve_tree(self, google_civic_election_id, load_point_list, load_fingerprint):
+        """
+        :param google_civic_election_id:
+        :param load_point_list: function returning the (id, latitude, longitude, state_code) list for the election
+        :param load_fingerprint: function returning a cheap value which changes when the election's map points change
+        :return: BallotReturnedKDTree
+        """
+        google_civic_election_id = int(google_civic_election_id)
+        with self.lock:
+            cached = self.index_by_election.get(google_civic_election_id)
+        if cached is not None:
+            if time.monotonic() - cached['date_validated'] < self.revalidate_seconds:
+                return cached['tree']
+            fingerprint = load_fingerprint()
+            if fingerprint == cached['fingerprint']:
+                cached['date_validated'] = time.monotonic()
+                return cached['tree']
+
+        fingerprint = load_fingerprint()
+        tree = BallotReturnedKDTree(load_point_list())
+        with self.lock:
+            self.index_by_election[google_civic_election_id] = {
+                'tree':             tree,
+                'fingerprint':      fingerprint,
+                'date_validated':   time.monotonic(),
+            }
+        return tree
+
+
+ballot_returned_spatial_index_cache = BallotReturnedSpatialIndexCache()
@@ -1,9 +1,10 @@
 from unittest import mock
 from collections import namedtuple
 
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 
 from ballot.models import BallotReturned, BallotReturnedManager
+from ballot.spatial_index import BallotReturnedKDTree
 
 
 Location = namedtuple('Location', ['address', 'latitude', 'longitude'])
@@ -100,3 +101,26 @@ class BallotTestCase(TestCase):
             self.assertFalse(result['geocoder_quota_exceeded'])
             self.assertTrue(result['ballot_returned_found'])
             self.assertEqual(result['ballot_returned'], ballot_in_jackson)
+
+
+class BallotReturnedKDTreeTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.tree = BallotReturnedKDTree([
+            (1, 34.6604854, -90.184124, 'MS'),    # Coldwater, MS
+            (2, 32.269163, -90.234566, 'MS'),     # Jackson, MS
+            (3, 35.1495343, -90.0489801, 'TN'),   # Memphis, TN
+            (4, 37.8030442, -122.2739699, 'CA'),  # Oakland, CA
+            (5, None, None, 'CA'),                # Map point without coordinates is skipped
+        ])
+
+    def test_nearest_are_returned_closest_first(self):
+        nearest_list = self.tree.find_nearest(34.7, -90.1, number_to_return=3)
+        self.assertEqual([ballot_returned_id for ballot_returned_id, distance in nearest_list], [1, 3, 2])
+        self.assertLess(nearest_list[0][1], nearest_list[1][1])
+
+    def test_state_code_and_distance_limit(self):
+        nearest_list = self.tree.find_nearest(35.1, -90.05, number_to_return=1, state_code='ms')
+        self.assertEqual(nearest_list[0][0], 1)
+        self.assertEqual(self.tree.find_nearest(40.0, -100.0, maximum_distance_in_miles=25), [])
+        self.assertEqual(len(self.tree), 4)
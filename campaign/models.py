@@ -7,6 +7,7 @@ import string
 
 from django.db import models
 from django.db.models import Q
+from django.db.models.functions import Lower
 from django.utils.text import slugify
 
 import wevote_functions.admin
@@ -519,6 +520,25 @@ class CampaignXManager(models.Manager):
 
         return voter_is_campaignx_owner
 
+    def fetch_campaignx_supporter_voter_we_vote_id_set(self, campaignx_we_vote_id='', voter_we_vote_id_list=[]):
+        """
+        Set-based version of is_voter_campaignx_supporter, for a list of voters
+        :param campaignx_we_vote_id:
+        :param voter_we_vote_id_list:
+        :return: set of the (lower case) voter_we_vote_ids which support this campaign
+        """
+        if not positive_value_exists(campaignx_we_vote_id) or not len(voter_we_vote_id_list):
+            return set()
+        try:
+            queryset = CampaignXSupporter.objects.using('readonly').annotate(
+                voter_we_vote_id_lower=Lower('voter_we_vote_id'))
+            queryset = queryset.filter(
+                campaignx_we_vote_id__iexact=campaignx_we_vote_id,
+                voter_we_vote_id_lower__in=[one_we_vote_id.lower() for one_we_vote_id in voter_we_vote_id_list])
+            return set(queryset.values_list('voter_we_vote_id_lower', flat=True).distinct())
+        except Exception as e:
+            return set()
+
     def is_voter_campaignx_supporter(self, campaignx_we_vote_id='', voter_we_vote_id=''):
         """
 
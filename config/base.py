@@ -248,6 +248,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'wevote_social.middleware.SocialMiddleware',
+    'voter.middleware.VoterDeviceCacheMiddleware',
 ]
 
 AUTHENTICATION_BACKENDS = (
@@ -289,6 +290,23 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
+# Each worker keeps its own "default" cache in memory. Anything which has to be the same for every worker (ex/
+#  VOTER_DEVICE_CACHE_SHARED_TIER_ALIAS) uses "shared", which is only configured when SHARED_CACHE_LOCATION is set, ex/
+#  SHARED_CACHE_BACKEND "django.core.cache.backends.memcached.PyMemcacheCache" and SHARED_CACHE_LOCATION
+#  "127.0.0.1:11211"
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+SHARED_CACHE_LOCATION = get_environment_variable_default("SHARED_CACHE_LOCATION", "")
+if SHARED_CACHE_LOCATION:
+    CACHES['shared'] = {
+        'BACKEND': get_environment_variable_default(
+            "SHARED_CACHE_BACKEND", "django.core.cache.backends.memcached.PyMemcacheCache"),
+        'LOCATION': SHARED_CACHE_LOCATION,
+    }
+
 # Internationalization
 # https://docs.djangoproject.com/en/1.8/topics/i18n/
 
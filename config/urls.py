@@ -32,6 +32,8 @@ urlpatterns = [
     re_path(r'^apis/v1/', include(('apis_v1.urls', 'apis_v1'), namespace="apis_v1")),
 
     re_path(r'^a/', include(('analytics.urls','analytics'), namespace="analytics")),
+    re_path(r'^api_internal_cache/', include((
+        'api_internal_cache.urls', 'api_internal_cache'), namespace="api_internal_cache")),
     re_path(r'^b/', include(('ballot.urls','ballot'), namespace="ballot")),
     re_path(r'^ballotpedia/', include(('import_export_ballotpedia.urls','ballotpedia'), namespace="ballotpedia")),
     re_path(r'^bookmark/', include(('bookmark.urls','bookmark'), namespace="bookmark")),
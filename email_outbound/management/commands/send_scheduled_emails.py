@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from email_outbound.models import EmailManager, EMAIL_SCHEDULED_RETRY_HOURS
+
+
+class Command(BaseCommand):
+    help = 'Sends the EmailScheduled entries which are still TO_BE_PROCESSED, in chunks over reused connections, ' \
+           'including any which failed or were queued by a process which stopped before sending them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry_hours', type=int, default=EMAIL_SCHEDULED_RETRY_HOURS,
+                            help='Only send entries changed in this many hours. '
+                                 'Defaults to EMAIL_SCHEDULED_RETRY_HOURS')
+        parser.add_argument('--maximum_emails', type=int, default=0,
+                            help='Number of emails sent in this run (0 for all of them)')
+
+    def handle(self, *args, **options):
+        email_manager = EmailManager()
+        results = email_manager.send_scheduled_emails_to_be_processed(
+            retry_hours=options['retry_hours'], maximum_emails=options['maximum_emails'])
+        self.stdout.write('Sent {sent} emails, {not_sent} not sent. {status}'.format(
+            sent=results['emails_sent'],
+            not_sent=results['emails_not_sent'],
+            status=results['status']))
@@ -2,10 +2,15 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from concurrent.futures import ThreadPoolExecutor
+from config.base import get_environment_variable_default
 from datetime import date, timedelta
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.apps import apps
-from django.db import models
+from django.db import models, transaction
+from django.utils.timezone import now
+import threading
+import time
 from wevote_functions.functions import convert_to_int, extract_email_addresses_from_string, generate_random_string, \
     positive_value_exists
 from wevote_settings.models import fetch_next_we_vote_id_email_integer, fetch_site_unique_id_prefix
@@ -57,6 +62,21 @@ SEND_STATUS_CHOICES = (
     (SENT, 'Message sent'),
 )
 
+# EmailScheduled entries claimed, sent and marked as sent at a time by send_scheduled_email_list
+EMAIL_SEND_CHUNK_SIZE = convert_to_int(get_environment_variable_default("EMAIL_SEND_CHUNK_SIZE", 200))
+# Each worker opens one connection to the email backend, and sends its share of a chunk over it
+EMAIL_SEND_NUMBER_OF_WORKERS = convert_to_int(get_environment_variable_default("EMAIL_SEND_NUMBER_OF_WORKERS", 4))
+# Most emails sent per second, across all of the workers (0 for no limit)
+EMAIL_SEND_MAXIMUM_PER_SECOND = convert_to_int(get_environment_variable_default("EMAIL_SEND_MAXIMUM_PER_SECOND", 50))
+# send_scheduled_emails_to_be_processed only picks up TO_BE_PROCESSED entries changed in this many hours. Before
+#  send_status was kept up to date, emails sent right away were left as TO_BE_PROCESSED.
+EMAIL_SCHEDULED_RETRY_HOURS = convert_to_int(get_environment_variable_default("EMAIL_SCHEDULED_RETRY_HOURS", 24))
+# Entries left BEING_SENT for this many minutes (the sender died between claiming and marking them) are sent again
+EMAIL_BEING_SENT_TIMEOUT_MINUTES = \
+    convert_to_int(get_environment_variable_default("EMAIL_BEING_SENT_TIMEOUT_MINUTES", 30))
+
+scheduled_email_deferral = threading.local()
+
 
 class EmailAddress(models.Model):
     """
@@ -152,6 +172,11 @@ class EmailScheduled(models.Model):
         verbose_name="the internal id of EmailOutboundDescription", default=0, null=False)
     date_last_changed = models.DateTimeField(verbose_name='date last changed', null=True, auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['send_status', 'date_last_changed']),
+        ]
+
 
 class EmailManager(models.Manager):
 
@@ -874,7 +899,7 @@ class EmailManager(models.Manager):
         }
         return results
 
-    def send_scheduled_email(self, email_scheduled):
+    def check_scheduled_email_ready_to_send(self, email_scheduled):
         success = True
         status = ""
 
@@ -897,9 +922,7 @@ class EmailManager(models.Manager):
             status += "MISSING_EMAIL_MESSAGE "
             success = False
 
-        if success:
-            return self.send_scheduled_email_via_sendgrid(email_scheduled)
-        else:
+        if not success:
             status += "ERROR_DID_NOT_SEND: ["
             try:
                 status += 'subject:' + str(email_scheduled.subject) + ' '
@@ -907,14 +930,67 @@ class EmailManager(models.Manager):
             except Exception as e:
                 pass
             status += "] "
-            email_scheduled_sent = False
+
+        results = {
+            'success':  success,
+            'status':   status,
+        }
+        return results
+
+    def generate_email_message(self, email_scheduled):
+        if positive_value_exists(email_scheduled.sender_voter_name):
+            # TODO DALE Make system variable
+            system_sender_email_address = "{sender_voter_name} via We Vote <info@WeVote.US>" \
+                                          "".format(sender_voter_name=email_scheduled.sender_voter_name)
+        else:
+            system_sender_email_address = "We Vote <info@WeVote.US>"  # TODO DALE Make system variable
+
+        mail = EmailMultiAlternatives(
+            subject=email_scheduled.subject,
+            body=email_scheduled.message_text,
+            from_email=system_sender_email_address,
+            to=[email_scheduled.recipient_voter_email],
+            # headers={"Reply-To": email_scheduled.sender_voter_email}
+        )
+        # 2020-01-19 Dale commented out Reply-To header because with it, Gmail gives phishing warning
+        if positive_value_exists(email_scheduled.message_html):
+            mail.attach_alternative(email_scheduled.message_html, "text/html")
+        return mail
+
+    def send_scheduled_email(self, email_scheduled):
+        """
+        Send one scheduled email. Inside "with DeferScheduledEmailSending():" the email is only queued, and it is
+        sent with the others queued there by send_scheduled_email_list when the block exits.
+        :param email_scheduled:
+        :return:
+        """
+        ready_results = self.check_scheduled_email_ready_to_send(email_scheduled)
+        if not ready_results['success']:
             results = {
-                'success': success,
-                'status': status,
-                'email_scheduled_sent': email_scheduled_sent,
+                'success': ready_results['success'],
+                'status': ready_results['status'],
+                'email_scheduled_sent': False,
             }
             return results
 
+        if getattr(scheduled_email_deferral, 'email_scheduled_id_list', None) is not None \
+                and positive_value_exists(email_scheduled.id):
+            scheduled_email_deferral.email_scheduled_id_list.append(email_scheduled.id)
+            results = {
+                'success': True,
+                'status': "SCHEDULED_EMAIL_QUEUED_TO_SEND ",
+                'email_scheduled_sent': True,
+            }
+            return results
+
+        results = self.send_scheduled_email_via_sendgrid(email_scheduled)
+        if results['email_scheduled_sent'] and positive_value_exists(email_scheduled.id):
+            try:
+                EmailScheduled.objects.filter(id=email_scheduled.id).update(send_status=SENT, date_last_changed=now())
+            except Exception as e:
+                results['status'] += "ERROR_FAILED_TO_UPDATE_SEND_STATUS: " + str(e) + ' '
+        return results
+
     def send_scheduled_email_via_sendgrid(self, email_scheduled):
         """
         Send a single scheduled email
@@ -934,23 +1010,7 @@ class EmailManager(models.Manager):
             }
             return results
 
-        if positive_value_exists(email_scheduled.sender_voter_name):
-            # TODO DALE Make system variable
-            system_sender_email_address = "{sender_voter_name} via We Vote <info@WeVote.US>" \
-                                          "".format(sender_voter_name=email_scheduled.sender_voter_name)
-        else:
-            system_sender_email_address = "We Vote <info@WeVote.US>"  # TODO DALE Make system variable
-
-        mail = EmailMultiAlternatives(
-            subject=email_scheduled.subject,
-            body=email_scheduled.message_text,
-            from_email=system_sender_email_address,
-            to=[email_scheduled.recipient_voter_email],
-            # headers={"Reply-To": email_scheduled.sender_voter_email}
-        )
-        # 2020-01-19 Dale commented out Reply-To header because with it, Gmail gives phishing warning
-        if positive_value_exists(email_scheduled.message_html):
-            mail.attach_alternative(email_scheduled.message_html, "text/html")
+        mail = self.generate_email_message(email_scheduled)
 
         try:
             mail.send()
@@ -968,19 +1028,164 @@ class EmailManager(models.Manager):
         }
         return results
 
-    def send_scheduled_email_list(self, messages_to_send):
+    def send_scheduled_email_list(self, messages_to_send, number_of_workers=EMAIL_SEND_NUMBER_OF_WORKERS,
+                                  maximum_per_second=EMAIL_SEND_MAXIMUM_PER_SECOND):
         """
-        Take in a list of scheduled_email_id's, and send them
+        Take in a list of scheduled_email_id's, and send the ones which are still TO_BE_PROCESSED. In each chunk the
+        entries are claimed by marking them BEING_SENT, the emails are sent by number_of_workers threads which each
+        reuse one backend connection, and then the send_status of the whole chunk is updated with two UPDATEs.
+        Emails which could not be sent go back to TO_BE_PROCESSED, so send_scheduled_emails_to_be_processed
+        retries them.
         :param messages_to_send:
+        :param number_of_workers:
+        :param maximum_per_second:
         :return:
         """
-        success = False
+        success = True
         status = ""
+        emails_sent = 0
+        emails_not_sent = 0
+        rate_limiter = EmailSendRateLimiter(maximum_per_second)
+        number_of_workers = max(1, convert_to_int(number_of_workers))
+
+        messages_to_send = list(messages_to_send)
+        for start in range(0, len(messages_to_send), EMAIL_SEND_CHUNK_SIZE):
+            email_scheduled_id_chunk = messages_to_send[start:start + EMAIL_SEND_CHUNK_SIZE]
+            try:
+                with transaction.atomic():
+                    # skip_locked, so two senders never claim the same entry
+                    claim_query = EmailScheduled.objects.select_for_update(skip_locked=True).filter(
+                        id__in=email_scheduled_id_chunk, send_status=TO_BE_PROCESSED)
+                    claimed_id_list = list(claim_query.values_list('id', flat=True))
+                    EmailScheduled.objects.filter(id__in=claimed_id_list).update(
+                        send_status=BEING_SENT, date_last_changed=now())
+                email_scheduled_list = list(EmailScheduled.objects.filter(id__in=claimed_id_list))
+            except Exception as e:
+                status += "COULD_NOT_CLAIM_SCHEDULED_EMAILS: " + str(e) + " "
+                success = False
+                continue
+
+            email_message_list = []
+            not_sent_id_list = []
+            for email_scheduled in email_scheduled_list:
+                ready_results = self.check_scheduled_email_ready_to_send(email_scheduled)
+                if ready_results['success']:
+                    email_message_list.append((email_scheduled.id, self.generate_email_message(email_scheduled)))
+                else:
+                    status += ready_results['status']
+                    not_sent_id_list.append(email_scheduled.id)
+
+            sent_id_list = []
+            if len(email_message_list):
+                worker_message_lists = [email_message_list[worker_number::number_of_workers]
+                                        for worker_number in range(min(number_of_workers, len(email_message_list)))]
+                with ThreadPoolExecutor(max_workers=len(worker_message_lists)) as executor:
+                    for send_results in executor.map(
+                            send_email_message_list, worker_message_lists,
+                            [rate_limiter] * len(worker_message_lists)):
+                        status += send_results['status']
+                        sent_id_list += send_results['sent_id_list']
+                        not_sent_id_list += send_results['not_sent_id_list']
 
+            try:
+                if len(sent_id_list):
+                    EmailScheduled.objects.filter(id__in=sent_id_list).update(
+                        send_status=SENT, date_last_changed=now())
+                if len(not_sent_id_list):
+                    EmailScheduled.objects.filter(id__in=not_sent_id_list).update(
+                        send_status=TO_BE_PROCESSED, date_last_changed=now())
+            except Exception as e:
+                status += "ERROR_FAILED_TO_UPDATE_SEND_STATUS: " + str(e) + ' '
+                success = False
+            emails_sent += len(sent_id_list)
+            emails_not_sent += len(not_sent_id_list)
+
+        status += "SCHEDULED_EMAIL_LIST_SENT: " + str(emails_sent) + ", NOT_SENT: " + str(emails_not_sent) + " "
         results = {
             'success':                  success,
             'status':                   status,
-            'at_least_one_email_found': True,
+            'at_least_one_email_found': positive_value_exists(emails_sent + emails_not_sent),
+            'emails_sent':              emails_sent,
+            'emails_not_sent':          emails_not_sent,
+        }
+        return results
+
+    def reclaim_scheduled_emails_being_sent(self, timeout_minutes=EMAIL_BEING_SENT_TIMEOUT_MINUTES):
+        """
+        Put EmailScheduled entries which have been BEING_SENT for more than timeout_minutes back to TO_BE_PROCESSED.
+        send_scheduled_email_list always moves the entries it claims on to SENT or TO_BE_PROCESSED, so these were
+        claimed by a sender which stopped before it could.
+        :param timeout_minutes:
+        :return:
+        """
+        status = ""
+        success = True
+        emails_reclaimed = 0
+        try:
+            emails_reclaimed = EmailScheduled.objects.filter(
+                send_status=BEING_SENT,
+                date_last_changed__lt=now() - timedelta(minutes=timeout_minutes),
+            ).update(send_status=TO_BE_PROCESSED, date_last_changed=now())
+            if positive_value_exists(emails_reclaimed):
+                status += "SCHEDULED_EMAILS_BEING_SENT_RECLAIMED: " + str(emails_reclaimed) + " "
+        except Exception as e:
+            status += "COULD_NOT_RECLAIM_SCHEDULED_EMAILS_BEING_SENT: " + str(e) + " "
+            success = False
+
+        results = {
+            'success':          success,
+            'status':           status,
+            'emails_reclaimed': emails_reclaimed,
+        }
+        return results
+
+    def send_scheduled_emails_to_be_processed(self, retry_hours=EMAIL_SCHEDULED_RETRY_HOURS, maximum_emails=0):
+        """
+        Send the TO_BE_PROCESSED EmailScheduled entries changed in the last retry_hours, oldest first. Entries stuck
+        in BEING_SENT are first put back to TO_BE_PROCESSED (reclaim_scheduled_emails_being_sent).
+        :param retry_hours:
+        :param maximum_emails: Stop after this many (0 for no limit)
+        :return:
+        """
+        success = True
+        status = ""
+        emails_sent = 0
+        emails_not_sent = 0
+        last_email_scheduled_id = 0
+        reclaim_results = self.reclaim_scheduled_emails_being_sent()
+        status += reclaim_results['status']
+        success = reclaim_results['success']
+        retry_since = now() - timedelta(hours=retry_hours)
+        while not positive_value_exists(maximum_emails) or emails_sent + emails_not_sent < maximum_emails:
+            number_to_retrieve = EMAIL_SEND_CHUNK_SIZE * EMAIL_SEND_NUMBER_OF_WORKERS
+            if positive_value_exists(maximum_emails):
+                number_to_retrieve = min(number_to_retrieve, maximum_emails - emails_sent - emails_not_sent)
+            try:
+                # Walking forward by id means emails which fail are only tried once in each run
+                email_scheduled_query = EmailScheduled.objects.filter(
+                    send_status=TO_BE_PROCESSED,
+                    date_last_changed__gte=retry_since,
+                    id__gt=last_email_scheduled_id)
+                email_scheduled_id_list = \
+                    list(email_scheduled_query.order_by('id').values_list('id', flat=True)[:number_to_retrieve])
+            except Exception as e:
+                status += "COULD_NOT_RETRIEVE_SCHEDULED_EMAILS_TO_BE_PROCESSED: " + str(e) + " "
+                success = False
+                break
+            if not len(email_scheduled_id_list):
+                break
+            last_email_scheduled_id = email_scheduled_id_list[-1]
+            send_results = self.send_scheduled_email_list(email_scheduled_id_list)
+            status += send_results['status']
+            success = success and send_results['success']
+            emails_sent += send_results['emails_sent']
+            emails_not_sent += send_results['emails_not_sent']
+
+        results = {
+            'success':          success,
+            'status':           status,
+            'emails_sent':      emails_sent,
+            'emails_not_sent':  emails_not_sent,
         }
         return results
 
@@ -992,7 +1197,6 @@ class EmailManager(models.Manager):
         :return:
         """
         at_least_one_email_found = False
-        save_scheduled_email = False
         send_status = WAITING_FOR_VERIFICATION
         success = True
         status = ""
@@ -1000,7 +1204,7 @@ class EmailManager(models.Manager):
             sender_we_vote_id, send_status)
         status += scheduled_email_results['status']
         if scheduled_email_results['scheduled_email_list_found']:
-            scheduled_email_list = scheduled_email_results['scheduled_email_list']
+            scheduled_email_list = list(scheduled_email_results['scheduled_email_list'])
             for scheduled_email in scheduled_email_list:
                 at_least_one_email_found = True
                 if positive_value_exists(sender_name):
@@ -1008,37 +1212,31 @@ class EmailManager(models.Manager):
                     # if there is a variable that hasn't been filled in yet.
                     try:
                         if scheduled_email.message_text:
-                            save_scheduled_email = True
                             scheduled_email.message_text = \
                                 scheduled_email.message_text.replace('Your   friend', sender_name)
                     except Exception as e:
                         status += "COULD_NOT_REPLACE_NAME_IN_MESSAGE_TEXT: " + str(e) + " "
                     try:
                         if scheduled_email.message_html:
-                            save_scheduled_email = True
                             scheduled_email.message_html = \
                                 scheduled_email.message_html.replace('Your   friend', sender_name)
                     except Exception as e:
                         status += "COULD_NOT_REPLACE_NAME_IN_HTML: " + str(e) + " "
-                    if save_scheduled_email:
-                        try:
-                            scheduled_email.save()
-                            status += "SCHEDULED_EMAIL_SAVED "
-                        except Exception as e:
-                            status += "ERROR_COULD_NOT_SAVE_SCHEDULED_EMAIL: " + str(e) + " "
-                            print(status)
-                send_results = self.send_scheduled_email(scheduled_email)
-                email_scheduled_sent = send_results['email_scheduled_sent']
+                # Move them from WAITING_FOR_VERIFICATION to the send queue
+                scheduled_email.send_status = TO_BE_PROCESSED
+            try:
+                EmailScheduled.objects.bulk_update(
+                    scheduled_email_list, ['message_text', 'message_html', 'send_status'],
+                    batch_size=EMAIL_SEND_CHUNK_SIZE)
+                status += "SCHEDULED_EMAILS_SAVED "
+            except Exception as e:
+                status += "ERROR_COULD_NOT_SAVE_SCHEDULED_EMAILS: " + str(e) + " "
+                print(status)
+                success = False
+            if success:
+                send_results = self.send_scheduled_email_list(
+                    [scheduled_email.id for scheduled_email in scheduled_email_list])
                 status += send_results['status']
-                if email_scheduled_sent:
-                    # If scheduled email sent successfully change their status from WAITING_FOR_VERIFICATION to SENT
-                    send_status = SENT
-                    try:
-                        scheduled_email.send_status = send_status
-                        scheduled_email.save()
-                    except Exception as e:
-                        status += "ERROR_FAILED_TO_UPDATE_SEND_STATUS: " + str(e) + ' '
-                        print(status)
         results = {
             'success':                  success,
             'status':                   status,
@@ -1087,6 +1285,108 @@ class EmailManager(models.Manager):
             return email_address_object
 
 
+class DeferScheduledEmailSending(object):
+    """
+    Code which schedules many emails runs inside "with DeferScheduledEmailSending():" so that
+    EmailManager.send_scheduled_email only queues each one, and they are all sent by send_scheduled_email_list,
+    over a few reused connections, when the outermost block exits.
+    """
+    def __init__(self):
+        self.outermost = False
+
+    def __enter__(self):
+        if getattr(scheduled_email_deferral, 'email_scheduled_id_list', None) is None:
+            scheduled_email_deferral.email_scheduled_id_list = []
+            self.outermost = True
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.outermost:
+            return False
+        email_scheduled_id_list = scheduled_email_deferral.email_scheduled_id_list
+        scheduled_email_deferral.email_scheduled_id_list = None
+        if len(email_scheduled_id_list):
+            # Anything not sent stays TO_BE_PROCESSED for send_scheduled_emails_to_be_processed
+            email_manager = EmailManager()
+            email_manager.send_scheduled_email_list(email_scheduled_id_list)
+        return False
+
+
+class EmailSendRateLimiter(object):
+    """
+    Spaces out sends across all of the worker threads, so no more than maximum_per_second go out
+    """
+    def __init__(self, maximum_per_second=EMAIL_SEND_MAXIMUM_PER_SECOND):
+        self.maximum_per_second = maximum_per_second
+        self.next_send_time = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not positive_value_exists(self.maximum_per_second):
+            return
+        with self.lock:
+            time_now = time.monotonic()
+            send_time = max(time_now, self.next_send_time)
+            self.next_send_time = send_time + 1.0 / self.maximum_per_second
+        if send_time > time_now:
+            time.sleep(send_time - time_now)
+
+
+def send_email_message_list(email_message_list, rate_limiter):
+    """
+    Send each message over one connection to the email backend. Runs in a worker thread, so it doesn't touch the
+    database.
+    :param email_message_list: list of (email_scheduled_id, EmailMultiAlternatives)
+    :param rate_limiter:
+    :return:
+    """
+    status = ""
+    sent_id_list = []
+    not_sent_id_list = []
+    connection = None
+    try:
+        connection = get_connection()
+        connection.open()
+    except Exception as e:
+        status += "ERROR_COULD_NOT_OPEN_EMAIL_CONNECTION: " + str(e) + " "
+        connection = None
+
+    for email_scheduled_id, email_message in email_message_list:
+        if connection is None:
+            not_sent_id_list.append(email_scheduled_id)
+            continue
+        rate_limiter.wait()
+        try:
+            # One message per call, so one bad address doesn't hide which of the others went out
+            if connection.send_messages([email_message]):
+                sent_id_list.append(email_scheduled_id)
+            else:
+                not_sent_id_list.append(email_scheduled_id)
+        except Exception as e:
+            status += "ERROR_COULD_NOT_SEND_VIA_SENDGRID: " + str(e) + ' '
+            not_sent_id_list.append(email_scheduled_id)
+            # The connection may have dropped, so start a new one for the rest
+            try:
+                connection.close()
+                connection.open()
+            except Exception as e:
+                status += "ERROR_COULD_NOT_REOPEN_EMAIL_CONNECTION: " + str(e) + " "
+                connection = None
+
+    if connection is not None:
+        try:
+            connection.close()
+        except Exception as e:
+            pass
+
+    results = {
+        'status':           status,
+        'sent_id_list':     sent_id_list,
+        'not_sent_id_list': not_sent_id_list,
+    }
+    return results
+
+
 def update_friend_invitation_email_link_with_new_email(deleted_email_we_vote_id, updated_email_we_vote_id):
     success = True
     status = ""
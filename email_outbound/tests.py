@@ -0,0 +1,62 @@
+# email_outbound/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from datetime import timedelta
+from django.core import mail
+from django.test import TestCase
+from django.utils.timezone import now
+from wevote_functions.functions import positive_value_exists
+from .models import EmailManager, EmailScheduled, BEING_SENT, SENT, TO_BE_PROCESSED
+
+
+class EmailScheduledSendTestCase(TestCase):
+
+    def setUp(self):
+        self.email_manager = EmailManager()
+
+    def create_email_scheduled(self, send_status=TO_BE_PROCESSED, recipient_voter_email='voter@example.com',
+                               minutes_since_last_changed=0):
+        email_scheduled = EmailScheduled.objects.create(
+            subject='Your friend has a new position',
+            message_text='Take a look',
+            recipient_voter_email=recipient_voter_email,
+            send_status=send_status)
+        if positive_value_exists(minutes_since_last_changed):
+            # date_last_changed is auto_now, so it can only be backdated with update()
+            EmailScheduled.objects.filter(id=email_scheduled.id).update(
+                date_last_changed=now() - timedelta(minutes=minutes_since_last_changed))
+        return email_scheduled
+
+    def test_claimed_email_is_only_sent_once(self):
+        email_scheduled = self.create_email_scheduled()
+        results = self.email_manager.send_scheduled_email_list([email_scheduled.id])
+        self.assertEqual(results['emails_sent'], 1)
+        results = self.email_manager.send_scheduled_email_list([email_scheduled.id])
+        self.assertEqual(results['emails_sent'], 0)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(EmailScheduled.objects.get(id=email_scheduled.id).send_status, SENT)
+
+    def test_email_claimed_by_another_sender_is_skipped(self):
+        email_scheduled = self.create_email_scheduled(send_status=BEING_SENT)
+        results = self.email_manager.send_scheduled_email_list([email_scheduled.id])
+        self.assertEqual(results['emails_sent'] + results['emails_not_sent'], 0)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EmailScheduled.objects.get(id=email_scheduled.id).send_status, BEING_SENT)
+
+    def test_email_not_sent_goes_back_to_be_processed(self):
+        email_scheduled = self.create_email_scheduled(recipient_voter_email='')
+        results = self.email_manager.send_scheduled_email_list([email_scheduled.id])
+        self.assertEqual(results['emails_not_sent'], 1)
+        self.assertIn('MISSING_EMAIL_SCHEDULED_RECIPIENT_VOTER_EMAIL', results['status'])
+        self.assertEqual(EmailScheduled.objects.get(id=email_scheduled.id).send_status, TO_BE_PROCESSED)
+
+    def test_stuck_being_sent_email_is_retried(self):
+        stuck_email_scheduled = self.create_email_scheduled(send_status=BEING_SENT, minutes_since_last_changed=120)
+        in_progress_email_scheduled = self.create_email_scheduled(send_status=BEING_SENT)
+        results = self.email_manager.send_scheduled_emails_to_be_processed()
+        self.assertIn('SCHEDULED_EMAILS_BEING_SENT_RECLAIMED: 1', results['status'])
+        self.assertEqual(results['emails_sent'], 1)
+        self.assertEqual(EmailScheduled.objects.get(id=stuck_email_scheduled.id).send_status, SENT)
+        # Still within EMAIL_BEING_SENT_TIMEOUT_MINUTES, so its sender may still be working on it
+        self.assertEqual(EmailScheduled.objects.get(id=in_progress_email_scheduled.id).send_status, BEING_SENT)
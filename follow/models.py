@@ -4,14 +4,19 @@
 
 from datetime import datetime, timedelta
 from django.db import models
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from election.models import ElectionManager
 from exception.models import handle_exception, handle_record_found_more_than_one_exception,\
     handle_record_not_found_exception, handle_record_not_saved_exception, print_to_log
 from issue.models import IssueManager
 from organization.models import OrganizationManager
 import pytz
+import threading
+import time
 import wevote_functions.admin
-from wevote_functions.functions import positive_value_exists
+from wevote_functions.functions import convert_to_int, positive_value_exists
 from voter.models import VoterManager
 
 
@@ -40,6 +45,11 @@ FOLLOW_SUGGESTIONS_FROM_TWITTER_IDS_I_FOLLOW = 'FOLLOW_SUGGESTIONS_FROM_TWITTER_
 FOLLOW_SUGGESTIONS_FROM_FRIENDS = 'FOLLOW_SUGGESTIONS_FROM_FRIENDS'
 FOLLOW_SUGGESTIONS_FROM_FRIENDS_ON_TWITTER = 'FOLLOW_SUGGESTIONS_FROM_FRIENDS_ON_TWITTER'
 
+# How long a voter's followed organizations are trusted before checking FollowOrganization for changes made by
+#  other processes. Changes made in this process are seen right away (see invalidate_voter_followed_organizations)
+VOTER_FOLLOWED_ORGANIZATIONS_REVALIDATE_SECONDS = 5
+VOTER_FOLLOWED_ORGANIZATIONS_MAXIMUM_VOTERS = 10000
+
 logger = wevote_functions.admin.get_logger(__name__)
 
 
@@ -1352,6 +1362,25 @@ class FollowOrganizationList(models.Model):
                     follow_organization_list_simple_array.append(follow_organization.organization_id)
         return follow_organization_list_simple_array
 
+    def retrieve_follow_organization_by_voter_id_simple_id_set(self, voter_id, return_we_vote_id=False):
+        """
+        Like retrieve_follow_organization_by_voter_id_simple_id_array, but read from voter_followed_organizations_index,
+        for callers that only test membership. Does not heal voter_linked_organization_we_vote_id.
+        :param voter_id:
+        :param return_we_vote_id:
+        :return: frozenset
+        """
+        if not positive_value_exists(voter_id):
+            return frozenset()
+        try:
+            index = voter_followed_organizations_index.retrieve_index(voter_id)
+        except Exception as e:
+            handle_record_not_found_exception(e, logger=logger)
+            return frozenset()
+        if return_we_vote_id:
+            return index['organization_we_vote_id_set']
+        return index['organization_id_set']
+
     def retrieve_followed_organization_by_organization_we_vote_id_simple_id_array(
             self, organization_we_vote_id, return_we_vote_id=False,
             auto_followed_from_twitter_suggestion=False):
@@ -1473,6 +1502,83 @@ class FollowOrganizationList(models.Model):
             return follow_organization_list
 
 
+class VoterFollowedOrganizationsIndex(object):
+    """
+    Per-voter frozensets of the organization ids and organization we_vote_ids the voter follows. Lets the position
+    lists for a ballot be split into "followed" and "not followed" with set lookups, without re-reading
+    FollowOrganization on every API call that renders part of the ballot.
+    """
+    def __init__(self, revalidate_seconds=VOTER_FOLLOWED_ORGANIZATIONS_REVALIDATE_SECONDS,
+                 maximum_voters=VOTER_FOLLOWED_ORGANIZATIONS_MAXIMUM_VOTERS):
+        self.revalidate_seconds = revalidate_seconds
+        self.maximum_voters = maximum_voters
+        self.lock = threading.Lock()
+        self.index_by_voter_id = {}
+
+    def invalidate(self, voter_id=None):
+        with self.lock:
+            if voter_id is None:
+                self.index_by_voter_id = {}
+            else:
+                self.index_by_voter_id.pop(convert_to_int(voter_id), None)
+
+    @staticmethod
+    def fetch_fingerprint(voter_id):
+        # Changes when any of this voter's FollowOrganization entries are added, changed or deleted
+        follow_organization_query = FollowOrganization.objects.using('readonly').filter(voter_id=voter_id)
+        aggregate = follow_organization_query.aggregate(count=Count('id'), latest=Max('date_last_changed'))
+        return aggregate['count'], aggregate['latest']
+
+    @staticmethod
+    def retrieve_followed_organizations(voter_id):
+        follow_organization_query = FollowOrganization.objects.using('readonly').filter(
+            voter_id=voter_id, following_status=FOLLOWING)
+        organization_id_set = set()
+        organization_we_vote_id_set = set()
+        for organization_id, organization_we_vote_id in \
+                follow_organization_query.values_list('organization_id', 'organization_we_vote_id'):
+            organization_id_set.add(organization_id)
+            organization_we_vote_id_set.add(organization_we_vote_id)
+        return frozenset(organization_id_set), frozenset(organization_we_vote_id_set)
+
+    def retrieve_index(self, voter_id):
+        """
+        :param voter_id:
+        :return: dict with 'organization_id_set' and 'organization_we_vote_id_set' (both frozensets)
+        """
+        voter_id = convert_to_int(voter_id)
+        with self.lock:
+            cached = self.index_by_voter_id.get(voter_id)
+        if cached is not None:
+            if time.monotonic() - cached['date_validated'] < self.revalidate_seconds:
+                return cached
+            fingerprint = self.fetch_fingerprint(voter_id)
+            if fingerprint == cached['fingerprint']:
+                cached['date_validated'] = time.monotonic()
+                return cached
+        else:
+            fingerprint = self.fetch_fingerprint(voter_id)
+
+        organization_id_set, organization_we_vote_id_set = self.retrieve_followed_organizations(voter_id)
+        index = {
+            'organization_id_set':          organization_id_set,
+            'organization_we_vote_id_set':  organization_we_vote_id_set,
+            'fingerprint':                  fingerprint,
+            'date_validated':               time.monotonic(),
+        }
+        with self.lock:
+            if len(self.index_by_voter_id) >= self.maximum_voters and voter_id not in self.index_by_voter_id:
+                # Drop the entry validated longest ago
+                oldest_voter_id = min(self.index_by_voter_id,
+                                      key=lambda one_voter_id: self.index_by_voter_id[one_voter_id]['date_validated'])
+                self.index_by_voter_id.pop(oldest_voter_id, None)
+            self.index_by_voter_id[voter_id] = index
+        return index
+
+
+voter_followed_organizations_index = VoterFollowedOrganizationsIndex()
+
+
 class SuggestedIssueToFollow(models.Model):
     """
     This table stores possible suggested issues to follow
@@ -1513,3 +1619,11 @@ class SuggestedOrganizationToFollow(models.Model):
         else:
             # If the we_vote_id passed in wasn't found, don't return another we_vote_id
             return ""
+
+
+@receiver(post_save, sender=FollowOrganization)
+@receiver(post_delete, sender=FollowOrganization)
+def invalidate_voter_followed_organizations_signal(sender, instance, **kwargs):
+    # Follow, stop following or ignore: rebuild this voter's index on next use in this process
+    if positive_value_exists(instance.voter_id):
+        voter_followed_organizations_index.invalidate(instance.voter_id)
@@ -8,8 +8,9 @@ from .models import ACCEPTED, FriendInvitationVoterLink, FriendManager, CURRENT_
     UNFRIEND_CURRENT_FRIEND
 from config.base import get_environment_variable
 from email_outbound.controllers import schedule_email_with_email_outbound_description, schedule_verification_email
-from email_outbound.models import EmailAddress, EmailManager, FRIEND_ACCEPTED_INVITATION_TEMPLATE, \
-    FRIEND_INVITATION_TEMPLATE, MESSAGE_TO_FRIEND_TEMPLATE, TO_BE_PROCESSED, WAITING_FOR_VERIFICATION
+from email_outbound.models import DeferScheduledEmailSending, EmailAddress, EmailManager, \
+    FRIEND_ACCEPTED_INVITATION_TEMPLATE, FRIEND_INVITATION_TEMPLATE, MESSAGE_TO_FRIEND_TEMPLATE, TO_BE_PROCESSED, \
+    WAITING_FOR_VERIFICATION
 from follow.models import FollowIssueList
 from import_export_facebook.models import FacebookManager
 import json
@@ -494,46 +495,22 @@ def friend_invitation_by_email_send_for_api(voter_device_id,  # friendInvitation
     if not isinstance(last_name_array, (list, tuple)):
         last_name_array = []
 
-    if email_address_array:
-        # Reconstruct dictionary array from lists
-        for n in range(len(email_address_array)):
-            first_name = first_name_array[n]
-            last_name = last_name_array[n]
-            one_normalized_raw_email = email_address_array[n]
-
-            # Make sure the current voter isn't already friends with owner of this email address
-            is_friend_results = retrieve_current_friend_by_email(
-                viewing_voter=sender_voter, one_normalized_raw_email=one_normalized_raw_email)
-            if is_friend_results['current_friend_found']:
-                # Do not send an invitation
-                status += is_friend_results['status']
-                status += "ALREADY_FRIENDS_WITH_SENDER_VOTER_EMAIL_ADDRESS_ARRAY "
-                error_message_to_show_voter += "You are already friends with the owner of " \
-                                               "'{one_normalized_raw_email}'. " \
-                                               "".format(one_normalized_raw_email=one_normalized_raw_email)
-                continue
-
-            send_results = send_to_one_friend(voter_device_id, sender_voter, send_now,
-                                              sender_email_with_ownership_verified,
-                                              one_normalized_raw_email, first_name, last_name, invitation_message,
-                                              web_app_root_url)
-            status += send_results['status']
+    # Invitations are queued as they are scheduled, and sent together over reused connections after the loop
+    with DeferScheduledEmailSending():
+        if email_address_array:
+            # Reconstruct dictionary array from lists
+            for n in range(len(email_address_array)):
+                first_name = first_name_array[n]
+                last_name = last_name_array[n]
+                one_normalized_raw_email = email_address_array[n]
 
-    else:
-        # Break apart all the emails in email_addresses_raw input from the voter
-        results = email_manager.parse_raw_emails_into_list(email_addresses_raw)
-        if results['at_least_one_email_found']:
-            raw_email_list_to_invite = results['email_list']
-            first_name = ""
-            last_name = ""
-            for one_normalized_raw_email in raw_email_list_to_invite:
                 # Make sure the current voter isn't already friends with owner of this email address
                 is_friend_results = retrieve_current_friend_by_email(
                     viewing_voter=sender_voter, one_normalized_raw_email=one_normalized_raw_email)
                 if is_friend_results['current_friend_found']:
                     # Do not send an invitation
                     status += is_friend_results['status']
-                    status += "ALREADY_FRIENDS_WITH_SENDER_VOTER_RAW_EMAILS "
+                    status += "ALREADY_FRIENDS_WITH_SENDER_VOTER_EMAIL_ADDRESS_ARRAY "
                     error_message_to_show_voter += "You are already friends with the owner of " \
                                                    "'{one_normalized_raw_email}'. " \
                                                    "".format(one_normalized_raw_email=one_normalized_raw_email)
@@ -544,17 +521,43 @@ def friend_invitation_by_email_send_for_api(voter_device_id,  # friendInvitation
                                                   one_normalized_raw_email, first_name, last_name, invitation_message,
                                                   web_app_root_url)
                 status += send_results['status']
+
         else:
-            error_message_to_show_voter = "Please enter the email address of at least one friend."
-            status += "LIST_OF_EMAILS_NOT_RECEIVED " + results['status']
-            error_results = {
-                'status':                               status,
-                'success':                              False,
-                'voter_device_id':                      voter_device_id,
-                'sender_voter_email_address_missing':   sender_voter_email_address_missing,
-                'error_message_to_show_voter':          error_message_to_show_voter
-            }
-            return error_results
+            # Break apart all the emails in email_addresses_raw input from the voter
+            results = email_manager.parse_raw_emails_into_list(email_addresses_raw)
+            if results['at_least_one_email_found']:
+                raw_email_list_to_invite = results['email_list']
+                first_name = ""
+                last_name = ""
+                for one_normalized_raw_email in raw_email_list_to_invite:
+                    # Make sure the current voter isn't already friends with owner of this email address
+                    is_friend_results = retrieve_current_friend_by_email(
+                        viewing_voter=sender_voter, one_normalized_raw_email=one_normalized_raw_email)
+                    if is_friend_results['current_friend_found']:
+                        # Do not send an invitation
+                        status += is_friend_results['status']
+                        status += "ALREADY_FRIENDS_WITH_SENDER_VOTER_RAW_EMAILS "
+                        error_message_to_show_voter += "You are already friends with the owner of " \
+                                                       "'{one_normalized_raw_email}'. " \
+                                                       "".format(one_normalized_raw_email=one_normalized_raw_email)
+                        continue
+
+                    send_results = send_to_one_friend(voter_device_id, sender_voter, send_now,
+                                                      sender_email_with_ownership_verified,
+                                                      one_normalized_raw_email, first_name, last_name,
+                                                      invitation_message, web_app_root_url)
+                    status += send_results['status']
+            else:
+                error_message_to_show_voter = "Please enter the email address of at least one friend."
+                status += "LIST_OF_EMAILS_NOT_RECEIVED " + results['status']
+                error_results = {
+                    'status':                               status,
+                    'success':                              False,
+                    'voter_device_id':                      voter_device_id,
+                    'sender_voter_email_address_missing':   sender_voter_email_address_missing,
+                    'error_message_to_show_voter':          error_message_to_show_voter
+                }
+                return error_results
 
     # Now send any "WAITING_FOR_VERIFICATION" emails if the voter has since verified themselves
     # Are there any waiting?
@@ -1991,6 +1994,8 @@ def get_current_friends_list(status, voter):
     status += retrieve_current_friends_as_voters_results['status']
     if retrieve_current_friends_as_voters_results['friend_list_found']:
         current_friend_list = retrieve_current_friends_as_voters_results['friend_list']
+        mutual_friends_count_dict = friend_manager.fetch_mutual_friends_count_dict(
+            voter.we_vote_id, [friend_voter.we_vote_id for friend_voter in current_friend_list])
         for friend_voter in current_friend_list:
             # if not positive_value_exists(friend_voter.linked_organization_we_vote_id):
             #     # We need to retrieve another voter object that can be saved
@@ -2017,7 +2022,7 @@ def get_current_friends_list(status, voter):
             #             status += "VOTER_COULD_NOT_BE_HEALED " + heal_results['status']
             #     else:
             #         status += "COULD_NOT_RETRIEVE_VOTER_THAT_CAN_BE_SAVED " + voter_results['status']
-            mutual_friends = friend_manager.fetch_mutual_friends_count(voter.we_vote_id, friend_voter.we_vote_id)
+            mutual_friends = mutual_friends_count_dict.get(friend_voter.we_vote_id, 0)
             # positions_taken = position_metrics_manager.fetch_positions_count_for_this_voter(friend_voter)
             one_friend = {
                 "voter_we_vote_id":                 friend_voter.we_vote_id,
@@ -2055,6 +2060,9 @@ def get_friend_invitations_processed(status, voter):
     status += retrieve_invitations_processed_results['status']
     if retrieve_invitations_processed_results['friend_list_found']:
         raw_friend_list = retrieve_invitations_processed_results['friend_list']
+        mutual_friends_count_dict = friend_manager.fetch_mutual_friends_count_dict(
+            voter.we_vote_id,
+            [one_friend_invitation.sender_voter_we_vote_id for one_friend_invitation in raw_friend_list])
         for one_friend_invitation in raw_friend_list:
             # Augment the line with voter information
             friend_voter_results = voter_manager.retrieve_voter_by_we_vote_id(
@@ -2064,8 +2072,7 @@ def get_friend_invitations_processed(status, voter):
                 recipient_voter_email = one_friend_invitation.recipient_voter_email \
                     if hasattr(one_friend_invitation, "recipient_voter_email") \
                     else ""
-                mutual_friends = friend_manager.fetch_mutual_friends_count(
-                    voter.we_vote_id, friend_voter.we_vote_id)
+                mutual_friends = mutual_friends_count_dict.get(friend_voter.we_vote_id, 0)
                 # Removed for now for speed
                 # positions_taken = position_metrics_manager.fetch_positions_count_for_this_voter(friend_voter)
                 one_friend = {
@@ -2125,10 +2132,11 @@ def get_friend_invitations_sent_to_me(status, voter, read_only=True):
             read_only=read_only)
         if results['voter_list_found']:
             sent_to_me_friend_list = results['voter_list']
+            mutual_friends_count_dict = friend_manager.fetch_mutual_friends_count_dict(
+                voter.we_vote_id, [friend_voter.we_vote_id for friend_voter in sent_to_me_friend_list])
             # Augment the line with voter information
             for friend_voter in sent_to_me_friend_list:  # This is the voter who sent the invitation to me
-                mutual_friends = friend_manager.fetch_mutual_friends_count(
-                    voter.we_vote_id, friend_voter.we_vote_id)
+                mutual_friends = mutual_friends_count_dict.get(friend_voter.we_vote_id, 0)
                 # Removed for now for speed
                 # positions_taken = position_metrics_manager.fetch_positions_count_for_this_voter(friend_voter)
                 one_friend = {
@@ -2235,11 +2243,12 @@ def get_friend_invitations_sent_by_me(status, voter, read_only=True):
             read_only=read_only)
         if results['voter_list_found']:
             sent_by_me_friend_list = results['voter_list']
+            mutual_friends_count_dict = friend_manager.fetch_mutual_friends_count_dict(
+                voter.we_vote_id, [friend_voter.we_vote_id for friend_voter in sent_by_me_friend_list])
             for friend_voter in sent_by_me_friend_list:
                 # Removed for now for speed
                 # positions_taken = position_metrics_manager.fetch_positions_count_for_this_voter(friend_voter)
-                mutual_friends = friend_manager.fetch_mutual_friends_count(
-                    voter.we_vote_id, friend_voter.we_vote_id)
+                mutual_friends = mutual_friends_count_dict.get(friend_voter.we_vote_id, 0)
                 one_friend = {
                     "voter_we_vote_id":                 friend_voter.we_vote_id,
                     "voter_date_last_changed":          friend_voter.date_last_changed.strftime('%Y-%m-%d %H:%M:%S'),
@@ -2299,6 +2308,8 @@ def get_suggested_friends_list(status, voter):
     status += retrieve_suggested_friend_list_as_voters_results['status']
     if retrieve_suggested_friend_list_as_voters_results['friend_list_found']:
         suggested_friend_list = retrieve_suggested_friend_list_as_voters_results['friend_list']
+        mutual_friends_count_dict = friend_manager.fetch_mutual_friends_count_dict(
+            voter.we_vote_id, [suggested_friend.we_vote_id for suggested_friend in suggested_friend_list])
         for suggested_friend in suggested_friend_list:
             if not positive_value_exists(suggested_friend.linked_organization_we_vote_id):
                 # We need to retrieve another voter object that can be saved
@@ -2317,8 +2328,7 @@ def get_suggested_friends_list(status, voter):
                         status += "SUGGESTED_FRIEND_VOTER_COULD_NOT_BE_HEALED " + heal_results['status']
                 else:
                     status += "SUGGESTED-COULD_NOT_RETRIEVE_VOTER_THAT_CAN_BE_SAVED " + voter_results['status']
-            mutual_friends = \
-                friend_manager.fetch_mutual_friends_count(voter.we_vote_id, suggested_friend.we_vote_id)
+            mutual_friends = mutual_friends_count_dict.get(suggested_friend.we_vote_id, 0)
             # Removed for now for speed
             # positions_taken = position_metrics_manager.fetch_positions_count_for_this_voter(suggested_friend)
             one_friend = {
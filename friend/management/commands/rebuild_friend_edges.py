@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from friend.models import rebuild_all_friend_edges
+
+
+class Command(BaseCommand):
+    help = 'Creates FriendEdge entries for every CurrentFriend and SuggestedFriend. ' \
+           'Run once after FriendEdge is added, so the friend lookups start reading from it.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk_size', type=int, default=1000,
+                            help='Number of friend entries indexed per pass')
+
+    def handle(self, *args, **options):
+        results = rebuild_all_friend_edges(chunk_size=options['chunk_size'])
+        self.stdout.write('Indexed {number} friend entries, {failed} failed. {status}'.format(
+            number=results['number_of_entries'],
+            failed=results['number_of_entries_failed'],
+            status=results['status']))
@@ -4,12 +4,18 @@
 
 import json
 import psycopg2
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Q
+from django.db.models.functions import Lower
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from config.base import get_environment_variable
 from email_outbound.models import EmailManager
 from voter.models import VoterManager
+import wevote_functions.admin
 from wevote_functions.functions import positive_value_exists
+from wevote_settings.models import WeVoteSetting, WeVoteSettingsManager
+import time
 
 NO_RESPONSE = 'NO_RESPONSE'
 PENDING_EMAIL_VERIFICATION = 'PENDING_EMAIL_VERIFICATION'
@@ -46,6 +52,19 @@ FRIENDS_IN_COMMON = 'FRIENDS_IN_COMMON'
 IGNORED_FRIEND_INVITATIONS = 'IGNORED_FRIEND_INVITATIONS'
 SUGGESTED_FRIEND_LIST = 'SUGGESTED_FRIEND_LIST'
 
+SUGGESTED_FRIEND_BULK_CREATE_CHUNK_SIZE = 1000
+
+# WeVoteSetting set by rebuild_all_friend_edges once FriendEdge covers every CurrentFriend and SuggestedFriend
+FRIEND_EDGES_READY_SETTING_NAME = 'friend_edges_ready'
+FRIEND_EDGES_READY_RECHECK_SECONDS = 60
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+friend_edges_ready_cache = {
+    'friend_edges_ready':   False,
+    'date_checked':         None,
+}
+
 
 class CurrentFriend(models.Model):
     """
@@ -307,14 +326,10 @@ class FriendManager(models.Manager):
         try:
             if positive_value_exists(read_only):
                 current_friend = CurrentFriend.objects.using('readonly').get(
-                    viewer_voter_we_vote_id__iexact=sender_voter_we_vote_id,
-                    viewee_voter_we_vote_id__iexact=recipient_voter_we_vote_id,
-                )
+                    generate_friend_edge_q(sender_voter_we_vote_id, recipient_voter_we_vote_id, voter_is_viewer=True))
             else:
                 current_friend = CurrentFriend.objects.get(
-                    viewer_voter_we_vote_id__iexact=sender_voter_we_vote_id,
-                    viewee_voter_we_vote_id__iexact=recipient_voter_we_vote_id,
-                )
+                    generate_friend_edge_q(sender_voter_we_vote_id, recipient_voter_we_vote_id, voter_is_viewer=True))
             current_friend_found = True
             success = True
             status += "RETRIEVE_CURRENT_FRIEND_FOUND-1 "
@@ -333,14 +348,12 @@ class FriendManager(models.Manager):
             try:
                 if positive_value_exists(read_only):
                     current_friend = CurrentFriend.objects.using('readonly').get(
-                        viewer_voter_we_vote_id__iexact=recipient_voter_we_vote_id,
-                        viewee_voter_we_vote_id__iexact=sender_voter_we_vote_id,
-                    )
+                        generate_friend_edge_q(recipient_voter_we_vote_id, sender_voter_we_vote_id,
+                                               voter_is_viewer=True))
                 else:
                     current_friend = CurrentFriend.objects.get(
-                        viewer_voter_we_vote_id__iexact=recipient_voter_we_vote_id,
-                        viewee_voter_we_vote_id__iexact=sender_voter_we_vote_id,
-                    )
+                        generate_friend_edge_q(recipient_voter_we_vote_id, sender_voter_we_vote_id,
+                                               voter_is_viewer=True))
                 current_friend_found = True
                 success = True
                 status += "RETRIEVE_CURRENT_FRIEND_FOUND-2 "
@@ -370,14 +383,12 @@ class FriendManager(models.Manager):
         try:
             if positive_value_exists(read_only):
                 suggested_friend = SuggestedFriend.objects.using('readonly').get(
-                    viewer_voter_we_vote_id__iexact=voter_we_vote_id_one,
-                    viewee_voter_we_vote_id__iexact=voter_we_vote_id_two,
-                )
+                    generate_friend_edge_q(voter_we_vote_id_one, voter_we_vote_id_two,
+                                           voter_is_viewer=True, kind_of_edge=SUGGESTED_FRIEND_LIST))
             else:
                 suggested_friend = SuggestedFriend.objects.get(
-                    viewer_voter_we_vote_id__iexact=voter_we_vote_id_one,
-                    viewee_voter_we_vote_id__iexact=voter_we_vote_id_two,
-                )
+                    generate_friend_edge_q(voter_we_vote_id_one, voter_we_vote_id_two,
+                                           voter_is_viewer=True, kind_of_edge=SUGGESTED_FRIEND_LIST))
             suggested_friend_found = True
             success = True
             status += "SUGGESTED_FRIEND_UPDATED_OR_CREATED "
@@ -396,14 +407,12 @@ class FriendManager(models.Manager):
             try:
                 if positive_value_exists(read_only):
                     suggested_friend = SuggestedFriend.objects.using('readonly').get(
-                        viewer_voter_we_vote_id__iexact=voter_we_vote_id_two,
-                        viewee_voter_we_vote_id__iexact=voter_we_vote_id_one,
-                    )
+                        generate_friend_edge_q(voter_we_vote_id_two, voter_we_vote_id_one,
+                                               voter_is_viewer=True, kind_of_edge=SUGGESTED_FRIEND_LIST))
                 else:
                     suggested_friend = SuggestedFriend.objects.get(
-                        viewer_voter_we_vote_id__iexact=voter_we_vote_id_two,
-                        viewee_voter_we_vote_id__iexact=voter_we_vote_id_one,
-                    )
+                        generate_friend_edge_q(voter_we_vote_id_two, voter_we_vote_id_one,
+                                               voter_is_viewer=True, kind_of_edge=SUGGESTED_FRIEND_LIST))
                 suggested_friend_found = True
                 success = True
                 status += "SUGGESTED_FRIEND_UPDATED_OR_CREATED "
@@ -759,60 +768,120 @@ class FriendManager(models.Manager):
 
         try:
             current_friend_queryset = CurrentFriend.objects.using('readonly').all()
-            current_friend_queryset = current_friend_queryset.filter(
-                Q(viewer_voter_we_vote_id__iexact=voter_we_vote_id) |
-                Q(viewee_voter_we_vote_id__iexact=voter_we_vote_id))
+            current_friend_queryset = current_friend_queryset.filter(generate_friend_edge_q(voter_we_vote_id))
             current_friends_count = current_friend_queryset.count()
         except Exception as e:
             current_friends_count = 0
         return current_friends_count
 
+    def retrieve_friend_we_vote_id_set_by_voter_we_vote_id(
+            self, voter_we_vote_id_list, limit_to_friend_we_vote_id_list=None, read_only=True):
+        """
+        Load the friends of many voters from CurrentFriend with one query, as a set of friend we_vote_ids per voter.
+        This adjacency index lets mutual friends and friend suggestions be worked out with set operations, instead
+        of with queries for every pair of voters. As with FriendEdge, we_vote_ids are matched case-insensitively, and
+        the friend we_vote_ids are returned in lower case.
+        :param voter_we_vote_id_list:
+        :param limit_to_friend_we_vote_id_list: Only include friends found in this list, so we don't load
+         every friend of every voter when we only need the friendships among a known group
+        :param read_only:
+        :return: friend_we_vote_id_set_by_voter_we_vote_id, keyed by the we_vote_ids in voter_we_vote_id_list
+        """
+        status = ""
+        success = True
+        friend_we_vote_id_set_by_voter_we_vote_id = {}
+        voter_we_vote_id_list = [voter_we_vote_id for voter_we_vote_id in voter_we_vote_id_list
+                                 if positive_value_exists(voter_we_vote_id)]
+        friend_we_vote_id_set_by_lower_voter_we_vote_id = {}
+        for voter_we_vote_id in voter_we_vote_id_list:
+            friend_we_vote_id_set_by_lower_voter_we_vote_id[voter_we_vote_id.lower()] = set()
+        if not len(friend_we_vote_id_set_by_lower_voter_we_vote_id):
+            results = {
+                'success':                                      success,
+                'status':                                       status,
+                'friend_we_vote_id_set_by_voter_we_vote_id':    friend_we_vote_id_set_by_voter_we_vote_id,
+            }
+            return results
+
+        try:
+            if positive_value_exists(read_only):
+                current_friend_queryset = CurrentFriend.objects.using('readonly').all()
+            else:
+                current_friend_queryset = CurrentFriend.objects.all()
+            current_friend_queryset = current_friend_queryset.filter(generate_friend_edge_q(
+                list(friend_we_vote_id_set_by_lower_voter_we_vote_id),
+                other_voter_we_vote_id=limit_to_friend_we_vote_id_list))
+            friendship_list = list(current_friend_queryset.values_list(
+                'viewer_voter_we_vote_id', 'viewee_voter_we_vote_id'))
+            limit_to_friend_we_vote_id_set = None if limit_to_friend_we_vote_id_list is None else \
+                set(friend_we_vote_id.lower() for friend_we_vote_id in limit_to_friend_we_vote_id_list)
+            for viewer_voter_we_vote_id, viewee_voter_we_vote_id in friendship_list:
+                viewer_voter_we_vote_id = viewer_voter_we_vote_id.lower()
+                viewee_voter_we_vote_id = viewee_voter_we_vote_id.lower()
+                if viewer_voter_we_vote_id == viewee_voter_we_vote_id:
+                    continue
+                # A friendship between two voters in voter_we_vote_id_list only counts for the sides where the
+                #  friend is in limit_to_friend_we_vote_id_list
+                if viewer_voter_we_vote_id in friend_we_vote_id_set_by_lower_voter_we_vote_id and \
+                        (limit_to_friend_we_vote_id_set is None or
+                         viewee_voter_we_vote_id in limit_to_friend_we_vote_id_set):
+                    friend_we_vote_id_set_by_lower_voter_we_vote_id[viewer_voter_we_vote_id].add(
+                        viewee_voter_we_vote_id)
+                if viewee_voter_we_vote_id in friend_we_vote_id_set_by_lower_voter_we_vote_id and \
+                        (limit_to_friend_we_vote_id_set is None or
+                         viewer_voter_we_vote_id in limit_to_friend_we_vote_id_set):
+                    friend_we_vote_id_set_by_lower_voter_we_vote_id[viewee_voter_we_vote_id].add(
+                        viewer_voter_we_vote_id)
+        except Exception as e:
+            success = False
+            status += "RETRIEVE_FRIEND_WE_VOTE_ID_SETS_FAILED: " + str(e) + " "
+
+        for voter_we_vote_id in voter_we_vote_id_list:
+            friend_we_vote_id_set_by_voter_we_vote_id[voter_we_vote_id] = \
+                set(friend_we_vote_id_set_by_lower_voter_we_vote_id[voter_we_vote_id.lower()])
+        results = {
+            'success':                                      success,
+            'status':                                       status,
+            'friend_we_vote_id_set_by_voter_we_vote_id':    friend_we_vote_id_set_by_voter_we_vote_id,
+        }
+        return results
+
     def fetch_mutual_friends_count(self, voter_we_vote_id, friend_we_vote_id):
         """
-        TODO: This could be converted to database only calculation for better speed
+        To count mutual friends for more than one voter, please use fetch_mutual_friends_count_dict
         :param voter_we_vote_id:
         :param friend_we_vote_id:
         :return:
         """
-        mutual_friends_count = 0
-
-        if not positive_value_exists(voter_we_vote_id) or not positive_value_exists(friend_we_vote_id):
-            return mutual_friends_count
-
-        voter_friends_we_vote_id_list = []
-        friend_friends_we_vote_id_list = []
-
-        try:
-            voter_friends_queryset = CurrentFriend.objects.using('readonly').all()
-            voter_friends_queryset = voter_friends_queryset.filter(
-                Q(viewer_voter_we_vote_id__iexact=voter_we_vote_id) |
-                Q(viewee_voter_we_vote_id__iexact=voter_we_vote_id))
-            voter_friends_list = list(voter_friends_queryset)
-            for one_friend in voter_friends_list:
-                voter_friends_we_vote_id_list.append(one_friend.fetch_other_voter_we_vote_id(voter_we_vote_id))
-        except Exception as e:
-            mutual_friends_count = 0
-            return mutual_friends_count
+        mutual_friends_count_dict = self.fetch_mutual_friends_count_dict(voter_we_vote_id, [friend_we_vote_id])
+        return mutual_friends_count_dict.get(friend_we_vote_id, 0)
 
-        try:
-            friend_friends_queryset = CurrentFriend.objects.using('readonly').all()
-            friend_friends_queryset = friend_friends_queryset.filter(
-                Q(viewer_voter_we_vote_id__iexact=friend_we_vote_id) |
-                Q(viewee_voter_we_vote_id__iexact=friend_we_vote_id))
-            friend_friends_list = list(friend_friends_queryset)
-            for one_friend in friend_friends_list:
-                friend_friends_we_vote_id_list.append(one_friend.fetch_other_voter_we_vote_id(friend_we_vote_id))
-        except Exception as e:
-            mutual_friends_count = 0
-            return mutual_friends_count
+    def fetch_mutual_friends_count_dict(self, voter_we_vote_id, other_voter_we_vote_id_list):
+        """
+        Count the friends voter_we_vote_id has in common with each voter in other_voter_we_vote_id_list, with two
+        queries however long the list is: one for the voter's friends, and one for the friendships between the
+        other voters and those friends.
+        :param voter_we_vote_id:
+        :param other_voter_we_vote_id_list:
+        :return: dict of mutual friend counts, keyed by the other voter's we_vote_id
+        """
+        mutual_friends_count_dict = {}
+        if not positive_value_exists(voter_we_vote_id):
+            return mutual_friends_count_dict
 
-        voter_set = set(voter_friends_we_vote_id_list)
-        friend_set = set(friend_friends_we_vote_id_list)
-        mutual_set = voter_set & friend_set
-        if mutual_set:
-            mutual_friends_count = len(mutual_set)
+        results = self.retrieve_friend_we_vote_id_set_by_voter_we_vote_id([voter_we_vote_id])
+        voter_friend_we_vote_id_set = results['friend_we_vote_id_set_by_voter_we_vote_id'][voter_we_vote_id]
+        if not results['success'] or not len(voter_friend_we_vote_id_set):
+            return mutual_friends_count_dict
 
-        return mutual_friends_count
+        results = self.retrieve_friend_we_vote_id_set_by_voter_we_vote_id(
+            other_voter_we_vote_id_list, limit_to_friend_we_vote_id_list=list(voter_friend_we_vote_id_set))
+        if not results['success']:
+            return mutual_friends_count_dict
+        for other_voter_we_vote_id, friend_we_vote_id_set in \
+                results['friend_we_vote_id_set_by_voter_we_vote_id'].items():
+            mutual_friends_count_dict[other_voter_we_vote_id] = len(friend_we_vote_id_set)
+        return mutual_friends_count_dict
 
     def fetch_suggested_friends_count(self, voter_we_vote_id):
         suggested_friends_count = 0
@@ -823,8 +892,7 @@ class FriendManager(models.Manager):
         try:
             suggested_friend_queryset = SuggestedFriend.objects.using('readonly').all()
             suggested_friend_queryset = suggested_friend_queryset.filter(
-                Q(viewer_voter_we_vote_id__iexact=voter_we_vote_id) |
-                Q(viewee_voter_we_vote_id__iexact=voter_we_vote_id))
+                generate_friend_edge_q(voter_we_vote_id, kind_of_edge=SUGGESTED_FRIEND_LIST))
             suggested_friends_count = suggested_friend_queryset.count()
         except Exception as e:
             suggested_friends_count = 0
@@ -852,9 +920,7 @@ class FriendManager(models.Manager):
                 current_friend_queryset = CurrentFriend.objects.using('readonly').all()
             else:
                 current_friend_queryset = CurrentFriend.objects.all()
-            current_friend_queryset = current_friend_queryset.filter(
-                Q(viewer_voter_we_vote_id__iexact=voter_we_vote_id) |
-                Q(viewee_voter_we_vote_id__iexact=voter_we_vote_id))
+            current_friend_queryset = current_friend_queryset.filter(generate_friend_edge_q(voter_we_vote_id))
             current_friend_queryset = current_friend_queryset.order_by('-date_last_changed')
             current_friend_list = current_friend_queryset
 
@@ -915,9 +981,7 @@ class FriendManager(models.Manager):
             # Note that since we are ultimately returning a list of voter objects, so we don't need to retrieve
             # editable CurrentFriend objects.
             current_friend_queryset = CurrentFriend.objects.using('readonly').all()
-            current_friend_queryset = current_friend_queryset.filter(
-                Q(viewer_voter_we_vote_id__iexact=voter_we_vote_id) |
-                Q(viewee_voter_we_vote_id__iexact=voter_we_vote_id))
+            current_friend_queryset = current_friend_queryset.filter(generate_friend_edge_q(voter_we_vote_id))
             # We can sort on the client
             # current_friend_queryset = current_friend_queryset.order_by('-date_last_changed')
             current_friend_list = list(current_friend_queryset)
@@ -989,9 +1053,7 @@ class FriendManager(models.Manager):
 
         try:
             current_friend_queryset = CurrentFriend.objects.using('readonly').all()
-            current_friend_queryset = current_friend_queryset.filter(
-                Q(viewer_voter_we_vote_id__iexact=voter_we_vote_id) |
-                Q(viewee_voter_we_vote_id__iexact=voter_we_vote_id))
+            current_friend_queryset = current_friend_queryset.filter(generate_friend_edge_q(voter_we_vote_id))
             current_friend_queryset = current_friend_queryset.order_by('-date_last_changed')
             current_friend_list = current_friend_queryset
 
@@ -1587,9 +1649,7 @@ class FriendManager(models.Manager):
 
         try:
             queryset = CurrentFriend.objects.using('readonly').all()
-            queryset = queryset.filter(
-                Q(viewer_voter_we_vote_id__iexact=voter_we_vote_id) |
-                Q(viewee_voter_we_vote_id__iexact=voter_we_vote_id))
+            queryset = queryset.filter(generate_friend_edge_q(voter_we_vote_id))
             current_friends_list_one = list(queryset.values_list('viewer_voter_we_vote_id', flat=True).distinct())
             current_friends_list_two = list(queryset.values_list('viewee_voter_we_vote_id', flat=True).distinct())
         except Exception as e:
@@ -1622,9 +1682,7 @@ class FriendManager(models.Manager):
 
         try:
             queryset = SuggestedFriend.objects.using('readonly').all()
-            queryset = queryset.filter(
-                Q(viewer_voter_we_vote_id__iexact=voter_we_vote_id) |
-                Q(viewee_voter_we_vote_id__iexact=voter_we_vote_id))
+            queryset = queryset.filter(generate_friend_edge_q(voter_we_vote_id, kind_of_edge=SUGGESTED_FRIEND_LIST))
             suggested_friends_list_one = list(queryset.values_list('viewer_voter_we_vote_id', flat=True).distinct())
             suggested_friends_list_two = list(queryset.values_list('viewee_voter_we_vote_id', flat=True).distinct())
         except Exception as e:
@@ -2080,8 +2138,7 @@ class FriendManager(models.Manager):
             else:
                 suggested_friend_queryset = SuggestedFriend.objects.all()
             suggested_friend_queryset = suggested_friend_queryset.filter(
-                Q(viewer_voter_we_vote_id__iexact=voter_we_vote_id) |
-                Q(viewee_voter_we_vote_id__iexact=voter_we_vote_id))
+                generate_friend_edge_q(voter_we_vote_id, kind_of_edge=SUGGESTED_FRIEND_LIST))
             if positive_value_exists(hide_deleted):
                 suggested_friend_queryset = suggested_friend_queryset.exclude(
                     Q(voter_we_vote_id_deleted_first__iexact=voter_we_vote_id) |
@@ -2147,8 +2204,7 @@ class FriendManager(models.Manager):
         try:
             suggested_friend_queryset = SuggestedFriend.objects.using('readonly').all()
             suggested_friend_queryset = suggested_friend_queryset.filter(
-                Q(viewer_voter_we_vote_id__iexact=voter_we_vote_id) |
-                Q(viewee_voter_we_vote_id__iexact=voter_we_vote_id))
+                generate_friend_edge_q(voter_we_vote_id, kind_of_edge=SUGGESTED_FRIEND_LIST))
             suggested_friend_queryset = suggested_friend_queryset.exclude(
                 Q(voter_we_vote_id_deleted_first__iexact=voter_we_vote_id) |
                 Q(voter_we_vote_id_deleted_second__iexact=voter_we_vote_id))
@@ -2237,38 +2293,98 @@ class FriendManager(models.Manager):
         the replicated read_only not being caught up with the master fast enough (since a friend
         was just created above.)
 
+        Every pair of this voter's friends who aren't friends with each other is suggested to each other. The
+        friendships and suggestions among this voter's friends are each loaded with one query, and the missing
+        suggestions are the set difference, saved with bulk_create.
         :param starting_voter_we_vote_id:
         :param read_only:
         :return:
         """
-        all_friends_one_person_results = self.retrieve_current_friends(starting_voter_we_vote_id, read_only=read_only)
+        status = ""
+        success = True
         suggested_friend_created_count = 0
-        if all_friends_one_person_results['current_friend_list_found']:
-            current_friend_list = all_friends_one_person_results['current_friend_list']
-            # For each friend on this list, suggest every other friend as a possible friend
-            # Ex/ You have the friends Jo and Pat. This routine makes sure they both see each other as suggested friends
-            for one_current_friend_to_suggest in current_friend_list:
-                first_voter_we_vote_id = one_current_friend_to_suggest.fetch_other_voter_we_vote_id(
-                    starting_voter_we_vote_id)
-                for second_current_friend_to_suggest in current_friend_list:
-                    second_voter_we_vote_id = second_current_friend_to_suggest.fetch_other_voter_we_vote_id(
-                        starting_voter_we_vote_id)
-                    if positive_value_exists(first_voter_we_vote_id) and \
-                            positive_value_exists(second_voter_we_vote_id) and \
-                            first_voter_we_vote_id != second_voter_we_vote_id:
-                        # Are they already friends?
-                        already_friend_results = self.retrieve_current_friend(first_voter_we_vote_id,
-                                                                              second_voter_we_vote_id)
-                        if not already_friend_results['current_friend_found']:
-                            suggested_friend_results = self.update_or_create_suggested_friend(first_voter_we_vote_id,
-                                                                                              second_voter_we_vote_id)
-                            if suggested_friend_results['suggested_friend_created'] or \
-                                    suggested_friend_results['suggested_friend_found']:
-                                suggested_friend_created_count += 1
+        results = self.retrieve_friend_we_vote_id_set_by_voter_we_vote_id(
+            [starting_voter_we_vote_id], read_only=read_only)
+        status += results['status']
+        friend_we_vote_id_list = \
+            sorted(results['friend_we_vote_id_set_by_voter_we_vote_id'].get(starting_voter_we_vote_id, set()))
+        if not results['success'] or len(friend_we_vote_id_list) < 2:
+            results = {
+                'status':                           status + "UPDATE_SUGGESTED_FRIENDS_COMPLETED ",
+                'success':                          results['success'],
+                'suggested_friend_created_count':   suggested_friend_created_count,
+            }
+            return results
+
+        # Ex/ You have the friends Jo and Pat. This routine makes sure they both see each other as suggested friends
+        results = self.retrieve_friend_we_vote_id_set_by_voter_we_vote_id(
+            friend_we_vote_id_list, limit_to_friend_we_vote_id_list=friend_we_vote_id_list, read_only=read_only)
+        status += results['status']
+        if not results['success']:
+            results = {
+                'status':                           status,
+                'success':                          False,
+                'suggested_friend_created_count':   suggested_friend_created_count,
+            }
+            return results
+        friend_we_vote_id_set_by_voter_we_vote_id = results['friend_we_vote_id_set_by_voter_we_vote_id']
+
+        # The direction of a suggestion doesn't matter, so each pair is stored with the lower we_vote_id first
+        existing_suggested_friend_pair_set = set()
+        try:
+            suggested_friend_queryset = SuggestedFriend.objects.filter(generate_friend_edge_q(
+                friend_we_vote_id_list, other_voter_we_vote_id=friend_we_vote_id_list, voter_is_viewer=True,
+                kind_of_edge=SUGGESTED_FRIEND_LIST))
+            for viewer_voter_we_vote_id, viewee_voter_we_vote_id in \
+                    suggested_friend_queryset.values_list('viewer_voter_we_vote_id', 'viewee_voter_we_vote_id'):
+                viewer_voter_we_vote_id = viewer_voter_we_vote_id.lower()
+                viewee_voter_we_vote_id = viewee_voter_we_vote_id.lower()
+                existing_suggested_friend_pair_set.add(
+                    (min(viewer_voter_we_vote_id, viewee_voter_we_vote_id),
+                     max(viewer_voter_we_vote_id, viewee_voter_we_vote_id)))
+        except Exception as e:
+            status += "UPDATE_SUGGESTED_FRIENDS-EXISTING_SUGGESTIONS_NOT_RETRIEVED: " + str(e) + " "
+            results = {
+                'status':                           status,
+                'success':                          False,
+                'suggested_friend_created_count':   suggested_friend_created_count,
+            }
+            return results
+
+        suggested_friend_to_create_list = []
+        for index, first_voter_we_vote_id in enumerate(friend_we_vote_id_list):
+            first_voter_friend_we_vote_id_set = friend_we_vote_id_set_by_voter_we_vote_id[first_voter_we_vote_id]
+            for second_voter_we_vote_id in friend_we_vote_id_list[index + 1:]:
+                if second_voter_we_vote_id in first_voter_friend_we_vote_id_set:
+                    # They are already friends
+                    continue
+                suggested_friend_created_count += 1
+                if (first_voter_we_vote_id, second_voter_we_vote_id) in existing_suggested_friend_pair_set:
+                    continue
+                suggested_friend_to_create_list.append(SuggestedFriend(
+                    viewer_voter_we_vote_id=first_voter_we_vote_id,
+                    viewee_voter_we_vote_id=second_voter_we_vote_id,
+                ))
+                if len(suggested_friend_to_create_list) >= SUGGESTED_FRIEND_BULK_CREATE_CHUNK_SIZE:
+                    try:
+                        SuggestedFriend.objects.bulk_create(suggested_friend_to_create_list)
+                        update_friend_edges(SUGGESTED_FRIEND_LIST, suggested_friend_to_create_list)
+                    except Exception as e:
+                        success = False
+                        status += "UPDATE_SUGGESTED_FRIENDS-BULK_CREATE_FAILED: " + str(e) + " "
+                    suggested_friend_to_create_list = []
+        if len(suggested_friend_to_create_list):
+            try:
+                SuggestedFriend.objects.bulk_create(suggested_friend_to_create_list)
+                # bulk_create() does not send post_save
+                update_friend_edges(SUGGESTED_FRIEND_LIST, suggested_friend_to_create_list)
+            except Exception as e:
+                success = False
+                status += "UPDATE_SUGGESTED_FRIENDS-BULK_CREATE_FAILED: " + str(e) + " "
 
         results = {
-            'status':                           "UPDATE_SUGGESTED_FRIENDS_COMPLETED ",
-            'success':                          True,
+            'status':                           status + "UPDATE_SUGGESTED_FRIENDS_COMPLETED ",
+            'success':                          success,
             'suggested_friend_created_count':   suggested_friend_created_count,
         }
         return results
@@ -2362,3 +2478,222 @@ class SuggestedFriend(models.Model):
         else:
             # If the we_vote_id passed in wasn't found, don't return another we_vote_id
             return ""
+
+
+class FriendEdge(models.Model):
+    """
+    CurrentFriend and SuggestedFriend store each connection once, in whichever direction it was made, so finding a
+    voter's connections needs an OR across viewer and viewee. FriendEdge stores every connection once for each voter
+    in it, with lowercase we_vote_ids, so that lookup is an exact match on one index. It is kept up to date by the
+    post_save and post_delete receivers below, and filled for older entries by "python manage.py rebuild_friend_edges".
+    """
+    kind_of_edge = models.CharField(max_length=50)  # CURRENT_FRIENDS or SUGGESTED_FRIEND_LIST
+    # The id of the CurrentFriend or SuggestedFriend entry
+    friend_entry_id = models.PositiveIntegerField()
+    voter_we_vote_id = models.CharField(max_length=255)
+    other_voter_we_vote_id = models.CharField(max_length=255, null=True)
+    # True when voter_we_vote_id is the entry's viewer_voter_we_vote_id
+    voter_is_viewer = models.BooleanField()
+
+    class Meta:
+        unique_together = ('kind_of_edge', 'friend_entry_id', 'voter_is_viewer')
+        indexes = [
+            models.Index(fields=['kind_of_edge', 'voter_we_vote_id', 'other_voter_we_vote_id']),
+        ]
+
+
+def fetch_friend_edges_ready():
+    """
+    FriendEdge is only complete after "python manage.py rebuild_friend_edges" has run once. Until then the friend
+    lookups keep using CurrentFriend and SuggestedFriend directly. Once ready, it stays ready for the life of this
+    process.
+    """
+    if friend_edges_ready_cache['friend_edges_ready']:
+        return True
+    if friend_edges_ready_cache['date_checked'] is not None and \
+            time.monotonic() - friend_edges_ready_cache['date_checked'] < FRIEND_EDGES_READY_RECHECK_SECONDS:
+        return False
+    we_vote_settings_manager = WeVoteSettingsManager()
+    friend_edges_ready = we_vote_settings_manager.fetch_setting(FRIEND_EDGES_READY_SETTING_NAME)
+    friend_edges_ready_cache['friend_edges_ready'] = positive_value_exists(friend_edges_ready)
+    friend_edges_ready_cache['date_checked'] = time.monotonic()
+    return friend_edges_ready_cache['friend_edges_ready']
+
+
+def generate_friend_edge_q(voter_we_vote_id, other_voter_we_vote_id=None, voter_is_viewer=False,
+                           kind_of_edge=CURRENT_FRIENDS):
+    """
+    The filter for the CurrentFriend (or SuggestedFriend) entries of voter_we_vote_id, in either direction. With
+    other_voter_we_vote_id, the filter for the entries between those two voters. With voter_is_viewer, only the
+    entries where voter_we_vote_id is the viewer.
+    :param voter_we_vote_id: One we_vote_id, or a list of them
+    :param other_voter_we_vote_id: One we_vote_id, or a list of them
+    :param voter_is_viewer:
+    :param kind_of_edge: CURRENT_FRIENDS or SUGGESTED_FRIEND_LIST
+    :return: Q
+    """
+    voter_we_vote_id_is_list = isinstance(voter_we_vote_id, (list, set, tuple))
+    other_voter_we_vote_id_is_list = isinstance(other_voter_we_vote_id, (list, set, tuple))
+    if not voter_we_vote_id_is_list:
+        voter_we_vote_id = voter_we_vote_id or ''
+    if fetch_friend_edges_ready():
+        friend_edge_query = FriendEdge.objects.filter(kind_of_edge=kind_of_edge)
+        if voter_we_vote_id_is_list:
+            friend_edge_query = friend_edge_query.filter(
+                voter_we_vote_id__in=[one_we_vote_id.lower() for one_we_vote_id in voter_we_vote_id])
+        else:
+            friend_edge_query = friend_edge_query.filter(voter_we_vote_id=voter_we_vote_id.lower())
+        if other_voter_we_vote_id_is_list:
+            friend_edge_query = friend_edge_query.filter(
+                other_voter_we_vote_id__in=[one_we_vote_id.lower() for one_we_vote_id in other_voter_we_vote_id])
+        elif other_voter_we_vote_id is not None:
+            friend_edge_query = friend_edge_query.filter(other_voter_we_vote_id=other_voter_we_vote_id.lower())
+        if voter_is_viewer:
+            friend_edge_query = friend_edge_query.filter(voter_is_viewer=True)
+        return Q(id__in=friend_edge_query.values('friend_entry_id'))
+
+    # The lookups FriendEdge replaces
+    if not voter_we_vote_id_is_list and not other_voter_we_vote_id_is_list:
+        viewer_q = Q(viewer_voter_we_vote_id__iexact=voter_we_vote_id)
+        viewee_q = Q(viewee_voter_we_vote_id__iexact=voter_we_vote_id)
+        if other_voter_we_vote_id is not None:
+            viewer_q &= Q(viewee_voter_we_vote_id__iexact=other_voter_we_vote_id)
+            viewee_q &= Q(viewer_voter_we_vote_id__iexact=other_voter_we_vote_id)
+        if voter_is_viewer:
+            return viewer_q
+        return viewer_q | viewee_q
+
+    # __iexact doesn't take a list, so lists are matched against the lower case we_vote_ids instead
+    voter_we_vote_id_list = voter_we_vote_id if voter_we_vote_id_is_list else [voter_we_vote_id]
+    voter_we_vote_id_lower_list = [one_we_vote_id.lower() for one_we_vote_id in voter_we_vote_id_list]
+    viewer_q = Q(viewer_voter_we_vote_id_lower__in=voter_we_vote_id_lower_list)
+    viewee_q = Q(viewee_voter_we_vote_id_lower__in=voter_we_vote_id_lower_list)
+    if other_voter_we_vote_id is not None:
+        other_voter_we_vote_id_list = \
+            other_voter_we_vote_id if other_voter_we_vote_id_is_list else [other_voter_we_vote_id]
+        other_voter_we_vote_id_lower_list = \
+            [one_we_vote_id.lower() for one_we_vote_id in other_voter_we_vote_id_list]
+        viewer_q &= Q(viewee_voter_we_vote_id_lower__in=other_voter_we_vote_id_lower_list)
+        viewee_q &= Q(viewer_voter_we_vote_id_lower__in=other_voter_we_vote_id_lower_list)
+    friend_entry_class = SuggestedFriend if kind_of_edge == SUGGESTED_FRIEND_LIST else CurrentFriend
+    friend_entry_query = friend_entry_class.objects.annotate(
+        viewer_voter_we_vote_id_lower=Lower('viewer_voter_we_vote_id'),
+        viewee_voter_we_vote_id_lower=Lower('viewee_voter_we_vote_id'))
+    friend_entry_query = friend_entry_query.filter(viewer_q if voter_is_viewer else viewer_q | viewee_q)
+    return Q(id__in=friend_entry_query.values('id'))
+
+
+def update_friend_edges(kind_of_edge, friend_entry_list):
+    """
+    Replace the FriendEdge entries for these CurrentFriend or SuggestedFriend entries
+    :param kind_of_edge: CURRENT_FRIENDS or SUGGESTED_FRIEND_LIST
+    :param friend_entry_list:
+    :return:
+    """
+    friend_edge_list = []
+    for friend_entry in friend_entry_list:
+        viewer_voter_we_vote_id = (friend_entry.viewer_voter_we_vote_id or '').lower()
+        viewee_voter_we_vote_id = (friend_entry.viewee_voter_we_vote_id or '').lower()
+        if positive_value_exists(viewer_voter_we_vote_id):
+            friend_edge_list.append(FriendEdge(
+                kind_of_edge=kind_of_edge,
+                friend_entry_id=friend_entry.id,
+                voter_we_vote_id=viewer_voter_we_vote_id,
+                other_voter_we_vote_id=viewee_voter_we_vote_id,
+                voter_is_viewer=True))
+        if positive_value_exists(viewee_voter_we_vote_id):
+            friend_edge_list.append(FriendEdge(
+                kind_of_edge=kind_of_edge,
+                friend_entry_id=friend_entry.id,
+                voter_we_vote_id=viewee_voter_we_vote_id,
+                other_voter_we_vote_id=viewer_voter_we_vote_id,
+                voter_is_viewer=False))
+    with transaction.atomic():
+        FriendEdge.objects.filter(
+            kind_of_edge=kind_of_edge,
+            friend_entry_id__in=[friend_entry.id for friend_entry in friend_entry_list]).delete()
+        FriendEdge.objects.bulk_create(friend_edge_list, ignore_conflicts=True)
+
+
+def rebuild_all_friend_edges(chunk_size=1000):
+    """
+    Create the FriendEdge entries for every CurrentFriend and SuggestedFriend, then mark FriendEdge as ready so
+    the friend lookups start using it. Safe to run again.
+    :param chunk_size:
+    :return:
+    """
+    status = ""
+    success = True
+    number_of_entries = 0
+    number_of_entries_failed = 0
+    for kind_of_edge, friend_model in ((CURRENT_FRIENDS, CurrentFriend), (SUGGESTED_FRIEND_LIST, SuggestedFriend)):
+        friend_entry_id_list = list(friend_model.objects.order_by('id').values_list('id', flat=True))
+        number_of_entries += len(friend_entry_id_list)
+        for start in range(0, len(friend_entry_id_list), chunk_size):
+            friend_entry_list = list(friend_model.objects.filter(
+                id__in=friend_entry_id_list[start:start + chunk_size]))
+            try:
+                update_friend_edges(kind_of_edge, friend_entry_list)
+            except Exception as e:
+                number_of_entries_failed += len(friend_entry_list)
+                status += "COULD_NOT_UPDATE_FRIEND_EDGES: " + str(e) + " "
+
+        try:
+            # Edges left from entries which no longer exist
+            FriendEdge.objects.filter(kind_of_edge=kind_of_edge)\
+                .exclude(friend_entry_id__in=friend_model.objects.values('id')).delete()
+        except Exception as e:
+            status += "COULD_NOT_DELETE_STALE_FRIEND_EDGES: " + str(e) + " "
+
+    if number_of_entries_failed:
+        success = False
+    else:
+        we_vote_settings_manager = WeVoteSettingsManager()
+        we_vote_settings_manager.save_setting(
+            setting_name=FRIEND_EDGES_READY_SETTING_NAME,
+            setting_value=True,
+            value_type=WeVoteSetting.BOOLEAN)
+    status += "FRIEND_EDGES_REBUILT "
+
+    results = {
+        'success':                      success,
+        'status':                       status,
+        'number_of_entries':            number_of_entries,
+        'number_of_entries_failed':     number_of_entries_failed,
+    }
+    return results
+
+
+@receiver(post_save, sender=CurrentFriend)
+def update_friend_edges_for_current_friend(sender, instance, **kwargs):
+    try:
+        update_friend_edges(CURRENT_FRIENDS, [instance])
+    except Exception as e:
+        # rebuild_friend_edges repairs edges which weren't saved
+        logger.error('update_friend_edges_for_current_friend: ' + str(e))
+
+
+@receiver(post_save, sender=SuggestedFriend)
+def update_friend_edges_for_suggested_friend(sender, instance, **kwargs):
+    try:
+        update_friend_edges(SUGGESTED_FRIEND_LIST, [instance])
+    except Exception as e:
+        logger.error('update_friend_edges_for_suggested_friend: ' + str(e))
+
+
+@receiver(post_delete, sender=CurrentFriend)
+def delete_friend_edges_for_current_friend(sender, instance, **kwargs):
+    try:
+        with transaction.atomic():
+            FriendEdge.objects.filter(kind_of_edge=CURRENT_FRIENDS, friend_entry_id=instance.id).delete()
+    except Exception as e:
+        logger.error('delete_friend_edges_for_current_friend: ' + str(e))
+
+
+@receiver(post_delete, sender=SuggestedFriend)
+def delete_friend_edges_for_suggested_friend(sender, instance, **kwargs):
+    try:
+        with transaction.atomic():
+            FriendEdge.objects.filter(kind_of_edge=SUGGESTED_FRIEND_LIST, friend_entry_id=instance.id).delete()
+    except Exception as e:
+        logger.error('delete_friend_edges_for_suggested_friend: ' + str(e))
@@ -0,0 +1,154 @@
+# friend/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.test import TestCase
+from .models import CurrentFriend, FriendEdge, FriendManager, SuggestedFriend, CURRENT_FRIENDS, \
+    SUGGESTED_FRIEND_LIST, friend_edges_ready_cache, rebuild_all_friend_edges
+
+
+def reset_friend_edges_ready_cache():
+    friend_edges_ready_cache['friend_edges_ready'] = False
+    friend_edges_ready_cache['date_checked'] = None
+
+
+def fetch_suggested_friend_pair_set():
+    return set(frozenset(suggested_friend_pair) for suggested_friend_pair in
+               SuggestedFriend.objects.values_list('viewer_voter_we_vote_id', 'viewee_voter_we_vote_id'))
+
+
+class FriendSuggestionTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        reset_friend_edges_ready_cache()
+        self.friend_manager = FriendManager()
+        # wv01voter1 is friends with 2, 3 and 4. 2 and 3 are already friends with each other, and 5 is friends
+        #  with 2 and 3
+        for viewer_voter_we_vote_id, viewee_voter_we_vote_id in [
+                ('wv01voter1', 'wv01voter2'), ('wv01voter3', 'wv01voter1'), ('wv01voter1', 'wv01voter4'),
+                ('wv01voter2', 'wv01voter3'), ('wv01voter5', 'wv01voter2'), ('wv01voter5', 'wv01voter3')]:
+            CurrentFriend.objects.create(
+                viewer_voter_we_vote_id=viewer_voter_we_vote_id, viewee_voter_we_vote_id=viewee_voter_we_vote_id)
+
+    def tearDown(self):
+        reset_friend_edges_ready_cache()
+
+    def test_only_missing_suggestions_are_created(self):
+        # Saved in the opposite direction from the one update_suggested_friends_starting_with_one_voter would use
+        SuggestedFriend.objects.create(viewer_voter_we_vote_id='wv01voter4', viewee_voter_we_vote_id='wv01voter2')
+        results = self.friend_manager.update_suggested_friends_starting_with_one_voter('wv01voter1')
+        self.assertTrue(results['success'])
+        self.assertEqual(
+            fetch_suggested_friend_pair_set(),
+            {frozenset(['wv01voter2', 'wv01voter4']), frozenset(['wv01voter3', 'wv01voter4'])})
+        self.assertEqual(SuggestedFriend.objects.count(), 2)
+
+    def test_running_again_creates_no_duplicates(self):
+        self.friend_manager.update_suggested_friends_starting_with_one_voter('wv01voter1')
+        suggested_friend_count = SuggestedFriend.objects.count()
+        self.friend_manager.update_suggested_friends_starting_with_one_voter('wv01voter1')
+        self.assertEqual(SuggestedFriend.objects.count(), suggested_friend_count)
+        self.assertEqual(suggested_friend_count, 2)
+
+    def test_mutual_friends_count_dict(self):
+        mutual_friends_count_dict = self.friend_manager.fetch_mutual_friends_count_dict(
+            'wv01voter1', ['wv01voter2', 'wv01voter3', 'wv01voter4', 'wv01voter5', 'wv01voter6'])
+        self.assertEqual(mutual_friends_count_dict, {
+            'wv01voter2': 1,
+            'wv01voter3': 1,
+            'wv01voter4': 0,
+            'wv01voter5': 2,
+            'wv01voter6': 0,
+        })
+        self.assertEqual(self.friend_manager.fetch_mutual_friends_count('wv01voter5', 'wv01voter1'), 2)
+
+    def test_mixed_case_we_vote_ids_match(self):
+        # Like the __iexact lookups these replaced, the adjacency lookups don't depend on how a we_vote_id was saved
+        CurrentFriend.objects.create(viewer_voter_we_vote_id='WV01VOTER6', viewee_voter_we_vote_id='wv01voter2')
+        CurrentFriend.objects.create(viewer_voter_we_vote_id='wv01voter3', viewee_voter_we_vote_id='Wv01Voter6')
+        mutual_friends_count_dict = self.friend_manager.fetch_mutual_friends_count_dict(
+            'WV01VOTER1', ['wv01voter6', 'WV01VOTER5'])
+        self.assertEqual(mutual_friends_count_dict, {
+            'wv01voter6': 2,
+            'WV01VOTER5': 2,
+        })
+        results = self.friend_manager.retrieve_friend_we_vote_id_set_by_voter_we_vote_id(['Wv01Voter6'])
+        self.assertEqual(results['friend_we_vote_id_set_by_voter_we_vote_id'],
+                         {'Wv01Voter6': {'wv01voter2', 'wv01voter3'}})
+
+    def test_same_results_with_friend_edges(self):
+        rebuild_all_friend_edges()
+        reset_friend_edges_ready_cache()
+        self.friend_manager.update_suggested_friends_starting_with_one_voter('wv01voter1')
+        self.assertTrue(friend_edges_ready_cache['friend_edges_ready'])
+        self.assertEqual(
+            fetch_suggested_friend_pair_set(),
+            {frozenset(['wv01voter2', 'wv01voter4']), frozenset(['wv01voter3', 'wv01voter4'])})
+        self.assertEqual(self.friend_manager.fetch_mutual_friends_count('wv01voter1', 'wv01voter5'), 2)
+        self.assertEqual(self.friend_manager.fetch_current_friends_count('WV01VOTER1'), 3)
+
+
+class FriendEdgeTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        reset_friend_edges_ready_cache()
+
+    def tearDown(self):
+        reset_friend_edges_ready_cache()
+
+    def fetch_friend_edge_set(self, kind_of_edge):
+        return set(FriendEdge.objects.filter(kind_of_edge=kind_of_edge).values_list(
+            'friend_entry_id', 'voter_we_vote_id', 'other_voter_we_vote_id', 'voter_is_viewer'))
+
+    def test_friend_edges_follow_current_friend_save_and_delete(self):
+        current_friend = CurrentFriend.objects.create(
+            viewer_voter_we_vote_id='WV01VOTER1', viewee_voter_we_vote_id='wv01voter2')
+        self.assertEqual(self.fetch_friend_edge_set(CURRENT_FRIENDS), {
+            (current_friend.id, 'wv01voter1', 'wv01voter2', True),
+            (current_friend.id, 'wv01voter2', 'wv01voter1', False),
+        })
+
+        current_friend.viewee_voter_we_vote_id = 'wv01voter3'
+        current_friend.save()
+        self.assertEqual(self.fetch_friend_edge_set(CURRENT_FRIENDS), {
+            (current_friend.id, 'wv01voter1', 'wv01voter3', True),
+            (current_friend.id, 'wv01voter3', 'wv01voter1', False),
+        })
+
+        current_friend.delete()
+        self.assertEqual(FriendEdge.objects.count(), 0)
+
+    def test_friend_edges_follow_queryset_delete(self):
+        SuggestedFriend.objects.create(viewer_voter_we_vote_id='wv01voter1', viewee_voter_we_vote_id='wv01voter2')
+        SuggestedFriend.objects.create(viewer_voter_we_vote_id='wv01voter1', viewee_voter_we_vote_id='wv01voter3')
+        self.assertEqual(FriendEdge.objects.filter(kind_of_edge=SUGGESTED_FRIEND_LIST).count(), 4)
+        SuggestedFriend.objects.filter(viewer_voter_we_vote_id='wv01voter1').delete()
+        self.assertEqual(FriendEdge.objects.count(), 0)
+
+    def test_friend_edges_for_bulk_created_suggestions(self):
+        CurrentFriend.objects.create(viewer_voter_we_vote_id='wv01voter1', viewee_voter_we_vote_id='wv01voter2')
+        CurrentFriend.objects.create(viewer_voter_we_vote_id='wv01voter1', viewee_voter_we_vote_id='wv01voter3')
+        # update_suggested_friends_starting_with_one_voter saves the new suggestions with bulk_create, which
+        #  doesn't send post_save
+        FriendManager().update_suggested_friends_starting_with_one_voter('wv01voter1')
+        suggested_friend = SuggestedFriend.objects.get()
+        self.assertEqual(self.fetch_friend_edge_set(SUGGESTED_FRIEND_LIST), {
+            (suggested_friend.id, 'wv01voter2', 'wv01voter3', True),
+            (suggested_friend.id, 'wv01voter3', 'wv01voter2', False),
+        })
+
+    def test_rebuild_repairs_missing_and_stale_edges(self):
+        current_friend = CurrentFriend.objects.create(
+            viewer_voter_we_vote_id='wv01voter1', viewee_voter_we_vote_id='wv01voter2')
+        FriendEdge.objects.all().delete()
+        FriendEdge.objects.create(kind_of_edge=CURRENT_FRIENDS, friend_entry_id=current_friend.id + 1000,
+                                  voter_we_vote_id='wv01voter8', other_voter_we_vote_id='wv01voter9',
+                                  voter_is_viewer=True)
+        results = rebuild_all_friend_edges()
+        self.assertTrue(results['success'])
+        self.assertEqual(self.fetch_friend_edge_set(CURRENT_FRIENDS), {
+            (current_friend.id, 'wv01voter1', 'wv01voter2', True),
+            (current_friend.id, 'wv01voter2', 'wv01voter1', False),
+        })
@@ -3,8 +3,10 @@
 # -*- coding: UTF-8 -*-
 
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from django.db import connection
 from django.db.models import Q
 
 import wevote_functions.admin
@@ -18,18 +20,19 @@ from position.controllers import reset_all_position_image_details_from_candidate
     reset_position_for_friends_image_details_from_voter, reset_position_entered_image_details_from_organization, \
     update_all_position_details_from_candidate
 from twitter.functions import retrieve_twitter_user_info
-from twitter.models import TwitterUserManager
+from twitter.models import TwitterLinkToOrganization, TwitterUserManager
 from voter.models import VoterManager, VoterDeviceLink, VoterDeviceLinkManager, VoterAddressManager, VoterAddress, Voter
 from voter_guide.models import VoterGuideManager
 from wevote_functions.functions import positive_value_exists, convert_to_int
-from .functions import analyze_remote_url, analyze_image_file, analyze_image_in_memory
+from .functions import analyze_remote_url, analyze_image_bytes, analyze_image_file, analyze_image_in_memory, \
+    calculate_image_content_hash
 from .models import WeVoteImageManager, WeVoteImage, \
     CHOSEN_FAVICON_NAME, CHOSEN_LOGO_NAME, CHOSEN_SOCIAL_SHARE_IMAGE_NAME, \
     FACEBOOK_PROFILE_IMAGE_NAME, FACEBOOK_BACKGROUND_IMAGE_NAME, \
     TWITTER_PROFILE_IMAGE_NAME, TWITTER_BACKGROUND_IMAGE_NAME, TWITTER_BANNER_IMAGE_NAME, MAPLIGHT_IMAGE_NAME, \
     MASTER_IMAGE, ISSUE_IMAGE_NAME, BALLOTPEDIA_IMAGE_NAME, CAMPAIGNX_PHOTO_IMAGE_NAME, CTCL_PROFILE_IMAGE_NAME, \
     LINKEDIN_IMAGE_NAME, VOTE_SMART_IMAGE_NAME, VOTE_USA_PROFILE_IMAGE_NAME, VOTER_UPLOADED_IMAGE_NAME, \
-    WIKIPEDIA_IMAGE_NAME
+    WIKIPEDIA_IMAGE_NAME, IMAGE_PIPELINE_NUMBER_OF_WORKERS
 
 logger = wevote_functions.admin.get_logger(__name__)
 HTTP_OK = 200
@@ -117,39 +120,53 @@ def log_and_time_cache_action(start, time0, name):
             return 0
 
 
+def run_image_pipeline_in_parallel(image_function, argument_list, number_of_workers=IMAGE_PIPELINE_NUMBER_OF_WORKERS):
+    """
+    Run image_function once for each entry in argument_list on a bounded pool of worker threads. Each worker
+    downloads over its own pooled HTTP session, and uploads through the shared S3 client.
+    :param image_function:
+    :param argument_list: Each entry is passed to image_function as its only argument. Entries must not share an
+     owner (voter, organization, candidate...), since same_day_image_version is calculated from the images
+     already saved for that owner.
+    :param number_of_workers:
+    :return: list of results from image_function, in the same order as argument_list
+    """
+    def run_one(argument):
+        # One bad image shouldn't stop the rest
+        try:
+            return image_function(argument)
+        except Exception as e:
+            return {
+                'success':  False,
+                'status':   "IMAGE_PIPELINE_WORKER_FAILED: " + str(e) + " ",
+            }
+
+    def run_one_in_worker_thread(argument):
+        try:
+            return run_one(argument)
+        finally:
+            # Each worker thread opens its own database connection
+            connection.close()
+
+    if number_of_workers <= 1 or len(argument_list) <= 1:
+        return [run_one(argument) for argument in argument_list]
+    with ThreadPoolExecutor(max_workers=number_of_workers) as executor:
+        return list(executor.map(run_one_in_worker_thread, argument_list))
+
+
 def cache_all_kind_of_images_locally_for_all_organizations():
     """
     Cache all kind of images locally for all organizations
     :return:
     """
     time0 = log_and_time_cache_action(True, 0, 'cache_all_kind_of_images_locally_for_all_organizations')
-    cache_images_locally_for_all_organizations_results = []
-
-    # TODO Update this for organizations
-    # voter_list = Voter.objects.all()
-    #
-    # # If there is a value in twitter_id OR facebook_id, return the voter
-    # image_filters = []
-    # new_filter = Q(twitter_id__isnull=False)
-    # image_filters.append(new_filter)
-    # new_filter = Q(facebook_id__isnull=False)
-    # image_filters.append(new_filter)
-    #
-    # # Add the first query
-    # final_filters = image_filters.pop()
-    #
-    # # ...and "OR" the remaining items in the list
-    # for item in image_filters:
-    #     final_filters |= item
-    #
-    # # voter_list = voter_list.filter(final_filters)
-    # voter_list = voter_list.order_by('-is_admin', '-is_verified_volunteer', 'facebook_email', 'twitter_screen_name',
-    #                                  'last_name', 'first_name')
-    # voter_list = voter_list[:200]  # Limit to 200 for now
-    #
-    # for voter in voter_list:
-    #     cache_images_for_one_organization_results = migrate_remote_voter_image_urls_to_local_cache(voter.id)
-    #     cache_images_locally_for_all_organizations_results.append(cache_images_for_one_organization_results)
+    # cache_organization_master_images only caches Twitter images, so only look at organizations linked to Twitter
+    organization_we_vote_id_list = list(TwitterLinkToOrganization.objects.all()
+                                        .order_by('organization_we_vote_id')
+                                        .values_list('organization_we_vote_id', flat=True)
+                                        .distinct()[:200])  # Limit to 200 for now, as with voters
+    cache_images_locally_for_all_organizations_results = run_image_pipeline_in_parallel(
+        cache_organization_master_images, organization_we_vote_id_list)
 
     log_and_time_cache_action(False, time0, 'cache_all_kind_of_images_locally_for_all_organizations')
     return cache_images_locally_for_all_organizations_results
@@ -161,8 +178,6 @@ def cache_all_kind_of_images_locally_for_all_voters():
     :return:
     """
     time0 = log_and_time_cache_action(True, 0, 'cache_all_kind_of_images_locally_for_all_voters')
-    cache_images_locally_for_all_voters_results = []
-
     voter_list = Voter.objects.all()
 
     # If there is a value in twitter_id OR facebook_id, return the voter
@@ -182,11 +197,10 @@ def cache_all_kind_of_images_locally_for_all_voters():
     # voter_list = voter_list.filter(final_filters)
     voter_list = voter_list.order_by('-is_admin', '-is_verified_volunteer', 'facebook_email', 'twitter_screen_name',
                                      'last_name', 'first_name')
-    voter_list = voter_list[:200]  # Limit to 200 for now
+    voter_id_list = list(voter_list.values_list('id', flat=True)[:200])  # Limit to 200 for now
 
-    for voter in voter_list:
-        cache_images_for_a_voter_results = cache_voter_master_images(voter.id)
-        cache_images_locally_for_all_voters_results.append(cache_images_for_a_voter_results)
+    cache_images_locally_for_all_voters_results = run_image_pipeline_in_parallel(
+        cache_voter_master_images, voter_id_list)
 
     log_and_time_cache_action(False, time0, 'cache_all_kind_of_images_locally_for_all_voters')
     return cache_images_locally_for_all_voters_results
@@ -427,7 +441,8 @@ def cache_organization_master_images(organization_we_vote_id):
         cache_all_kind_of_images_results['cached_twitter_profile_image'] = TWITTER_URL_NOT_FOUND
     else:
         cache_all_kind_of_images_results['cached_twitter_profile_image'] = cache_image_if_not_cached(
-            google_civic_election_id, twitter_profile_image_url_https, organization_we_vote_id=organization_we_vote_id,
+            google_civic_election_id=google_civic_election_id,
+            image_url_https=twitter_profile_image_url_https, organization_we_vote_id=organization_we_vote_id,
             twitter_id=twitter_id, twitter_screen_name=twitter_screen_name, is_active_version=True,
             kind_of_image_twitter_profile=True, kind_of_image_original=True)
 
@@ -435,7 +450,8 @@ def cache_organization_master_images(organization_we_vote_id):
         cache_all_kind_of_images_results['cached_twitter_background_image'] = TWITTER_URL_NOT_FOUND
     else:
         cache_all_kind_of_images_results['cached_twitter_background_image'] = cache_image_if_not_cached(
-            google_civic_election_id, twitter_profile_background_image_url_https,
+            google_civic_election_id=google_civic_election_id,
+            image_url_https=twitter_profile_background_image_url_https,
             organization_we_vote_id=organization_we_vote_id, twitter_id=twitter_id,
             twitter_screen_name=twitter_screen_name, is_active_version=True,
             kind_of_image_twitter_background=True, kind_of_image_original=True)
@@ -444,7 +460,8 @@ def cache_organization_master_images(organization_we_vote_id):
         cache_all_kind_of_images_results['cached_twitter_banner_image'] = TWITTER_URL_NOT_FOUND
     else:
         cache_all_kind_of_images_results['cached_twitter_banner_image'] = cache_image_if_not_cached(
-            google_civic_election_id, twitter_profile_banner_url_https,
+            google_civic_election_id=google_civic_election_id,
+            image_url_https=twitter_profile_banner_url_https,
             organization_we_vote_id=organization_we_vote_id, twitter_id=twitter_id,
             twitter_screen_name=twitter_screen_name, is_active_version=True,
             kind_of_image_twitter_banner=True, kind_of_image_original=True)
@@ -566,8 +583,8 @@ def cache_voter_master_images(voter_id):
             cache_all_kind_of_images_results['cached_twitter_profile_image'] = TWITTER_URL_NOT_FOUND
         else:
             cache_all_kind_of_images_results['cached_twitter_profile_image'] = cache_image_if_not_cached(
-                google_civic_election_id,
-                twitter_profile_image_url_https,
+                google_civic_election_id=google_civic_election_id,
+                image_url_https=twitter_profile_image_url_https,
                 voter_we_vote_id=voter.we_vote_id,
                 twitter_id=twitter_id,
                 twitter_screen_name=twitter_screen_name,
@@ -579,8 +596,8 @@ def cache_voter_master_images(voter_id):
             cache_all_kind_of_images_results['cached_twitter_background_image'] = TWITTER_URL_NOT_FOUND
         else:
             cache_all_kind_of_images_results['cached_twitter_background_image'] = cache_image_if_not_cached(
-                google_civic_election_id,
-                twitter_profile_background_image_url_https,
+                google_civic_election_id=google_civic_election_id,
+                image_url_https=twitter_profile_background_image_url_https,
                 voter_we_vote_id=voter.we_vote_id,
                 twitter_id=twitter_id,
                 twitter_screen_name=twitter_screen_name,
@@ -592,8 +609,8 @@ def cache_voter_master_images(voter_id):
             cache_all_kind_of_images_results['cached_twitter_banner_image'] = TWITTER_URL_NOT_FOUND
         else:
             cache_all_kind_of_images_results['cached_twitter_banner_image'] = cache_image_if_not_cached(
-                google_civic_election_id,
-                twitter_profile_banner_url_https,
+                google_civic_election_id=google_civic_election_id,
+                image_url_https=twitter_profile_banner_url_https,
                 voter_we_vote_id=voter.we_vote_id,
                 twitter_id=twitter_id,
                 twitter_screen_name=twitter_screen_name,
@@ -615,8 +632,8 @@ def cache_voter_master_images(voter_id):
             cache_all_kind_of_images_results['cached_facebook_profile_image'] = FACEBOOK_URL_NOT_FOUND
         else:
             cache_all_kind_of_images_results['cached_facebook_profile_image'] = cache_image_if_not_cached(
-                google_civic_election_id,
-                facebook_profile_image_url_https,
+                google_civic_election_id=google_civic_election_id,
+                image_url_https=facebook_profile_image_url_https,
                 voter_we_vote_id=voter.we_vote_id,
                 facebook_user_id=facebook_id,
                 is_active_version=True,
@@ -627,8 +644,8 @@ def cache_voter_master_images(voter_id):
             cache_all_kind_of_images_results['cached_facebook_background_image'] = FACEBOOK_URL_NOT_FOUND
         else:
             cache_all_kind_of_images_results['cached_facebook_background_image'] = cache_image_if_not_cached(
-                google_civic_election_id,
-                facebook_background_image_url_https,
+                google_civic_election_id=google_civic_election_id,
+                image_url_https=facebook_background_image_url_https,
                 voter_we_vote_id=voter.we_vote_id,
                 facebook_user_id=facebook_id,
                 is_active_version=True,
@@ -772,6 +789,14 @@ def cache_image_locally(
     we_vote_image_created = True
     we_vote_image = create_we_vote_image_results['we_vote_image']
 
+    # Download the image into memory once. It is analyzed and uploaded from these same bytes.
+    retrieve_image_results = we_vote_image_manager.retrieve_image_bytes_from_url(image_url_https)
+    image_bytes = retrieve_image_results['image_bytes']
+    image_pipeline_report = {
+        'download_bytes':   retrieve_image_results['bytes'],
+        'download_seconds': retrieve_image_results['seconds'],
+    }
+
     # Image url validation and get source image properties
     analyze_source_images_results = analyze_source_images(
         twitter_id=twitter_id,
@@ -794,7 +819,8 @@ def cache_image_locally(
         kind_of_image_vote_usa_profile=kind_of_image_vote_usa_profile,
         kind_of_image_voter_uploaded_profile=kind_of_image_voter_uploaded_profile,
         kind_of_image_wikipedia_profile=kind_of_image_wikipedia_profile,
-        other_source=other_source)
+        other_source=other_source,
+        image_bytes=image_bytes if image_bytes is not None else b'')
 
     if 'analyze_image_url_results' not in analyze_source_images_results or \
             'image_url_valid' not in analyze_source_images_results['analyze_image_url_results'] or not \
@@ -947,8 +973,8 @@ def cache_image_locally(
         else:
             we_vote_image_file_location = we_vote_image_file_name
 
-        image_stored_locally = we_vote_image_manager.store_image_locally(
-            analyze_source_images_results['image_url_https'], we_vote_image_file_name)
+        # The image is held in memory, rather than stored in /tmp
+        image_stored_locally = image_bytes is not None
 
         if not image_stored_locally:
             error_results = {
@@ -965,9 +991,21 @@ def cache_image_locally(
             return error_results
 
         status += " IMAGE_STORED_LOCALLY "
-        image_stored_to_aws = we_vote_image_manager.store_image_to_aws(
-            we_vote_image_file_name, we_vote_image_file_location,
-            analyze_source_images_results['analyze_image_url_results']['image_format'])
+        source_image_content_hash = calculate_image_content_hash(image_bytes)
+        content_hash_results = we_vote_image_manager.retrieve_we_vote_image_from_content_hash(
+            source_image_content_hash, exclude_we_vote_image_id=we_vote_image.id)
+        if content_hash_results['we_vote_image_found'] and \
+                content_hash_results['we_vote_image'].we_vote_image_file_location.endswith('.' + str(image_format)):
+            # These exact bytes are already on AWS, so point at that object instead of uploading another copy
+            we_vote_image_file_location = content_hash_results['we_vote_image'].we_vote_image_file_location
+            image_stored_to_aws = True
+            status += " IMAGE_CONTENT_HASH_MATCHED "
+        else:
+            store_image_results = we_vote_image_manager.store_image_bytes_to_aws(
+                image_bytes, we_vote_image_file_location,
+                analyze_source_images_results['analyze_image_url_results']['image_format'])
+            image_stored_to_aws = store_image_results['success']
+            image_pipeline_report['upload_seconds'] = store_image_results['seconds']
         if not image_stored_to_aws:
             error_results = {
                 'success':                      success,
@@ -984,9 +1022,9 @@ def cache_image_locally(
         we_vote_image_url = "https://{bucket_name}.s3.amazonaws.com/{we_vote_image_file_location}" \
                             "".format(bucket_name=AWS_STORAGE_BUCKET_NAME,
                                       we_vote_image_file_location=we_vote_image_file_location)
-        save_aws_info = we_vote_image_manager.save_we_vote_image_aws_info(we_vote_image, we_vote_image_url,
-                                                                          we_vote_image_file_location,
-                                                                          we_vote_parent_image_id, is_active_version)
+        save_aws_info = we_vote_image_manager.save_we_vote_image_aws_info(
+            we_vote_image, we_vote_image_url, we_vote_image_file_location, we_vote_parent_image_id,
+            is_active_version, source_image_content_hash=source_image_content_hash)
         status += " IMAGE_STORED_TO_AWS " + save_aws_info['status'] + " "
         success = save_aws_info['success']
         if not success:
@@ -1026,6 +1064,7 @@ def cache_image_locally(
         'image_stored_from_source':     image_stored_from_source,
         'image_stored_locally':         image_stored_locally,
         'image_stored_to_aws':          image_stored_to_aws,
+        'image_pipeline_report':        image_pipeline_report,
     }
     log_and_time_cache_action(False, time0, 'cache_image_locally -- final')
     return results
@@ -1202,7 +1241,8 @@ def analyze_source_images(
         kind_of_image_vote_usa_profile=False,
         kind_of_image_voter_uploaded_profile=False,
         kind_of_image_wikipedia_profile=False,
-        other_source=False):
+        other_source=False,
+        image_bytes=None):
     """
 
     :param twitter_id:
@@ -1227,6 +1267,7 @@ def analyze_source_images(
     :param kind_of_image_voter_uploaded_profile:
     :param kind_of_image_wikipedia_profile:
     :param other_source:
+    :param image_bytes: When image_url_https has already been downloaded, analyze these bytes instead
     :return:
     """
     image_type = None
@@ -1261,7 +1302,10 @@ def analyze_source_images(
     elif kind_of_image_wikipedia_profile:
         image_type = WIKIPEDIA_IMAGE_NAME
 
-    analyze_image_url_results = analyze_remote_url(image_url_https)
+    if image_bytes is not None:
+        analyze_image_url_results = analyze_image_bytes(image_bytes)
+    else:
+        analyze_image_url_results = analyze_remote_url(image_url_https)
     results = {
         'twitter_id':                   twitter_id,
         'twitter_screen_name':          twitter_screen_name,
@@ -1275,20 +1319,103 @@ def analyze_source_images(
     return results
 
 
+def group_we_vote_image_list_by_owner(we_vote_image_list):
+    """
+    Split master images into one list per voter, campaignx, candidate, organization or issue, so the image
+    pipeline workers never calculate same_day_image_version for the same owner at the same time
+    :param we_vote_image_list:
+    :return:
+    """
+    we_vote_image_list_by_owner = {}
+    for we_vote_image in we_vote_image_list:
+        owner_key = (we_vote_image.voter_we_vote_id, we_vote_image.campaignx_we_vote_id,
+                     we_vote_image.candidate_we_vote_id, we_vote_image.organization_we_vote_id,
+                     we_vote_image.issue_we_vote_id)
+        we_vote_image_list_by_owner.setdefault(owner_key, []).append(we_vote_image)
+    return list(we_vote_image_list_by_owner.values())
+
+
+def create_resized_images_for_image_list(we_vote_image_list):
+    create_resized_images_results_list = []
+    for we_vote_image in we_vote_image_list:
+        try:
+            create_resized_images_results = create_resized_image_if_not_created(we_vote_image)
+        except Exception as e:
+            create_resized_images_results = {
+                'success':  False,
+                'status':   "CREATE_RESIZED_IMAGE_FAILED: " + str(e) + " ",
+            }
+        create_resized_images_results_list.append(create_resized_images_results)
+    return create_resized_images_results_list
+
+
+def backfill_we_vote_image_content_hashes(chunk_size=500, number_of_workers=IMAGE_PIPELINE_NUMBER_OF_WORKERS):
+    """
+    Calculate source_image_content_hash for original images stored before it was added, by downloading each one
+    from AWS
+    :param chunk_size: Number of images hashed and saved per pass
+    :param number_of_workers:
+    :return:
+    """
+    status = ""
+    success = True
+    images_hashed = 0
+    images_failed = 0
+    we_vote_image_manager = WeVoteImageManager()
+
+    def calculate_hash_from_aws(we_vote_image_file_location):
+        retrieve_results = we_vote_image_manager.retrieve_image_bytes_from_aws(we_vote_image_file_location)
+        return calculate_image_content_hash(retrieve_results['image_bytes'])
+
+    we_vote_image_id_list = list(WeVoteImage.objects.filter(
+        kind_of_image_original=True,
+        source_image_content_hash__isnull=True,
+        we_vote_image_file_location__isnull=False,
+    ).exclude(we_vote_image_file_location='').order_by('id').values_list('id', flat=True))
+    for start in range(0, len(we_vote_image_id_list), chunk_size):
+        we_vote_image_list = list(WeVoteImage.objects.filter(
+            id__in=we_vote_image_id_list[start:start + chunk_size]))
+        source_image_content_hash_list = run_image_pipeline_in_parallel(
+            calculate_hash_from_aws,
+            [we_vote_image.we_vote_image_file_location for we_vote_image in we_vote_image_list],
+            number_of_workers=number_of_workers)
+        hashed_we_vote_image_list = []
+        for we_vote_image, source_image_content_hash in zip(we_vote_image_list, source_image_content_hash_list):
+            if isinstance(source_image_content_hash, str):
+                we_vote_image.source_image_content_hash = source_image_content_hash
+                hashed_we_vote_image_list.append(we_vote_image)
+            else:
+                images_failed += 1
+        try:
+            WeVoteImage.objects.bulk_update(hashed_we_vote_image_list, ['source_image_content_hash'])
+            images_hashed += len(hashed_we_vote_image_list)
+        except Exception as e:
+            status += "BACKFILL_WE_VOTE_IMAGE_CONTENT_HASHES_FAILED: " + str(e) + " "
+            success = False
+            images_failed += len(hashed_we_vote_image_list)
+
+    results = {
+        'success':          success,
+        'status':           status,
+        'images_hashed':    images_hashed,
+        'images_failed':    images_failed,
+    }
+    return results
+
+
 def create_resized_images_for_all_organizations():
     """
     Create resized images for all organizations
     :return:
     """
     time0 = log_and_time_cache_action(True, 0, 'create_resized_images_for_all_organizations')
-    create_all_resized_images_results = []
-    we_vote_image_list = WeVoteImage.objects.all()
+    we_vote_image_list = WeVoteImage.objects.filter(kind_of_image_original=True)
     # TODO Limit this to organizations only
 
-    for we_vote_image in we_vote_image_list:
-        # Iterate through all cached images
-        create_resized_images_results = create_resized_image_if_not_created(we_vote_image)
-        create_all_resized_images_results.append(create_resized_images_results)
+    create_all_resized_images_results = []
+    for create_resized_images_results_list in run_image_pipeline_in_parallel(
+            create_resized_images_for_image_list, group_we_vote_image_list_by_owner(we_vote_image_list)):
+        create_all_resized_images_results += create_resized_images_results_list
     log_and_time_cache_action(True, time0, 'create_resized_images_for_all_organizations')
     return create_all_resized_images_results
 
@@ -1299,14 +1426,13 @@ def create_resized_images_for_all_voters():
     :return:
     """
     time0 = log_and_time_cache_action(True, 0, 'create_resized_images_for_all_voters')
-    create_all_resized_images_results = []
-    we_vote_image_list = WeVoteImage.objects.all()
+    we_vote_image_list = WeVoteImage.objects.filter(kind_of_image_original=True)
     # TODO Limit this to voters only
 
-    for we_vote_image in we_vote_image_list:
-        # Iterate through all cached images
-        create_resized_images_results = create_resized_image_if_not_created(we_vote_image)
-        create_all_resized_images_results.append(create_resized_images_results)
+    create_all_resized_images_results = []
+    for create_resized_images_results_list in run_image_pipeline_in_parallel(
+            create_resized_images_for_image_list, group_we_vote_image_list_by_owner(we_vote_image_list)):
+        create_all_resized_images_results += create_resized_images_results_list
     log_and_time_cache_action(False, time0, 'create_resized_images_for_all_voters')
     return create_all_resized_images_results
 
@@ -1895,25 +2021,10 @@ def cache_campaignx_image(
 
     we_vote_image_file_location = campaignx_we_vote_id + "/" + we_vote_image_file_name
 
-    image_stored_locally = we_vote_image_manager.store_python_image_locally(
-        python_image_library_image, we_vote_image_file_name)
-
-    if not image_stored_locally:
-        error_results = {
-            'success': success,
-            'status': status + " IMAGE_NOT_STORED_LOCALLY ",
-            'we_vote_image_created': we_vote_image_created,
-            'image_url_valid': image_url_valid,
-            'image_stored_from_source': image_stored_from_source,
-            'image_stored_locally': False,
-            'image_stored_to_aws': image_stored_to_aws,
-        }
-        delete_we_vote_image_results = we_vote_image_manager.delete_we_vote_image(we_vote_image)
-        log_and_time_cache_action(True, time0, 'cache_campaignx_image -- not image_stored_locally')
-        return error_results
-
-    image_stored_to_aws = we_vote_image_manager.store_image_to_aws(
-        we_vote_image_file_name, we_vote_image_file_location, image_format)
+    # Encoded in memory and uploaded with put_object, rather than stored in /tmp
+    store_image_results = we_vote_image_manager.store_python_image_to_aws(
+        python_image_library_image, we_vote_image_file_location, image_format)
+    image_stored_to_aws = store_image_results['success']
     if not image_stored_to_aws:
         error_results = {
             'success':                      success,
@@ -2098,25 +2209,10 @@ def cache_voter_master_uploaded_image(
 
     we_vote_image_file_location = voter_we_vote_id + "/" + we_vote_image_file_name
 
-    image_stored_locally = we_vote_image_manager.store_python_image_locally(
-        python_image_library_image, we_vote_image_file_name)
-
-    if not image_stored_locally:
-        error_results = {
-            'success': success,
-            'status': status + " IMAGE_NOT_STORED_LOCALLY ",
-            'we_vote_image_created': we_vote_image_created,
-            'image_url_valid': image_url_valid,
-            'image_stored_from_source': image_stored_from_source,
-            'image_stored_locally': False,
-            'image_stored_to_aws': image_stored_to_aws,
-        }
-        delete_we_vote_image_results = we_vote_image_manager.delete_we_vote_image(we_vote_image)
-        log_and_time_cache_action(True, time0, 'cache_voter_master_uploaded_image -- not image_stored_locally')
-        return error_results
-
-    image_stored_to_aws = we_vote_image_manager.store_image_to_aws(
-        we_vote_image_file_name, we_vote_image_file_location, image_format)
+    # Encoded in memory and uploaded with put_object, rather than stored in /tmp
+    store_image_results = we_vote_image_manager.store_python_image_to_aws(
+        python_image_library_image, we_vote_image_file_location, image_format)
+    image_stored_to_aws = store_image_results['success']
     if not image_stored_to_aws:
         error_results = {
             'success':                      success,
@@ -2258,6 +2354,7 @@ def create_resized_image_if_not_created(we_vote_image):
         'cached_large_image':                       False,
         'cached_medium_image':                      False,
         'cached_tiny_image':                        False,
+        'image_pipeline_report':                    {},
     }
 
     if we_vote_image.kind_of_image_ballotpedia_profile:
@@ -2316,6 +2413,56 @@ def create_resized_image_if_not_created(we_vote_image):
         organization_we_vote_id=we_vote_image.organization_we_vote_id,
         voter_we_vote_id=we_vote_image.voter_we_vote_id,
     )
+    # Only some of our kinds of images have medium or tiny sizes
+    has_medium_and_tiny_sizes = \
+        we_vote_image.kind_of_image_ballotpedia_profile or \
+        we_vote_image.kind_of_image_campaignx_photo or \
+        we_vote_image.kind_of_image_ctcl_profile or \
+        we_vote_image.kind_of_image_facebook_profile or \
+        we_vote_image.kind_of_image_linkedin_profile or \
+        we_vote_image.kind_of_image_maplight or \
+        we_vote_image.kind_of_image_twitter_profile or \
+        we_vote_image.kind_of_image_vote_smart or \
+        we_vote_image.kind_of_image_vote_usa_profile or \
+        we_vote_image.kind_of_image_voter_uploaded_profile or \
+        we_vote_image.kind_of_image_wikipedia_profile or \
+        we_vote_image.kind_of_image_other_source
+    # Resized images already made from another original with exactly the same bytes can be reused
+    we_vote_image_manager = WeVoteImageManager()
+    if we_vote_image.kind_of_image_facebook_background:
+        # Cropped with this owner's own offset, so not shared
+        content_hash_we_vote_image_list = []
+    else:
+        content_hash_we_vote_image_list = \
+            we_vote_image_manager.retrieve_resized_we_vote_image_list_from_content_hash(
+                we_vote_image.source_image_content_hash, exclude_we_vote_parent_image_id=we_vote_image.id)
+    large_content_hash_match = any(image.kind_of_image_large for image in content_hash_we_vote_image_list)
+    medium_content_hash_match = any(image.kind_of_image_medium for image in content_hash_we_vote_image_list)
+    tiny_content_hash_match = any(image.kind_of_image_tiny for image in content_hash_we_vote_image_list)
+
+    # Download and decode the source image once, and make every missing size from it
+    source_image = None
+    if not positive_value_exists(image_url_https):
+        pass
+    elif (not resized_version_exists_results['large_image_version_exists'] and not large_content_hash_match) or \
+            (has_medium_and_tiny_sizes and
+             ((not resized_version_exists_results['medium_image_version_exists'] and not medium_content_hash_match) or
+              (not resized_version_exists_results['tiny_image_version_exists'] and not tiny_content_hash_match))):
+        if we_vote_image.kind_of_image_campaignx_photo:
+            largest_width, largest_height = CAMPAIGN_PHOTO_LARGE_MAX_WIDTH, CAMPAIGN_PHOTO_LARGE_MAX_HEIGHT
+        elif we_vote_image.kind_of_image_facebook_background:
+            largest_width, largest_height = SOCIAL_BACKGROUND_IMAGE_WIDTH, SOCIAL_BACKGROUND_IMAGE_HEIGHT
+        else:
+            largest_width, largest_height = PROFILE_IMAGE_LARGE_WIDTH, PROFILE_IMAGE_LARGE_HEIGHT
+        retrieve_source_image_results = we_vote_image_manager.retrieve_source_image(
+            image_url_https, largest_width=largest_width, largest_height=largest_height)
+        source_image = retrieve_source_image_results['source_image']
+        create_resized_image_results['image_pipeline_report'].update({
+            'download_bytes':   retrieve_source_image_results['bytes'],
+            'download_seconds': retrieve_source_image_results['download_seconds'],
+            'decode_seconds':   retrieve_source_image_results['decode_seconds'],
+        })
+
     if not resized_version_exists_results['large_image_version_exists']:
         # Large version does not exist so create resize image and cache it
         cache_resized_image_locally_results = cache_resized_image_locally(
@@ -2348,26 +2495,18 @@ def create_resized_image_if_not_created(we_vote_image):
             other_source=we_vote_image.other_source,
             twitter_id=we_vote_image.twitter_id,
             vote_smart_id=we_vote_image.vote_smart_id,
+            content_hash_we_vote_image_list=content_hash_we_vote_image_list,
+            source_image=source_image,
             voter_we_vote_id=we_vote_image.voter_we_vote_id,
             we_vote_parent_image_id=we_vote_image.id,
         )
         create_resized_image_results['cached_large_image'] = cache_resized_image_locally_results['success']
+        create_resized_image_results['image_pipeline_report']['large'] = \
+            cache_resized_image_locally_results.get('image_pipeline_report', {})
     else:
         create_resized_image_results['cached_large_image'] = IMAGE_ALREADY_CACHED
 
-    # Only some of our kinds of images have medium or tiny sizes
-    if we_vote_image.kind_of_image_ballotpedia_profile or \
-            we_vote_image.kind_of_image_campaignx_photo or \
-            we_vote_image.kind_of_image_ctcl_profile or \
-            we_vote_image.kind_of_image_facebook_profile or \
-            we_vote_image.kind_of_image_linkedin_profile or \
-            we_vote_image.kind_of_image_maplight or \
-            we_vote_image.kind_of_image_twitter_profile or \
-            we_vote_image.kind_of_image_vote_smart or \
-            we_vote_image.kind_of_image_vote_usa_profile or \
-            we_vote_image.kind_of_image_voter_uploaded_profile or \
-            we_vote_image.kind_of_image_wikipedia_profile or \
-            we_vote_image.kind_of_image_other_source:
+    if has_medium_and_tiny_sizes:
         if not resized_version_exists_results['medium_image_version_exists']:
             # Medium version does not exist so create resize image and cache it
             cache_resized_image_locally_results = cache_resized_image_locally(
@@ -2400,10 +2539,14 @@ def create_resized_image_if_not_created(we_vote_image):
                 other_source=we_vote_image.other_source,
                 twitter_id=we_vote_image.twitter_id,
                 vote_smart_id=we_vote_image.vote_smart_id,
+                content_hash_we_vote_image_list=content_hash_we_vote_image_list,
+                source_image=source_image,
                 voter_we_vote_id=we_vote_image.voter_we_vote_id,
                 we_vote_parent_image_id=we_vote_image.id,
             )
             create_resized_image_results['cached_medium_image'] = cache_resized_image_locally_results['success']
+            create_resized_image_results['image_pipeline_report']['medium'] = \
+                cache_resized_image_locally_results.get('image_pipeline_report', {})
         else:
             create_resized_image_results['cached_medium_image'] = IMAGE_ALREADY_CACHED
 
@@ -2439,10 +2582,14 @@ def create_resized_image_if_not_created(we_vote_image):
                 other_source=we_vote_image.other_source,
                 twitter_id=we_vote_image.twitter_id,
                 vote_smart_id=we_vote_image.vote_smart_id,
+                content_hash_we_vote_image_list=content_hash_we_vote_image_list,
+                source_image=source_image,
                 voter_we_vote_id=we_vote_image.voter_we_vote_id,
                 we_vote_parent_image_id=we_vote_image.id,
             )
             create_resized_image_results['cached_tiny_image'] = cache_resized_image_locally_results['success']
+            create_resized_image_results['image_pipeline_report']['tiny'] = \
+                cache_resized_image_locally_results.get('image_pipeline_report', {})
         else:
             create_resized_image_results['cached_tiny_image'] = IMAGE_ALREADY_CACHED
     log_and_time_cache_action(False, time0, 'create_resized_image_if_not_created')
@@ -2653,6 +2800,8 @@ def cache_resized_image_locally(
         maplight_id=None,
         organization_we_vote_id=None,
         other_source=None,
+        content_hash_we_vote_image_list=None,
+        source_image=None,
         twitter_id=None,
         vote_smart_id=None,
         voter_we_vote_id=None,
@@ -2693,6 +2842,10 @@ def cache_resized_image_locally(
     :param maplight_id:
     :param organization_we_vote_id:
     :param other_source:
+    :param content_hash_we_vote_image_list: Resized images made from an original with the same
+     source_image_content_hash, from WeVoteImageManager.retrieve_resized_we_vote_image_list_from_content_hash
+    :param source_image: Decoded image from WeVoteImageManager.retrieve_source_image, so image_url_https doesn't
+     have to be downloaded again for each size. When None, image_url_https is downloaded into memory here.
     :param twitter_id:
     :param vote_smart_id:
     :param voter_we_vote_id:
@@ -2709,6 +2862,7 @@ def cache_resized_image_locally(
     image_stored_to_aws = False
     image_versions = []
     we_vote_image_file_location = None
+    image_pipeline_report = {}
 
     we_vote_image_manager = WeVoteImageManager()
 
@@ -2985,58 +3139,94 @@ def cache_resized_image_locally(
         elif issue_we_vote_id:
             we_vote_image_file_location = issue_we_vote_id + "/" + we_vote_image_file_name
 
-        image_stored_locally = we_vote_image_manager.store_image_locally(
-                image_url_https, we_vote_image_file_name)
-        if not image_stored_locally:
-            error_results = {
-                'success':                      success,
-                'status':                       status + " IMAGE_NOT_STORED_LOCALLY ",
-                'we_vote_image_created':        we_vote_image_created,
-                'image_stored_from_source':     image_stored_from_source,
-                'image_stored_locally':         False,
-                'resized_image_created':        resized_image_created,
-                'image_stored_to_aws':          image_stored_to_aws,
-            }
-            delete_we_vote_image_results = we_vote_image_manager.delete_we_vote_image(we_vote_image)
-            return error_results
-
-        status += " IMAGE_STORED_LOCALLY "
-        resized_image_created = we_vote_image_manager.resize_we_vote_master_image(
-            image_local_path=we_vote_image_file_name,
-            image_width=image_width,
-            image_height=image_height,
-            image_type=image_type,
-            image_offset_x=image_offset_x,
-            image_offset_y=image_offset_y,
-            convert_image_to_jpg=convert_image_to_jpg)
-        if not resized_image_created:
-            error_results = {
-                'success':                      success,
-                'status':                       status + " IMAGE_NOT_STORED_LOCALLY ",
-                'we_vote_image_created':        we_vote_image_created,
-                'image_stored_from_source':     image_stored_from_source,
-                'image_stored_locally':         image_stored_locally,
-                'resized_image_created':        False,
-                'image_stored_to_aws':          image_stored_to_aws,
-            }
-            delete_we_vote_image_results = we_vote_image_manager.delete_we_vote_image(we_vote_image)
-            return error_results
-
-        status += " RESIZED_IMAGE_CREATED "
-        image_stored_to_aws = we_vote_image_manager.store_image_to_aws(
-            we_vote_image_file_name, we_vote_image_file_location, image_format_filtered)
-        if not image_stored_to_aws:
-            error_results = {
-                'success':                      success,
-                'status':                       status + " IMAGE_NOT_STORED_TO_AWS",
-                'we_vote_image_created':        we_vote_image_created,
-                'image_stored_from_source':     image_stored_from_source,
-                'image_stored_locally':         image_stored_locally,
-                'resized_image_created':        resized_image_created,
-                'image_stored_to_aws':          False,
-            }
-            delete_we_vote_image_results = we_vote_image_manager.delete_we_vote_image(we_vote_image)
-            return error_results
+        # Resized images of exactly the same bytes, of the same image_type, size and format, can share one S3
+        #  object. The image_type has to match too, since twitter backgrounds and banners are stretched to size
+        #  while the other kinds of images are cropped to size.
+        content_hash_match = None
+        resized_file_name_beginning = "{image_type}-".format(image_type=image_type)
+        resized_file_name_ending = "_{image_width}x{image_height}.{image_format}".format(
+            image_width=str(image_width), image_height=str(image_height), image_format=str(image_format_filtered))
+        for content_hash_we_vote_image in content_hash_we_vote_image_list or []:
+            content_hash_file_name = str(content_hash_we_vote_image.we_vote_image_file_location).split("/")[-1]
+            if content_hash_we_vote_image.kind_of_image_large == kind_of_image_large and \
+                    content_hash_we_vote_image.kind_of_image_medium == kind_of_image_medium and \
+                    content_hash_we_vote_image.kind_of_image_tiny == kind_of_image_tiny and \
+                    content_hash_file_name.startswith(resized_file_name_beginning) and \
+                    content_hash_file_name.endswith(resized_file_name_ending):
+                content_hash_match = content_hash_we_vote_image
+                break
+
+        if content_hash_match is not None:
+            we_vote_image_file_location = content_hash_match.we_vote_image_file_location
+            image_stored_locally = True
+            resized_image_created = True
+            image_stored_to_aws = True
+            status += " RESIZED_IMAGE_CONTENT_HASH_MATCHED "
+        else:
+            if source_image is None:
+                retrieve_source_image_results = we_vote_image_manager.retrieve_source_image(
+                    image_url_https, largest_width=image_width, largest_height=image_height)
+                source_image = retrieve_source_image_results['source_image']
+                image_pipeline_report['download_bytes'] = retrieve_source_image_results['bytes']
+                image_pipeline_report['download_seconds'] = retrieve_source_image_results['download_seconds']
+                image_pipeline_report['decode_seconds'] = retrieve_source_image_results['decode_seconds']
+            # The source image is held in memory, rather than stored in /tmp
+            image_stored_locally = source_image is not None
+            if not image_stored_locally:
+                error_results = {
+                    'success':                      success,
+                    'status':                       status + " IMAGE_NOT_STORED_LOCALLY ",
+                    'we_vote_image_created':        we_vote_image_created,
+                    'image_stored_from_source':     image_stored_from_source,
+                    'image_stored_locally':         False,
+                    'resized_image_created':        resized_image_created,
+                    'image_stored_to_aws':          image_stored_to_aws,
+                }
+                delete_we_vote_image_results = we_vote_image_manager.delete_we_vote_image(we_vote_image)
+                return error_results
+
+            status += " IMAGE_STORED_LOCALLY "
+            resize_image_results = we_vote_image_manager.resize_image_in_memory(
+                source_image=source_image,
+                image_width=image_width,
+                image_height=image_height,
+                image_type=image_type,
+                image_offset_y=image_offset_y,
+                image_format=image_format_filtered,
+                convert_image_to_jpg=convert_image_to_jpg)
+            resized_image_created = resize_image_results['success']
+            image_pipeline_report['resize_seconds'] = resize_image_results['seconds']
+            image_pipeline_report['resized_bytes'] = resize_image_results['bytes']
+            if not resized_image_created:
+                error_results = {
+                    'success':                      success,
+                    'status':                       status + " IMAGE_NOT_STORED_LOCALLY ",
+                    'we_vote_image_created':        we_vote_image_created,
+                    'image_stored_from_source':     image_stored_from_source,
+                    'image_stored_locally':         image_stored_locally,
+                    'resized_image_created':        False,
+                    'image_stored_to_aws':          image_stored_to_aws,
+                }
+                delete_we_vote_image_results = we_vote_image_manager.delete_we_vote_image(we_vote_image)
+                return error_results
+
+            status += " RESIZED_IMAGE_CREATED "
+            store_image_results = we_vote_image_manager.store_image_bytes_to_aws(
+                resize_image_results['image_bytes'], we_vote_image_file_location, image_format_filtered)
+            image_stored_to_aws = store_image_results['success']
+            image_pipeline_report['upload_seconds'] = store_image_results['seconds']
+            if not image_stored_to_aws:
+                error_results = {
+                    'success':                      success,
+                    'status':                       status + " IMAGE_NOT_STORED_TO_AWS",
+                    'we_vote_image_created':        we_vote_image_created,
+                    'image_stored_from_source':     image_stored_from_source,
+                    'image_stored_locally':         image_stored_locally,
+                    'resized_image_created':        resized_image_created,
+                    'image_stored_to_aws':          False,
+                }
+                delete_we_vote_image_results = we_vote_image_manager.delete_we_vote_image(we_vote_image)
+                return error_results
 
         we_vote_image_url = "https://{bucket_name}.s3.amazonaws.com/{we_vote_image_file_location}" \
                             "".format(bucket_name=AWS_STORAGE_BUCKET_NAME,
@@ -3099,6 +3289,7 @@ def cache_resized_image_locally(
         'image_stored_locally':         image_stored_locally,
         'resized_image_created':        resized_image_created,
         'image_stored_to_aws':          image_stored_to_aws,
+        'image_pipeline_report':        image_pipeline_report,
     }
     log_and_time_cache_action(False, time0, 'cache_resized_image_locally')
     return results
@@ -4137,24 +4328,10 @@ def cache_organization_sharing_image(
 
     we_vote_image_file_location = organization_we_vote_id + "/" + we_vote_image_file_name
 
-    image_stored_locally = we_vote_image_manager.store_python_image_locally(
-        python_image_library_image, we_vote_image_file_name)
-
-    if not image_stored_locally:
-        error_results = {
-            'success': success,
-            'status': status + " IMAGE_NOT_STORED_LOCALLY ",
-            'we_vote_image_created': we_vote_image_created,
-            'image_url_valid': image_url_valid,
-            'image_stored_from_source': image_stored_from_source,
-            'image_stored_locally': False,
-            'image_stored_to_aws': image_stored_to_aws,
-        }
-        delete_we_vote_image_results = we_vote_image_manager.delete_we_vote_image(we_vote_image)
-        return error_results
-
-    image_stored_to_aws = we_vote_image_manager.store_image_to_aws(
-        we_vote_image_file_name, we_vote_image_file_location, image_format)
+    # Encoded in memory and uploaded with put_object, rather than stored in /tmp
+    store_image_results = we_vote_image_manager.store_python_image_to_aws(
+        python_image_library_image, we_vote_image_file_location, image_format)
+    image_stored_to_aws = store_image_results['success']
     if not image_stored_to_aws:
         error_results = {
             'success':                      success,
@@ -4,6 +4,7 @@
 
 from exception.models import handle_exception
 from io import BytesIO
+import hashlib
 from PIL import Image, ImageOps
 from urllib.request import Request, urlopen
 import urllib
@@ -63,6 +64,46 @@ def analyze_remote_url(image_url_https):
     return results
 
 
+def calculate_image_content_hash(image_bytes):
+    """
+    Images with exactly the same bytes get the same hash, whichever url they were downloaded from
+    :param image_bytes:
+    :return:
+    """
+    if not image_bytes:
+        return None
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def analyze_image_bytes(image_bytes):
+    """
+    Get image properties from an image already downloaded into memory, so the url doesn't have to be fetched again
+    :param image_bytes:
+    :return:
+    """
+    image_format = None
+    image_height = None
+    image_width = None
+    image_url_valid = False
+    if image_bytes:
+        try:
+            original_image = Image.open(BytesIO(image_bytes))
+            image_format = original_image.format
+            image = ImageOps.exif_transpose(original_image)
+            image_width, image_height = image.size
+            image_url_valid = True
+        except Exception:
+            image_url_valid = False
+
+    results = {
+        'image_url_valid':              image_url_valid,
+        'image_width':                  image_width,
+        'image_height':                 image_height,
+        'image_format':                 image_format.lower() if image_format is not None else image_format
+    }
+    return results
+
+
 def analyze_image_file(image_file):
     """
     Analyse inMemoryUploadedFile object to get image properties
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from image.controllers import backfill_we_vote_image_content_hashes
+from image.models import IMAGE_PIPELINE_NUMBER_OF_WORKERS
+
+
+class Command(BaseCommand):
+    help = 'Calculates source_image_content_hash for original WeVoteImage entries stored before it was added, ' \
+           'so new copies of the same photo reuse the S3 objects and resized images already stored.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk_size', type=int, default=500,
+                            help='Number of images hashed and saved per pass')
+        parser.add_argument('--number_of_workers', type=int, default=IMAGE_PIPELINE_NUMBER_OF_WORKERS,
+                            help='Number of images downloaded from AWS at the same time')
+
+    def handle(self, *args, **options):
+        results = backfill_we_vote_image_content_hashes(
+            chunk_size=options['chunk_size'], number_of_workers=options['number_of_workers'])
+        self.stdout.write('Hashed {hashed} images, {failed} failed. {status}'.format(
+            hashed=results['images_hashed'],
+            failed=results['images_failed'],
+            status=results['status']))
@@ -7,11 +7,14 @@ from datetime import date
 from django.db import models
 from exception.models import handle_record_found_more_than_one_exception, handle_exception, \
     handle_record_not_saved_exception, handle_record_not_deleted_exception
+from io import BytesIO
 from PIL import Image, ImageOps
-from urllib.request import urlretrieve
-from urllib.error import HTTPError
 from wevote_functions.functions import convert_to_int, positive_value_exists
 import boto3
+import botocore.config
+import requests
+import threading
+import time
 import wevote_functions.admin
 from .functions import analyze_remote_url
 
@@ -43,8 +46,89 @@ AWS_REGION_NAME = get_environment_variable("AWS_REGION_NAME")
 AWS_STORAGE_BUCKET_NAME = get_environment_variable("AWS_STORAGE_BUCKET_NAME")
 AWS_STORAGE_SERVICE = "s3"
 
+IMAGE_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+IMAGE_DOWNLOAD_TIMEOUT_SECONDS = 30
+IMAGE_PIPELINE_NUMBER_OF_WORKERS = 8
+# When shrinking, first reduce() by a whole factor as long as the image stays at least this many times the target
+IMAGE_RESIZE_REDUCING_GAP = 2
+
 logger = wevote_functions.admin.get_logger(__name__)
 
+aws_s3_client = None
+aws_s3_client_lock = threading.Lock()
+image_download_thread_local = threading.local()
+
+
+def get_aws_s3_client():
+    """
+    boto3 clients are thread safe, so one client (and its connection pool) is shared by every upload, download
+    and delete in this process, instead of building a new client for each image
+    :return:
+    """
+    global aws_s3_client
+    if aws_s3_client is None:
+        with aws_s3_client_lock:
+            if aws_s3_client is None:
+                aws_s3_client = boto3.client(
+                    AWS_STORAGE_SERVICE, region_name=AWS_REGION_NAME,
+                    aws_access_key_id=AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                    config=botocore.config.Config(max_pool_connections=IMAGE_PIPELINE_NUMBER_OF_WORKERS * 2))
+    return aws_s3_client
+
+
+def get_image_download_session():
+    """
+    requests.Session is not thread safe, so each thread keeps its own (and its pooled keep-alive connections)
+    :return:
+    """
+    if not hasattr(image_download_thread_local, 'session'):
+        session = requests.Session()
+        session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                          'Chrome/36.0.1941.0 Safari/537.36',
+        })
+        image_download_thread_local.session = session
+    return image_download_thread_local.session
+
+
+def resize_python_image(
+        image,
+        image_width=0,
+        image_height=0,
+        image_type='',
+        image_offset_y=0):
+    """
+    Crop and scale a decoded image to image_width x image_height. Large images are first shrunk with reduce(), which
+    is much cheaper than resampling the full size image, and still leaves IMAGE_RESIZE_REDUCING_GAP times the target
+    size for the final ANTIALIAS pass.
+    :param image:
+    :param image_width:
+    :param image_height:
+    :param image_type:
+    :param image_offset_y:
+    :return: resized image
+    """
+    centering_y = 0.5
+    if image_type == FACEBOOK_BACKGROUND_IMAGE_NAME:
+        centering_y = ((image.height - image_offset_y) * 0.5) / image.height
+    reduce_factor = int(min(image.width / image_width, image.height / image_height) / IMAGE_RESIZE_REDUCING_GAP)
+    if reduce_factor > 1 and image.mode in ('L', 'LA', 'RGB', 'RGBA'):
+        image = image.reduce(reduce_factor)
+    if image_type == TWITTER_BACKGROUND_IMAGE_NAME or image_type == TWITTER_BANNER_IMAGE_NAME:
+        return image.resize((image_width, image_height), Image.ANTIALIAS)
+    return ImageOps.fit(image, (image_width, image_height), Image.ANTIALIAS, centering=(0.5, centering_y))
+
+
+def convert_image_format_to_pil_format(image_format):
+    """
+    :param image_format: File extension, like "png" or "jpg"
+    :return: Name PIL uses for that format, like "PNG" or "JPEG", or None
+    """
+    if not positive_value_exists(image_format):
+        return None
+    return Image.registered_extensions().get('.' + str(image_format).lower())
+
 
 class WeVoteImage(models.Model):
     """
@@ -105,8 +189,14 @@ class WeVoteImage(models.Model):
     image_height = models.BigIntegerField(verbose_name="height of image in pixel", null=True, blank=True)
     image_width = models.BigIntegerField(verbose_name="width of image in pixel", null=True, blank=True)
     we_vote_image_url = models.TextField(verbose_name="url of image on AWS", blank=True, null=True)
-    we_vote_image_file_location = models.TextField(verbose_name="image file path on AWS", null=True, blank=True)
-    we_vote_parent_image_id = models.BigIntegerField(verbose_name="Local id of parent image", null=True, blank=True)
+    # Indexed for delete_image_from_aws, which checks whether another image still shares this S3 object
+    we_vote_image_file_location = models.TextField(
+        verbose_name="image file path on AWS", null=True, blank=True, db_index=True)
+    # Indexed for retrieve_resized_we_vote_image_list_from_content_hash
+    we_vote_parent_image_id = models.BigIntegerField(
+        verbose_name="Local id of parent image", null=True, blank=True, db_index=True)
+    # sha256 of the downloaded source image, so identical photos share one S3 object and one set of resized images
+    source_image_content_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
     date_image_saved = models.DateTimeField(verbose_name="date when image saved on wevote", auto_now_add=True)
     same_day_image_version = models.BigIntegerField(verbose_name="image version on same day", null=True, blank=True)
     is_active_version = models.BooleanField(verbose_name="True if image is newest", default=False)
@@ -332,10 +422,11 @@ class WeVoteImageManager(models.Manager):
         :return:
         """
         try:
-
-            client = boto3.client(AWS_STORAGE_SERVICE, region_name=AWS_REGION_NAME,
-                                  aws_access_key_id=AWS_ACCESS_KEY_ID,
-                                  aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
+            if WeVoteImage.objects.filter(we_vote_image_file_location=we_vote_image_file_location).count() > 1:
+                # Images with the same source_image_content_hash share one S3 object, so it is only deleted once
+                #  the last WeVoteImage using it is deleted
+                return True
+            client = get_aws_s3_client()
             client.delete_object(Bucket=AWS_STORAGE_BUCKET_NAME, Key=we_vote_image_file_location)
             image_deleted_from_aws = True
         except Exception as e:
@@ -894,7 +985,8 @@ class WeVoteImageManager(models.Manager):
             we_vote_image_url='',
             we_vote_image_file_location='',
             we_vote_parent_image_id=0,
-            is_active_version=False):
+            is_active_version=False,
+            source_image_content_hash=None):
         """
         Save aws specific information to WeVoteImage
         :param we_vote_image:
@@ -902,6 +994,7 @@ class WeVoteImageManager(models.Manager):
         :param we_vote_image_file_location:
         :param we_vote_parent_image_id:
         :param is_active_version:
+        :param source_image_content_hash:
         :return:
         """
         try:
@@ -909,6 +1002,8 @@ class WeVoteImageManager(models.Manager):
             we_vote_image.we_vote_image_file_location = we_vote_image_file_location
             we_vote_image.we_vote_parent_image_id = we_vote_parent_image_id
             we_vote_image.is_active_version = is_active_version
+            if positive_value_exists(source_image_content_hash):
+                we_vote_image.source_image_content_hash = source_image_content_hash
 
             we_vote_image.save()
             success = True
@@ -1121,6 +1216,58 @@ class WeVoteImageManager(models.Manager):
         }
         return results
 
+    def retrieve_we_vote_image_from_content_hash(self, source_image_content_hash, exclude_we_vote_image_id=0):
+        """
+        Find the most recent original image already stored on AWS with exactly the same bytes
+        :param source_image_content_hash:
+        :param exclude_we_vote_image_id:
+        :return:
+        """
+        status = ""
+        we_vote_image = None
+        we_vote_image_found = False
+        if positive_value_exists(source_image_content_hash):
+            try:
+                queryset = WeVoteImage.objects.filter(
+                    source_image_content_hash=source_image_content_hash,
+                    kind_of_image_original=True,
+                    we_vote_image_url__isnull=False,
+                ).exclude(we_vote_image_url='')
+                if positive_value_exists(exclude_we_vote_image_id):
+                    queryset = queryset.exclude(id=exclude_we_vote_image_id)
+                we_vote_image = queryset.order_by('-id').first()
+                we_vote_image_found = we_vote_image is not None
+            except Exception as e:
+                status += "RETRIEVE_WE_VOTE_IMAGE_FROM_CONTENT_HASH_FAILED: " + str(e) + " "
+
+        results = {
+            'success':              not positive_value_exists(status),
+            'status':               status,
+            'we_vote_image_found':  we_vote_image_found,
+            'we_vote_image':        we_vote_image,
+        }
+        return results
+
+    def retrieve_resized_we_vote_image_list_from_content_hash(
+            self, source_image_content_hash, exclude_we_vote_parent_image_id=0):
+        """
+        Resized images already made from an original image with exactly the same bytes
+        :param source_image_content_hash:
+        :param exclude_we_vote_parent_image_id:
+        :return:
+        """
+        we_vote_image_list = []
+        if positive_value_exists(source_image_content_hash):
+            parent_image_query = WeVoteImage.objects.filter(
+                source_image_content_hash=source_image_content_hash,
+                kind_of_image_original=True,
+            ).exclude(id=exclude_we_vote_parent_image_id).values('id')
+            we_vote_image_list = list(WeVoteImage.objects.filter(
+                we_vote_parent_image_id__in=parent_image_query,
+                we_vote_image_url__isnull=False,
+            ).exclude(we_vote_image_url='').order_by('-id'))
+        return we_vote_image_list
+
     def retrieve_we_vote_image_list_from_we_vote_id(self, voter_we_vote_id=None, candidate_we_vote_id=None,
                                                     organization_we_vote_id=None, issue_we_vote_id=None):
         """
@@ -1770,121 +1917,178 @@ class WeVoteImageManager(models.Manager):
         }
         return results
 
-    def resize_we_vote_master_image(
+    def resize_image_in_memory(
             self,
-            image_local_path='',
+            source_image=None,
             image_width=0,
             image_height=0,
             image_type='',
-            image_offset_x=0,
             image_offset_y=0,
+            image_format='',
             convert_image_to_jpg=True):
         """
-        Resize image and save it to the same location
-        Note re the facebook background:  We are scaling and sizing here to match the size of the html pane on the
-        client, which is driven by the aspect ratio of the twitter banner.
-        :param image_local_path:
+        Resize an already decoded image and encode it into bytes, in memory
+        :param source_image: Decoded image from retrieve_source_image
         :param image_width:
         :param image_height:
         :param image_type:
-        :param image_offset_x:
         :param image_offset_y:
+        :param image_format: File extension the resized image is saved with, when not converted to jpg
         :param convert_image_to_jpg:
         :return:
         """
+        status = ""
+        success = False
+        image_bytes = None
+        t0 = time.time()
         try:
-            image_local_path = "/tmp/" + image_local_path
-            original_image = Image.open(image_local_path)
-            image = ImageOps.exif_transpose(original_image)
-            if image_type == TWITTER_BACKGROUND_IMAGE_NAME or image_type == TWITTER_BANNER_IMAGE_NAME:
-                image = image.resize((image_width, image_height), Image.ANTIALIAS)
-            elif image_type == FACEBOOK_BACKGROUND_IMAGE_NAME:
-                centering_x = 0.5
-                centering_y = ((image.height - image_offset_y) * 0.5) / image.height
-                image = ImageOps.fit(image, (image_width, image_height), Image.ANTIALIAS,
-                                     centering=(centering_x, centering_y))
-            else:
-                image = ImageOps.fit(image, (image_width, image_height), Image.ANTIALIAS, centering=(0.5, 0.5))
+            image = resize_python_image(source_image, image_width=image_width, image_height=image_height,
+                                        image_type=image_type, image_offset_y=image_offset_y)
+            image_buffer = BytesIO()
             if convert_image_to_jpg:
                 image = image.convert('RGB')
-                image.save(image_local_path, quality=95, subsampling=0)
+                image.save(image_buffer, format='JPEG', quality=95, subsampling=0)
             else:
-                image.save(image_local_path)
-            resized_image_created = True
+                image.save(image_buffer,
+                           format=convert_image_format_to_pil_format(image_format) or source_image.format)
+            image_bytes = image_buffer.getvalue()
+            success = True
         except Exception as e:
-            resized_image_created = False
-            exception_message = "resize_we_vote_master_image failed"
-            handle_exception(e, logger=logger, exception_message=exception_message)
+            status += "RESIZE_IMAGE_IN_MEMORY_FAILED: " + str(e) + " "
+            handle_exception(e, logger=logger, exception_message=status)
 
-        return resized_image_created
+        results = {
+            'success':      success,
+            'status':       status,
+            'image_bytes':  image_bytes,
+            'bytes':        len(image_bytes) if image_bytes else 0,
+            'seconds':      time.time() - t0,
+        }
+        return results
 
-    def store_image_locally(self, image_url_https, image_local_path):
+    def retrieve_image_bytes_from_url(self, image_url_https):
         """
-        Save image locally at /tmp/ folder
+        Stream an image into memory over this thread's pooled session, without writing it to /tmp
         :param image_url_https:
-        :param image_local_path:
         :return:
         """
+        status = ""
+        success = False
+        image_bytes = None
+        t0 = time.time()
         try:
-            image_local_path = "/tmp/" + image_local_path
-            urlretrieve(image_url_https, image_local_path)
-            image_stored = True
-        except HTTPError as error:  # something wrong with url
-            image_stored = False
-            exception_message = "store_image_locally failed because of http error"
-            handle_exception(error, logger=logger, exception_message=exception_message)
+            session = get_image_download_session()
+            image_buffer = BytesIO()
+            with session.get(image_url_https, stream=True, timeout=IMAGE_DOWNLOAD_TIMEOUT_SECONDS) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=IMAGE_DOWNLOAD_CHUNK_SIZE):
+                    image_buffer.write(chunk)
+            image_bytes = image_buffer.getvalue()
+            success = True
         except Exception as e:
-            image_stored = False
-            exception_message = "store_image_locally failed"
-            handle_exception(e, logger=logger, exception_message=exception_message)
+            status += "RETRIEVE_IMAGE_BYTES_FROM_URL_FAILED: " + str(e) + " "
 
-        return image_stored
+        results = {
+            'success':      success,
+            'status':       status,
+            'image_bytes':  image_bytes,
+            'bytes':        len(image_bytes) if image_bytes else 0,
+            'seconds':      time.time() - t0,
+        }
+        return results
 
-    def store_python_image_locally(self, python_image_library_image, image_local_path):
+    def retrieve_source_image(self, image_url_https, largest_width=0, largest_height=0):
         """
-        Save image locally at /tmp/ folder
-        :param python_image_library_image:
-        :param image_local_path:
+        Download an image into memory and decode it once, so every resized version can be made from the same
+        decoded image. JPEGs are decoded with draft(), which lets libjpeg scale down by 1/2, 1/4 or 1/8 while
+        decoding, as long as the result is still at least the largest size we need.
+        :param image_url_https:
+        :param largest_width: Largest resized width which will be made from this image
+        :param largest_height: Largest resized height which will be made from this image
+        :return: source_image is the decoded image with its exif orientation applied
+        """
+        source_image = None
+        retrieve_results = self.retrieve_image_bytes_from_url(image_url_https)
+        status = retrieve_results['status']
+        success = retrieve_results['success']
+        t0 = time.time()
+        if success:
+            try:
+                original_image = Image.open(BytesIO(retrieve_results['image_bytes']))
+                image_format = original_image.format
+                if image_format == 'JPEG' and positive_value_exists(largest_width) \
+                        and positive_value_exists(largest_height):
+                    # Either side may end up as the width once exif orientation is applied
+                    largest_side = max(largest_width, largest_height)
+                    original_image.draft('RGB', (largest_side, largest_side))
+                source_image = ImageOps.exif_transpose(original_image)
+                source_image.load()
+                source_image.format = image_format
+            except Exception as e:
+                success = False
+                status += "RETRIEVE_SOURCE_IMAGE_DECODE_FAILED: " + str(e) + " "
+
+        results = {
+            'success':          success,
+            'status':           status,
+            'source_image':     source_image,
+            'bytes':            retrieve_results['bytes'],
+            'download_seconds': retrieve_results['seconds'],
+            'decode_seconds':   time.time() - t0,
+        }
+        return results
+
+    def store_image_bytes_to_aws(self, image_bytes, we_vote_image_file_location, image_format):
+        """
+        Upload an image held in memory to aws with put_object, without writing it to /tmp first
+        :param image_bytes:
+        :param we_vote_image_file_location:
+        :param image_format:
         :return:
         """
+        status = ""
+        success = False
+        t0 = time.time()
         try:
-            image_local_path = "/tmp/" + image_local_path
-            python_image_library_image.save(image_local_path, format=python_image_library_image.format)
-            image_stored = True
-        except HTTPError as error:  # something wrong with url
-            image_stored = False
-            exception_message = "store_image_locally failed because of http error"
-            handle_exception(error, logger=logger, exception_message=exception_message)
+            client = get_aws_s3_client()
+            content_type = "image/{image_format}".format(image_format=image_format)
+            client.put_object(Bucket=AWS_STORAGE_BUCKET_NAME, Key=we_vote_image_file_location, Body=image_bytes,
+                              ContentType=content_type)
+            success = True
         except Exception as e:
-            image_stored = False
-            exception_message = "store_image_locally failed"
-            handle_exception(e, logger=logger, exception_message=exception_message)
+            status += "STORE_IMAGE_BYTES_TO_AWS_FAILED: " + str(e) + " "
+            handle_exception(e, logger=logger, exception_message=status)
 
-        return image_stored
+        results = {
+            'success':  success,
+            'status':   status,
+            'bytes':    len(image_bytes) if image_bytes else 0,
+            'seconds':  time.time() - t0,
+        }
+        return results
 
-    def store_image_to_aws(self, we_vote_image_file_name, we_vote_image_file_location, image_format):
+    def store_python_image_to_aws(self, python_image_library_image, we_vote_image_file_location, image_format):
         """
-        Upload image to aws
-        :param we_vote_image_file_name:
+        Encode an image in memory and upload it to aws with put_object
+        :param python_image_library_image:
         :param we_vote_image_file_location:
         :param image_format:
         :return:
         """
         try:
-            client = boto3.client(AWS_STORAGE_SERVICE, region_name=AWS_REGION_NAME,
-                                  aws_access_key_id=AWS_ACCESS_KEY_ID,
-                                  aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
-            upload_image_from_location = "/tmp/" + we_vote_image_file_name
-            content_type = "image/{image_format}".format(image_format=image_format)
-            client.upload_file(upload_image_from_location, AWS_STORAGE_BUCKET_NAME, we_vote_image_file_location,
-                               ExtraArgs={'ContentType': content_type})
-            image_stored_to_aws = True
+            image_buffer = BytesIO()
+            python_image_library_image.save(image_buffer, format=python_image_library_image.format)
         except Exception as e:
-            image_stored_to_aws = False
-            exception_message = "store_image_to_aws failed: " + str(e) + " "
-            handle_exception(e, logger=logger, exception_message=exception_message)
-
-        return image_stored_to_aws
+            status = "STORE_PYTHON_IMAGE_TO_AWS_ENCODE_FAILED: " + str(e) + " "
+            handle_exception(e, logger=logger, exception_message=status)
+            results = {
+                'success':  False,
+                'status':   status,
+                'bytes':    0,
+                'seconds':  0,
+            }
+            return results
+        return self.store_image_bytes_to_aws(image_buffer.getvalue(), we_vote_image_file_location, image_format)
 
     def store_image_file_to_aws(self, image_file, we_vote_image_file_location):
         """
@@ -1894,12 +2098,8 @@ class WeVoteImageManager(models.Manager):
         :return:
         """
         try:
-            session = boto3.session.Session(region_name=AWS_REGION_NAME,
-                                            aws_access_key_id=AWS_ACCESS_KEY_ID,
-                                            aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
-            s3 = session.resource(AWS_STORAGE_SERVICE)
-            s3.Bucket(AWS_STORAGE_BUCKET_NAME).put_object(Key=we_vote_image_file_location,
-                                                          Body=image_file)
+            client = get_aws_s3_client()
+            client.put_object(Bucket=AWS_STORAGE_BUCKET_NAME, Key=we_vote_image_file_location, Body=image_file)
             image_stored_to_aws = True
         except Exception as e:
             image_stored_to_aws = False
@@ -1908,22 +2108,29 @@ class WeVoteImageManager(models.Manager):
 
         return image_stored_to_aws
 
-    def retrieve_image_from_aws(self, we_vote_image_file_location):
+    def retrieve_image_bytes_from_aws(self, we_vote_image_file_location):
         """
-        Download image from aws
+        Download an image from aws into memory
         :param we_vote_image_file_location:
         :return:
         """
+        status = ""
+        success = False
+        image_bytes = None
+        t0 = time.time()
         try:
-            client = boto3.client(AWS_STORAGE_SERVICE, region_name=AWS_REGION_NAME,
-                                  aws_access_key_id=AWS_ACCESS_KEY_ID,
-                                  aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
-            download_image_at_location = "/tmp/" + we_vote_image_file_location
-            client.download_file(AWS_STORAGE_BUCKET_NAME, we_vote_image_file_location, download_image_at_location)
-            image_retrieved_from_aws = True
+            client = get_aws_s3_client()
+            response = client.get_object(Bucket=AWS_STORAGE_BUCKET_NAME, Key=we_vote_image_file_location)
+            image_bytes = response['Body'].read()
+            success = True
         except Exception as e:
-            image_retrieved_from_aws = False
-            exception_message = "retrieve_image_from_aws failed"
-            handle_exception(e, logger=logger, exception_message=exception_message)
+            status += "RETRIEVE_IMAGE_BYTES_FROM_AWS_FAILED: " + str(e) + " "
 
-        return image_retrieved_from_aws
+        results = {
+            'success':      success,
+            'status':       status,
+            'image_bytes':  image_bytes,
+            'bytes':        len(image_bytes) if image_bytes else 0,
+            'seconds':      time.time() - t0,
+        }
+        return results
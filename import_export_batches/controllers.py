@@ -13,10 +13,10 @@ from .models import BatchManager, BatchDescription, BatchHeaderMap, BatchRow, Ba
     BATCH_IMPORT_KEYS_ACCEPTED_FOR_ORGANIZATIONS, BATCH_IMPORT_KEYS_ACCEPTED_FOR_POLITICIANS, \
     BATCH_IMPORT_KEYS_ACCEPTED_FOR_POLLING_LOCATIONS, BATCH_IMPORT_KEYS_ACCEPTED_FOR_POSITIONS, \
     BATCH_IMPORT_KEYS_ACCEPTED_FOR_BALLOT_ITEMS
-from ballot.models import BallotItem, BallotItemListManager, BallotItemManager, BallotReturnedManager
+from ballot.models import BallotItem, BallotItemListManager, BallotItemManager, BallotReturned, BallotReturnedManager
 from candidate.controllers import retrieve_next_or_most_recent_office_for_candidate
 from candidate.models import CandidateCampaign, CandidateListManager, CandidateManager
-# from django.db import transaction
+from django.db import transaction
 from django.db.models import Q
 from django.utils.timezone import now
 from elected_office.models import ElectedOffice, ElectedOfficeManager
@@ -50,6 +50,8 @@ IMPORT_POLLING_LOCATION = 'IMPORT_POLLING_LOCATION'
 IMPORT_VOTER = 'IMPORT_VOTER'
 MEASURE = 'MEASURE'
 POLITICIAN = 'POLITICIAN'
+# Number of rows sent to the database per bulk_create/bulk_update statement when a whole batch is processed at once
+BULK_SAVE_CHUNK_SIZE = 1000
 
 
 def create_batch_row_actions(
@@ -164,7 +166,32 @@ def create_batch_row_actions(
 
     batch_row_action_list = []
     start_create_batch_row_action_time_tracker = []
+    # When analyzing every row of a ballot item batch, look up everything the rows refer to in a few queries up front,
+    #  and write the BatchRowActionBallotItem and BatchRow changes with bulk_create/bulk_update at the end
+    ballot_item_bulk_mode = kind_of_batch == IMPORT_BALLOT_ITEM and not positive_value_exists(batch_row_id)
+    batch_row_action_ballot_item_dict = None
+    existing_ballot_item_id_dict = None
+    batch_row_action_ballot_item_create_list = []
+    batch_row_action_ballot_item_update_list = []
+    batch_row_update_list = []
     if batch_description_found and batch_header_map_found and batch_row_action_list_found and not delete_analysis_only:
+        if ballot_item_bulk_mode:
+            results = prefetch_batch_row_action_ballot_item_objects(
+                batch_description=batch_description,
+                batch_header_map=batch_header_map,
+                batch_row_list=batch_row_list,
+                measure_objects_dict=measure_objects_dict,
+                office_objects_dict=office_objects_dict,
+            )
+            status += results['status']
+            if results['success']:
+                batch_row_action_ballot_item_dict = results['batch_row_action_ballot_item_dict']
+                existing_ballot_item_id_dict = results['existing_ballot_item_id_dict']
+                measure_objects_dict = results['measure_objects_dict']
+                office_objects_dict = results['office_objects_dict']
+            else:
+                # Fall back to looking up and saving one row at a time
+                ballot_item_bulk_mode = False
         for one_batch_row in batch_row_list:
             start_create_batch_row_action_time_tracker.append(now().strftime("%H:%M:%S:%f"))
             if kind_of_batch == CANDIDATE:
@@ -262,10 +289,20 @@ def create_batch_row_actions(
                     election_objects_dict=election_objects_dict,
                     measure_objects_dict=measure_objects_dict,
                     office_objects_dict=office_objects_dict,
+                    batch_row_action_ballot_item_dict=batch_row_action_ballot_item_dict,
+                    existing_ballot_item_id_dict=existing_ballot_item_id_dict,
+                    save_to_database=not ballot_item_bulk_mode,
                 )
                 election_objects_dict = results['election_objects_dict']
                 measure_objects_dict = results['measure_objects_dict']
                 office_objects_dict = results['office_objects_dict']
+                if ballot_item_bulk_mode:
+                    if results['batch_row_action_created']:
+                        batch_row_action_ballot_item_create_list.append(results['batch_row_action_ballot_item'])
+                    elif results['batch_row_action_ballot_item_changed']:
+                        batch_row_action_ballot_item_update_list.append(results['batch_row_action_ballot_item'])
+                    if results['batch_row_changed']:
+                        batch_row_update_list.append(one_batch_row)
 
                 if results['batch_row_action_updated']:
                     number_of_batch_actions_updated += 1
@@ -287,6 +324,23 @@ def create_batch_row_actions(
                   "[batch_description_found and batch_header_map_found and batch_row_action_list_found " \
                   "and not delete_analysis_only] "
 
+    if ballot_item_bulk_mode:
+        results = save_batch_row_action_ballot_item_changes(
+            batch_row_action_ballot_item_create_list=batch_row_action_ballot_item_create_list,
+            batch_row_action_ballot_item_update_list=batch_row_action_ballot_item_update_list,
+            batch_row_update_list=batch_row_update_list)
+        status += results['status']
+        if not results['batch_row_actions_created']:
+            number_of_batch_actions_created -= len(batch_row_action_ballot_item_create_list)
+            # The delete analysis below compares against these, and they were never saved
+            unsaved_action_set = set(id(one_action) for one_action in batch_row_action_ballot_item_create_list)
+            batch_row_action_list = \
+                [one_action for one_action in batch_row_action_list if id(one_action) not in unsaved_action_set]
+        if not results['batch_row_actions_updated']:
+            number_of_batch_actions_updated -= len(batch_row_action_ballot_item_update_list)
+        success = positive_value_exists(number_of_batch_actions_created) or \
+            positive_value_exists(number_of_batch_actions_updated)
+
     existing_ballot_item_list = []
     number_of_batch_action_deletes_created = 0
     if kind_of_batch == IMPORT_BALLOT_ITEM:
@@ -2802,12 +2856,224 @@ def create_batch_row_action_position(batch_description, batch_header_map, one_ba
     return results
 
 
+def generate_ballot_item_lookup_key(
+        google_civic_election_id='',
+        polling_location_we_vote_id='',
+        contest_office_we_vote_id='',
+        contest_measure_we_vote_id=''):
+    """
+    Key for existing_ballot_item_id_dict. Matches the way create_batch_row_action_ballot_item looks for an existing
+    BallotItem: by office if we have one, otherwise by measure, with case-insensitive we_vote_ids.
+    """
+    polling_location_we_vote_id = polling_location_we_vote_id.lower() if polling_location_we_vote_id else ''
+    if positive_value_exists(contest_office_we_vote_id):
+        return str(google_civic_election_id), polling_location_we_vote_id, 'office', contest_office_we_vote_id.lower()
+    return str(google_civic_election_id), polling_location_we_vote_id, 'measure', \
+        contest_measure_we_vote_id.lower() if contest_measure_we_vote_id else ''
+
+
+def prefetch_batch_row_action_ballot_item_objects(
+        batch_description=None,
+        batch_header_map=None,
+        batch_row_list=[],
+        measure_objects_dict={},
+        office_objects_dict={}):
+    """
+    Retrieve, in a handful of queries, everything create_batch_row_action_ballot_item would otherwise look up
+    row by row: existing BatchRowActionBallotItem entries, the offices and measures referred to by we_vote_id,
+    and the ids of BallotItem entries that already exist for these map points.
+    :param batch_description:
+    :param batch_header_map:
+    :param batch_row_list:
+    :param measure_objects_dict:
+    :param office_objects_dict:
+    :return:
+    """
+    status = ""
+    success = True
+    batch_manager = BatchManager()
+    batch_row_action_ballot_item_dict = {}
+    existing_ballot_item_id_dict = {}
+
+    google_civic_election_id_set = set()
+    polling_location_we_vote_id_set = set()
+    # Offices and measures of the rows without a polling location, so we don't load every BallotItem
+    #  in the election that has no polling location
+    no_polling_location_office_we_vote_id_set = set()
+    no_polling_location_measure_we_vote_id_set = set()
+    contest_office_we_vote_id_set = set()
+    contest_measure_we_vote_id_set = set()
+    for one_batch_row in batch_row_list:
+        if positive_value_exists(one_batch_row.google_civic_election_id):
+            google_civic_election_id_set.add(str(one_batch_row.google_civic_election_id))
+        else:
+            google_civic_election_id_set.add(str(batch_description.google_civic_election_id))
+        polling_location_we_vote_id = batch_manager.retrieve_value_from_batch_row(
+            "polling_location_we_vote_id", batch_header_map, one_batch_row)
+        if positive_value_exists(polling_location_we_vote_id):
+            # Existing entries were matched with __iexact, so cover the common spellings
+            polling_location_we_vote_id_set.update([
+                polling_location_we_vote_id, polling_location_we_vote_id.lower(), polling_location_we_vote_id.upper()])
+        contest_office_we_vote_id = batch_manager.retrieve_value_from_batch_row(
+            "contest_office_we_vote_id", batch_header_map, one_batch_row)
+        if positive_value_exists(contest_office_we_vote_id) and contest_office_we_vote_id not in office_objects_dict:
+            contest_office_we_vote_id_set.add(contest_office_we_vote_id)
+        contest_measure_we_vote_id = batch_manager.retrieve_value_from_batch_row(
+            "contest_measure_we_vote_id", batch_header_map, one_batch_row)
+        if not positive_value_exists(polling_location_we_vote_id):
+            if positive_value_exists(contest_office_we_vote_id):
+                no_polling_location_office_we_vote_id_set.update([
+                    contest_office_we_vote_id, contest_office_we_vote_id.lower(), contest_office_we_vote_id.upper()])
+            elif positive_value_exists(contest_measure_we_vote_id):
+                no_polling_location_measure_we_vote_id_set.update([
+                    contest_measure_we_vote_id, contest_measure_we_vote_id.lower(),
+                    contest_measure_we_vote_id.upper()])
+        if positive_value_exists(contest_measure_we_vote_id) and \
+                contest_measure_we_vote_id not in measure_objects_dict:
+            contest_measure_we_vote_id_set.add(contest_measure_we_vote_id)
+
+    try:
+        batch_row_action_query = BatchRowActionBallotItem.objects.filter(
+            batch_header_id=batch_description.batch_header_id)
+        for batch_row_action_ballot_item in batch_row_action_query:
+            # Like BatchManager.retrieve_batch_row_action_ballot_item, we expect one entry per batch_row_id
+            batch_row_action_ballot_item_dict.setdefault(
+                batch_row_action_ballot_item.batch_row_id, batch_row_action_ballot_item)
+
+        # Needs to be read_only=False so we don't get "terminating connection due to conflict with recovery" error
+        if len(contest_office_we_vote_id_set):
+            office_query = ContestOffice.objects.filter(we_vote_id__in=list(contest_office_we_vote_id_set))
+            for contest_office in office_query:
+                office_objects_dict[contest_office.we_vote_id] = contest_office
+        if len(contest_measure_we_vote_id_set):
+            measure_query = ContestMeasure.objects.filter(we_vote_id__in=list(contest_measure_we_vote_id_set))
+            for contest_measure in measure_query:
+                measure_objects_dict[contest_measure.we_vote_id] = contest_measure
+
+        # This used to retrieve from using('readonly') but the query gets interrupted from updates from master
+        polling_location_filter = Q(polling_location_we_vote_id__in=list(polling_location_we_vote_id_set))
+        if len(no_polling_location_office_we_vote_id_set) or len(no_polling_location_measure_we_vote_id_set):
+            polling_location_filter |= \
+                (Q(polling_location_we_vote_id__isnull=True) | Q(polling_location_we_vote_id='')) & \
+                (Q(contest_office_we_vote_id__in=list(no_polling_location_office_we_vote_id_set)) |
+                 Q(contest_measure_we_vote_id__in=list(no_polling_location_measure_we_vote_id_set)))
+        ballot_item_query = BallotItem.objects.filter(google_civic_election_id__in=list(google_civic_election_id_set))
+        ballot_item_query = ballot_item_query.filter(polling_location_filter)
+        ballot_item_query = ballot_item_query.order_by('id').values_list(
+            'id', 'google_civic_election_id', 'polling_location_we_vote_id',
+            'contest_office_we_vote_id', 'contest_measure_we_vote_id')
+        for ballot_item_id, google_civic_election_id, polling_location_we_vote_id, contest_office_we_vote_id, \
+                contest_measure_we_vote_id in ballot_item_query:
+            # Keep the first (lowest id) entry, as the single row query would most likely have returned
+            if positive_value_exists(contest_office_we_vote_id):
+                existing_ballot_item_id_dict.setdefault(generate_ballot_item_lookup_key(
+                    google_civic_election_id=google_civic_election_id,
+                    polling_location_we_vote_id=polling_location_we_vote_id,
+                    contest_office_we_vote_id=contest_office_we_vote_id), ballot_item_id)
+            if positive_value_exists(contest_measure_we_vote_id):
+                existing_ballot_item_id_dict.setdefault(generate_ballot_item_lookup_key(
+                    google_civic_election_id=google_civic_election_id,
+                    polling_location_we_vote_id=polling_location_we_vote_id,
+                    contest_measure_we_vote_id=contest_measure_we_vote_id), ballot_item_id)
+        status += "BATCH_ROW_ACTION_BALLOT_ITEM_OBJECTS_PREFETCHED "
+    except Exception as e:
+        success = False
+        status += "COULD_NOT_PREFETCH_BATCH_ROW_ACTION_BALLOT_ITEM_OBJECTS: " + str(e) + " "
+        handle_exception(e, logger=logger, exception_message=status)
+
+    results = {
+        'success':                              success,
+        'status':                               status,
+        'batch_row_action_ballot_item_dict':    batch_row_action_ballot_item_dict,
+        'existing_ballot_item_id_dict':         existing_ballot_item_id_dict,
+        'measure_objects_dict':                 measure_objects_dict,
+        'office_objects_dict':                  office_objects_dict,
+    }
+    return results
+
+
+def save_batch_row_action_ballot_item_changes(
+        batch_row_action_ballot_item_create_list=[],
+        batch_row_action_ballot_item_update_list=[],
+        batch_row_update_list=[]):
+    """
+    Write the results of create_batch_row_action_ballot_item(save_to_database=False) in chunks
+    :param batch_row_action_ballot_item_create_list:
+    :param batch_row_action_ballot_item_update_list:
+    :param batch_row_update_list:
+    :return:
+    """
+    status = ""
+    success = True
+    batch_row_actions_created = True
+    batch_row_actions_updated = True
+    batch_rows_updated = True
+
+    if len(batch_row_action_ballot_item_create_list):
+        try:
+            with transaction.atomic():
+                BatchRowActionBallotItem.objects.bulk_create(
+                    batch_row_action_ballot_item_create_list, batch_size=BULK_SAVE_CHUNK_SIZE)
+            status += "BATCH_ROW_ACTION_BALLOT_ITEMS_BULK_CREATED: " + \
+                str(len(batch_row_action_ballot_item_create_list)) + " "
+        except Exception as e:
+            success = False
+            batch_row_actions_created = False
+            status += "BATCH_ROW_ACTION_BALLOT_ITEMS_NOT_BULK_CREATED: " + str(e) + " "
+            handle_exception(e, logger=logger, exception_message=status)
+
+    if len(batch_row_action_ballot_item_update_list):
+        try:
+            with transaction.atomic():
+                BatchRowActionBallotItem.objects.bulk_update(
+                    batch_row_action_ballot_item_update_list,
+                    [
+                        'ballot_item_display_name', 'batch_set_id', 'contest_measure_we_vote_id',
+                        'contest_office_we_vote_id', 'google_civic_election_id', 'kind_of_action',
+                        'local_ballot_order', 'measure_text', 'measure_url', 'no_vote_description',
+                        'polling_location_we_vote_id', 'state_code', 'status', 'voter_id', 'yes_vote_description',
+                    ],
+                    batch_size=BULK_SAVE_CHUNK_SIZE)
+            status += "BATCH_ROW_ACTION_BALLOT_ITEMS_BULK_UPDATED: " + \
+                str(len(batch_row_action_ballot_item_update_list)) + " "
+        except Exception as e:
+            success = False
+            batch_row_actions_updated = False
+            status += "BATCH_ROW_ACTION_BALLOT_ITEMS_NOT_BULK_UPDATED: " + str(e) + " "
+            handle_exception(e, logger=logger, exception_message=status)
+
+    if len(batch_row_update_list):
+        try:
+            with transaction.atomic():
+                BatchRow.objects.bulk_update(
+                    batch_row_update_list,
+                    ['batch_row_analyzed', 'polling_location_we_vote_id', 'voter_id'],
+                    batch_size=BULK_SAVE_CHUNK_SIZE)
+        except Exception as e:
+            success = False
+            batch_rows_updated = False
+            status += "COULD_NOT_BULK_SAVE_BATCH_ROWS: " + str(e) + " "
+            handle_exception(e, logger=logger, exception_message=status)
+
+    results = {
+        'success':                      success,
+        'status':                       status,
+        'batch_row_actions_created':    batch_row_actions_created,
+        'batch_row_actions_updated':    batch_row_actions_updated,
+        'batch_rows_updated':           batch_rows_updated,
+    }
+    return results
+
+
 def create_batch_row_action_ballot_item(batch_description,
                                         batch_header_map,
                                         one_batch_row,
                                         election_objects_dict={},
                                         measure_objects_dict={},
-                                        office_objects_dict={}):
+                                        office_objects_dict={},
+                                        batch_row_action_ballot_item_dict=None,
+                                        existing_ballot_item_id_dict=None,
+                                        save_to_database=True):
     """
     Handle batch_row for ballot_item type
     :param batch_description:
@@ -2816,12 +3082,20 @@ def create_batch_row_action_ballot_item(batch_description,
     :param election_objects_dict:
     :param measure_objects_dict:
     :param office_objects_dict:
+    :param batch_row_action_ballot_item_dict: existing BatchRowActionBallotItem entries by batch_row_id, from
+      prefetch_batch_row_action_ballot_item_objects. If None, we query for this row's entry.
+    :param existing_ballot_item_id_dict: existing BallotItem ids by generate_ballot_item_lookup_key, from
+      prefetch_batch_row_action_ballot_item_objects. If None, we query for this row's ballot item.
+    :param save_to_database: If False, a new BatchRowActionBallotItem is returned unsaved, and changes are only
+      flagged (batch_row_action_ballot_item_changed, batch_row_changed) so the caller can save them in bulk
     :return:
     """
     batch_manager = BatchManager()
 
     batch_row_action_created = False
     batch_row_action_updated = False
+    batch_row_action_ballot_item_changed = False
+    batch_row_changed = False
     status = ''
     status += 'CREATE_BATCH_ROW_ACTION_BALLOT_ITEM-START '
     success = True
@@ -3027,7 +3301,18 @@ def create_batch_row_action_ballot_item(batch_description,
 
     # check for duplicate entries in the live ballot_item data
     existing_ballot_item_query_completed = False
-    if positive_value_exists(contest_office_we_vote_id) or positive_value_exists(contest_measure_we_vote_id):
+    if existing_ballot_item_id_dict is not None and \
+            (positive_value_exists(contest_office_we_vote_id) or positive_value_exists(contest_measure_we_vote_id)):
+        # Retrieved for the whole batch in prefetch_batch_row_action_ballot_item_objects
+        ballot_item_lookup_key = generate_ballot_item_lookup_key(
+            google_civic_election_id=google_civic_election_id,
+            polling_location_we_vote_id=polling_location_we_vote_id,
+            contest_office_we_vote_id=contest_office_we_vote_id,
+            contest_measure_we_vote_id=contest_measure_we_vote_id)
+        existing_ballot_item_id = existing_ballot_item_id_dict.get(ballot_item_lookup_key, 0)
+        existing_ballot_item_found = positive_value_exists(existing_ballot_item_id)
+        existing_ballot_item_query_completed = True
+    elif positive_value_exists(contest_office_we_vote_id) or positive_value_exists(contest_measure_we_vote_id):
         try:
             # This used to retrieve from using('readonly') but the query gets interrupted from updates from master
             existing_ballot_item_query = BallotItem.objects.all()
@@ -3086,12 +3371,42 @@ def create_batch_row_action_ballot_item(batch_description,
     # We want to start with the BatchRowAction... entry first so we can record our findings line by line while
     #  we are checking for existing duplicate data
     batch_row_action_ballot_item_change_found = False
-    existing_results = batch_manager.retrieve_batch_row_action_ballot_item(
-        batch_description.batch_header_id, one_batch_row.id)
-    if existing_results['batch_row_action_found']:
+    if batch_row_action_ballot_item_dict is not None:
+        batch_row_action_ballot_item = batch_row_action_ballot_item_dict.get(one_batch_row.id)
+        batch_row_action_found = batch_row_action_ballot_item is not None
+    else:
+        existing_results = batch_manager.retrieve_batch_row_action_ballot_item(
+            batch_description.batch_header_id, one_batch_row.id)
         batch_row_action_ballot_item = existing_results['batch_row_action_ballot_item']
+        batch_row_action_found = existing_results['batch_row_action_found']
+    if batch_row_action_found:
         batch_row_action_updated = True
         status += "EXISTING_BATCH_ROW_ACTION_BALLOT_ITEM_FOUND "
+    elif not save_to_database:
+        # The caller saves this with bulk_create
+        status += "[BatchRowActionBallotItem]"
+        batch_row_action_ballot_item = BatchRowActionBallotItem(
+            ballot_item_display_name=ballot_item_display_name,
+            ballot_item_id=existing_ballot_item_id,
+            batch_header_id=batch_description.batch_header_id,
+            batch_row_id=one_batch_row.id,
+            batch_set_id=batch_description.batch_set_id,
+            contest_measure_we_vote_id=contest_measure_we_vote_id,
+            contest_office_we_vote_id=contest_office_we_vote_id,
+            google_civic_election_id=google_civic_election_id,
+            kind_of_action=kind_of_action,
+            local_ballot_order=local_ballot_order,
+            measure_text=contest_measure_text,
+            measure_url=contest_measure_url,
+            no_vote_description=no_vote_description,
+            polling_location_we_vote_id=polling_location_we_vote_id,
+            state_code=state_code,
+            status=status,
+            voter_id=voter_id,
+            yes_vote_description=yes_vote_description,
+        )
+        batch_row_action_created = True
+        status += "BATCH_ROW_ACTION_BALLOT_ITEM_CREATED "
     else:
         # If a BatchRowActionBallotItem entry does not exist, create one
         status += "[BatchRowActionBallotItem.objects.create]"
@@ -3131,7 +3446,9 @@ def create_batch_row_action_ballot_item(batch_description,
                 'batch_row_action_updated':     batch_row_action_updated,
                 'batch_row_action_created':     batch_row_action_created,
                 'batch_row_action_ballot_item': batch_row_action_ballot_item,
+                'batch_row_action_ballot_item_changed': batch_row_action_ballot_item_changed,
                 'batch_row':                    one_batch_row,
+                'batch_row_changed':            batch_row_changed,
                 'election_objects_dict':        election_objects_dict,
                 'measure_objects_dict':         measure_objects_dict,
                 'office_objects_dict':          office_objects_dict,
@@ -3185,8 +3502,12 @@ def create_batch_row_action_ballot_item(batch_description,
             batch_row_action_ballot_item_change_found = True
         if positive_value_exists(batch_row_action_ballot_item_change_found):
             batch_row_action_ballot_item.status = status
-            batch_row_action_ballot_item.save()
-            status += "BATCH_ROW_ACTION_BALLOT_ITEM_SAVED "
+            if save_to_database:
+                batch_row_action_ballot_item.save()
+                status += "BATCH_ROW_ACTION_BALLOT_ITEM_SAVED "
+            else:
+                batch_row_action_ballot_item_changed = True
+                status += "BATCH_ROW_ACTION_BALLOT_ITEM_TO_BE_SAVED "
         else:
             status += "BATCH_ROW_ACTION_BALLOT_ITEM_NO_SAVE_NEEDED "
     except Exception as e:
@@ -3209,7 +3530,7 @@ def create_batch_row_action_ballot_item(batch_description,
             if not positive_value_exists(one_batch_row.batch_row_analyzed):
                 one_batch_row.batch_row_analyzed = True
                 batch_row_changed = True
-            if batch_row_changed:
+            if batch_row_changed and save_to_database:
                 one_batch_row.save()
     except Exception as e:
         status += "COULD_NOT_SAVE_BATCH_ROW: " + str(e) + " "
@@ -3221,7 +3542,9 @@ def create_batch_row_action_ballot_item(batch_description,
         'batch_row_action_created':     batch_row_action_created,
         'batch_row_action_updated':     batch_row_action_updated,
         'batch_row_action_ballot_item': batch_row_action_ballot_item,
+        'batch_row_action_ballot_item_changed': batch_row_action_ballot_item_changed,
         'batch_row':                    one_batch_row,
+        'batch_row_changed':            batch_row_changed,
         'election_objects_dict':        election_objects_dict,
         'measure_objects_dict':         measure_objects_dict,
         'office_objects_dict':          office_objects_dict,
@@ -5210,6 +5533,121 @@ def import_update_or_create_elected_office_entry(batch_header_id, batch_row_id):
     return results
 
 
+def prefetch_ballot_item_import_objects(
+        batch_row_action_list=[],
+        google_civic_election_id=0,
+        retrieve_existing_ballot_items=False):
+    """
+    For import_ballot_item_data_from_batch_row_actions working on a whole batch: fill in the missing office and
+    measure ids on each BatchRowActionBallotItem, and retrieve the BallotReturned (and optionally BallotItem) entries
+    that already exist for these map points, all in a handful of queries.
+    :param batch_row_action_list:
+    :param google_civic_election_id: from the batch_description, for rows without their own
+    :param retrieve_existing_ballot_items:
+    :return:
+    """
+    status = ""
+    success = True
+    ballot_returned_entries_that_exist = set()
+    existing_ballot_item_list_dict = {}
+
+    contest_office_we_vote_id_set = set()
+    contest_office_id_set = set()
+    contest_measure_we_vote_id_set = set()
+    contest_measure_id_set = set()
+    google_civic_election_id_set = set()
+    polling_location_we_vote_id_set = set()
+    for one_batch_row_action in batch_row_action_list:
+        if positive_value_exists(one_batch_row_action.contest_office_we_vote_id) \
+                and not positive_value_exists(one_batch_row_action.contest_office_id):
+            contest_office_we_vote_id_set.add(one_batch_row_action.contest_office_we_vote_id)
+        elif positive_value_exists(one_batch_row_action.contest_office_id) \
+                and not positive_value_exists(one_batch_row_action.contest_office_we_vote_id):
+            contest_office_id_set.add(one_batch_row_action.contest_office_id)
+        if positive_value_exists(one_batch_row_action.contest_measure_we_vote_id) \
+                and not positive_value_exists(one_batch_row_action.contest_measure_id):
+            contest_measure_we_vote_id_set.add(one_batch_row_action.contest_measure_we_vote_id)
+        elif positive_value_exists(one_batch_row_action.contest_measure_id) \
+                and not positive_value_exists(one_batch_row_action.contest_measure_we_vote_id):
+            contest_measure_id_set.add(one_batch_row_action.contest_measure_id)
+        if positive_value_exists(one_batch_row_action.google_civic_election_id):
+            google_civic_election_id_set.add(str(one_batch_row_action.google_civic_election_id))
+        else:
+            google_civic_election_id_set.add(str(google_civic_election_id))
+        if positive_value_exists(one_batch_row_action.polling_location_we_vote_id):
+            polling_location_we_vote_id_set.add(one_batch_row_action.polling_location_we_vote_id)
+
+    try:
+        contest_office_id_by_we_vote_id = dict(ContestOffice.objects.filter(
+            we_vote_id__in=list(contest_office_we_vote_id_set)).values_list('we_vote_id', 'id')) \
+            if len(contest_office_we_vote_id_set) else {}
+        contest_office_we_vote_id_by_id = dict(ContestOffice.objects.filter(
+            id__in=list(contest_office_id_set)).values_list('id', 'we_vote_id')) \
+            if len(contest_office_id_set) else {}
+        contest_measure_id_by_we_vote_id = dict(ContestMeasure.objects.filter(
+            we_vote_id__in=list(contest_measure_we_vote_id_set)).values_list('we_vote_id', 'id')) \
+            if len(contest_measure_we_vote_id_set) else {}
+        contest_measure_we_vote_id_by_id = dict(ContestMeasure.objects.filter(
+            id__in=list(contest_measure_id_set)).values_list('id', 'we_vote_id')) \
+            if len(contest_measure_id_set) else {}
+        # Entries we can't find here are left alone, and looked up one at a time by the caller as before
+        for one_batch_row_action in batch_row_action_list:
+            if one_batch_row_action.contest_office_we_vote_id in contest_office_id_by_we_vote_id \
+                    and not positive_value_exists(one_batch_row_action.contest_office_id):
+                one_batch_row_action.contest_office_id = \
+                    contest_office_id_by_we_vote_id[one_batch_row_action.contest_office_we_vote_id]
+            elif one_batch_row_action.contest_office_id in contest_office_we_vote_id_by_id \
+                    and not positive_value_exists(one_batch_row_action.contest_office_we_vote_id):
+                one_batch_row_action.contest_office_we_vote_id = \
+                    contest_office_we_vote_id_by_id[one_batch_row_action.contest_office_id]
+            if one_batch_row_action.contest_measure_we_vote_id in contest_measure_id_by_we_vote_id \
+                    and not positive_value_exists(one_batch_row_action.contest_measure_id):
+                one_batch_row_action.contest_measure_id = \
+                    contest_measure_id_by_we_vote_id[one_batch_row_action.contest_measure_we_vote_id]
+            elif one_batch_row_action.contest_measure_id in contest_measure_we_vote_id_by_id \
+                    and not positive_value_exists(one_batch_row_action.contest_measure_we_vote_id):
+                one_batch_row_action.contest_measure_we_vote_id = \
+                    contest_measure_we_vote_id_by_id[one_batch_row_action.contest_measure_id]
+
+        if len(polling_location_we_vote_id_set):
+            ballot_returned_query = BallotReturned.objects.filter(
+                google_civic_election_id__in=list(google_civic_election_id_set),
+                polling_location_we_vote_id__in=list(polling_location_we_vote_id_set))
+            for polling_location_we_vote_id, ballot_returned_google_civic_election_id in \
+                    ballot_returned_query.values_list('polling_location_we_vote_id', 'google_civic_election_id'):
+                ballot_returned_entries_that_exist.add(
+                    str(polling_location_we_vote_id) + "-" + str(ballot_returned_google_civic_election_id))
+
+        if retrieve_existing_ballot_items and len(polling_location_we_vote_id_set):
+            ballot_item_query = BallotItem.objects.filter(
+                google_civic_election_id__in=list(google_civic_election_id_set),
+                polling_location_we_vote_id__in=list(polling_location_we_vote_id_set))
+            for ballot_item in ballot_item_query.order_by('id'):
+                if positive_value_exists(ballot_item.contest_office_we_vote_id):
+                    existing_ballot_item_list_dict.setdefault(generate_ballot_item_lookup_key(
+                        google_civic_election_id=ballot_item.google_civic_election_id,
+                        polling_location_we_vote_id=ballot_item.polling_location_we_vote_id,
+                        contest_office_we_vote_id=ballot_item.contest_office_we_vote_id), []).append(ballot_item)
+                elif positive_value_exists(ballot_item.contest_measure_we_vote_id):
+                    existing_ballot_item_list_dict.setdefault(generate_ballot_item_lookup_key(
+                        google_civic_election_id=ballot_item.google_civic_election_id,
+                        polling_location_we_vote_id=ballot_item.polling_location_we_vote_id,
+                        contest_measure_we_vote_id=ballot_item.contest_measure_we_vote_id), []).append(ballot_item)
+        status += "BALLOT_ITEM_IMPORT_OBJECTS_PREFETCHED "
+    except Exception as e:
+        success = False
+        status += "COULD_NOT_PREFETCH_BALLOT_ITEM_IMPORT_OBJECTS: " + str(e) + " "
+        handle_exception(e, logger=logger, exception_message=status)
+
+    results = {
+        'success':                              success,
+        'status':                               status,
+        'ballot_returned_entries_that_exist':   ballot_returned_entries_that_exist,
+        'existing_ballot_item_list_dict':       existing_ballot_item_list_dict,
+    }
+    return results
+
+
 def import_ballot_item_data_from_batch_row_actions(batch_header_id, batch_row_id,
                                                    create_entry_flag=False, update_entry_flag=False):
     """
@@ -5325,10 +5763,30 @@ def import_ballot_item_data_from_batch_row_actions(batch_header_id, batch_row_id
         return results
 
     ballot_returned_manager = BallotReturnedManager()
-    ballot_returned_entries_that_exist = []
+    ballot_returned_entries_that_exist = set()
     measure_manager = ContestMeasureManager()
     office_manager = ContestOfficeManager()
     polling_location_manager = PollingLocationManager()
+    # When importing a whole batch, look up ids and existing entries for every row in a few queries up front,
+    #  and write the BallotItem changes with bulk_create/bulk_update at the end
+    bulk_mode = not positive_value_exists(batch_row_id)
+    existing_ballot_item_list_dict = {}
+    new_ballot_item_list = []
+    new_ballot_item_batch_row_action_list = []
+    changed_ballot_item_list = []
+    changed_ballot_item_id_set = set()
+    if bulk_mode:
+        batch_row_action_list = list(batch_row_action_list)
+        results = prefetch_ballot_item_import_objects(
+            batch_row_action_list=batch_row_action_list,
+            google_civic_election_id=batch_description.google_civic_election_id,
+            retrieve_existing_ballot_items=update_entry_flag)
+        status += results['status']
+        if results['success']:
+            ballot_returned_entries_that_exist = results['ballot_returned_entries_that_exist']
+            existing_ballot_item_list_dict = results['existing_ballot_item_list_dict']
+        else:
+            bulk_mode = False
     for one_batch_row_action in batch_row_action_list:
         # Find the column in the incoming batch_row with the header == ballot_item_display_name
         ballot_item_display_name = one_batch_row_action.ballot_item_display_name
@@ -5377,7 +5835,27 @@ def import_ballot_item_data_from_batch_row_actions(batch_header_id, batch_row_id
         if positive_value_exists(ballot_item_display_name) and positive_value_exists(state_code) \
                 and positive_value_exists(google_civic_election_id):
             ballot_item_manager = BallotItemManager()
-            if create_entry_flag:
+            existing_ballot_item_list = []
+            if update_entry_flag and bulk_mode:
+                existing_ballot_item_list = existing_ballot_item_list_dict.get(generate_ballot_item_lookup_key(
+                    google_civic_election_id=google_civic_election_id,
+                    polling_location_we_vote_id=one_batch_row_action.polling_location_we_vote_id,
+                    contest_office_we_vote_id=one_batch_row_action.contest_office_we_vote_id,
+                    contest_measure_we_vote_id=one_batch_row_action.contest_measure_we_vote_id), [])
+            if create_entry_flag and bulk_mode:
+                new_ballot_item_list.append(ballot_item_manager.generate_ballot_item_row_entry(
+                    ballot_item_display_name, local_ballot_order, state_code, google_civic_election_id, defaults))
+                new_ballot_item_batch_row_action_list.append(one_batch_row_action)
+            elif update_entry_flag and len(existing_ballot_item_list) == 1:
+                # Zero or several matching entries go through update_ballot_item_row_entry below, which reports
+                #  the missing entry or cleans up the duplicates
+                existing_ballot_item = existing_ballot_item_list[0]
+                if ballot_item_manager.update_ballot_item_row_entry_values(
+                        existing_ballot_item, ballot_item_display_name, local_ballot_order, defaults) and \
+                        existing_ballot_item.id not in changed_ballot_item_id_set:
+                    changed_ballot_item_list.append(existing_ballot_item)
+                    changed_ballot_item_id_set.add(existing_ballot_item.id)
+            elif create_entry_flag:
                 results = ballot_item_manager.create_ballot_item_row_entry(ballot_item_display_name,
                                                                            local_ballot_order, state_code,
                                                                            google_civic_election_id, defaults)
@@ -5446,7 +5924,7 @@ def import_ballot_item_data_from_batch_row_actions(batch_header_id, batch_row_id
                                 text_for_map_search=text_for_map_search,
                                 normalized_state=state_code)
                             if create_results['ballot_returned_found']:
-                                ballot_returned_entries_that_exist.append(combined_key)
+                                ballot_returned_entries_that_exist.add(combined_key)
                                 status += "BALLOT_RETURNED_CREATED_OR_UPDATED "
                             else:
                                 status += create_results['status']
@@ -5461,6 +5939,39 @@ def import_ballot_item_data_from_batch_row_actions(batch_header_id, batch_row_id
         else:
             status += "IMPORT_BALLOT_ITEM_ENTRY:MISSING_DISPLAY_NAME-STATE_CODE-OR_ELECTION_ID "
 
+    if len(new_ballot_item_list):
+        try:
+            with transaction.atomic():
+                BallotItem.objects.bulk_create(new_ballot_item_list, batch_size=BULK_SAVE_CHUNK_SIZE)
+                # now update BatchRowActionBallotItem table entries
+                for one_batch_row_action in new_ballot_item_batch_row_action_list:
+                    one_batch_row_action.kind_of_action = IMPORT_ADD_TO_EXISTING
+                BatchRowActionBallotItem.objects.bulk_update(
+                    new_ballot_item_batch_row_action_list, ['kind_of_action'], batch_size=BULK_SAVE_CHUNK_SIZE)
+            number_of_ballot_items_created += len(new_ballot_item_list)
+            new_ballot_item = new_ballot_item_list[-1]
+        except Exception as e:
+            success = False
+            status += "BALLOT_ITEM_BULK_CREATE_ERROR: " + str(e) + " "
+            handle_exception(e, logger=logger, exception_message=status)
+
+    if len(changed_ballot_item_list):
+        try:
+            with transaction.atomic():
+                BallotItem.objects.bulk_update(
+                    changed_ballot_item_list,
+                    [
+                        'ballot_item_display_name', 'contest_measure_id', 'contest_measure_we_vote_id',
+                        'contest_office_id', 'contest_office_we_vote_id', 'local_ballot_order', 'measure_subtitle',
+                        'measure_url', 'no_vote_description', 'state_code', 'yes_vote_description',
+                    ],
+                    batch_size=BULK_SAVE_CHUNK_SIZE)
+            number_of_ballot_items_updated += len(changed_ballot_item_list)
+        except Exception as e:
+            success = False
+            status += "BALLOT_ITEM_BULK_UPDATE_ERROR: " + str(e) + " "
+            handle_exception(e, logger=logger, exception_message=status)
+
     # if number_of_ballot_items_created or number_of_ballot_items_updated:
     #     if positive_value_exists(polling_location_we_vote_id) and positive_value_exists(google_civic_election_id):
     #         # Make sure there is a ballot_returned entry
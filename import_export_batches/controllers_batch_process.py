@@ -5,6 +5,7 @@
 from .controllers import create_batch_row_actions, import_data_from_batch_row_actions
 from .models import ACTIVITY_NOTICE_PROCESS, API_REFRESH_REQUEST, \
     AUGMENT_ANALYTICS_ACTION_WITH_ELECTION_ID, AUGMENT_ANALYTICS_ACTION_WITH_FIRST_VISIT, \
+    BATCH_PROCESS_LEASE_SECONDS, BATCH_PROCESS_NUMBER_OF_WORKERS, BATCH_PROCESS_WORKER_IDLE_SECONDS, \
     BatchDescription, BatchManager, BatchProcessManager, \
     CALCULATE_ORGANIZATION_DAILY_METRICS, \
     CALCULATE_ORGANIZATION_ELECTION_METRICS, \
@@ -15,14 +16,16 @@ from .models import ACTIVITY_NOTICE_PROCESS, API_REFRESH_REQUEST, \
     RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS, REFRESH_BALLOT_ITEMS_FROM_POLLING_LOCATIONS, \
     REFRESH_BALLOT_ITEMS_FROM_VOTERS, SEARCH_TWITTER_FOR_CANDIDATE_TWITTER_HANDLE, UPDATE_TWITTER_DATA_FROM_TWITTER
 from activity.controllers import process_activity_notice_seeds_triggered_by_batch_process
-from analytics.controllers import calculate_sitewide_daily_metrics, \
+from analytics.controllers import \
     process_one_analytics_batch_process_augment_with_election_id, \
     process_one_analytics_batch_process_augment_with_first_visit, process_sitewide_voter_metrics, \
-    retrieve_analytics_processing_next_step
+    retrieve_analytics_processing_next_step, save_daily_metrics_for_one_date
 from analytics.models import AnalyticsManager
+from api_internal_cache.controllers import store_api_internal_cache_in_tiers
 from api_internal_cache.models import ApiInternalCacheManager
 from ballot.models import BallotReturnedListManager
 from datetime import timedelta
+from django.db import close_old_connections, connection
 from django.utils.timezone import now
 from election.models import ElectionManager
 from exception.models import handle_exception
@@ -32,9 +35,12 @@ from import_export_twitter.controllers import fetch_number_of_candidates_needing
     retrieve_possible_twitter_handles_in_bulk
 from issue.controllers import update_issue_statistics
 import json
+import os
+import socket
+import threading
 from voter_guide.controllers import voter_guides_upcoming_retrieve_for_api
 import wevote_functions.admin
-from wevote_functions.functions import positive_value_exists
+from wevote_functions.functions import convert_to_int, positive_value_exists
 from wevote_settings.models import fetch_batch_process_system_on, fetch_batch_process_system_activity_notices_on, \
     fetch_batch_process_system_api_refresh_on, fetch_batch_process_system_ballot_items_on, \
     fetch_batch_process_system_calculate_analytics_on, fetch_batch_process_system_search_twitter_on, \
@@ -60,6 +66,12 @@ NUMBER_OF_SIMULTANEOUS_BATCH_PROCESSES = 4  # Four processes at a time
 NUMBER_OF_SIMULTANEOUS_BALLOT_ITEM_BATCH_PROCESSES = 4  # Four processes at a time
 NUMBER_OF_SIMULTANEOUS_GENERAL_MAINTENANCE_BATCH_PROCESSES = 1
 
+# Kinds of work run_batch_process_workers can be asked to do
+WORKER_KIND_ACTIVITY_NOTICES = 'activity_notices'
+WORKER_KIND_BALLOT_ITEMS = 'ballot_items'
+WORKER_KIND_GENERAL_MAINTENANCE = 'general_maintenance'
+WORKER_KIND_LIST = [WORKER_KIND_ACTIVITY_NOTICES, WORKER_KIND_BALLOT_ITEMS, WORKER_KIND_GENERAL_MAINTENANCE]
+
 
 def process_next_activity_notices():
     success = True
@@ -197,6 +209,8 @@ def process_next_activity_notices():
 def process_next_ballot_items():
     success = True
     status = ""
+    # Claimed with the same leases as run_batch_process_worker, so the two never run the same process at once
+    worker_id = socket.gethostname() + "-" + str(os.getpid()) + "-process_next_ballot_items"
 
     if not fetch_batch_process_system_on():
         status += "BATCH_PROCESS_SYSTEM_TURNED_OFF-BALLOT_ITEMS "
@@ -252,35 +266,21 @@ def process_next_ballot_items():
     process_restarted = False
     if batch_process_list and len(batch_process_list) > 0:
         for batch_process in batch_process_list:
-            if batch_process.kind_of_process in \
+            if batch_process.kind_of_process not in \
                     [REFRESH_BALLOT_ITEMS_FROM_POLLING_LOCATIONS, REFRESH_BALLOT_ITEMS_FROM_VOTERS,
                      RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS]:
-                process_restarted = True
-                # When a batch_process is running, we set date_checked_out to show it is being worked on
-                results = process_one_ballot_item_batch_process(batch_process)
-                status += results['status']
-                # Now that the process is complete, we reset date_checked_out to "NULL"
-                try:
-                    # Before saving batch_process, make sure we have the latest version, since there were
-                    #  updates in process_one_ballot_item_batch_process
-                    batch_process_results = \
-                        batch_process_manager.retrieve_batch_process(batch_process_id=batch_process.id)
-                    if positive_value_exists(batch_process_results['batch_process_found']):
-                        batch_process = batch_process_results['batch_process']
-                    batch_process.date_checked_out = None
-                    batch_process.save()
-                except Exception as e:
-                    status += "ERROR-COULD_NOT_SET_CHECKED_OUT_TIME_TO_NULL: " + str(e) + " "
-                    handle_exception(e, logger=logger, exception_message=status)
-                    batch_process_manager.create_batch_process_log_entry(
-                        batch_process_id=batch_process.id,
-                        google_civic_election_id=batch_process.google_civic_election_id,
-                        kind_of_process=batch_process.kind_of_process,
-                        state_code=batch_process.state_code,
-                        status=status,
-                    )
-            else:
                 status += "KIND_OF_PROCESS_NOT_RECOGNIZED "
+                continue
+            # batch_process_list was retrieved before the processes ahead of this one ran, so a
+            #  run_batch_process_worker may have claimed this one since. Only run it if our claim succeeds.
+            results = batch_process_manager.claim_batch_process_by_id(
+                batch_process_id=batch_process.id, worker_id=worker_id)
+            status += results['status']
+            if not results['batch_process_claimed']:
+                continue
+            process_restarted = True
+            results = run_ballot_item_batch_process_with_lease(results['batch_process'], worker_id=worker_id)
+            status += results['status']
 
     # If a process was started immediately above, exit
     if process_restarted:
@@ -338,56 +338,20 @@ def process_next_ballot_items():
             new_batch_process_list_count = len(new_batch_process_list)
             status += "NEW_BATCH_PROCESS_LIST_COUNT: " + str(new_batch_process_list_count) + ", ADDING ONE "
             for batch_process in new_batch_process_list:
-                # Bring the batch_process_list up by 1 item
-                batch_process_started = False
-                kind_of_process = ""
-                try:
-                    kind_of_process = batch_process.kind_of_process
-                    batch_process.date_started = now()
-                    batch_process.save()
-                    batch_process_started = True
-                except Exception as e:
-                    status += "ERROR-BATCH_PROCESS-CANNOT_SAVE_DATE_STARTED: " + str(e) + " "
-                    handle_exception(e, logger=logger, exception_message=status)
-                    batch_process_manager.create_batch_process_log_entry(
-                        batch_process_id=batch_process.id,
-                        kind_of_process=kind_of_process,
-                        status=status,
-                    )
-
-                if batch_process_started:
-                    if batch_process.kind_of_process in \
-                            [REFRESH_BALLOT_ITEMS_FROM_POLLING_LOCATIONS, REFRESH_BALLOT_ITEMS_FROM_VOTERS,
-                             RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS]:
-                        # Now process the batch
-                        results = process_one_ballot_item_batch_process(batch_process)
-                        status += results['status']
-
-                        # Before a batch_process runs, we set `date_checked_out`, like you check out a library book
-                        #  When the process is complete, we reset `date_checked_out` to "NULL"
-                        try:
-                            # Before saving batch_process, make sure we have the latest version.
-                            # (For example, it might have been paused since it was first retrieved.)
-                            batch_process_results = \
-                                batch_process_manager.retrieve_batch_process(batch_process_id=batch_process.id)
-                            if positive_value_exists(batch_process_results['batch_process_found']):
-                                batch_process = batch_process_results['batch_process']
-
-                            batch_process.date_checked_out = None
-                            batch_process.save()
-                        except Exception as e:
-                            status += "ERROR-COULD_NOT_SET_CHECKED_OUT_TIME_TO_NULL: " + str(e) + " "
-                            handle_exception(e, logger=logger, exception_message=status)
-                            batch_process_manager.create_batch_process_log_entry(
-                                batch_process_id=batch_process.id,
-                                google_civic_election_id=batch_process.google_civic_election_id,
-                                kind_of_process=batch_process.kind_of_process,
-                                state_code=batch_process.state_code,
-                                status=status,
-                            )
-                    else:
-                        status += "KIND_OF_PROCESS_NOT_RECOGNIZED "
-
+                if batch_process.kind_of_process not in \
+                        [REFRESH_BALLOT_ITEMS_FROM_POLLING_LOCATIONS, REFRESH_BALLOT_ITEMS_FROM_VOTERS,
+                         RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS]:
+                    status += "KIND_OF_PROCESS_NOT_RECOGNIZED "
+                    break
+                # Bring the batch_process_list up by 1 item. Claiming it also sets date_started.
+                results = batch_process_manager.claim_batch_process_by_id(
+                    batch_process_id=batch_process.id, worker_id=worker_id)
+                status += results['status']
+                if not results['batch_process_claimed']:
+                    # Taken by a run_batch_process_worker since the list was retrieved
+                    continue
+                results = run_ballot_item_batch_process_with_lease(results['batch_process'], worker_id=worker_id)
+                status += results['status']
                 break
 
     results = {
@@ -778,6 +742,210 @@ def process_next_general_maintenance():
     return results
 
 
+def run_ballot_item_batch_process_with_lease(batch_process, worker_id='', lease_seconds=BATCH_PROCESS_LEASE_SECONDS):
+    """
+    Run the next step of a ballot item batch_process which worker_id has claimed, then release the lease. The lease
+    is renewed in the background while the step is running, so a step which takes longer than lease_seconds is not
+    claimed by another worker.
+    :param batch_process:
+    :param worker_id:
+    :param lease_seconds:
+    :return:
+    """
+    status = ""
+    success = True
+    batch_process_manager = BatchProcessManager()
+    lease_released = threading.Event()
+
+    def renew_lease():
+        try:
+            while not lease_released.wait(max(1, lease_seconds // 3)):
+                batch_process_manager.renew_batch_process_lease(
+                    batch_process_id=batch_process.id, worker_id=worker_id, lease_seconds=lease_seconds)
+        finally:
+            connection.close()
+
+    heartbeat_thread = threading.Thread(
+        name='batch_process_lease_' + str(batch_process.id), target=renew_lease, daemon=True)
+    heartbeat_thread.start()
+    try:
+        results = process_one_ballot_item_batch_process(batch_process)
+        status += results['status']
+    except Exception as e:
+        success = False
+        status += "ERROR-LEASED_BALLOT_ITEM_BATCH_PROCESS: " + str(e) + " "
+        handle_exception(e, logger=logger, exception_message=status)
+        batch_process_manager.create_batch_process_log_entry(
+            batch_process_id=batch_process.id,
+            google_civic_election_id=batch_process.google_civic_election_id,
+            kind_of_process=batch_process.kind_of_process,
+            state_code=batch_process.state_code,
+            status=status,
+        )
+    finally:
+        lease_released.set()
+        heartbeat_thread.join()
+        # This also sets date_checked_out back to NULL
+        results = batch_process_manager.release_batch_process_lease(
+            batch_process_id=batch_process.id, worker_id=worker_id)
+        status += results['status']
+
+    results = {
+        'success':  success,
+        'status':   status,
+    }
+    return results
+
+
+def process_next_ballot_items_with_lease(worker_id='', lease_seconds=BATCH_PROCESS_LEASE_SECONDS):
+    """
+    Claim the next ballot item BatchProcess with a lease, run its next step, and release it. The lease is renewed
+    in the background while the step is running, so a step which takes longer than lease_seconds is not claimed by
+    another worker, while a worker which stops without releasing its lease only holds the process for
+    lease_seconds. Unlike process_next_ballot_items, this does not cap the number of ballot item processes
+    running at once: that is the number of workers running.
+    :param worker_id:
+    :param lease_seconds:
+    :return:
+    """
+    success = True
+    status = ""
+    batch_process_found = False
+
+    if not fetch_batch_process_system_on():
+        status += "BATCH_PROCESS_SYSTEM_TURNED_OFF-BALLOT_ITEMS "
+    elif not fetch_batch_process_system_ballot_items_on():
+        status += "BATCH_PROCESS_SYSTEM_BALLOT_ITEMS_TURNED_OFF "
+    else:
+        batch_process_manager = BatchProcessManager()
+        results = batch_process_manager.claim_batch_process(
+            kind_of_process_list=[
+                REFRESH_BALLOT_ITEMS_FROM_POLLING_LOCATIONS,
+                REFRESH_BALLOT_ITEMS_FROM_VOTERS,
+                RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS],
+            worker_id=worker_id,
+            lease_seconds=lease_seconds,
+            for_upcoming_elections=True)
+        status += results['status']
+        if not results['success']:
+            success = False
+            batch_process_manager.create_batch_process_log_entry(
+                critical_failure=True,
+                status=status,
+            )
+        elif results['batch_process_found']:
+            batch_process_found = True
+            results = run_ballot_item_batch_process_with_lease(
+                results['batch_process'], worker_id=worker_id, lease_seconds=lease_seconds)
+            status += results['status']
+
+    results = {
+        'success':              success,
+        'status':               status,
+        'batch_process_found':  batch_process_found,
+    }
+    return results
+
+
+def run_batch_process_worker(
+        worker_id='',
+        kind_of_worker=WORKER_KIND_BALLOT_ITEMS,
+        lease_seconds=BATCH_PROCESS_LEASE_SECONDS,
+        idle_seconds=BATCH_PROCESS_WORKER_IDLE_SECONDS,
+        stop_event=None):
+    """
+    Keep working through BatchProcesses until stop_event is set. Ballot item workers claim processes with leases,
+    so any number of them can run across processes and servers. Activity notice and general maintenance workers
+    call process_next_activity_notices or process_next_general_maintenance every idle_seconds, in place of the
+    requests to their admin URLs, since those only run one process at a time.
+    :param worker_id:
+    :param kind_of_worker:
+    :param lease_seconds:
+    :param idle_seconds:
+    :param stop_event:
+    :return:
+    """
+    steps_run = 0
+    while not stop_event.is_set():
+        close_old_connections()
+        batch_process_found = False
+        try:
+            if kind_of_worker == WORKER_KIND_BALLOT_ITEMS:
+                results = process_next_ballot_items_with_lease(worker_id=worker_id, lease_seconds=lease_seconds)
+                batch_process_found = results['batch_process_found']
+            elif kind_of_worker == WORKER_KIND_ACTIVITY_NOTICES:
+                results = process_next_activity_notices()
+            else:
+                results = process_next_general_maintenance()
+            logger.debug(worker_id + ": " + results['status'])
+        except Exception as e:
+            handle_exception(e, logger=logger, exception_message="BATCH_PROCESS_WORKER_FAILED: " + worker_id + " ")
+        if batch_process_found:
+            steps_run += 1
+        else:
+            stop_event.wait(idle_seconds)
+    connection.close()
+    return steps_run
+
+
+def run_batch_process_workers(
+        number_of_workers=BATCH_PROCESS_NUMBER_OF_WORKERS,
+        kind_of_worker_list=[WORKER_KIND_BALLOT_ITEMS],
+        lease_seconds=BATCH_PROCESS_LEASE_SECONDS,
+        idle_seconds=BATCH_PROCESS_WORKER_IDLE_SECONDS,
+        stop_event=None):
+    """
+    Start number_of_workers ballot item workers, plus one worker for each other kind in kind_of_worker_list, and
+    wait for them to finish after stop_event is set.
+    :param number_of_workers:
+    :param kind_of_worker_list:
+    :param lease_seconds:
+    :param idle_seconds:
+    :param stop_event:
+    :return:
+    """
+    status = ""
+    if stop_event is None:
+        stop_event = threading.Event()
+    worker_id_prefix = socket.gethostname() + "-" + str(os.getpid()) + "-"
+
+    worker_kind_list = []
+    for kind_of_worker in kind_of_worker_list:
+        if kind_of_worker == WORKER_KIND_BALLOT_ITEMS:
+            worker_kind_list += [kind_of_worker] * max(1, convert_to_int(number_of_workers))
+        elif kind_of_worker in WORKER_KIND_LIST:
+            worker_kind_list.append(kind_of_worker)
+        else:
+            status += "KIND_OF_WORKER_NOT_RECOGNIZED: " + str(kind_of_worker) + " "
+
+    steps_run_list = [0] * len(worker_kind_list)
+
+    def run_one_worker(worker_number):
+        steps_run_list[worker_number] = run_batch_process_worker(
+            worker_id=worker_id_prefix + str(worker_number),
+            kind_of_worker=worker_kind_list[worker_number],
+            lease_seconds=lease_seconds,
+            idle_seconds=idle_seconds,
+            stop_event=stop_event)
+
+    worker_thread_list = []
+    for worker_number in range(len(worker_kind_list)):
+        worker_thread = threading.Thread(
+            name='batch_process_worker_' + str(worker_number), target=run_one_worker, args=(worker_number,))
+        worker_thread.start()
+        worker_thread_list.append(worker_thread)
+    for worker_thread in worker_thread_list:
+        worker_thread.join()
+
+    status += "BATCH_PROCESS_WORKERS_STOPPED: " + str(len(worker_thread_list)) + " "
+    results = {
+        'success':                  True,
+        'status':                   status,
+        'ballot_item_steps_run':    sum(steps_run_list),
+    }
+    return results
+
+
 def process_one_analytics_batch_process(batch_process):
     from import_export_batches.models import BatchProcessManager
     batch_process_manager = BatchProcessManager()
@@ -959,7 +1127,7 @@ def process_one_analytics_batch_process(batch_process):
         # Not implemented yet -- mark as completed
         mark_as_completed = True
     elif batch_process.kind_of_process in [CALCULATE_ORGANIZATION_DAILY_METRICS]:
-        # Not implemented yet -- mark as completed
+        # Saved along with CALCULATE_SITEWIDE_DAILY_METRICS, by save_daily_metrics_for_one_date -- mark as completed
         mark_as_completed = True
     elif batch_process.kind_of_process in [CALCULATE_ORGANIZATION_ELECTION_METRICS]:
         # Not implemented yet -- mark as completed
@@ -1049,6 +1217,15 @@ def process_one_api_refresh_request_batch_process(batch_process):
             status += results['status']
             api_internal_cache_saved = results['success']
             api_internal_cache_id = results['api_internal_cache_id']
+            if api_internal_cache_saved:
+                # Hand the new response to the in-process and shared cache tiers, so readers don't wait
+                #  for their next revalidation to deserialize it from the database
+                status += store_api_internal_cache_in_tiers(
+                    api_name=batch_process.api_name,
+                    election_id_list_serialized=batch_process.election_id_list_serialized,
+                    api_internal_cache_id=api_internal_cache_id,
+                    date_cached=results['api_internal_cache'].date_cached,
+                    cached_api_response_serialized=cached_api_response_serialized)
         else:
             status += "NEW_API_RESULTS_RETRIEVE_FAILED "
     else:
@@ -1139,7 +1316,7 @@ def process_one_ballot_item_batch_process(batch_process):
             batch_process = batch_process_results['batch_process']
 
         batch_process.date_checked_out = now()
-        batch_process.save()
+        batch_process.save(update_fields=['date_checked_out'])
         batch_process_id = batch_process.id
     except Exception as e:
         status += "ERROR-CHECKED_OUT_TIME_NOT_SAVED: " + str(e) + " "
@@ -1343,7 +1520,7 @@ def process_one_ballot_item_batch_process(batch_process):
                 # Now clear out date_checked_out so it can be picked up by the next step
                 try:
                     batch_process.date_checked_out = None
-                    batch_process.save()
+                    batch_process.save(update_fields=['date_checked_out'])
                 except Exception as e:
                     status += "CANNOT_CLEAR_OUT_DATE_CHECKED_OUT: " + str(e) + " "
 
@@ -2416,29 +2593,14 @@ def process_one_sitewide_daily_analytics_batch_process(batch_process):
     status += update_results['status']
 
     daily_metrics_calculated = False
-    results = calculate_sitewide_daily_metrics(batch_process.analytics_date_as_integer)
+    # Sitewide and organization daily metrics come from one pass over this day's AnalyticsAction entries
+    results = save_daily_metrics_for_one_date(batch_process.analytics_date_as_integer)
     status += results['status']
     if positive_value_exists(results['success']):
-        sitewide_daily_metrics_values = results['sitewide_daily_metrics_values']
-        update_results = analytics_manager.save_sitewide_daily_metrics_values(sitewide_daily_metrics_values)
-        status += update_results['status']
-        if positive_value_exists(update_results['success']):
-            daily_metrics_calculated = True
-        else:
-            status += "SAVE_SITEWIDE_DAILY_METRICS-FAILED_TO_SAVE "
-            success = False
-            batch_process_manager.create_batch_process_log_entry(
-                batch_process_id=batch_process.id,
-                kind_of_process=batch_process.kind_of_process,
-                status=status,
-            )
-            results = {
-                'success': success,
-                'status': status,
-            }
-            return results
+        daily_metrics_calculated = True
+        status += "ORGANIZATION_DAILY_METRICS_SAVED: " + str(results['organization_daily_metrics_saved_count']) + " "
     else:
-        status += "SAVE_SITEWIDE_DAILY_METRICS-FAILED_TO_CALCULATE "
+        status += "SAVE_SITEWIDE_DAILY_METRICS-FAILED "
         success = False
         batch_process_manager.create_batch_process_log_entry(
             batch_process_id=batch_process.id,
@@ -2472,6 +2634,7 @@ def process_one_sitewide_daily_analytics_batch_process(batch_process):
     if daily_metrics_calculated:
         # If here, there aren't any more sitewide_daily_metrics to process for this date
         defaults = {
+            'finished_calculate_organization_daily_metrics': True,
             'finished_calculate_sitewide_daily_metrics': True,
         }
         status_results = analytics_manager.save_analytics_processing_status(
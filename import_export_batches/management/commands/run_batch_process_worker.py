@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from import_export_batches.controllers_batch_process import run_batch_process_workers, \
+    WORKER_KIND_BALLOT_ITEMS, WORKER_KIND_LIST
+from import_export_batches.models import BATCH_PROCESS_LEASE_SECONDS, BATCH_PROCESS_NUMBER_OF_WORKERS, \
+    BATCH_PROCESS_WORKER_IDLE_SECONDS
+import signal
+import threading
+
+
+class Command(BaseCommand):
+    help = 'Runs BatchProcesses until stopped, in place of requests to the process_next_* admin URLs. Ballot item ' \
+           'processes are claimed with leases, so this can run in several processes and on several servers at once.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', choices=WORKER_KIND_LIST,
+                            help='Kind of work to run. Can be repeated. Defaults to ' + WORKER_KIND_BALLOT_ITEMS)
+        parser.add_argument('--number_of_workers', type=int, default=BATCH_PROCESS_NUMBER_OF_WORKERS,
+                            help='Number of ballot item BatchProcesses run at the same time by this command')
+        parser.add_argument('--lease_seconds', type=int, default=BATCH_PROCESS_LEASE_SECONDS,
+                            help='Seconds a BatchProcess stays claimed by a worker which stops renewing its lease')
+        parser.add_argument('--idle_seconds', type=int, default=BATCH_PROCESS_WORKER_IDLE_SECONDS,
+                            help='Seconds a worker waits when there was nothing to do')
+
+    def handle(self, *args, **options):
+        stop_event = threading.Event()
+
+        def stop_workers(signal_number, frame):
+            self.stdout.write('Stopping after the steps already running have finished')
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, stop_workers)
+        signal.signal(signal.SIGTERM, stop_workers)
+        results = run_batch_process_workers(
+            number_of_workers=options['number_of_workers'],
+            kind_of_worker_list=options['kind'] or [WORKER_KIND_BALLOT_ITEMS],
+            lease_seconds=options['lease_seconds'],
+            idle_seconds=options['idle_seconds'],
+            stop_event=stop_event)
+        self.stdout.write('Ran {steps} ballot item steps. {status}'.format(
+            steps=results['ballot_item_steps_run'],
+            status=results['status']))
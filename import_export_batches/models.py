@@ -3,10 +3,11 @@
 # -*- coding: UTF-8 -*-
 
 import codecs
+from config.base import get_environment_variable_default
 import csv
 from datetime import date, timedelta
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.utils.http import urlquote
 from django.utils.timezone import localtime, now
 from election.models import ElectionManager
@@ -17,6 +18,8 @@ import magic
 from organization.models import ORGANIZATION_TYPE_CHOICES, UNKNOWN, alphanumeric
 from party.controllers import retrieve_all_party_names_and_ids_api, party_import_from_xml_data
 from politician.models import GENDER_CHOICES, UNKNOWN
+import shutil
+import tempfile
 import urllib
 from urllib.request import Request, urlopen
 from voter_guide.models import ORGANIZATION_WORD
@@ -626,9 +629,69 @@ KIND_OF_PROCESS_CHOICES = (
     (SEARCH_TWITTER_FOR_CANDIDATE_TWITTER_HANDLE, 'Search for Candidate Twitter Handles'),
 )
 
+# A run_batch_process_worker thread holds the lease on a BatchProcess for this many seconds, and renews it every
+#  third of that while it is still working on the process. A lease which isn't renewed (the worker crashed or the
+#  node went away) can be claimed by another worker once it expires.
+BATCH_PROCESS_LEASE_SECONDS = convert_to_int(get_environment_variable_default("BATCH_PROCESS_LEASE_SECONDS", 120))
+# Number of BatchProcesses each run_batch_process_worker command works on at the same time
+BATCH_PROCESS_NUMBER_OF_WORKERS = \
+    convert_to_int(get_environment_variable_default("BATCH_PROCESS_NUMBER_OF_WORKERS", 4))
+# Seconds a worker waits before looking again, when there was nothing for it to claim
+BATCH_PROCESS_WORKER_IDLE_SECONDS = \
+    convert_to_int(get_environment_variable_default("BATCH_PROCESS_WORKER_IDLE_SECONDS", 30))
+
+# Elements of one kind stored at a time by create_batch_set_vip_xml, which streams the VIP xml document
+VIP_XML_CHUNK_SIZE = convert_to_int(get_environment_variable_default("VIP_XML_CHUNK_SIZE", 1000))
+# Stored in a first pass through the document, since the elements in the second pass are matched against them
+VIP_XML_FIRST_PASS_TAG_LIST = ['ElectoralDistrict', 'Party', 'CandidateSelection']
+VIP_XML_SECOND_PASS_TAG_LIST = [
+    'Office', 'CandidateContest', 'Person', 'Candidate', 'BallotMeasureContest', 'State', 'Election', 'Source']
+
 logger = wevote_functions.admin.get_logger(__name__)
 
 
+def iterate_vip_xml_element_chunks(xml_file, tag_list, chunk_size=VIP_XML_CHUNK_SIZE):
+    """
+    Stream the direct children of the VipObject root with iterparse, and yield the ones with a tag in tag_list in
+    chunks of up to chunk_size elements with the same tag. Each chunk is yielded as (tag, chunk_root), where
+    chunk_root holds only that chunk, so the store_*_xml functions can call findall on it like on the whole document.
+    Every element is dropped from the parsed tree as soon as it is complete, so memory is bounded by chunk_size
+    instead of the size of the document.
+    :param xml_file: File name or file object
+    :param tag_list:
+    :param chunk_size:
+    :return:
+    """
+    xml_root = None
+    depth = 0
+    element_list_by_tag = {tag: [] for tag in tag_list}
+    for event, element in ElementTree.iterparse(xml_file, events=('start', 'end')):
+        if event == 'start':
+            if xml_root is None:
+                xml_root = element
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1:
+            continue
+        # element is a complete direct child of the root, so the root doesn't need to keep it
+        xml_root.clear()
+        if element.tag not in element_list_by_tag:
+            element.clear()
+            continue
+        element_list_by_tag[element.tag].append(element)
+        if len(element_list_by_tag[element.tag]) >= chunk_size:
+            chunk_root = ElementTree.Element(xml_root.tag)
+            chunk_root.extend(element_list_by_tag[element.tag])
+            element_list_by_tag[element.tag] = []
+            yield element.tag, chunk_root
+    for tag in tag_list:
+        if len(element_list_by_tag[tag]):
+            chunk_root = ElementTree.Element(xml_root.tag)
+            chunk_root.extend(element_list_by_tag[tag])
+            yield tag, chunk_root
+
+
 def get_value_if_index_in_list(incoming_list, index):
     try:
         return incoming_list[index]
@@ -2029,57 +2092,28 @@ class BatchManager(models.Manager):
         return results
 
     def retrieve_value_from_batch_row(self, batch_header_name_we_want, batch_header_map, one_batch_row):
-        index_number = 0
-        batch_header_name_we_want = batch_header_name_we_want.lower().strip()
-        number_of_columns = 50
-        while index_number < number_of_columns:
-            index_number_string = "00" + str(index_number)
-            index_number_string = index_number_string[-3:]
-            batch_header_map_attribute_name = "batch_header_map_" + index_number_string
-            # If this position in the batch_header_map matches the batch_header_name_we_want, then we know what column
-            # to look in within one_batch_row for the value
-            value_from_batch_header_map = getattr(batch_header_map, batch_header_map_attribute_name)
-            if value_from_batch_header_map is None:
-                # Break out when we stop getting batch_header_map values
-                return ""
-            value_from_batch_header_map = value_from_batch_header_map.replace('"', '')
-            value_from_batch_header_map = value_from_batch_header_map.replace('﻿', '')
-            value_from_batch_header_map = value_from_batch_header_map.lower().strip()
-            if batch_header_name_we_want == value_from_batch_header_map:
-                one_batch_row_attribute_name = "batch_row_" + index_number_string
-                value_from_batch_row = getattr(one_batch_row, one_batch_row_attribute_name)
-                if isinstance(value_from_batch_row, str):
-                    return value_from_batch_row.strip()
-                else:
-                    return value_from_batch_row
-            index_number += 1
-        return ""
+        # If this header in the batch_header_map matches the batch_header_name_we_want, then we know what column
+        # to look in within one_batch_row for the value
+        one_batch_row_attribute_name = batch_header_map.batch_row_column_name_by_header()[
+            'match_with_quotes_removed'].get(batch_header_name_we_want.lower().strip())
+        if one_batch_row_attribute_name is None:
+            return ""
+        value_from_batch_row = getattr(one_batch_row, one_batch_row_attribute_name)
+        if isinstance(value_from_batch_row, str):
+            return value_from_batch_row.strip()
+        else:
+            return value_from_batch_row
 
     def retrieve_column_name_from_batch_row(self, batch_header_name_we_want, batch_header_map):
         """
         Given column name from batch_header_map, retrieve equivalent column name from batch row
+        eg: batch_header_map_000 --> measure_batch_id
         :param batch_header_name_we_want: 
         :param batch_header_map: 
         :return:
         """
-        index_number = 0
-        batch_header_name_we_want = batch_header_name_we_want.lower().strip()
-        number_of_columns = 50
-        while index_number < number_of_columns:
-            index_number_string = "00" + str(index_number)
-            index_number_string = index_number_string[-3:]
-            batch_header_map_attribute_name = "batch_header_map_" + index_number_string
-            # If this position in the batch_header_map matches the batch_header_name_we_want, then we know what column
-            # to look in within one_batch_row for the value, eg: batch_header_map_000 --> measure_batch_id
-            value_from_batch_header_map = getattr(batch_header_map, batch_header_map_attribute_name)
-            if value_from_batch_header_map is None:
-                # Break out when we stop getting batch_header_map values
-                return ""
-            if batch_header_name_we_want == value_from_batch_header_map.lower().strip():
-                one_batch_row_attribute_name = "batch_row_" + index_number_string
-                return one_batch_row_attribute_name
-            index_number += 1
-        return ""
+        return batch_header_map.batch_row_column_name_by_header()['match_as_stored'].get(
+            batch_header_name_we_want.lower().strip(), "")
 
     def find_file_type(self, batch_uri):
         """
@@ -2122,48 +2156,76 @@ class BatchManager(models.Manager):
 
     def create_batch_vip_xml(self, batch_uri, kind_of_batch, google_civic_election_id, organization_we_vote_id):
         """
-        Retrieves CTCL data from an xml file - Measure, Office, Candidate, Politician
+        Retrieves CTCL data from an xml file - Measure, Office, Candidate, Politician. The document is streamed, and
+        the elements of kind_of_batch are stored VIP_XML_CHUNK_SIZE at a time.
         :param batch_uri:
         :param kind_of_batch:
         :param google_civic_election_id:
         :param organization_we_vote_id:
         :return:
         """
+        if kind_of_batch == MEASURE:
+            tag, store_function = 'BallotMeasureContest', self.store_measure_xml
+        elif kind_of_batch == ELECTED_OFFICE:
+            tag, store_function = 'Office', self.store_elected_office_xml
+        elif kind_of_batch == CONTEST_OFFICE:
+            tag, store_function = 'CandidateContest', self.store_contest_office_xml
+        elif kind_of_batch == CANDIDATE:
+            tag, store_function = 'Candidate', self.store_candidate_xml
+        elif kind_of_batch == POLITICIAN:
+            tag, store_function = 'Person', self.store_politician_xml
+        else:
+            results = {
+                'success': False,
+                'status': '',
+                'batch_header_id': 0,
+                'batch_saved': False,
+                'number_of_batch_rows': 0,
+            }
+            return results
+
         # Retrieve from XML
         request = urllib.request.urlopen(batch_uri)
-        # xml_data = request.read()
-        # xml_data = xmltodict.parse(xml_data)
-        # # xml_data_list_json = list(xml_data)
-        # structured_json = json.dumps(xml_data)
-
-        xml_tree = ElementTree.parse(request)
-        request.close()
-        xml_root = xml_tree.getroot()
+        status = ''
+        success = True
+        batch_header_id = 0
+        number_of_batch_rows = 0
+        chunk_found = False
+        try:
+            for tag_found, chunk_root in iterate_vip_xml_element_chunks(request, [tag]):
+                chunk_found = True
+                results = store_function(batch_uri, google_civic_election_id, organization_we_vote_id, chunk_root,
+                                         batch_header_id=batch_header_id)
+                status += results['status']
+                number_of_batch_rows += results['number_of_batch_rows']
+                batch_header_id = results['batch_header_id']
+                if not results['success']:
+                    success = False
+                    break
+            if not chunk_found:
+                # No elements of this kind, which store_function reports as it would for the whole document
+                results = store_function(batch_uri, google_civic_election_id, organization_we_vote_id,
+                                         ElementTree.Element('VipObject'))
+                status += results['status']
+                success = results['success']
+        except ElementTree.ParseError as e:
+            success = False
+            status += " EXCEPTION_PARSING_VIP_XML: " + str(e) + " "
+            handle_exception(e, logger=logger, exception_message=status)
+        finally:
+            request.close()
 
-        if xml_root:
-            if kind_of_batch == MEASURE:
-                return self.store_measure_xml(batch_uri, google_civic_election_id, organization_we_vote_id, xml_root)
-            elif kind_of_batch == ELECTED_OFFICE:
-                return self.store_elected_office_xml(batch_uri, google_civic_election_id, organization_we_vote_id,
-                                                     xml_root)
-            elif kind_of_batch == CONTEST_OFFICE:
-                return self.store_contest_office_xml(batch_uri, google_civic_election_id, organization_we_vote_id,
-                                                     xml_root)
-            elif kind_of_batch == CANDIDATE:
-                return self.store_candidate_xml(batch_uri, google_civic_election_id, organization_we_vote_id, xml_root)
-            elif kind_of_batch == POLITICIAN:
-                return self.store_politician_xml(batch_uri, google_civic_election_id, organization_we_vote_id, xml_root)
-            else:
-                results = {
-                    'success': False,
-                    'status': '',
-                    'batch_header_id': 0,
-                    'batch_saved': False,
-                    'number_of_batch_rows': 0,
-                }
-                return results
+        results = {
+            'success': success,
+            'status': status,
+            'batch_header_id': batch_header_id,
+            'batch_saved': success,
+            'number_of_batch_rows': number_of_batch_rows,
+        }
+        return results
 
-    def store_measure_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root, batch_set_id=0):
+    def store_measure_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
+                          batch_set_id=0, batch_header_id=0):
         """
         Retrieves Measure data from CTCL xml file
         :param batch_uri:
@@ -2171,23 +2233,24 @@ class BatchManager(models.Manager):
         :param organization_we_vote_id:
         :param xml_root:
         :param batch_set_id:
+        :param batch_header_id: Add the rows to this batch_header, when the elements are stored in chunks
         :return:
         """
         # Process BallotMeasureContest data
 
         number_of_batch_rows = 0
-        first_line = True
+        first_line = not positive_value_exists(batch_header_id)
         success = True
         status = ''
         limit_for_testing = 0
-        batch_header_id = 0
+        batch_row_list = []
 
         # Look for BallotMeasureContest and create the batch_header first. BallotMeasureContest is the direct child node
         # of VipObject
         ballot_measure_xml_node = xml_root.findall('BallotMeasureContest')
         # if ballot_measure_xml_node is not None:
         for one_ballot_measure in ballot_measure_xml_node:
-            if positive_value_exists(limit_for_testing) and number_of_batch_rows >= limit_for_testing:
+            if positive_value_exists(limit_for_testing) and len(batch_row_list) >= limit_for_testing:
                 break
 
             # look for relevant child nodes under BallotMeasureContest: id, BallotTitle, BallotSubTitle,
@@ -2284,21 +2347,23 @@ class BatchManager(models.Manager):
                     (positive_value_exists(ballot_measure_subtitle) or positive_value_exists(ballot_measure_title) or
                          positive_value_exists(ballot_measure_name))):
 
-                try:
-                    batch_row = BatchRow.objects.create(
-                        batch_header_id=batch_header_id,
-                        batch_row_000=ballot_measure_id,
-                        batch_row_001=ballot_measure_subtitle,
-                        batch_row_002=ballot_measure_title,
-                        batch_row_003=electoral_district_id,
-                        batch_row_004=ctcl_uuid,
-                        batch_row_005=ballot_measure_name
-                    )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += " EXCEPTION_BATCH_ROW: " + str(e) + " "
-                    break
+                batch_row_list.append(BatchRow(
+                    batch_header_id=batch_header_id,
+                    batch_row_000=ballot_measure_id,
+                    batch_row_001=ballot_measure_subtitle,
+                    batch_row_002=ballot_measure_title,
+                    batch_row_003=electoral_district_id,
+                    batch_row_004=ctcl_uuid,
+                    batch_row_005=ballot_measure_name
+                ))
+        if len(batch_row_list):
+            try:
+                BatchRow.objects.bulk_create(batch_row_list)
+                number_of_batch_rows += len(batch_row_list)
+            except Exception as e:
+                status += " EXCEPTION_BATCH_ROW: " + str(e) + " "
+                handle_exception(e, logger=logger, exception_message=status)
+                success = False
         results = {
             'success': success,
             'status': status,
@@ -2309,7 +2374,7 @@ class BatchManager(models.Manager):
         return results
 
     def store_elected_office_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
-                                 batch_set_id=0):
+                                 batch_set_id=0, batch_header_id=0):
         """
         Retrieves Office data from CTCL xml file
         :param batch_uri:
@@ -2317,22 +2382,24 @@ class BatchManager(models.Manager):
         :param organization_we_vote_id:
         :param xml_root:
         :param batch_set_id
+        :param batch_header_id: Add the rows to this batch_header, when the elements are stored in chunks
         :return:
         """
         # Process VIP Office data
         number_of_batch_rows = 0
-        first_line = True
-        success = False
+        first_line = not positive_value_exists(batch_header_id)
+        # Later chunks of Office elements add to the batch_header saved with the first chunk
+        success = positive_value_exists(batch_header_id)
         status = ''
         limit_for_testing = 0
-        batch_header_id = 0
+        batch_row_list = []
 
         # Look for Office and create the batch_header first. Office is the direct child node
         # of VipObject
         elected_office_xml_node = xml_root.findall('Office')
         # if ballot_measure_xml_node is not None:
         for one_elected_office in elected_office_xml_node:
-            if positive_value_exists(limit_for_testing) and number_of_batch_rows >= limit_for_testing:
+            if positive_value_exists(limit_for_testing) and len(batch_row_list) >= limit_for_testing:
                 break
 
             # look for relevant child nodes under Office: id, Name, Description, ElectoralDistrictId,
@@ -2445,24 +2512,25 @@ class BatchManager(models.Manager):
             if positive_value_exists(elected_office_id) and positive_value_exists(ctcl_uuid) and \
                     (positive_value_exists(electoral_district_id) or positive_value_exists(elected_office_name)) or \
                     positive_value_exists(elected_office_name_es):
-                try:
-                    batch_row = BatchRow.objects.create(
-                        batch_header_id=batch_header_id,
-                        batch_row_000=elected_office_id,
-                        batch_row_001=elected_office_name,
-                        batch_row_002=elected_office_name_es,
-                        batch_row_003=elected_office_description,
-                        batch_row_004=elected_office_description_es,
-                        batch_row_005=electoral_district_id,
-                        batch_row_006=elected_office_is_partisan,
-                        batch_row_007=ctcl_uuid
-                    )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += " EXCEPTION_BATCH_ROW: " + str(e) + " "
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
+                batch_row_list.append(BatchRow(
+                    batch_header_id=batch_header_id,
+                    batch_row_000=elected_office_id,
+                    batch_row_001=elected_office_name,
+                    batch_row_002=elected_office_name_es,
+                    batch_row_003=elected_office_description,
+                    batch_row_004=elected_office_description_es,
+                    batch_row_005=electoral_district_id,
+                    batch_row_006=elected_office_is_partisan,
+                    batch_row_007=ctcl_uuid
+                ))
+        if len(batch_row_list):
+            try:
+                BatchRow.objects.bulk_create(batch_row_list)
+                number_of_batch_rows += len(batch_row_list)
+            except Exception as e:
+                status += " EXCEPTION_BATCH_ROW: " + str(e) + " "
+                handle_exception(e, logger=logger, exception_message=status)
+                success = False
         results = {
             'success': success,
             'status': status,
@@ -2473,7 +2541,7 @@ class BatchManager(models.Manager):
         return results
 
     def store_contest_office_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
-                                 batch_set_id=0):
+                                 batch_set_id=0, batch_header_id=0):
         """
         Retrieves ContestOffice data from CTCL xml file
         :param batch_uri:
@@ -2481,16 +2549,17 @@ class BatchManager(models.Manager):
         :param organization_we_vote_id:
         :param xml_root:
         :param batch_set_id
+        :param batch_header_id: Add the rows to this batch_header, when the elements are stored in chunks
         :return:
         """
         from import_export_ctcl.controllers import retrieve_candidate_from_candidate_selection
         # Process VIP CandidateContest data
         number_of_batch_rows = 0
-        first_line = True
+        first_line = not positive_value_exists(batch_header_id)
         success = True
         status = ''
         limit_for_testing = 0
-        batch_header_id = 0
+        batch_row_list = []
 
         candidate_selection_id_key_list = [
             'candidate_selection_id_1', 'candidate_selection_id_2', 'candidate_selection_id_3',
@@ -2502,7 +2571,7 @@ class BatchManager(models.Manager):
         contest_office_xml_node = xml_root.findall('CandidateContest')
         # if contest_office_xml_node is not None:
         for one_contest_office in contest_office_xml_node:
-            if positive_value_exists(limit_for_testing) and number_of_batch_rows >= limit_for_testing:
+            if positive_value_exists(limit_for_testing) and len(batch_row_list) >= limit_for_testing:
                 break
 
             # look for relevant child nodes under CandidateContest: id, Name, OfficeId, ElectoralDistrictId,
@@ -2645,33 +2714,34 @@ class BatchManager(models.Manager):
             # check for contest_office_batch_id or electoral_district or name AND ctcl_uuid
             if positive_value_exists(contest_office_id) and positive_value_exists(ctcl_uuid) and \
                     (positive_value_exists(electoral_district_id) or positive_value_exists(contest_office_name)):
-                try:
-                    batch_row = BatchRow.objects.create(
-                        batch_header_id=batch_header_id,
-                        batch_row_000=contest_office_id,
-                        batch_row_001=contest_office_name,
-                        batch_row_002=elected_office_id,
-                        batch_row_003=electoral_district_id,
-                        batch_row_004=contest_office_votes_allowed,
-                        batch_row_005=contest_office_number_elected,
-                        batch_row_006=ctcl_uuid,
-                        batch_row_007=candidate_selection_ids_dict.get('candidate_selection_id_1', ''),
-                        batch_row_008=candidate_selection_ids_dict.get('candidate_selection_id_2', ''),
-                        batch_row_009=candidate_selection_ids_dict.get('candidate_selection_id_3', ''),
-                        batch_row_010=candidate_selection_ids_dict.get('candidate_selection_id_4', ''),
-                        batch_row_011=candidate_selection_ids_dict.get('candidate_selection_id_5', ''),
-                        batch_row_012=candidate_selection_ids_dict.get('candidate_selection_id_6', ''),
-                        batch_row_013=candidate_selection_ids_dict.get('candidate_selection_id_7', ''),
-                        batch_row_014=candidate_selection_ids_dict.get('candidate_selection_id_8', ''),
-                        batch_row_015=candidate_selection_ids_dict.get('candidate_selection_id_9', ''),
-                        batch_row_016=candidate_selection_ids_dict.get('candidate_selection_id_10', ''),
-                    )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += " EXCEPTION_BATCH_ROW: " + str(e) + " "
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
+                batch_row_list.append(BatchRow(
+                    batch_header_id=batch_header_id,
+                    batch_row_000=contest_office_id,
+                    batch_row_001=contest_office_name,
+                    batch_row_002=elected_office_id,
+                    batch_row_003=electoral_district_id,
+                    batch_row_004=contest_office_votes_allowed,
+                    batch_row_005=contest_office_number_elected,
+                    batch_row_006=ctcl_uuid,
+                    batch_row_007=candidate_selection_ids_dict.get('candidate_selection_id_1', ''),
+                    batch_row_008=candidate_selection_ids_dict.get('candidate_selection_id_2', ''),
+                    batch_row_009=candidate_selection_ids_dict.get('candidate_selection_id_3', ''),
+                    batch_row_010=candidate_selection_ids_dict.get('candidate_selection_id_4', ''),
+                    batch_row_011=candidate_selection_ids_dict.get('candidate_selection_id_5', ''),
+                    batch_row_012=candidate_selection_ids_dict.get('candidate_selection_id_6', ''),
+                    batch_row_013=candidate_selection_ids_dict.get('candidate_selection_id_7', ''),
+                    batch_row_014=candidate_selection_ids_dict.get('candidate_selection_id_8', ''),
+                    batch_row_015=candidate_selection_ids_dict.get('candidate_selection_id_9', ''),
+                    batch_row_016=candidate_selection_ids_dict.get('candidate_selection_id_10', ''),
+                ))
+        if len(batch_row_list):
+            try:
+                BatchRow.objects.bulk_create(batch_row_list)
+                number_of_batch_rows += len(batch_row_list)
+            except Exception as e:
+                status += " EXCEPTION_BATCH_ROW: " + str(e) + " "
+                handle_exception(e, logger=logger, exception_message=status)
+                success = False
         results = {
             'success': success,
             'status': status,
@@ -2682,7 +2752,7 @@ class BatchManager(models.Manager):
         return results
 
     def store_politician_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
-                             batch_set_id=0):
+                             batch_set_id=0, batch_header_id=0):
         """
         Retrieves Politician data from CTCL xml file
         :param batch_uri:
@@ -2690,15 +2760,16 @@ class BatchManager(models.Manager):
         :param organization_we_vote_id:
         :param xml_root:
         :param batch_set_id
+        :param batch_header_id: Add the rows to this batch_header, when the elements are stored in chunks
         :return:
         """
         # Process VIP Person data
         number_of_batch_rows = 0
-        first_line = True
+        first_line = not positive_value_exists(batch_header_id)
         success = True
         status = ''
         limit_for_testing = 0
-        batch_header_id = 0
+        batch_row_list = []
 
         # Get party names and their corresponding party ids
         party_details_list = retrieve_all_party_names_and_ids_api()
@@ -2707,7 +2778,7 @@ class BatchManager(models.Manager):
         # of VipObject
         person_xml_node = xml_root.findall('Person')
         for one_person in person_xml_node:
-            if positive_value_exists(limit_for_testing) and number_of_batch_rows >= limit_for_testing:
+            if positive_value_exists(limit_for_testing) and len(batch_row_list) >= limit_for_testing:
                 break
 
             # look for relevant child nodes under Person: id, FullName, FirstName, LastName, MiddleName, PartyId, Email,
@@ -2878,30 +2949,31 @@ class BatchManager(models.Manager):
             #                 person_first_name is not None:
             if positive_value_exists(person_id) and positive_value_exists(ctcl_uuid) and \
                     (positive_value_exists(person_full_name) or positive_value_exists(person_first_name)):
-                try:
-                    batch_row = BatchRow.objects.create(
-                        batch_header_id=batch_header_id,
-                        batch_row_000=person_id,
-                        batch_row_001=person_full_name,
-                        batch_row_002=person_first_name,
-                        batch_row_003=person_middle_name,
-                        batch_row_004=person_last_name,
-                        batch_row_005=person_party_name,
-                        batch_row_006=person_email_id,
-                        batch_row_007=person_phone_number,
-                        batch_row_008=person_website_url,
-                        batch_row_009=person_facebook_id,
-                        batch_row_010=person_twitter_id,
-                        batch_row_011=person_youtube_id,
-                        batch_row_012=person_googleplus_id,
-                        batch_row_013=ctcl_uuid,
-                    )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += " EXCEPTION_BATCH_ROW: " + str(e) + " "
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
+                batch_row_list.append(BatchRow(
+                    batch_header_id=batch_header_id,
+                    batch_row_000=person_id,
+                    batch_row_001=person_full_name,
+                    batch_row_002=person_first_name,
+                    batch_row_003=person_middle_name,
+                    batch_row_004=person_last_name,
+                    batch_row_005=person_party_name,
+                    batch_row_006=person_email_id,
+                    batch_row_007=person_phone_number,
+                    batch_row_008=person_website_url,
+                    batch_row_009=person_facebook_id,
+                    batch_row_010=person_twitter_id,
+                    batch_row_011=person_youtube_id,
+                    batch_row_012=person_googleplus_id,
+                    batch_row_013=ctcl_uuid,
+                ))
+        if len(batch_row_list):
+            try:
+                BatchRow.objects.bulk_create(batch_row_list)
+                number_of_batch_rows += len(batch_row_list)
+            except Exception as e:
+                status += " EXCEPTION_BATCH_ROW: " + str(e) + " "
+                handle_exception(e, logger=logger, exception_message=status)
+                success = False
         results = {
             'success': success,
             'status': status,
@@ -2912,7 +2984,7 @@ class BatchManager(models.Manager):
         return results
 
     def store_candidate_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
-                            batch_set_id=0):
+                            batch_set_id=0, batch_header_id=0):
         """
         Retrieves Candidate data from CTCL xml file
         :param batch_uri:
@@ -2920,15 +2992,16 @@ class BatchManager(models.Manager):
         :param organization_we_vote_id:
         :param xml_root:
         :param batch_set_id
+        :param batch_header_id: Add the rows to this batch_header, when the elements are stored in chunks
         :return:
         """
         # Process VIP Candidate data
         number_of_batch_rows = 0
-        first_line = True
+        first_line = not positive_value_exists(batch_header_id)
         success = True
         status = ''
         limit_for_testing = 0
-        batch_header_id = 0
+        batch_row_list = []
 
         # Call party api to get corresponding party name from party id
         party_details_list = retrieve_all_party_names_and_ids_api()
@@ -2937,7 +3010,7 @@ class BatchManager(models.Manager):
         # of VipObject
         candidate_xml_node = xml_root.findall('Candidate')
         for one_candidate in candidate_xml_node:
-            if positive_value_exists(limit_for_testing) and number_of_batch_rows >= limit_for_testing:
+            if positive_value_exists(limit_for_testing) and len(batch_row_list) >= limit_for_testing:
                 break
 
             candidate_name_english = None
@@ -3043,25 +3116,24 @@ class BatchManager(models.Manager):
             # check for candidate_id or candidate_ctcl_person_id or name AND ctcl_uuid
             if positive_value_exists(candidate_id) and positive_value_exists(ctcl_uuid) and \
                     (positive_value_exists(candidate_ctcl_person_id) or positive_value_exists(candidate_name_english)):
-                try:
-                    batch_row = BatchRow.objects.create(
-                        batch_header_id=batch_header_id,
-                        batch_row_000=candidate_id,
-                        batch_row_001=candidate_ctcl_person_id,
-                        batch_row_002=candidate_name_english,
-                        batch_row_003=candidate_party_name,
-                        batch_row_004=candidate_is_top_ticket,
-                        batch_row_005=ctcl_uuid,
-                        batch_row_006=candidate_selection_id
-                    )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += " EXCEPTION_BATCH_ROW: " + str(e) + " "
-                    handle_exception(e, logger=logger, exception_message=status)
-                    success = False
-
-                    break
+                batch_row_list.append(BatchRow(
+                    batch_header_id=batch_header_id,
+                    batch_row_000=candidate_id,
+                    batch_row_001=candidate_ctcl_person_id,
+                    batch_row_002=candidate_name_english,
+                    batch_row_003=candidate_party_name,
+                    batch_row_004=candidate_is_top_ticket,
+                    batch_row_005=ctcl_uuid,
+                    batch_row_006=candidate_selection_id
+                ))
+        if len(batch_row_list):
+            try:
+                BatchRow.objects.bulk_create(batch_row_list)
+                number_of_batch_rows += len(batch_row_list)
+            except Exception as e:
+                status += " EXCEPTION_BATCH_ROW: " + str(e) + " "
+                handle_exception(e, logger=logger, exception_message=status)
+                success = False
         results = {
             'success': success,
             'status': status,
@@ -3072,7 +3144,7 @@ class BatchManager(models.Manager):
         return results
 
     def store_state_data_from_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
-                                  batch_set_id=0):
+                                  batch_set_id=0, batch_header_id=0):
         """
         Retrieves state data from CTCL xml file
         :param batch_uri:
@@ -3080,23 +3152,24 @@ class BatchManager(models.Manager):
         :param organization_we_vote_id:
         :param xml_root:
         :param batch_set_id
+        :param batch_header_id: Add the rows to this batch_header, when the elements are stored in chunks
         :return:
         """
         # This state is not used right now. Parsing it for future reference
         # Process VIP State data
         number_of_batch_rows = 0
-        first_line = True
+        first_line = not positive_value_exists(batch_header_id)
         success = True
         status = ''
         limit_for_testing = 0
-        batch_header_id = 0
+        batch_row_list = []
 
         # Look for State and create the batch_header first. State is the direct child node of VipObject
         # TODO Will this be a single node object or will there be multiple state nodes in a CTCL XML?
         state_xml_node = xml_root.findall('State')
         for one_state in state_xml_node:
             state_name = None
-            if positive_value_exists(limit_for_testing) and number_of_batch_rows >= limit_for_testing:
+            if positive_value_exists(limit_for_testing) and len(batch_row_list) >= limit_for_testing:
                 break
 
             # look for relevant child nodes under State: id, ocd-id, Name
@@ -3161,21 +3234,20 @@ class BatchManager(models.Manager):
 
             # check for state_id or name AND ocd_id
             if positive_value_exists(state_id) and (positive_value_exists(state_name)):
-                try:
-                    batch_row = BatchRow.objects.create(
-                        batch_header_id=batch_header_id,
-                        batch_row_000=state_id,
-                        batch_row_001=state_name,
-                        batch_row_002=ocd_id,
-                    )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += " EXCEPTION_BATCH_ROW: " + str(e) + " "
-                    handle_exception(e, logger=logger, exception_message=status)
-                    success = False
-
-                    break
+                batch_row_list.append(BatchRow(
+                    batch_header_id=batch_header_id,
+                    batch_row_000=state_id,
+                    batch_row_001=state_name,
+                    batch_row_002=ocd_id,
+                ))
+        if len(batch_row_list):
+            try:
+                BatchRow.objects.bulk_create(batch_row_list)
+                number_of_batch_rows += len(batch_row_list)
+            except Exception as e:
+                status += " EXCEPTION_BATCH_ROW: " + str(e) + " "
+                handle_exception(e, logger=logger, exception_message=status)
+                success = False
         results = {
             'success': success,
             'status': status,
@@ -3421,7 +3493,10 @@ class BatchManager(models.Manager):
 
     def create_batch_set_vip_xml(self, batch_file, batch_uri, google_civic_election_id, organization_we_vote_id):
         """
-        Retrieves CTCL Batch Set data from an xml file - Measure, Office, Candidate, Politician
+        Retrieves CTCL Batch Set data from an xml file - Measure, Office, Candidate, Politician. The document is
+        streamed twice with iterparse instead of being loaded whole, so large state feeds are stored in bounded
+        memory: first ElectoralDistrict, Party and CandidateSelection, which the other elements are matched
+        against, and then the elements stored as BatchRows, VIP_XML_CHUNK_SIZE at a time.
         :param batch_file:
         :param batch_uri:
         :param google_civic_election_id:
@@ -3433,32 +3508,29 @@ class BatchManager(models.Manager):
 
         # Retrieve from XML
         if batch_file:
-            xml_tree = ElementTree.parse(batch_file)
+            xml_file = batch_file
             batch_set_name = batch_file.name + " - " + str(import_date)
 
         else:
-            request = urllib.request.urlopen(batch_uri)
-            # xml_data = request.read()
-            # xml_data = xmltodict.parse(xml_data)
-            # # xml_data_list_json = list(xml_data)
-            # structured_json = json.dumps(xml_data)
-
-            xml_tree = ElementTree.parse(request)
-            request.close()
+            # Save the download to a temporary file, since we read through it twice
+            xml_file = tempfile.TemporaryFile()
 
             # set batch_set_name as file_name
             batch_set_name_list = batch_uri.split('/')
             batch_set_name = batch_set_name_list[len(batch_set_name_list) - 1] + " - " + str(import_date)
 
-        xml_root = xml_tree.getroot()
+        try:
+            if not batch_file:
+                with urllib.request.urlopen(batch_uri) as request:
+                    shutil.copyfileobj(request, xml_file)
 
-        status = ''
-        success = False
-        number_of_batch_rows = 0
-        batch_set_id = 0
-        continue_batch_set_processing = True  # Set to False if we run into a problem that requires we stop processing
+            status = ''
+            success = False
+            number_of_batch_rows = 0
+            batch_set_id = 0
+            # Set to False if we run into a problem that requires we stop processing
+            continue_batch_set_processing = True
 
-        if xml_root:
             # create batch_set object
             try:
                 batch_set = BatchSet.objects.create(batch_set_description_text="", batch_set_name=batch_set_name,
@@ -3476,180 +3548,139 @@ class BatchManager(models.Manager):
                 status += " EXCEPTION_BATCH_SET-VIP_XML: " + str(e) + " "
                 handle_exception(e, logger=logger, exception_message=status)
 
-            # import Electoral District
-            skip_electoral_district = False  # We can set this to True during development to save time
-            if continue_batch_set_processing and not skip_electoral_district:
-                electoral_district_list_found = False
-                electoral_district_item_list = xml_root.findall('ElectoralDistrict')
-                if not len(electoral_district_item_list):
-                    continue_batch_set_processing = False
-                else:
-                    results = electoral_district_import_from_xml_data(electoral_district_item_list)
+            # For each kind of element stored as BatchRows: the function which stores it, and the status when it works
+            #  or fails
+            store_batch_rows_by_tag = {
+                'Office': (self.store_elected_office_xml, 'CREATE_BATCH_SET_ELECTED_OFFICE_DATA_FOUND',
+                           " CREATE_BATCH_SET-PARTY_IMPORT_ERRORS "),
+                'CandidateContest': (self.store_contest_office_xml, 'CREATE_BATCH_SET_CONTEST_OFFICE_DATA_FOUND',
+                                     " CREATE_BATCH_SET-CONTEST_OFFICE_ERRORS "),
+                'Person': (self.store_politician_xml, 'CREATE_BATCH_SET_POLITICIAN_DATA_FOUND',
+                           " CREATE_BATCH_SET-POLITICIAN_ERRORS "),
+                'Candidate': (self.store_candidate_xml, 'CREATE_BATCH_SET_CANDIDATE_DATA_FOUND',
+                              " CREATE_BATCH_SET-CANDIDATE_ERRORS "),
+                'BallotMeasureContest': (self.store_measure_xml, 'CREATE_BATCH_SET_MEASURE_DATA_FOUND',
+                                         " CREATE_BATCH_SET-MEASURE_ERRORS "),
+                'State': (self.store_state_data_from_xml, 'CREATE_BATCH_SET_STATE_DATA_FOUND',
+                          " CREATE_BATCH_SET-STATE_DATA_ERRORS "),
+            }
+            # When the elements of one kind come in more than one chunk, they are all added to the first batch_header
+            batch_header_id_by_tag = {}
+
+            def store_xml_chunk(tag, chunk_root):
+                chunk_status = ''
+                chunk_success = True
+                chunk_number_of_batch_rows = 0
+                if tag == 'ElectoralDistrict':
+                    electoral_district_item_list = chunk_root.findall('ElectoralDistrict')
+                    if not len(electoral_district_item_list):
+                        chunk_success = False
+                    else:
+                        results = electoral_district_import_from_xml_data(electoral_district_item_list)
+                        if results['success']:
+                            chunk_status += "CREATE_BATCH_SET_ELECTORAL_DISTRICT_IMPORTED-VIP_XML "
+                            chunk_number_of_batch_rows += results['saved']
+                            # TODO check this whether it should be only saved or updated Electoral districts
+                            chunk_number_of_batch_rows += results['updated']
+                        else:
+                            chunk_success = False
+                            chunk_status += results['status']
+                            chunk_status += " CREATE_BATCH_SET_ELECTORAL_DISTRICT_ERRORS-VIP_XML "
+                elif tag == 'Party':
+                    party_item_list = chunk_root.findall('Party')
+                    if not len(party_item_list):
+                        chunk_success = False
+                        chunk_status += " CREATE_BATCH_SET-PARTY_IMPORT_ERRORS-NO_party_item_list "
+                    else:
+                        results = party_import_from_xml_data(party_item_list)
+                        if results['success']:
+                            chunk_status += "CREATE_BATCH_SET_PARTY_IMPORTED-VIP_XML "
+                            chunk_number_of_batch_rows += results['saved']
+                            chunk_number_of_batch_rows += results['updated']
+                        else:
+                            chunk_success = False
+                            chunk_status += results['status']
+                            chunk_status += " CREATE_BATCH_SET-PARTY_IMPORT_ERRORS-VIP_XML "
+                elif tag == 'CandidateSelection':
+                    # Candidate-to-office-mappings
+                    results = create_candidate_selection_rows(chunk_root, batch_set_id)
                     if results['success']:
-                        status += "CREATE_BATCH_SET_ELECTORAL_DISTRICT_IMPORTED-VIP_XML "
-                        number_of_batch_rows += results['saved']
-                        # TODO check this whether it should be only saved or updated Electoral districts
-                        number_of_batch_rows += results['updated']
-                        electoral_district_list_found = True
+                        chunk_status += 'CREATE_BATCH_SET_CANDIDATE_SELECTION_DATA_FOUND'
+                        chunk_number_of_batch_rows += results['number_of_batch_rows']
                     else:
-                        continue_batch_set_processing = False
-                        status += results['status']
-                        status += " CREATE_BATCH_SET_ELECTORAL_DISTRICT_ERRORS-VIP_XML "
-
-            # import Party
-            skip_party = False  # We can set this to True during development to save time
-            if continue_batch_set_processing and not skip_party:
-                party_list_found = False
-                party_item_list = xml_root.findall('Party')
-                if not len(party_item_list):
-                    continue_batch_set_processing = False
-                    status += " CREATE_BATCH_SET-PARTY_IMPORT_ERRORS-NO_party_item_list "
+                        chunk_success = False
+                        chunk_status += results['status']
+                        chunk_status += " CREATE_BATCH_SET-CANDIDATE_SELECTION_ERRORS "
+                elif tag in ['Election', 'Source']:
+                    if tag == 'Election':
+                        results = self.store_election_metadata_from_xml(
+                            batch_uri, google_civic_election_id, organization_we_vote_id, chunk_root, batch_set_id)
+                    else:
+                        results = self.store_source_metadata_from_xml(
+                            batch_uri, google_civic_election_id, organization_we_vote_id, chunk_root, batch_set_id)
+                    if results['success']:
+                        chunk_status += ' CREATE_BATCH_SET_' + tag.upper() + '_METADATA_FOUND '
+                        chunk_number_of_batch_rows += 1
+                    else:
+                        chunk_success = False
+                        chunk_status += results['status']
+                        chunk_status += " CREATE_BATCH_SET-" + tag.upper() + "_METADATA_ERRORS "
                 else:
-                    results = party_import_from_xml_data(party_item_list)
+                    store_function, found_status, error_status = store_batch_rows_by_tag[tag]
+                    results = store_function(
+                        batch_uri, google_civic_election_id, organization_we_vote_id, chunk_root, batch_set_id,
+                        batch_header_id=batch_header_id_by_tag.get(tag, 0))
                     if results['success']:
-                        status += "CREATE_BATCH_SET_PARTY_IMPORTED-VIP_XML "
-                        number_of_batch_rows += results['saved']
-                        number_of_batch_rows += results['updated']
-                        # TODO check this whether it should be only saved or updated Electoral districts
-                        party_list_found = True
-                        # A given data source may not always have electoral district and/or party data,
-                        # but the referenced electoral district id or party id might be already present
-                        # in the master database tables, hence commenting out below code
-                        # if not electoral_district_list_found or not party_list_found:
-                        #     results = {
-                        #         'success': False,
-                        #         'status': status,
-                        #         'batch_header_id': 0,
-                        #         'batch_saved': False,
-                        #         'number_of_batch_rows': 0,
-                        #     }
-                        #     return results
+                        chunk_status += found_status
+                        chunk_number_of_batch_rows += results['number_of_batch_rows']
+                        if positive_value_exists(results['batch_header_id']):
+                            batch_header_id_by_tag[tag] = results['batch_header_id']
                     else:
-                        continue_batch_set_processing = False
+                        chunk_success = False
+                        chunk_status += results['status']
+                        chunk_status += error_status
+                return {
+                    'success':              chunk_success,
+                    'status':               chunk_status,
+                    'number_of_batch_rows': chunk_number_of_batch_rows,
+                }
+
+            for xml_tag_list in [VIP_XML_FIRST_PASS_TAG_LIST, VIP_XML_SECOND_PASS_TAG_LIST]:
+                if not continue_batch_set_processing:
+                    break
+                tag_found_list = []
+                try:
+                    xml_file.seek(0)
+                    for tag, chunk_root in iterate_vip_xml_element_chunks(xml_file, xml_tag_list):
+                        if tag not in tag_found_list:
+                            tag_found_list.append(tag)
+                        results = store_xml_chunk(tag, chunk_root)
                         status += results['status']
-                        status += " CREATE_BATCH_SET-PARTY_IMPORT_ERRORS-VIP_XML "
-
-            # look for different data sets in the XML - ElectedOffice, ContestOffice, Candidate, Politician, Measure
-
-            # Elected Office
-            skip_elected_office = False  # We can set this to True during development to save time
-            if continue_batch_set_processing and not skip_elected_office:
-                results = self.store_elected_office_xml(batch_uri, google_civic_election_id, organization_we_vote_id,
-                                                        xml_root, batch_set_id)
-                if results['success']:
-                    # Elected Office data found
-                    status += 'CREATE_BATCH_SET_ELECTED_OFFICE_DATA_FOUND'
-                    number_of_batch_rows += results['number_of_batch_rows']
-                else:
-                    continue_batch_set_processing = False
-                    status += results['status']
-                    status += " CREATE_BATCH_SET-PARTY_IMPORT_ERRORS "
-
-            # Candidate-to-office-mappings
-            skip_candidate_mapping = False  # We can set this to True during development to save time
-            if continue_batch_set_processing and not skip_candidate_mapping:
-                results = create_candidate_selection_rows(xml_root, batch_set_id)
-                if results['success']:
-                    # Elected Office data found
-                    status += 'CREATE_BATCH_SET_CANDIDATE_SELECTION_DATA_FOUND'
-                    number_of_batch_rows += results['number_of_batch_rows']
-                else:
-                    continue_batch_set_processing = False
-                    status += results['status']
-                    status += " CREATE_BATCH_SET-CANDIDATE_SELECTION_ERRORS "
-
-            # ContestOffice entries
-            skip_contest_office = False  # We can set this to True during development to save time
-            if continue_batch_set_processing and not skip_contest_office:
-                results = self.store_contest_office_xml(
-                    batch_uri, google_civic_election_id, organization_we_vote_id, xml_root, batch_set_id)
-                if results['success']:
-                    # Contest Office data found
-                    status += 'CREATE_BATCH_SET_CONTEST_OFFICE_DATA_FOUND'
-                    number_of_batch_rows += results['number_of_batch_rows']
-                else:
-                    continue_batch_set_processing = False
-                    status += results['status']
-                    status += " CREATE_BATCH_SET-CONTEST_OFFICE_ERRORS "
-
-            # Politician entries
-            skip_politician = False  # We can set this to True during development to save time
-            if continue_batch_set_processing and not skip_politician:
-                results = self.store_politician_xml(
-                    batch_uri, google_civic_election_id, organization_we_vote_id, xml_root, batch_set_id)
-                if results['success']:
-                    status += 'CREATE_BATCH_SET_POLITICIAN_DATA_FOUND'
-                    number_of_batch_rows += results['number_of_batch_rows']
-                else:
-                    continue_batch_set_processing = False
-                    status += results['status']
-                    status += " CREATE_BATCH_SET-POLITICIAN_ERRORS "
-
-            # Candidate entries
-            skip_candidate = False  # We can set this to True during development to save time
-            if continue_batch_set_processing and not skip_candidate:
-                results = self.store_candidate_xml(
-                    batch_uri, google_civic_election_id, organization_we_vote_id, xml_root, batch_set_id)
-                if results['success']:
-                    status += 'CREATE_BATCH_SET_CANDIDATE_DATA_FOUND'
-                    number_of_batch_rows += results['number_of_batch_rows']
-                else:
-                    continue_batch_set_processing = False
-                    status += results['status']
-                    status += " CREATE_BATCH_SET-CANDIDATE_ERRORS "
-
-            # Measure entries
-            skip_measure = False  # We can set this to True during development to save time
-            if continue_batch_set_processing and not skip_measure:
-                results = self.store_measure_xml(
-                    batch_uri, google_civic_election_id, organization_we_vote_id, xml_root, batch_set_id)
-                if results['success']:
-                    status += 'CREATE_BATCH_SET_MEASURE_DATA_FOUND'
-                    number_of_batch_rows += results['number_of_batch_rows']
-                    success = True
-                else:
-                    continue_batch_set_processing = False
-                    status += results['status']
-                    status += " CREATE_BATCH_SET-MEASURE_ERRORS "
-
-            # State data entries
-            if continue_batch_set_processing:
-                results = self.store_state_data_from_xml(batch_uri, google_civic_election_id, organization_we_vote_id,
-                                                         xml_root, batch_set_id)
-                if results['success']:
-                    status += 'CREATE_BATCH_SET_STATE_DATA_FOUND'
-                    number_of_batch_rows += results['number_of_batch_rows']
-                    success = True
-                else:
-                    continue_batch_set_processing = False
-                    status += results['status']
-                    status += " CREATE_BATCH_SET-STATE_DATA_ERRORS "
-
-            # Election metadata entries
-            if continue_batch_set_processing:
-                results = self.store_election_metadata_from_xml(
-                    batch_uri, google_civic_election_id, organization_we_vote_id, xml_root, batch_set_id)
-                if results['success']:
-                    status += ' CREATE_BATCH_SET_ELECTION_METADATA_FOUND '
-                    number_of_batch_rows += 1
-                    success = True
-                else:
-                    continue_batch_set_processing = False
-                    status += results['status']
-                    status += " CREATE_BATCH_SET-ELECTION_METADATA_ERRORS "
-
-            # Source metadata entries
-            if continue_batch_set_processing:
-                results = self.store_source_metadata_from_xml(
-                    batch_uri, google_civic_election_id, organization_we_vote_id, xml_root, batch_set_id)
-                if results['success']:
-                    status += ' CREATE_BATCH_SET_SOURCE_METADATA_FOUND '
-                    number_of_batch_rows += 1
-                    success = True
-                else:
+                        number_of_batch_rows += results['number_of_batch_rows']
+                        if not results['success']:
+                            continue_batch_set_processing = False
+                            break
+                except ElementTree.ParseError as e:
                     continue_batch_set_processing = False
-                    status += results['status']
-                    status += " CREATE_BATCH_SET-SOURCE_METADATA_ERRORS "
+                    success = False
+                    status += " EXCEPTION_PARSING_VIP_XML: " + str(e) + " "
+                    handle_exception(e, logger=logger, exception_message=status)
+
+                # Kinds of elements missing from the document are stored as an empty list, which stops processing for
+                #  the ones we can't do without
+                for tag in xml_tag_list:
+                    if not continue_batch_set_processing:
+                        break
+                    if tag not in tag_found_list:
+                        results = store_xml_chunk(tag, ElementTree.Element('VipObject'))
+                        status += results['status']
+                        number_of_batch_rows += results['number_of_batch_rows']
+                        if not results['success']:
+                            continue_batch_set_processing = False
+
+        finally:
+            if not batch_file:
+                xml_file.close()
 
         results = {
             'success':                  success,
@@ -4715,6 +4746,41 @@ class BatchHeaderMap(models.Model):
     batch_header_map_049 = models.TextField(null=True, blank=True)
     batch_header_map_050 = models.TextField(null=True, blank=True)
 
+    # We override the save function so the compiled header lookups are rebuilt if the mapping changes
+    def save(self, *args, **kwargs):
+        self.__dict__.pop('_batch_row_column_name_by_header', None)
+        super(BatchHeaderMap, self).save(*args, **kwargs)
+
+    def batch_row_column_name_by_header(self):
+        """
+        Map each We Vote header name (lower case, stripped) to the BatchRow column holding its value, so looking up
+        a field in a BatchRow is one dictionary lookup instead of a scan through the batch_header_map_### columns.
+        Built once per BatchHeaderMap object, and reused for every BatchRow in the batch.
+        :return: {'match_with_quotes_removed': {...}, 'match_as_stored': {...}}
+        """
+        if '_batch_row_column_name_by_header' not in self.__dict__:
+            match_with_quotes_removed = {}
+            match_as_stored = {}
+            number_of_columns = 50
+            for index_number in range(number_of_columns):
+                index_number_string = "00" + str(index_number)
+                index_number_string = index_number_string[-3:]
+                value_from_batch_header_map = getattr(self, "batch_header_map_" + index_number_string)
+                if value_from_batch_header_map is None:
+                    # Stop when we stop getting batch_header_map values
+                    break
+                one_batch_row_attribute_name = "batch_row_" + index_number_string
+                # The first column with a matching header wins
+                match_as_stored.setdefault(value_from_batch_header_map.lower().strip(), one_batch_row_attribute_name)
+                header_with_quotes_removed = value_from_batch_header_map.replace('"', '').replace('\ufeff', '')
+                match_with_quotes_removed.setdefault(
+                    header_with_quotes_removed.lower().strip(), one_batch_row_attribute_name)
+            self.__dict__['_batch_row_column_name_by_header'] = {
+                'match_with_quotes_removed':    match_with_quotes_removed,
+                'match_as_stored':              match_as_stored,
+            }
+        return self.__dict__['_batch_row_column_name_by_header']
+
 
 class BatchRow(models.Model):
     """
@@ -5023,6 +5089,173 @@ class BatchProcessManager(models.Manager):
         }
         return results
 
+    def claim_batch_process(
+            self,
+            kind_of_process_list=[],
+            worker_id='',
+            lease_seconds=BATCH_PROCESS_LEASE_SECONDS,
+            checked_out_expiration_seconds=1800,
+            for_upcoming_elections=True):
+        """
+        Claim the next BatchProcess which needs to be run, by giving worker_id a lease on it. The row is selected
+        with FOR UPDATE SKIP LOCKED, so workers in other processes or on other servers never claim the same
+        batch_process. Processes already started are claimed before queued ones.
+        :param kind_of_process_list:
+        :param worker_id:
+        :param lease_seconds:
+        :param checked_out_expiration_seconds: Processes checked out by process_next_* without a lease are only
+         claimed once they have been checked out this long
+        :param for_upcoming_elections:
+        :return:
+        """
+        status = ""
+        success = True
+        batch_process = None
+        batch_process_found = False
+
+        google_civic_election_id_list = []
+        if positive_value_exists(for_upcoming_elections):
+            election_manager = ElectionManager()
+            results = election_manager.retrieve_upcoming_elections()
+            # Limit this search to upcoming_elections only, or no election specified
+            google_civic_election_id_list = [0]
+            for one_election in results['election_list']:
+                google_civic_election_id_list.append(convert_to_int(one_election.google_civic_election_id))
+
+        try:
+            with transaction.atomic():
+                batch_process_queryset = BatchProcess.objects.select_for_update(skip_locked=True)
+                if kind_of_process_list and len(kind_of_process_list) > 0:
+                    batch_process_queryset = batch_process_queryset.filter(kind_of_process__in=kind_of_process_list)
+                batch_process_queryset = batch_process_queryset.filter(date_completed__isnull=True)
+                batch_process_queryset = batch_process_queryset.exclude(batch_process_paused=True)
+                if positive_value_exists(for_upcoming_elections):
+                    batch_process_queryset = batch_process_queryset.filter(
+                        google_civic_election_id__in=google_civic_election_id_list)
+                batch_process_queryset = batch_process_queryset.filter(
+                    generate_batch_process_claimable_q(checked_out_expiration_seconds))
+                batch_process_queryset = batch_process_queryset.order_by(F('date_started').asc(nulls_last=True), 'id')
+                batch_process = batch_process_queryset.first()
+                if batch_process:
+                    batch_process.checked_out_by = worker_id
+                    batch_process.date_checked_out = now()
+                    batch_process.date_lease_expires = now() + timedelta(seconds=lease_seconds)
+                    if batch_process.date_started is None:
+                        batch_process.date_started = now()
+                    batch_process.save(update_fields=[
+                        'checked_out_by', 'date_checked_out', 'date_lease_expires', 'date_started'])
+                    batch_process_found = True
+                    status += 'BATCH_PROCESS_CLAIMED(' + str(batch_process.id) + ') '
+                else:
+                    status += 'NO_BATCH_PROCESS_TO_CLAIM '
+        except Exception as e:
+            status += 'FAILED_TO_CLAIM_BATCH_PROCESS: ' + str(e) + ' '
+            success = False
+            batch_process = None
+
+        results = {
+            'success':              success,
+            'status':               status,
+            'batch_process':        batch_process,
+            'batch_process_found':  batch_process_found,
+        }
+        return results
+
+    def claim_batch_process_by_id(
+            self,
+            batch_process_id=0,
+            worker_id='',
+            lease_seconds=BATCH_PROCESS_LEASE_SECONDS,
+            checked_out_expiration_seconds=1800):
+        """
+        Claim this BatchProcess for worker_id, with the same lease claim_batch_process gives. The claim is one
+        conditional UPDATE, so if another worker has claimed it since it was retrieved, nothing changes and
+        batch_process_claimed is False.
+        :param batch_process_id:
+        :param worker_id:
+        :param lease_seconds:
+        :param checked_out_expiration_seconds:
+        :return:
+        """
+        status = ""
+        success = True
+        batch_process = None
+        batch_process_claimed = False
+        try:
+            rows_updated = BatchProcess.objects.filter(id=batch_process_id, date_completed__isnull=True)\
+                .filter(generate_batch_process_claimable_q(checked_out_expiration_seconds))\
+                .update(checked_out_by=worker_id, date_checked_out=now(),
+                        date_lease_expires=now() + timedelta(seconds=lease_seconds))
+            if rows_updated == 1:
+                BatchProcess.objects.filter(id=batch_process_id, date_started__isnull=True).update(
+                    date_started=now())
+                batch_process = BatchProcess.objects.get(id=batch_process_id)
+                batch_process_claimed = True
+                status += 'BATCH_PROCESS_CLAIMED(' + str(batch_process_id) + ') '
+            else:
+                status += 'BATCH_PROCESS_NOT_CLAIMED(' + str(batch_process_id) + ') '
+        except Exception as e:
+            status += 'FAILED_TO_CLAIM_BATCH_PROCESS_BY_ID: ' + str(e) + ' '
+            success = False
+
+        results = {
+            'success':                  success,
+            'status':                   status,
+            'batch_process':            batch_process,
+            'batch_process_claimed':    batch_process_claimed,
+        }
+        return results
+
+    def renew_batch_process_lease(self, batch_process_id=0, worker_id='', lease_seconds=BATCH_PROCESS_LEASE_SECONDS):
+        """
+        Heartbeat from the worker holding the lease on this batch_process
+        :param batch_process_id:
+        :param worker_id:
+        :param lease_seconds:
+        :return:
+        """
+        status = ""
+        success = True
+        lease_renewed = False
+        try:
+            rows_updated = BatchProcess.objects.filter(id=batch_process_id, checked_out_by=worker_id).update(
+                date_checked_out=now(), date_lease_expires=now() + timedelta(seconds=lease_seconds))
+            lease_renewed = positive_value_exists(rows_updated)
+            status += 'BATCH_PROCESS_LEASE_RENEWED ' if lease_renewed else 'BATCH_PROCESS_LEASE_NOT_HELD '
+        except Exception as e:
+            status += 'FAILED_TO_RENEW_BATCH_PROCESS_LEASE: ' + str(e) + ' '
+            success = False
+
+        results = {
+            'success':          success,
+            'status':           status,
+            'lease_renewed':    lease_renewed,
+        }
+        return results
+
+    def release_batch_process_lease(self, batch_process_id=0, worker_id=''):
+        """
+        Give up the lease worker_id holds on this batch_process, so any worker can claim its next step
+        :param batch_process_id:
+        :param worker_id:
+        :return:
+        """
+        status = ""
+        success = True
+        try:
+            BatchProcess.objects.filter(id=batch_process_id, checked_out_by=worker_id).update(
+                checked_out_by=None, date_checked_out=None, date_lease_expires=None)
+            status += 'BATCH_PROCESS_LEASE_RELEASED '
+        except Exception as e:
+            status += 'FAILED_TO_RELEASE_BATCH_PROCESS_LEASE: ' + str(e) + ' '
+            success = False
+
+        results = {
+            'success':  success,
+            'status':   status,
+        }
+        return results
+
     def retrieve_batch_process(
             self,
             batch_process_id=0,
@@ -5464,6 +5697,19 @@ class BatchProcessManager(models.Manager):
         return not fetch_batch_process_system_on()
 
 
+def generate_batch_process_claimable_q(checked_out_expiration_seconds=1800):
+    """
+    BatchProcesses which are not leased, or whose lease has run out. Without a lease, also not checked out in the
+    last checked_out_expiration_seconds.
+    :param checked_out_expiration_seconds:
+    :return: Q
+    """
+    date_checked_out_time_out = now() - timedelta(seconds=checked_out_expiration_seconds)
+    return Q(date_lease_expires__isnull=True, date_checked_out__isnull=True) | \
+        Q(date_lease_expires__isnull=True, date_checked_out__lt=date_checked_out_time_out) | \
+        Q(date_lease_expires__lt=now())
+
+
 class BatchProcess(models.Model):
     """
     """
@@ -5496,6 +5742,10 @@ class BatchProcess(models.Model):
     # When a batch_process is running, we mark when it was "taken off the shelf" to be worked on.
     #  When the process is complete, we should reset this to "NULL"
     date_checked_out = models.DateTimeField(null=True)
+    # When a run_batch_process_worker has claimed this batch_process, which worker holds the lease, and when the
+    #  lease runs out unless the worker renews it
+    checked_out_by = models.CharField(max_length=255, null=True)
+    date_lease_expires = models.DateTimeField(null=True, db_index=True)
     batch_process_paused = models.BooleanField(default=False)
     completion_summary = models.TextField(null=True, blank=True)
     use_ballotpedia = models.BooleanField(default=False)
@@ -0,0 +1,114 @@
+# import_export_batches/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from datetime import timedelta
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils.timezone import now
+import threading
+from .models import BatchProcess, BatchProcessManager, RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS
+
+
+def create_batch_process(**kwargs):
+    return BatchProcess.objects.create(
+        kind_of_process=RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS,
+        google_civic_election_id=1000,
+        **kwargs)
+
+
+class BatchProcessClaimTestCase(TestCase):
+
+    def setUp(self):
+        self.batch_process_manager = BatchProcessManager()
+
+    def claim(self, worker_id):
+        return self.batch_process_manager.claim_batch_process(worker_id=worker_id, for_upcoming_elections=False)
+
+    def test_leased_batch_process_is_not_claimed_again(self):
+        first_batch_process = create_batch_process()
+        second_batch_process = create_batch_process()
+        first_results = self.claim('worker-1')
+        second_results = self.claim('worker-2')
+        self.assertEqual(first_results['batch_process'].id, first_batch_process.id)
+        self.assertEqual(second_results['batch_process'].id, second_batch_process.id)
+        third_results = self.claim('worker-3')
+        self.assertFalse(third_results['batch_process_found'])
+        self.assertIn('NO_BATCH_PROCESS_TO_CLAIM', third_results['status'])
+
+    def test_expired_lease_can_be_claimed(self):
+        batch_process = create_batch_process(
+            checked_out_by='worker-1', date_checked_out=now() - timedelta(minutes=10),
+            date_lease_expires=now() - timedelta(minutes=1))
+        results = self.claim('worker-2')
+        self.assertEqual(results['batch_process'].id, batch_process.id)
+        self.assertEqual(BatchProcess.objects.get(id=batch_process.id).checked_out_by, 'worker-2')
+
+    def test_checked_out_without_lease_is_left_alone_until_timed_out(self):
+        create_batch_process(date_checked_out=now())
+        self.assertFalse(self.claim('worker-1')['batch_process_found'])
+
+    def test_batch_process_claimed_by_a_worker_is_not_claimed_by_id(self):
+        batch_process = create_batch_process()
+        # process_next_ballot_items retrieved batch_process before this worker claimed it
+        self.claim('worker-1')
+        results = self.batch_process_manager.claim_batch_process_by_id(
+            batch_process_id=batch_process.id, worker_id='process_next_ballot_items')
+        self.assertTrue(results['success'])
+        self.assertFalse(results['batch_process_claimed'])
+        self.assertEqual(BatchProcess.objects.get(id=batch_process.id).checked_out_by, 'worker-1')
+
+    def test_claim_by_id_takes_the_lease_and_starts_the_batch_process(self):
+        batch_process = create_batch_process()
+        results = self.batch_process_manager.claim_batch_process_by_id(
+            batch_process_id=batch_process.id, worker_id='process_next_ballot_items')
+        self.assertTrue(results['batch_process_claimed'])
+        self.assertIsNotNone(results['batch_process'].date_started)
+        self.assertGreater(results['batch_process'].date_lease_expires, now())
+        # Now workers pass it by
+        self.assertFalse(self.claim('worker-1')['batch_process_found'])
+        self.assertFalse(self.batch_process_manager.claim_batch_process_by_id(
+            batch_process_id=batch_process.id, worker_id='worker-2')['batch_process_claimed'])
+
+    def test_saving_date_checked_out_keeps_the_lease(self):
+        create_batch_process()
+        batch_process = self.claim('worker-1')['batch_process']
+        date_lease_expires = now() + timedelta(minutes=5)
+        # The lease heartbeat renews date_lease_expires with an update() while the step is running
+        self.batch_process_manager.renew_batch_process_lease(
+            batch_process_id=batch_process.id, worker_id='worker-1', lease_seconds=300)
+        batch_process.date_checked_out = None
+        batch_process.save(update_fields=['date_checked_out'])
+        self.assertGreater(BatchProcess.objects.get(id=batch_process.id).date_lease_expires,
+                           date_lease_expires - timedelta(seconds=30))
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class BatchProcessConcurrentClaimTestCase(TransactionTestCase):
+
+    def test_locked_batch_process_is_skipped(self):
+        locked_batch_process = create_batch_process()
+        open_batch_process = create_batch_process()
+        row_locked = threading.Event()
+        claim_done = threading.Event()
+
+        def hold_row_lock():
+            # Stands in for another worker part way through claiming locked_batch_process
+            try:
+                with transaction.atomic():
+                    list(BatchProcess.objects.select_for_update().filter(id=locked_batch_process.id))
+                    row_locked.set()
+                    claim_done.wait(timeout=30)
+            finally:
+                connection.close()
+
+        lock_thread = threading.Thread(target=hold_row_lock)
+        lock_thread.start()
+        try:
+            self.assertTrue(row_locked.wait(timeout=30))
+            results = BatchProcessManager().claim_batch_process(worker_id='worker-2', for_upcoming_elections=False)
+        finally:
+            claim_done.set()
+            lock_thread.join()
+        self.assertEqual(results['batch_process'].id, open_batch_process.id)
+        self.assertIsNone(BatchProcess.objects.get(id=locked_batch_process.id).checked_out_by)
@@ -3,6 +3,7 @@
 # -*- coding: UTF-8 -*-
 
 from django.db import models
+from django.db.models.functions import Lower
 from exception.models import handle_exception, handle_record_found_more_than_one_exception, \
     handle_record_not_found_exception, handle_record_not_saved_exception
 from wevote_settings.models import fetch_next_we_vote_id_issue_integer, fetch_site_unique_id_prefix
@@ -691,6 +692,39 @@ class OrganizationLinkToIssueList(models.Manager):
             link_issue_we_vote_id_list.append(issue.issue_we_vote_id)
         return link_issue_we_vote_id_list
 
+    def fetch_issue_we_vote_id_lists_for_organization_we_vote_id_list(self, organization_we_vote_id_list):
+        """
+        Bulk version of fetch_issue_we_vote_id_list_by_organization_we_vote_id, with one query for the links of all
+        of these organizations and one for the visible issues
+        :param organization_we_vote_id_list:
+        :return: dict of visible issue_we_vote_id lists, keyed by the lowercase organization_we_vote_id
+        """
+        issue_we_vote_id_list_by_organization_we_vote_id = {}
+        organization_we_vote_id_lower_list = \
+            [organization_we_vote_id.lower() for organization_we_vote_id in organization_we_vote_id_list
+             if positive_value_exists(organization_we_vote_id)]
+        if not len(organization_we_vote_id_lower_list):
+            return issue_we_vote_id_list_by_organization_we_vote_id
+
+        try:
+            link_issue_query = OrganizationLinkToIssue.objects.using('readonly')\
+                .annotate(organization_we_vote_id_lower=Lower('organization_we_vote_id'))\
+                .filter(organization_we_vote_id_lower__in=organization_we_vote_id_lower_list, link_active=True)
+            link_issue_value_list = list(
+                link_issue_query.values_list('organization_we_vote_id_lower', 'issue_we_vote_id'))
+        except Exception as e:
+            handle_exception(e, logger=logger)
+            return issue_we_vote_id_list_by_organization_we_vote_id
+
+        if len(link_issue_value_list):
+            issue_list_manager = IssueListManager()
+            visible_issue_we_vote_ids = set(issue_list_manager.fetch_visible_issue_we_vote_ids())
+            for organization_we_vote_id_lower, issue_we_vote_id in link_issue_value_list:
+                if issue_we_vote_id in visible_issue_we_vote_ids:
+                    issue_we_vote_id_list_by_organization_we_vote_id.setdefault(
+                        organization_we_vote_id_lower, []).append(issue_we_vote_id)
+        return issue_we_vote_id_list_by_organization_we_vote_id
+
     def fetch_organization_we_vote_id_list_by_issue_we_vote_id_list(self, issue_we_vote_id_list):
         organization_we_vote_id_list = []
         results = self.retrieve_organization_we_vote_id_list_from_issue_we_vote_id_list(
@@ -496,9 +496,9 @@ def measure_list_view(request):
                 support_and_oppose_total = 0
                 # Find the count of Voters that support this candidate (Endorsers are not included in this)
                 one_measure.support_count = position_list_manager.fetch_voter_positions_count_for_contest_measure(
-                    one_measure.id, "", SUPPORT)
+                    one_measure.id, one_measure.we_vote_id, SUPPORT)
                 one_measure.oppose_count = position_list_manager.fetch_voter_positions_count_for_contest_measure(
-                    one_measure.id, "", OPPOSE)
+                    one_measure.id, one_measure.we_vote_id, OPPOSE)
                 support_and_oppose_total += one_measure.support_count
                 support_and_oppose_total += one_measure.oppose_count
 
@@ -1103,9 +1103,9 @@ def office_summary_view(request, office_id=0, contest_office_we_vote_id=''):
         for one_candidate in candidate_list:
             # Find the count of Voters that support this candidate (Endorsers are not included in this)
             one_candidate.support_count = position_list_manager.fetch_voter_positions_count_for_candidate(
-                one_candidate.id, "", SUPPORT)
+                one_candidate.id, one_candidate.we_vote_id, SUPPORT)
             one_candidate.oppose_count = position_list_manager.fetch_voter_positions_count_for_candidate(
-                one_candidate.id, "", OPPOSE)
+                one_candidate.id, one_candidate.we_vote_id, OPPOSE)
             support_total += one_candidate.support_count
             root_office_candidate_last_names += " " + one_candidate.extract_last_name()
 
@@ -2777,7 +2777,8 @@ class OrganizationListManager(models.Manager):
         }
         return results
 
-    def retrieve_organizations_by_organization_we_vote_id_list(self, list_of_organization_we_vote_ids):
+    def retrieve_organizations_by_organization_we_vote_id_list(self, list_of_organization_we_vote_ids,
+                                                               read_only=False):
         organization_list = []
         organization_list_found = False
 
@@ -2804,7 +2805,10 @@ class OrganizationListManager(models.Manager):
             return results
 
         try:
-            organization_queryset = Organization.objects.all()
+            if read_only:
+                organization_queryset = Organization.objects.using('readonly').all()
+            else:
+                organization_queryset = Organization.objects.all()
             organization_queryset = organization_queryset.filter(
                 we_vote_id__in=list_of_organization_we_vote_ids)
             organization_queryset = organization_queryset.order_by('-twitter_followers_count')
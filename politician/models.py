@@ -453,7 +453,13 @@ class PoliticianManager(models.Manager):
         }
         return results
 
-    def search_politicians(self, name_search_terms=None):
+    def search_politicians(self, name_search_terms=None, limit=0):
+        """
+        Database search, used when the in-memory index in search/models.py can't be built
+        :param name_search_terms:
+        :param limit: Maximum number of politicians to return, or 0 for all of them
+        :return:
+        """
         status = ""
         success = True
         politician_search_results_list = []
@@ -482,6 +488,8 @@ class PoliticianManager(models.Manager):
 
                     queryset = queryset.filter(final_filters)
 
+            if positive_value_exists(limit):
+                queryset = queryset[:limit]
             politician_search_results_list = list(queryset)
         except Exception as e:
             success = False
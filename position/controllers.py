@@ -2,15 +2,17 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
-from .models import PositionEntered, PositionForFriends, PositionManager, PositionListManager, ANY_STANCE, \
-    FRIENDS_AND_PUBLIC, FRIENDS_ONLY, PUBLIC_ONLY, SHOW_PUBLIC, THIS_ELECTION_ONLY, ALL_OTHER_ELECTIONS, \
-    ALL_ELECTIONS, SUPPORT, OPPOSE, INFORMATION_ONLY, NO_STANCE
+from .models import apply_candidate_details_to_position, apply_contest_measure_details_to_position, \
+    apply_contest_office_details_to_position, DeferPositionTallyUpdates, PositionEntered, PositionForFriends, \
+    PositionManager, PositionListManager, ANY_STANCE, FRIENDS_AND_PUBLIC, FRIENDS_ONLY, PUBLIC_ONLY, SHOW_PUBLIC, \
+    THIS_ELECTION_ONLY, ALL_OTHER_ELECTIONS, ALL_ELECTIONS, SUPPORT, OPPOSE, INFORMATION_ONLY, NO_STANCE
 from ballot.controllers import figure_out_google_civic_election_id_voter_is_watching, \
     figure_out_google_civic_election_id_voter_is_watching_by_voter_id
 from ballot.models import BallotItemListManager, OFFICE, CANDIDATE, MEASURE
 from candidate.models import CandidateCampaign, CandidateManager, CandidateListManager, \
     CandidateToOfficeLink
 from config.base import get_environment_variable
+from django.db import transaction
 from django.db.models import Q
 from django.http import HttpResponse
 from election.models import ElectionManager, fetch_election_state
@@ -20,7 +22,7 @@ from friend.models import FriendManager
 from measure.models import ContestMeasure, ContestMeasureManager, ContestMeasureListManager
 from office.models import ContestOfficeManager, ContestOfficeListManager
 from operator import itemgetter
-from organization.models import Organization, OrganizationManager, PUBLIC_FIGURE, UNKNOWN
+from organization.models import Organization, OrganizationManager, PUBLIC_FIGURE
 from share.models import ShareManager
 import json
 from voter.models import fetch_voter_id_from_voter_device_link, VoterManager
@@ -33,6 +35,8 @@ logger = wevote_functions.admin.get_logger(__name__)
 
 UNKNOWN = 'U'
 WE_VOTE_API_KEY = get_environment_variable("WE_VOTE_API_KEY")
+# Positions deleted or re-pointed per query by the move_positions_to_another_... functions
+POSITION_MOVE_CHUNK_SIZE = 1000
 POSITIONS_SYNC_URL = get_environment_variable("POSITIONS_SYNC_URL")  # positionsSyncOut
 
 
@@ -513,60 +517,73 @@ def generate_position_sorting_dates_for_election(google_civic_election_id=0):
 
 
 def merge_duplicate_positions_for_voter(position_list_for_one_voter):
-
-    removed = []
-    included = []
+    """
+    Fold duplicate positions (same candidate or same measure) into the first one in the list, in one grouped pass.
+    Each kept position is saved once, and the duplicates are deleted with one query per table.
+    :param position_list_for_one_voter: positions (all from one table) for one voter or organization
+    :return: position list with the duplicates removed
+    """
     position_list_for_one_voter_to_return = []
+    kept_position_by_ballot_item = {}
+    kept_positions_changed = {}
+    duplicate_position_id_list = []
     for one_position in position_list_for_one_voter:
-        for position_to_compare in position_list_for_one_voter:
-            if one_position.we_vote_id != position_to_compare.we_vote_id and \
-                    one_position.we_vote_id not in removed and position_to_compare not in removed:
-                if do_these_match(one_position, position_to_compare, "candidate_campaign_we_vote_id"):
-                    # These need to be merged
-                    combine_two_positions_for_voter_and_save(position_to_compare, one_position)
-                    removed.append(position_to_compare.we_vote_id)
-                if do_these_match(one_position, position_to_compare, "contest_measure_we_vote_id"):
-                    # These need to be merged
-                    one_position = combine_two_positions_for_voter_and_save(position_to_compare, one_position)
-                    removed.append(position_to_compare.we_vote_id)
-                    # We do not add one_position to the "removed" list because there might be more
-                    #  position_to_compare duplicates
-                # We should end up with only the non-duplicate positions
-                if one_position.we_vote_id not in included:
-                    position_list_for_one_voter_to_return.append(one_position)
-                    included.append(one_position.we_vote_id)
+        if positive_value_exists(one_position.candidate_campaign_we_vote_id):
+            ballot_item_key = (CANDIDATE, one_position.candidate_campaign_we_vote_id)
+        elif positive_value_exists(one_position.contest_measure_we_vote_id):
+            ballot_item_key = (MEASURE, one_position.contest_measure_we_vote_id)
+        else:
+            position_list_for_one_voter_to_return.append(one_position)
+            continue
+        kept_position = kept_position_by_ballot_item.get(ballot_item_key)
+        if kept_position is None:
+            kept_position_by_ballot_item[ballot_item_key] = one_position
+            position_list_for_one_voter_to_return.append(one_position)
+        elif one_position.we_vote_id != kept_position.we_vote_id and \
+                positions_can_be_combined_for_voter(one_position, kept_position):
+            combine_two_positions_for_voter(one_position, kept_position)
+            kept_positions_changed[kept_position.we_vote_id] = kept_position
+            duplicate_position_id_list.append(one_position.id)
+        else:
+            position_list_for_one_voter_to_return.append(one_position)
+
+    if not len(duplicate_position_id_list):
+        return position_list_for_one_voter_to_return
+
+    position_manager = PositionManager()
+    position_model = type(list(kept_positions_changed.values())[0])
+    try:
+        with DeferPositionTallyUpdates():
+            with transaction.atomic():
+                for kept_position in kept_positions_changed.values():
+                    # Cached data like: ballot_item_display_name, ballot_item_image_url_https,
+                    #  ballot_item_twitter_handle, contest_office_name
+                    results = position_manager.refresh_cached_position_info(kept_position)
+                    results['position'].save()
+                position_model.objects.filter(id__in=duplicate_position_id_list).delete()
+    except Exception as e:
+        handle_record_not_saved_exception(e, logger=logger, exception_message_optional="MERGE_DUPLICATE_POSITIONS")
 
     return position_list_for_one_voter_to_return
 
 
-def combine_two_positions_for_voter_and_save(from_position, to_position):
+def positions_can_be_combined_for_voter(from_position, to_position):
+    # If these two positions are not for the same ballot item, and for the same person, we do not proceed
+    if not do_these_match(from_position, to_position, "candidate_campaign_we_vote_id") and \
+            not do_these_match(from_position, to_position, "contest_measure_we_vote_id"):
+        return False
+    # We only want to merge duplicate positions for a voter or organization - at least one of them must match
+    return do_these_match(from_position, to_position, "voter_we_vote_id") or \
+        do_these_match(from_position, to_position, "organization_we_vote_id")
+
+
+def combine_two_positions_for_voter(from_position, to_position):
     """
-    We want to move all values over to the "to_position". If anything gets in the way of a merge, it fails silently
-    and returns the original to_position.
+    Copy the voter entered data from from_position onto to_position, without saving either one
     :param from_position:
     :param to_position:
     :return:
     """
-
-    # If these two positions are not for the same ballot item, and for the same person, we do not proceed
-    if do_these_match(from_position, to_position, "candidate_campaign_we_vote_id"):
-        # This is good
-        pass
-    elif do_these_match(from_position, to_position, "contest_measure_we_vote_id"):
-        # This is good
-        pass
-    else:
-        return to_position
-
-    if do_these_match(from_position, to_position, "voter_we_vote_id") or \
-            do_these_match(from_position, to_position, "organization_we_vote_id"):
-        # This is required
-        pass
-    else:
-        # We only want to merge duplicate positions for a voter or organization - at least one of them must match
-        return to_position
-
-    # If here we have made sure that we can proceed without damaging data
     # Voter entered data
     to_position.statement_html = return_most_likely_data(from_position, to_position, "statement_html")
     to_position.statement_text = return_most_likely_data(from_position, to_position, "statement_text")
@@ -590,6 +607,22 @@ def combine_two_positions_for_voter_and_save(from_position, to_position):
         to_position.stance = getattr(from_position, "stance")
     elif positive_value_exists(getattr(to_position, "stance")):
         to_position.stance = getattr(to_position, "stance")
+    return to_position
+
+
+def combine_two_positions_for_voter_and_save(from_position, to_position):
+    """
+    We want to move all values over to the "to_position". If anything gets in the way of a merge, it fails silently
+    and returns the original to_position.
+    :param from_position:
+    :param to_position:
+    :return:
+    """
+    if not positions_can_be_combined_for_voter(from_position, to_position):
+        return to_position
+
+    # If here we have made sure that we can proceed without damaging data
+    to_position = combine_two_positions_for_voter(from_position, to_position)
 
     # Cached data like: ballot_item_display_name, ballot_item_image_url_https, ballot_item_twitter_handle,
     #  contest_office_name,
@@ -630,6 +663,155 @@ def return_most_likely_data(from_position, to_position, attribute):
     return getattr(to_position, attribute)
 
 
+def generate_position_ballot_item_key(position):
+    """
+    The ballot item a position is about, most specific first: candidate, then measure, then office
+    :param position:
+    :return: (ballot item type, identifier), or None
+    """
+    if positive_value_exists(position.candidate_campaign_we_vote_id):
+        return CANDIDATE, position.candidate_campaign_we_vote_id.lower()
+    elif positive_value_exists(position.candidate_campaign_id):
+        return CANDIDATE, position.candidate_campaign_id
+    elif positive_value_exists(position.contest_measure_we_vote_id):
+        return MEASURE, position.contest_measure_we_vote_id.lower()
+    elif positive_value_exists(position.contest_measure_id):
+        return MEASURE, position.contest_measure_id
+    elif positive_value_exists(position.contest_office_we_vote_id):
+        return OFFICE, position.contest_office_we_vote_id.lower()
+    elif positive_value_exists(position.contest_office_id):
+        return OFFICE, position.contest_office_id
+    return None
+
+
+def move_positions_to_another_ballot_item(
+        ballot_item_id_field_name='',
+        ballot_item_we_vote_id_field_name='',
+        from_ballot_item_id=0,
+        from_ballot_item_we_vote_id='',
+        to_ballot_item_id=0,
+        to_ballot_item_we_vote_id='',
+        public_or_private=True,
+        cached_ballot_item_values={},
+        status_prefix='MOVE_TO_ANOTHER_BALLOT_ITEM'):
+    """
+    Set-based move of every position from one candidate, measure or office onto another. Positions whose
+    organization or voter already has a position on the "to" ballot item are deleted, and all of the others are
+    re-pointed with one UPDATE per chunk, inside one transaction.
+    :param ballot_item_id_field_name: candidate_campaign_id, contest_measure_id or contest_office_id
+    :param ballot_item_we_vote_id_field_name: candidate_campaign_we_vote_id, contest_measure_we_vote_id or
+     contest_office_we_vote_id
+    :param from_ballot_item_id:
+    :param from_ballot_item_we_vote_id:
+    :param to_ballot_item_id:
+    :param to_ballot_item_we_vote_id:
+    :param public_or_private: If true, move public positions. If false, move friends only positions.
+    :param cached_ballot_item_values: from PositionManager.generate_cached_ballot_item_values, for the moved positions
+    :param status_prefix:
+    :return:
+    """
+    status = ''
+    success = True
+    position_entries_moved = 0
+    position_entries_not_moved = 0
+    position_model = PositionEntered if public_or_private else PositionForFriends
+    position_type_text = "PUBLIC" if public_or_private else "FRIENDS"
+
+    if not positive_value_exists(from_ballot_item_id) and not positive_value_exists(from_ballot_item_we_vote_id):
+        status += status_prefix + "-MISSING_FROM_BALLOT_ITEM "
+        results = {
+            'status':                       status,
+            'success':                      success,
+            'position_entries_moved':       position_entries_moved,
+            'position_entries_not_moved':   position_entries_not_moved,
+        }
+        return results
+
+    def filter_positions_for_ballot_item(ballot_item_id, ballot_item_we_vote_id):
+        # As of Aug 2018 we are no longer using PERCENT_RATING
+        queryset = position_model.objects.exclude(stance__iexact='PERCENT_RATING')
+        if positive_value_exists(ballot_item_id):
+            return queryset.filter(**{ballot_item_id_field_name: ballot_item_id})
+        return queryset.filter(**{ballot_item_we_vote_id_field_name + '__iexact': ballot_item_we_vote_id})
+
+    # Organizations and voters with an existing position attached to the ballot item we are going to keep
+    to_organization_we_vote_ids = set()
+    to_voter_we_vote_ids = set()
+    if positive_value_exists(to_ballot_item_id) or positive_value_exists(to_ballot_item_we_vote_id):
+        to_position_query = filter_positions_for_ballot_item(to_ballot_item_id, to_ballot_item_we_vote_id)
+        for organization_we_vote_id, voter_we_vote_id in \
+                to_position_query.values_list('organization_we_vote_id', 'voter_we_vote_id'):
+            if positive_value_exists(organization_we_vote_id):
+                to_organization_we_vote_ids.add(organization_we_vote_id)
+            if positive_value_exists(voter_we_vote_id):
+                to_voter_we_vote_ids.add(voter_we_vote_id)
+
+    duplicate_position_id_list = []
+    move_position_id_list = []
+    from_ballot_item_we_vote_id_list = [from_ballot_item_we_vote_id]
+    from_position_query = filter_positions_for_ballot_item(from_ballot_item_id, from_ballot_item_we_vote_id)
+    for position_id, organization_we_vote_id, voter_we_vote_id, ballot_item_we_vote_id in \
+            from_position_query.values_list('id', 'organization_we_vote_id', 'voter_we_vote_id',
+                                            ballot_item_we_vote_id_field_name):
+        from_ballot_item_we_vote_id_list.append(ballot_item_we_vote_id)
+        if not positive_value_exists(organization_we_vote_id) and not positive_value_exists(voter_we_vote_id):
+            status += status_prefix + "-UNABLE_TO_FIND_ORGANIZATION_OR_VOTER_WE_VOTE_ID_" \
+                                      "FOR_" + position_type_text + "_POSITION "
+            success = False
+            break
+        if organization_we_vote_id in to_organization_we_vote_ids or voter_we_vote_id in to_voter_we_vote_ids:
+            # We have an existing position for the same organization or voter already attached to the "to" ballot
+            # item, so just delete the one from the "from" ballot item
+            # In the future we could see if one has a comment that needs to be saved.
+            duplicate_position_id_list.append(position_id)
+        else:
+            move_position_id_list.append(position_id)
+
+    if not success:
+        results = {
+            'status':                       status,
+            'success':                      success,
+            'position_entries_moved':       position_entries_moved,
+            'position_entries_not_moved':   position_entries_not_moved,
+        }
+        return results
+
+    update_values = dict(cached_ballot_item_values)
+    update_values[ballot_item_id_field_name] = to_ballot_item_id
+    update_values[ballot_item_we_vote_id_field_name] = to_ballot_item_we_vote_id
+    try:
+        with DeferPositionTallyUpdates() as position_tally_updates:
+            with transaction.atomic():
+                for start in range(0, len(duplicate_position_id_list), POSITION_MOVE_CHUNK_SIZE):
+                    position_model.objects \
+                        .filter(id__in=duplicate_position_id_list[start:start + POSITION_MOVE_CHUNK_SIZE]) \
+                        .delete()
+                    position_entries_not_moved += \
+                        len(duplicate_position_id_list[start:start + POSITION_MOVE_CHUNK_SIZE])
+                for start in range(0, len(move_position_id_list), POSITION_MOVE_CHUNK_SIZE):
+                    position_entries_moved += position_model.objects \
+                        .filter(id__in=move_position_id_list[start:start + POSITION_MOVE_CHUNK_SIZE]) \
+                        .update(**update_values)
+            if ballot_item_we_vote_id_field_name in ('candidate_campaign_we_vote_id', 'contest_measure_we_vote_id'):
+                # QuerySet.update() does not send post_save, so recount the PositionTally entries ourselves
+                position_tally_updates.add_ballot_items(from_ballot_item_we_vote_id_list + [to_ballot_item_we_vote_id])
+        status += status_prefix + "-" + position_type_text + "_POSITIONS_MOVED: " + str(position_entries_moved) + \
+            " DUPLICATES_DELETED: " + str(position_entries_not_moved) + " "
+    except Exception as e:
+        status += status_prefix + "-UNABLE_TO_MOVE_" + position_type_text + "_POSITIONS: " + str(e) + " "
+        success = False
+        position_entries_moved = 0
+        position_entries_not_moved = 0
+
+    results = {
+        'status':                       status,
+        'success':                      success,
+        'position_entries_moved':       position_entries_moved,
+        'position_entries_not_moved':   position_entries_not_moved,
+    }
+    return results
+
+
 def move_positions_to_another_candidate(from_candidate_id, from_candidate_we_vote_id,
                                         to_candidate_id, to_candidate_we_vote_id,
                                         public_or_private):
@@ -643,131 +825,48 @@ def move_positions_to_another_candidate(from_candidate_id, from_candidate_we_vot
     :return:
     """
     status = ''
-    success = True
-    position_entries_moved = 0
-    position_entries_not_moved = 0
-    position_manager = PositionManager()
-    position_list_manager = PositionListManager()
-
-    stance_we_are_looking_for = ANY_STANCE
-    most_recent_only = False
-    friends_we_vote_id_list = False
-    retrieve_all_admin_override = True
-
-    # Get all positions for the "from_candidate" that we are moving away from
-    from_position_list = position_list_manager.retrieve_all_positions_for_candidate(
-        public_or_private, from_candidate_id, from_candidate_we_vote_id, stance_we_are_looking_for,
-        most_recent_only, friends_we_vote_id_list, retrieve_all_admin_override=retrieve_all_admin_override)
-
-    # Get all positions for the "to_candidate" that we need to check
-    to_position_list = position_list_manager.retrieve_all_positions_for_candidate(
-        public_or_private, to_candidate_id, to_candidate_we_vote_id, stance_we_are_looking_for,
-        most_recent_only, friends_we_vote_id_list, retrieve_all_admin_override=retrieve_all_admin_override)
-
-    # Put the organization_we_vote_id's of the orgs that have opinions about this candidate in a simple array
-    # These are existing positions attached to the candidate we are going to keep
-    to_organization_we_vote_ids = []
-    to_voter_we_vote_ids = []
-    for position_object in to_position_list:
-        if positive_value_exists(position_object.organization_we_vote_id):
-            to_organization_we_vote_ids.append(position_object.organization_we_vote_id)
-        if positive_value_exists(position_object.voter_we_vote_id):
-            to_voter_we_vote_ids.append(position_object.voter_we_vote_id)
-
-    offices_dict = {}
-    candidates_dict = {}
-    measures_dict = {}
-    organizations_dict = {}
-    voters_by_linked_org_dict = {}
-    voters_dict = {}
-    for position_object in from_position_list:
-        # Check organization_we_vote_ids for duplicate positions
-        # This is a list of positions that we want to migrate to the candidate we are planning to keep
-
-        # If the position is friends only and doesn't have an organization_we_vote_id stored with it,
-        #  we want to check the voter record to see if there is a linked_organization_we_vote_id
-
-        if positive_value_exists(position_object.organization_we_vote_id) or \
-                positive_value_exists(position_object.voter_we_vote_id):
-            if position_object.organization_we_vote_id in to_organization_we_vote_ids:
-                # We have an existing position for the same organization already attached to the "to" candidate,
-                # so just delete the one from "from" candidate
-                # In the future we could see if one has a comment that needs to be saved.
-                try:
-                    position_object.delete()
-                    position_entries_not_moved += 1
-                except Exception:
-                    if public_or_private:
-                        status += \
-                            "MOVE_TO_ANOTHER_CANDIDATE-UNABLE_TO_DELETE_DUPLICATE_PUBLIC_POSITION-BY_ORGANIZATION "
-                    else:
-                        status += \
-                            "MOVE_TO_ANOTHER_CANDIDATE-UNABLE_TO_DELETE_DUPLICATE_FRIENDS_POSITION-BY_ORGANIZATION "
-                    success = False
-                    break  # stop merge, exit for loop
-            elif position_object.voter_we_vote_id in to_voter_we_vote_ids:
-                # We have an existing position for the same voter already attached to the "to" candidate,
-                # so just delete the one from "from" candidate
-                # In the future we could see if one has a comment that needs to be saved.
-                try:
-                    position_object.delete()
-                    position_entries_not_moved += 1
-                except Exception:
-                    if public_or_private:
-                        status += "MOVE_TO_ANOTHER_CANDIDATE-UNABLE_TO_DELETE_DUPLICATE_PUBLIC_POSITION-BY_VOTER "
-                    else:
-                        status += "MOVE_TO_ANOTHER_CANDIDATE-UNABLE_TO_DELETE_DUPLICATE_FRIENDS_POSITION-BY_VOTER "
-                    success = False
-                    break  # stop merge, exit for loop
-            else:
-                # Update candidate's ids for this position
-                position_object.candidate_campaign_id = to_candidate_id
-                position_object.candidate_campaign_we_vote_id = to_candidate_we_vote_id
-                try:
-                    position_object.save()
-                    position_entries_moved += 1
-                    # And finally, refresh the position to use the latest information
-                    force_update = True
-                    results = position_manager.refresh_cached_position_info(
-                        position_object, force_update,
-                        offices_dict=offices_dict,
-                        candidates_dict=candidates_dict,
-                        measures_dict=measures_dict,
-                        organizations_dict=organizations_dict,
-                        voters_by_linked_org_dict=voters_by_linked_org_dict,
-                        voters_dict=voters_dict)
-                    offices_dict = results['offices_dict']
-                    candidates_dict = results['candidates_dict']
-                    measures_dict = results['measures_dict']
-                    organizations_dict = results['organizations_dict']
-                    voters_by_linked_org_dict = results['voters_by_linked_org_dict']
-                    voters_dict = results['voters_dict']
-                except Exception:
-                    if public_or_private:
-                        status += "MOVE_TO_ANOTHER_CANDIDATE-UNABLE_TO_SAVE_NEW_PUBLIC_POSITION "
-                    else:
-                        status += "MOVE_TO_ANOTHER_CANDIDATE-UNABLE_TO_SAVE_NEW_FRIENDS_POSITION "
-                    success = False
-                    break  # stop merge, exit for loop
-        else:
-            if public_or_private:
-                status += \
-                    "MOVE_TO_ANOTHER_CANDIDATE-UNABLE_TO_FIND_ORGANIZATION_OR_VOTER_WE_VOTE_ID_FOR_PUBLIC_POSITION "
-            else:
-                status += \
-                    "MOVE_TO_ANOTHER_CANDIDATE-UNABLE_TO_FIND_ORGANIZATION_OR_VOTER_WE_VOTE_ID_FOR_FRIENDS_POSITION "
-            success = False
-            break  # stop merge, exit for loop
+    candidate_manager = CandidateManager()
+    contest_office_manager = ContestOfficeManager()
+
+    # Every moved position gets the same cached candidate information, so look it up once
+    to_candidate = None
+    to_contest_office = None
+    results = candidate_manager.retrieve_candidate(to_candidate_id, to_candidate_we_vote_id, read_only=True)
+    if results['candidate_found']:
+        to_candidate = results['candidate']
+        to_candidate_id = to_candidate.id
+        to_candidate_we_vote_id = to_candidate.we_vote_id
+        if positive_value_exists(to_candidate.contest_office_we_vote_id):
+            office_results = contest_office_manager.retrieve_contest_office_from_we_vote_id(
+                to_candidate.contest_office_we_vote_id)
+            if office_results['contest_office_found']:
+                to_contest_office = office_results['contest_office']
+    else:
+        status += "MOVE_TO_ANOTHER_CANDIDATE-TO_CANDIDATE_NOT_FOUND "
+    cached_ballot_item_values = PositionManager.generate_cached_ballot_item_values(
+        candidate=to_candidate, contest_office=to_contest_office)
+
+    move_results = move_positions_to_another_ballot_item(
+        ballot_item_id_field_name='candidate_campaign_id',
+        ballot_item_we_vote_id_field_name='candidate_campaign_we_vote_id',
+        from_ballot_item_id=from_candidate_id,
+        from_ballot_item_we_vote_id=from_candidate_we_vote_id,
+        to_ballot_item_id=to_candidate_id,
+        to_ballot_item_we_vote_id=to_candidate_we_vote_id,
+        public_or_private=public_or_private,
+        cached_ballot_item_values=cached_ballot_item_values,
+        status_prefix="MOVE_TO_ANOTHER_CANDIDATE")
+    status += move_results['status']
 
     results = {
         'status':                       status,
-        'success':                      success,
+        'success':                      move_results['success'],
         'from_candidate_id':            from_candidate_id,
         'from_candidate_we_vote_id':    from_candidate_we_vote_id,
         'to_candidate_id':              to_candidate_id,
         'to_candidate_we_vote_id':      to_candidate_we_vote_id,
-        'position_entries_moved':       position_entries_moved,
-        'position_entries_not_moved':   position_entries_not_moved,
+        'position_entries_moved':       move_results['position_entries_moved'],
+        'position_entries_not_moved':   move_results['position_entries_not_moved'],
     }
     return results
 
@@ -775,132 +874,44 @@ def move_positions_to_another_candidate(from_candidate_id, from_candidate_we_vot
 def move_positions_to_another_measure(from_contest_measure_id, from_contest_measure_we_vote_id,
                                       to_contest_measure_id, to_contest_measure_we_vote_id, public_or_private):
     status = ''
-    success = True
-    position_entries_moved = 0
-    position_entries_not_moved = 0
-    position_manager = PositionManager()
-    position_list_manager = PositionListManager()
-
-    stance_we_are_looking_for = ANY_STANCE
-    most_recent_only = False
-    friends_we_vote_id_list = False
-
-    # Get all positions for the "from_office" that we are moving away from
-    from_position_list = position_list_manager.retrieve_all_positions_for_contest_measure(
-        public_or_private, from_contest_measure_id, from_contest_measure_we_vote_id, stance_we_are_looking_for,
-        most_recent_only, friends_we_vote_id_list)
-
-    # Get all positions for the "to_office" that we need to check
-    to_position_list = position_list_manager.retrieve_all_positions_for_contest_measure(
-        public_or_private, to_contest_measure_id, to_contest_measure_we_vote_id, stance_we_are_looking_for,
-        most_recent_only, friends_we_vote_id_list)
-
-    # Put the organization_we_vote_id's of the orgs that have opinions about this contest measure in a simple array
-    # These are existing positions attached to the contest_measure we are going to keep
-    to_organization_we_vote_ids = []
-    to_voter_we_vote_ids = []
-    for position_object in to_position_list:
-        if positive_value_exists(position_object.organization_we_vote_id):
-            to_organization_we_vote_ids.append(position_object.organization_we_vote_id)
-        if positive_value_exists(position_object.voter_we_vote_id):
-            to_voter_we_vote_ids.append(position_object.voter_we_vote_id)
+    contest_measure_manager = ContestMeasureManager()
 
-    offices_dict = {}
-    candidates_dict = {}
-    measures_dict = {}
-    organizations_dict = {}
-    voters_by_linked_org_dict = {}
-    voters_dict = {}
-    for position_object in from_position_list:
-        # Check organization_we_vote_ids for duplicate positions
-        # This is a list of positions that we want to migrate to the contest_measure we are planning to keep
-
-        # If the position is friends only and doesn't have an organization_we_vote_id stored with it,
-        #  we want to check the voter record to see if there is a linked_organization_we_vote_id
-
-        if positive_value_exists(position_object.organization_we_vote_id) or \
-                positive_value_exists(position_object.voter_we_vote_id):
-            if position_object.organization_we_vote_id in to_organization_we_vote_ids:
-                # We have an existing position for the same organization already attached to the "to" contest office,
-                # so just delete the one from "from" contest_measure
-                # In the future we could see if one has a comment that needs to be saved.
-                try:
-                    position_object.delete()
-                    position_entries_not_moved += 1
-                except Exception:
-                    if public_or_private:
-                        status += \
-                            "MOVE_TO_ANOTHER_CONTEST_MEASURE-UNABLE_TO_DELETE_DUPLICATE_PUBLIC_POSITION-BY_ORG "
-                    else:
-                        status += \
-                            "MOVE_TO_ANOTHER_CONTEST_MEASURE-UNABLE_TO_DELETE_DUPLICATE_FRIENDS_POSITION-BY_ORG "
-                    success = False
-                    break  # stop merge, exit for loop
-            elif position_object.voter_we_vote_id in to_voter_we_vote_ids:
-                # We have an existing position for the same voter already attached to the "to" contest_measure,
-                # so just delete the one from "from" contest_measure
-                # In the future we could see if one has a comment that needs to be saved.
-                try:
-                    position_object.delete()
-                    position_entries_not_moved += 1
-                except Exception:
-                    if public_or_private:
-                        status += "MOVE_TO_ANOTHER_CONTEST_MEASURE-UNABLE_TO_DELETE_DUPLICATE_PUBLIC_POSITION-BY_VOTER "
-                    else:
-                        status += "MOVE_TO_ANOTHER_CONTEST_MEASURE-UNABLE_TO_DELETE_DUPLICATE_FRNDS_POSITION-BY_VOTER "
-                    success = False
-                    break  # stop merge, exit for loop
-            else:
-                # Update contest_measure's ids for this position
-                position_object.contest_measure_id = to_contest_measure_id
-                position_object.contest_measure_we_vote_id = to_contest_measure_we_vote_id
-                try:
-                    position_object.save()
-                    position_entries_moved += 1
-                    # And finally, refresh the position to use the latest information
-                    force_update = True
-                    results = position_manager.refresh_cached_position_info(
-                        position_object, force_update,
-                        offices_dict=offices_dict,
-                        candidates_dict=candidates_dict,
-                        measures_dict=measures_dict,
-                        organizations_dict=organizations_dict,
-                        voters_by_linked_org_dict=voters_by_linked_org_dict,
-                        voters_dict=voters_dict)
-                    offices_dict = results['offices_dict']
-                    candidates_dict = results['candidates_dict']
-                    measures_dict = results['measures_dict']
-                    organizations_dict = results['organizations_dict']
-                    voters_by_linked_org_dict = results['voters_by_linked_org_dict']
-                    voters_dict = results['voters_dict']
-                except Exception:
-                    if public_or_private:
-                        status += "MOVE_TO_ANOTHER_CONTEST_MEASURE-UNABLE_TO_SAVE_NEW_PUBLIC_POSITION "
-                    else:
-                        status += "MOVE_TO_ANOTHER_CONTEST_MEASURE-UNABLE_TO_SAVE_NEW_FRIENDS_POSITION "
-                    success = False
-                    break  # stop merge, exit for loop
-        else:
-            if public_or_private:
-                status += \
-                    "MOVE_TO_ANOTHER_CONTEST_MEASURE-UNABLE_TO_FIND_ORGANIZATION_OR_VOTER_WE_VOTE_ID_" \
-                    "FOR_PUBLIC_POSITION "
-            else:
-                status += \
-                    "MOVE_TO_ANOTHER_CONTEST_MEASURE-UNABLE_TO_FIND_ORGANIZATION_OR_VOTER_WE_VOTE_ID_" \
-                    "FOR_FRIENDS_POSITION "
-            success = False
-            break  # stop merge, exit for loop
+    # Every moved position gets the same cached measure information, so look it up once
+    to_contest_measure = None
+    results = contest_measure_manager.retrieve_contest_measure(
+        contest_measure_id=to_contest_measure_id,
+        contest_measure_we_vote_id=to_contest_measure_we_vote_id,
+        read_only=True)
+    if results['contest_measure_found']:
+        to_contest_measure = results['contest_measure']
+        to_contest_measure_id = to_contest_measure.id
+        to_contest_measure_we_vote_id = to_contest_measure.we_vote_id
+    else:
+        status += "MOVE_TO_ANOTHER_CONTEST_MEASURE-TO_CONTEST_MEASURE_NOT_FOUND "
+    cached_ballot_item_values = PositionManager.generate_cached_ballot_item_values(
+        contest_measure=to_contest_measure)
+
+    move_results = move_positions_to_another_ballot_item(
+        ballot_item_id_field_name='contest_measure_id',
+        ballot_item_we_vote_id_field_name='contest_measure_we_vote_id',
+        from_ballot_item_id=from_contest_measure_id,
+        from_ballot_item_we_vote_id=from_contest_measure_we_vote_id,
+        to_ballot_item_id=to_contest_measure_id,
+        to_ballot_item_we_vote_id=to_contest_measure_we_vote_id,
+        public_or_private=public_or_private,
+        cached_ballot_item_values=cached_ballot_item_values,
+        status_prefix="MOVE_TO_ANOTHER_CONTEST_MEASURE")
+    status += move_results['status']
 
     results = {
         'status':                           status,
-        'success':                          success,
+        'success':                          move_results['success'],
         'from_contest_measure_id':          from_contest_measure_id,
         'from_contest_measure_we_vote_id':  from_contest_measure_we_vote_id,
         'to_contest_measure_id':            to_contest_measure_id,
         'to_contest_measure_we_vote_id':    to_contest_measure_we_vote_id,
-        'position_entries_moved':           position_entries_moved,
-        'position_entries_not_moved':       position_entries_not_moved,
+        'position_entries_moved':           move_results['position_entries_moved'],
+        'position_entries_not_moved':       move_results['position_entries_not_moved'],
     }
     return results
 
@@ -908,383 +919,251 @@ def move_positions_to_another_measure(from_contest_measure_id, from_contest_meas
 def move_positions_to_another_office(from_contest_office_id, from_contest_office_we_vote_id,
                                      to_contest_office_id, to_contest_office_we_vote_id, public_or_private):
     status = ''
-    success = True
-    position_entries_moved = 0
-    position_entries_not_moved = 0
-    position_manager = PositionManager()
-    position_list_manager = PositionListManager()
-
-    stance_we_are_looking_for = ANY_STANCE
-    most_recent_only = False
-    friends_we_vote_id_list = False
-
-    # Get all positions for the "from_office" that we are moving away from
-    from_position_list = position_list_manager.retrieve_all_positions_for_contest_office(
-        retrieve_public_positions=public_or_private,
-        contest_office_id=from_contest_office_id,
-        contest_office_we_vote_id=from_contest_office_we_vote_id,
-        stance_we_are_looking_for=stance_we_are_looking_for,
-        most_recent_only=most_recent_only,
-        friends_we_vote_id_list=friends_we_vote_id_list)
+    contest_office_manager = ContestOfficeManager()
 
-    # Get all positions for the "to_office" that we need to check
-    to_position_list = position_list_manager.retrieve_all_positions_for_contest_office(
-        retrieve_public_positions=public_or_private,
+    # Every moved position gets the same cached office information, so look it up once
+    to_contest_office = None
+    results = contest_office_manager.retrieve_contest_office(
         contest_office_id=to_contest_office_id,
-        contest_office_we_vote_id=to_contest_office_we_vote_id,
-        stance_we_are_looking_for=stance_we_are_looking_for,
-        most_recent_only=most_recent_only,
-        friends_we_vote_id_list=friends_we_vote_id_list)
-
-    # Put the organization_we_vote_id's of the orgs that have opinions about this contest office in a simple array
-    # These are existing positions attached to the contest office we are going to keep
-    to_organization_we_vote_ids = []
-    to_voter_we_vote_ids = []
-    for position_object in to_position_list:
-        if positive_value_exists(position_object.organization_we_vote_id):
-            to_organization_we_vote_ids.append(position_object.organization_we_vote_id)
-        if positive_value_exists(position_object.voter_we_vote_id):
-            to_voter_we_vote_ids.append(position_object.voter_we_vote_id)
-
-    offices_dict = {}
-    candidates_dict = {}
-    measures_dict = {}
-    organizations_dict = {}
-    voters_by_linked_org_dict = {}
-    voters_dict = {}
-    for position_object in from_position_list:
-        # Check organization_we_vote_ids for duplicate positions
-        # This is a list of positions that we want to migrate to the contest office we are planning to keep
-
-        # If the position is friends only and doesn't have an organization_we_vote_id stored with it,
-        #  we want to check the voter record to see if there is a linked_organization_we_vote_id
-
-        if positive_value_exists(position_object.organization_we_vote_id) or \
-                positive_value_exists(position_object.voter_we_vote_id):
-            if position_object.organization_we_vote_id in to_organization_we_vote_ids:
-                # We have an existing position for the same organization already attached to the "to" contest office,
-                # so just delete the one from "from" contest office
-                # In the future we could see if one has a comment that needs to be saved.
-                try:
-                    position_object.delete()
-                    position_entries_not_moved += 1
-                except Exception:
-                    if public_or_private:
-                        status += \
-                            "MOVE_TO_ANOTHER_CONTEST_OFFICE-UNABLE_TO_DELETE_DUPLICATE_PUBLIC_POSITION-BY_ORGANIZATION "
-                    else:
-                        status += \
-                            "MOVE_TO_ANOTHER_CONTEST_OFFICE-UNABLE_TO_DELETE_DUPLICATE_FRIENDS_POSITION-" \
-                            "BY_ORGANIZATION "
-                    success = False
-                    break  # stop merge, exit for loop
-            elif position_object.voter_we_vote_id in to_voter_we_vote_ids:
-                # We have an existing position for the same voter already attached to the "to" contest office,
-                # so just delete the one from "from" contest office
-                # In the future we could see if one has a comment that needs to be saved.
-                try:
-                    position_object.delete()
-                    position_entries_not_moved += 1
-                except Exception:
-                    if public_or_private:
-                        status += "MOVE_TO_ANOTHER_CONTEST_OFFICE-UNABLE_TO_DELETE_DUPLICATE_PUBLIC_POSITION-BY_VOTER "
-                    else:
-                        status += "MOVE_TO_ANOTHER_CONTEST_OFFICE-UNABLE_TO_DELETE_DUPLICATE_FRIENDS_POSITION-BY_VOTER "
-                    success = False
-                    break  # stop merge, exit for loop
-            else:
-                # Update contest_office's ids for this position
-                # DALE 2020-06-04 I think we will want to remove this soon
-                position_object.contest_office_id = to_contest_office_id
-                position_object.contest_office_we_vote_id = to_contest_office_we_vote_id
-                try:
-                    position_object.save()
-                    position_entries_moved += 1
-                    # And finally, refresh the position to use the latest information
-                    force_update = True
-                    results = position_manager.refresh_cached_position_info(
-                        position_object, force_update,
-                        offices_dict=offices_dict,
-                        candidates_dict=candidates_dict,
-                        measures_dict=measures_dict,
-                        organizations_dict=organizations_dict,
-                        voters_by_linked_org_dict=voters_by_linked_org_dict,
-                        voters_dict=voters_dict)
-                    offices_dict = results['offices_dict']
-                    candidates_dict = results['candidates_dict']
-                    measures_dict = results['measures_dict']
-                    organizations_dict = results['organizations_dict']
-                    voters_by_linked_org_dict = results['voters_by_linked_org_dict']
-                    voters_dict = results['voters_dict']
-                except Exception:
-                    if public_or_private:
-                        status += "MOVE_TO_ANOTHER_CONTEST_OFFICE-UNABLE_TO_SAVE_NEW_PUBLIC_POSITION "
-                    else:
-                        status += "MOVE_TO_ANOTHER_CONTEST_OFFICE-UNABLE_TO_SAVE_NEW_FRIENDS_POSITION "
-                    success = False
-                    break  # stop merge, exit for loop
-        else:
-            if public_or_private:
-                status += \
-                    "MOVE_TO_ANOTHER_CONTEST_OFFICE-UNABLE_TO_FIND_ORGANIZATION_OR_VOTER_WE_VOTE_ID_" \
-                    "FOR_PUBLIC_POSITION "
-            else:
-                status += \
-                    "MOVE_TO_ANOTHER_CONTEST_OFFICE-UNABLE_TO_FIND_ORGANIZATION_OR_VOTER_WE_VOTE_ID_" \
-                    "FOR_FRIENDS_POSITION "
-            success = False
-            break  # stop merge, exit for loop
+        contest_office_we_vote_id=to_contest_office_we_vote_id)
+    if results['contest_office_found']:
+        to_contest_office = results['contest_office']
+        to_contest_office_id = to_contest_office.id
+        to_contest_office_we_vote_id = to_contest_office.we_vote_id
+    else:
+        status += "MOVE_TO_ANOTHER_CONTEST_OFFICE-TO_CONTEST_OFFICE_NOT_FOUND "
+    cached_ballot_item_values = PositionManager.generate_cached_ballot_item_values(
+        contest_office=to_contest_office)
+
+    # DALE 2020-06-04 I think we will want to remove this soon
+    move_results = move_positions_to_another_ballot_item(
+        ballot_item_id_field_name='contest_office_id',
+        ballot_item_we_vote_id_field_name='contest_office_we_vote_id',
+        from_ballot_item_id=from_contest_office_id,
+        from_ballot_item_we_vote_id=from_contest_office_we_vote_id,
+        to_ballot_item_id=to_contest_office_id,
+        to_ballot_item_we_vote_id=to_contest_office_we_vote_id,
+        public_or_private=public_or_private,
+        cached_ballot_item_values=cached_ballot_item_values,
+        status_prefix="MOVE_TO_ANOTHER_CONTEST_OFFICE")
+    status += move_results['status']
 
     results = {
         'status':                           status,
-        'success':                          success,
+        'success':                          move_results['success'],
         'from_contest_office_id':           from_contest_office_id,
         'from_contest_office_we_vote_id':   from_contest_office_we_vote_id,
         'to_contest_office_id':             to_contest_office_id,
         'to_contest_office_we_vote_id':     to_contest_office_we_vote_id,
-        'position_entries_moved':           position_entries_moved,
-        'position_entries_not_moved':       position_entries_not_moved,
+        'position_entries_moved':           move_results['position_entries_moved'],
+        'position_entries_not_moved':       move_results['position_entries_not_moved'],
     }
     return results
 
 
-def move_positions_to_another_organization(
-        from_organization_id=0,
-        from_organization_we_vote_id='',
-        to_organization_id=0,
-        to_organization_we_vote_id='',
-        to_voter_id=0,
-        to_voter_we_vote_id=''):
+def move_positions_to_another_owner(
+        owner_field_name='',
+        from_owner_id=0,
+        from_owner_we_vote_id='',
+        to_owner_id=0,
+        to_owner_we_vote_id='',
+        moved_position_values={},
+        existing_position_values={},
+        status_prefix='MOVE_TO_ANOTHER_OWNER'):
+    """
+    Set-based move of every public and friends-only position from one organization or voter to another.
+    The "to" owner's existing positions are loaded once and grouped by ballot item. Where the "to" owner already has
+    a position on the same ballot item, the "from" position's statement is copied over (if the "to" position has
+    none) and the "from" position is deleted; every other position is re-pointed. The writes are done with
+    bulk_update and one DELETE per chunk, inside one transaction.
+    :param owner_field_name: organization or voter
+    :param from_owner_id:
+    :param from_owner_we_vote_id:
+    :param to_owner_id:
+    :param to_owner_we_vote_id:
+    :param moved_position_values: field name -> value, set on the positions we move
+    :param existing_position_values: field name -> value, set on the "to" owner's positions which absorb a duplicate
+    :param status_prefix:
+    :return:
+    """
     status = ''
     success = True
-    position_entries_not_deleted = 0
     position_entries_moved = 0
+    position_entries_merged = 0
     position_entries_not_moved = 0
-    position_manager = PositionManager()
-    position_list_manager = PositionListManager()
-    organization_manager = OrganizationManager()
-    to_organization_name = ""
-    to_organization_type = None
-    to_twitter_followers_count = None
-    if positive_value_exists(to_organization_we_vote_id):
-        results = organization_manager.retrieve_organization_from_we_vote_id(to_organization_we_vote_id)
-        if results['organization_found']:
-            to_voter_organization = results['organization']
-            to_organization_name = to_voter_organization.organization_name
-            to_organization_type = to_voter_organization.organization_type
-            to_twitter_followers_count = to_voter_organization.twitter_followers_count
-
-    # Find private positions for the "from_organization" that we are moving away from
-    stance_we_are_looking_for = ANY_STANCE
-    friends_vs_public = FRIENDS_ONLY
 
-    from_position_private_list = position_list_manager.retrieve_all_positions_for_organization(
-        organization_id=from_organization_id,
-        organization_we_vote_id=from_organization_we_vote_id,
-        stance_we_are_looking_for=stance_we_are_looking_for,
-        friends_vs_public=friends_vs_public)
+    def filter_positions_for_owner(position_model, owner_id, owner_we_vote_id):
+        # Include the old PERCENT_RATING positions, so none are left pointing at the "from" owner after a merge
+        queryset = position_model.objects.all()
+        if positive_value_exists(owner_id):
+            return queryset.filter(**{owner_field_name + '_id': owner_id})
+        return queryset.filter(**{owner_field_name + '_we_vote_id__iexact': owner_we_vote_id})
 
-    for from_position_entry in from_position_private_list:
-        # See if the "to_organization" already has the same entry
-        position_we_vote_id = ""
-        # We do not want the voter information to change this retrieve
-        empty_voter_id = 0
-        empty_voter_we_vote_id = ''
-
-        results = position_manager.retrieve_position_table_unknown(
-            position_we_vote_id=position_we_vote_id,
-            organization_id=to_organization_id,
-            organization_we_vote_id=to_organization_we_vote_id,
-            voter_id=empty_voter_id,
-            contest_office_id=from_position_entry.contest_office_id,
-            candidate_id=from_position_entry.candidate_campaign_id,
-            contest_measure_id=from_position_entry.contest_measure_id,
-            voter_we_vote_id=empty_voter_we_vote_id,
-            contest_office_we_vote_id=from_position_entry.contest_office_we_vote_id,
-            candidate_we_vote_id=from_position_entry.candidate_campaign_we_vote_id,
-            contest_measure_we_vote_id=from_position_entry.contest_measure_we_vote_id)
-
-        if results['position_found']:
-            # Look to see if there is a statement that can be preserved (i.e., moved from from_position to to_position
-            to_position_entry = results['position']
-            if not positive_value_exists(to_position_entry.statement_html):
-                # If the "to_position" does NOT have a statement_html, we look to see if the "from_position" has one
-                # we can use
-                if positive_value_exists(from_position_entry.statement_html):
-                    to_position_entry.statement_html = from_position_entry.statement_html
-            if not positive_value_exists(to_position_entry.statement_text):
-                # If the "to_position" does NOT have a statement_html, we look to see if the "from_position" has one
-                # we can use
-                if positive_value_exists(from_position_entry.statement_text):
-                    to_position_entry.statement_text = from_position_entry.statement_text
-            # Update the voter values to the new "to" voter
-            to_position_entry.voter_id = to_voter_id
-            to_position_entry.voter_we_vote_id = to_voter_we_vote_id
-            # Update cached organization information
-            if positive_value_exists(to_organization_name):
-                to_position_entry.speaker_display_name = to_organization_name
-            if positive_value_exists(to_organization_type):
-                to_position_entry.speaker_type = to_organization_type
-            if positive_value_exists(to_twitter_followers_count):
-                to_position_entry.twitter_followers_count = to_twitter_followers_count
-            try:
-                to_position_entry.save()
-                position_entries_moved += 1
-            except Exception as e:
-                position_entries_not_moved += 1
-                status += "TO_POSITION_COULD_NOT_SAVE: " + str(e) + " "
-                success = False
-        else:
-            # Change the position values to the new we_vote_id
-            try:
-                from_position_entry.organization_id = to_organization_id
-                from_position_entry.organization_we_vote_id = to_organization_we_vote_id
-                from_position_entry.voter_id = to_voter_id
-                from_position_entry.voter_we_vote_id = to_voter_we_vote_id
-                # Update cached organization information
-                if positive_value_exists(to_organization_name):
-                    from_position_entry.speaker_display_name = to_organization_name
-                if positive_value_exists(to_organization_type):
-                    from_position_entry.speaker_type = to_organization_type
-                if positive_value_exists(to_twitter_followers_count):
-                    from_position_entry.twitter_followers_count = to_twitter_followers_count
+    if not positive_value_exists(from_owner_id) and not positive_value_exists(from_owner_we_vote_id):
+        status += status_prefix + "-MISSING_FROM_OWNER "
+        results = {
+            'status':                       status,
+            'success':                      False,
+            'position_entries_moved':       position_entries_moved,
+            'position_entries_merged':      position_entries_merged,
+            'position_entries_not_moved':   position_entries_not_moved,
+        }
+        return results
 
-                from_position_entry.save()
-                position_entries_moved += 1
-            except Exception as e:
-                position_entries_not_moved += 1
-                status += "FROM_POSITION_COULD_NOT_SAVE: " + str(e) + " "
-                success = False
+    # Positions the "to" owner already has, by ballot item. Public positions take priority over friends-only.
+    to_position_by_ballot_item = {}
+    if positive_value_exists(to_owner_id) or positive_value_exists(to_owner_we_vote_id):
+        for position_model in (PositionEntered, PositionForFriends):
+            for to_position in filter_positions_for_owner(position_model, to_owner_id, to_owner_we_vote_id):
+                ballot_item_key = generate_position_ballot_item_key(to_position)
+                if ballot_item_key is not None:
+                    to_position_by_ballot_item.setdefault(ballot_item_key, to_position)
+
+    updated_to_position_by_id = {}
+    moved_position_list_by_model = {PositionForFriends: [], PositionEntered: []}
+    merged_position_id_list_by_model = {PositionForFriends: [], PositionEntered: []}
+    ballot_item_we_vote_id_list = []
+    # Friends-only positions first, then public
+    for position_model in (PositionForFriends, PositionEntered):
+        for from_position in filter_positions_for_owner(position_model, from_owner_id, from_owner_we_vote_id):
+            ballot_item_we_vote_id_list += [from_position.candidate_campaign_we_vote_id,
+                                            from_position.contest_measure_we_vote_id]
+            ballot_item_key = generate_position_ballot_item_key(from_position)
+            to_position = to_position_by_ballot_item.get(ballot_item_key) if ballot_item_key is not None else None
+            if to_position is not None:
+                # Look to see if there is a statement that can be preserved
+                if not positive_value_exists(to_position.statement_html) and \
+                        positive_value_exists(from_position.statement_html):
+                    to_position.statement_html = from_position.statement_html
+                if not positive_value_exists(to_position.statement_text) and \
+                        positive_value_exists(from_position.statement_text):
+                    to_position.statement_text = from_position.statement_text
+                for field_name, value in existing_position_values.items():
+                    setattr(to_position, field_name, value)
+                updated_to_position_by_id[(type(to_position), to_position.id)] = to_position
+                merged_position_id_list_by_model[position_model].append(from_position.id)
+            else:
+                for field_name, value in moved_position_values.items():
+                    setattr(from_position, field_name, value)
+                moved_position_list_by_model[position_model].append(from_position)
+                if ballot_item_key is not None:
+                    # Any later duplicate of this ballot item now merges into the position we just moved
+                    to_position_by_ballot_item[ballot_item_key] = from_position
+
+    updated_to_position_list_by_model = {PositionForFriends: [], PositionEntered: []}
+    for (position_model, position_id), to_position in updated_to_position_by_id.items():
+        updated_to_position_list_by_model[position_model].append(to_position)
+        ballot_item_we_vote_id_list += [to_position.candidate_campaign_we_vote_id,
+                                        to_position.contest_measure_we_vote_id]
+    existing_position_field_list = \
+        list(set(list(existing_position_values.keys()) + ['statement_html', 'statement_text']))
+    moved_position_field_list = list(moved_position_values.keys())
 
-    from_position_private_list_remaining = position_list_manager.retrieve_all_positions_for_organization(
-        organization_id=from_organization_id,
-        organization_we_vote_id=from_organization_we_vote_id,
-        stance_we_are_looking_for=stance_we_are_looking_for,
-        friends_vs_public=friends_vs_public)
-    for from_position_entry in from_position_private_list_remaining:
-        # Delete the remaining position values
-        try:
-            from_position_entry.delete()
-        except Exception as e:
-            position_entries_not_deleted += 1
-            status += "FROM_POSITION_NOT_DELETED: " + str(e) + " "
-            success = False
+    try:
+        with DeferPositionTallyUpdates() as position_tally_updates:
+            with transaction.atomic():
+                for position_model in (PositionForFriends, PositionEntered):
+                    if len(updated_to_position_list_by_model[position_model]):
+                        position_model.objects.bulk_update(
+                            updated_to_position_list_by_model[position_model], existing_position_field_list,
+                            batch_size=POSITION_MOVE_CHUNK_SIZE)
+                    if len(moved_position_list_by_model[position_model]) and len(moved_position_field_list):
+                        position_model.objects.bulk_update(
+                            moved_position_list_by_model[position_model], moved_position_field_list,
+                            batch_size=POSITION_MOVE_CHUNK_SIZE)
+                    position_entries_moved += len(moved_position_list_by_model[position_model])
+                    merged_position_id_list = merged_position_id_list_by_model[position_model]
+                    for start in range(0, len(merged_position_id_list), POSITION_MOVE_CHUNK_SIZE):
+                        position_model.objects \
+                            .filter(id__in=merged_position_id_list[start:start + POSITION_MOVE_CHUNK_SIZE]) \
+                            .delete()
+                    position_entries_merged += len(merged_position_id_list)
+            # bulk_update() does not send post_save, so recount the PositionTally entries ourselves
+            position_tally_updates.add_ballot_items(ballot_item_we_vote_id_list)
+        status += status_prefix + "-POSITIONS_MOVED: " + str(position_entries_moved) + \
+            " POSITIONS_MERGED: " + str(position_entries_merged) + " "
+    except Exception as e:
+        status += status_prefix + "-UNABLE_TO_MOVE_POSITIONS: " + str(e) + " "
+        success = False
+        position_entries_not_moved = \
+            sum(len(position_list) for position_list in moved_position_list_by_model.values()) + \
+            sum(len(position_id_list) for position_id_list in merged_position_id_list_by_model.values())
+        position_entries_moved = 0
+        position_entries_merged = 0
 
-    # Find public positions for the "from_voter" that we are moving away from
-    stance_we_are_looking_for = ANY_STANCE
-    friends_vs_public = PUBLIC_ONLY
-    from_position_public_list = position_list_manager.retrieve_all_positions_for_organization(
-        organization_id=from_organization_id,
-        organization_we_vote_id=from_organization_we_vote_id,
-        stance_we_are_looking_for=stance_we_are_looking_for,
-        friends_vs_public=friends_vs_public)
+    results = {
+        'status':                       status,
+        'success':                      success,
+        'position_entries_moved':       position_entries_moved,
+        'position_entries_merged':      position_entries_merged,
+        'position_entries_not_moved':   position_entries_not_moved,
+    }
+    return results
 
-    for from_position_entry in from_position_public_list:
-        # See if the "to_organization" already has the same entry
-        position_we_vote_id = ""
-        # We do not want the voter information to change this retrieve
-        empty_voter_id = 0
-        empty_voter_we_vote_id = ''
-        results = position_manager.retrieve_position_table_unknown(
-            position_we_vote_id=position_we_vote_id,
-            organization_id=to_organization_id,
-            organization_we_vote_id=to_organization_we_vote_id,
-            voter_id=empty_voter_id,
-            contest_office_id=from_position_entry.contest_office_id,
-            candidate_id=from_position_entry.candidate_campaign_id,
-            contest_measure_id=from_position_entry.contest_measure_id,
-            voter_we_vote_id=empty_voter_we_vote_id,
-            contest_office_we_vote_id=from_position_entry.contest_office_we_vote_id,
-            candidate_we_vote_id=from_position_entry.candidate_campaign_we_vote_id,
-            contest_measure_we_vote_id=from_position_entry.contest_measure_we_vote_id)
 
-        if results['position_found']:
-            # Look to see if there is a statement that can be preserved
-            to_position_entry = results['position']
-            if not positive_value_exists(to_position_entry.statement_html):
-                # If the "to_position" does NOT have a statement_html, we look to see if the "from_position" has one
-                # we can use
-                if positive_value_exists(from_position_entry.statement_html):
-                    to_position_entry.statement_html = from_position_entry.statement_html
-            if not positive_value_exists(to_position_entry.statement_text):
-                # If the "to_position" does NOT have a statement_html, we look to see if the "from_position" has one
-                # we can use
-                if positive_value_exists(from_position_entry.statement_text):
-                    to_position_entry.statement_text = from_position_entry.statement_text
-            # Update the voter values to the new "to" voter
-            to_position_entry.voter_id = to_voter_id
-            to_position_entry.voter_we_vote_id = to_voter_we_vote_id
-            # Update cached organization information
-            if positive_value_exists(to_organization_name):
-                to_position_entry.speaker_display_name = to_organization_name
-            if positive_value_exists(to_organization_type):
-                to_position_entry.speaker_type = to_organization_type
-            if positive_value_exists(to_twitter_followers_count):
-                to_position_entry.twitter_followers_count = to_twitter_followers_count
-            try:
-                to_position_entry.save()
-                position_entries_moved += 1
-            except Exception as e:
-                position_entries_not_moved += 1
-                status += "TO_POSITION_COULD_NOT_SAVE2: " + str(e) + " "
-                success = False
-        else:
-            # Change the position values to the new we_vote_id
-            try:
-                from_position_entry.organization_id = to_organization_id
-                from_position_entry.organization_we_vote_id = to_organization_we_vote_id
-                from_position_entry.voter_id = to_voter_id
-                from_position_entry.voter_we_vote_id = to_voter_we_vote_id
-                # Update cached organization information
-                if positive_value_exists(to_organization_name):
-                    from_position_entry.speaker_display_name = to_organization_name
-                if positive_value_exists(to_organization_type):
-                    from_position_entry.speaker_type = to_organization_type
-                if positive_value_exists(to_twitter_followers_count):
-                    from_position_entry.twitter_followers_count = to_twitter_followers_count
+def generate_speaker_values_from_organization(organization_we_vote_id):
+    """
+    Cached organization information for positions which now belong to this organization
+    :param organization_we_vote_id:
+    :return:
+    """
+    speaker_values = {}
+    if not positive_value_exists(organization_we_vote_id):
+        return speaker_values
+    organization_manager = OrganizationManager()
+    results = organization_manager.retrieve_organization_from_we_vote_id(organization_we_vote_id)
+    if results['organization_found']:
+        organization = results['organization']
+        if positive_value_exists(organization.organization_name):
+            speaker_values['speaker_display_name'] = organization.organization_name
+        if positive_value_exists(organization.organization_type):
+            speaker_values['speaker_type'] = organization.organization_type
+        if positive_value_exists(organization.twitter_followers_count):
+            speaker_values['twitter_followers_count'] = organization.twitter_followers_count
+    return speaker_values
 
-                from_position_entry.save()
-                position_entries_moved += 1
-            except Exception as e:
-                position_entries_not_moved += 1
-                status += "FROM_POSITION_COULD_NOT_SAVE2: " + str(e) + " "
-                success = False
 
-    from_position_public_list_remaining = position_list_manager.retrieve_all_positions_for_organization(
-        organization_id=from_organization_id,
-        organization_we_vote_id=from_organization_we_vote_id,
-        stance_we_are_looking_for=stance_we_are_looking_for,
-        friends_vs_public=friends_vs_public)
-    # organization_id,
-    # organization_we_vote_id,
-    # stance_we_are_looking_for,
-    # friends_vs_public,
-    # show_positions_current_voter_election = False,
-    # exclude_positions_current_voter_election = False,
-    # voter_device_id = '',
-    # voter_we_vote_id = '',
-    # google_civic_election_id = '',
-    # state_code = '', read_only =
-    for from_position_entry in from_position_public_list_remaining:
-        # Delete the remaining position values
-        try:
-            # Leave this turned off until testing is finished
-            from_position_entry.delete()
-        except Exception as e:
-            position_entries_not_deleted += 1
-            status += "FROM_POSITION_NOT_DELETED2: " + str(e) + " "
-            success = False
+def move_positions_to_another_organization(
+        from_organization_id=0,
+        from_organization_we_vote_id='',
+        to_organization_id=0,
+        to_organization_we_vote_id='',
+        to_voter_id=0,
+        to_voter_we_vote_id=''):
+    status = ''
+    speaker_values = generate_speaker_values_from_organization(to_organization_we_vote_id)
+
+    # Update the voter values to the new "to" voter
+    existing_position_values = dict(speaker_values)
+    existing_position_values['voter_id'] = to_voter_id
+    existing_position_values['voter_we_vote_id'] = to_voter_we_vote_id
+    # Change the position values to the new we_vote_id
+    moved_position_values = dict(existing_position_values)
+    moved_position_values['organization_id'] = to_organization_id
+    moved_position_values['organization_we_vote_id'] = to_organization_we_vote_id
+
+    move_results = move_positions_to_another_owner(
+        owner_field_name='organization',
+        from_owner_id=from_organization_id,
+        from_owner_we_vote_id=from_organization_we_vote_id,
+        to_owner_id=to_organization_id,
+        to_owner_we_vote_id=to_organization_we_vote_id,
+        moved_position_values=moved_position_values,
+        existing_position_values=existing_position_values,
+        status_prefix="MOVE_TO_ANOTHER_ORGANIZATION")
+    status += move_results['status']
 
     results = {
         'status':                       status,
-        'success':                      success,
+        'success':                      move_results['success'],
         'from_organization_id':         from_organization_id,
         'from_organization_we_vote_id': from_organization_we_vote_id,
         'to_voter_id':                  to_voter_id,
         'to_voter_we_vote_id':          to_voter_we_vote_id,
-        'position_entries_moved':       position_entries_moved,
-        'position_entries_not_deleted': position_entries_not_deleted,
-        'position_entries_not_moved':   position_entries_not_moved,
+        'position_entries_moved':       move_results['position_entries_moved'] +
+        move_results['position_entries_merged'],
+        'position_entries_not_deleted': 0,
+        'position_entries_not_moved':   move_results['position_entries_not_moved'],
     }
     return results
 
@@ -1306,43 +1185,29 @@ def move_positions_to_another_politician(
     success = True
     position_entries_moved = 0
 
+    # One UPDATE per table, matching on either identifier, so a position is not counted twice
+    from_politician_filter = Q()
     if positive_value_exists(from_politician_we_vote_id):
-        try:
-            position_entries_moved += PositionEntered.objects \
-                .filter(politician_we_vote_id__iexact=from_politician_we_vote_id) \
-                .update(politician_id=to_politician_id,
-                        politician_we_vote_id=to_politician_we_vote_id)
-        except Exception as e:
-            status += "FAILED_MOVE_PUBLIC_POSITIONS_BY_POLITICIAN_WE_VOTE_ID: " + str(e) + " "
-            success = False
-
-        try:
-            position_entries_moved += PositionForFriends.objects \
-                .filter(politician_we_vote_id__iexact=from_politician_we_vote_id) \
-                .update(politician_id=to_politician_id,
-                        politician_we_vote_id=to_politician_we_vote_id)
-        except Exception as e:
-            status += "FAILED_MOVE_FRIEND_POSITIONS_BY_POLITICIAN_WE_VOTE_ID: " + str(e) + " "
-            success = False
-
+        from_politician_filter |= Q(politician_we_vote_id__iexact=from_politician_we_vote_id)
     if positive_value_exists(from_politician_id):
-        try:
-            position_entries_moved += PositionEntered.objects \
-                .filter(politician_id=from_politician_id) \
-                .update(politician_id=to_politician_id,
-                        politician_we_vote_id=to_politician_we_vote_id)
-        except Exception as e:
-            status += "FAILED_MOVE_PUBLIC_POSITIONS_BY_POLITICIAN_ID: " + str(e) + " "
-            success = False
+        from_politician_filter |= Q(politician_id=from_politician_id)
 
+    if positive_value_exists(from_politician_we_vote_id) or positive_value_exists(from_politician_id):
         try:
-            position_entries_moved += PositionForFriends.objects \
-                .filter(politician_id=from_politician_id) \
-                .update(politician_id=to_politician_id,
-                        politician_we_vote_id=to_politician_we_vote_id)
+            with transaction.atomic():
+                position_entries_moved += PositionEntered.objects \
+                    .filter(from_politician_filter) \
+                    .update(politician_id=to_politician_id,
+                            politician_we_vote_id=to_politician_we_vote_id)
+                position_entries_moved += PositionForFriends.objects \
+                    .filter(from_politician_filter) \
+                    .update(politician_id=to_politician_id,
+                            politician_we_vote_id=to_politician_we_vote_id)
+            status += "MOVED_POSITIONS_BY_POLITICIAN: " + str(position_entries_moved) + " "
         except Exception as e:
-            status += "FAILED_MOVE_FRIEND_POSITIONS_BY_POLITICIAN_ID: " + str(e) + " "
+            status += "FAILED_MOVE_POSITIONS_BY_POLITICIAN: " + str(e) + " "
             success = False
+            position_entries_moved = 0
 
     results = {
         'status':                       status,
@@ -1359,12 +1224,6 @@ def move_positions_to_another_voter(from_voter_id, from_voter_we_vote_id,
     success = False
     position_entries_moved = 0
     position_entries_not_moved = 0
-    position_manager = PositionManager()
-    position_list_manager = PositionListManager()
-    organization_manager = OrganizationManager()
-    to_organization_name = ""
-    to_organization_type = None
-    to_twitter_followers_count = None
 
     if from_voter_id == to_voter_id:
         status += "MOVE_POSITIONS_TO_ANOTHER_VOTER-from_voter_id and to_voter_id identical "
@@ -1394,170 +1253,30 @@ def move_positions_to_another_voter(from_voter_id, from_voter_we_vote_id,
         }
         return results
 
-    if positive_value_exists(to_voter_linked_organization_we_vote_id):
-        results = organization_manager.retrieve_organization_from_we_vote_id(to_voter_linked_organization_we_vote_id)
-        if results['organization_found']:
-            to_voter_organization = results['organization']
-            to_organization_name = to_voter_organization.organization_name
-            to_organization_type = to_voter_organization.organization_type
-            to_twitter_followers_count = to_voter_organization.twitter_followers_count
-
-    # Find private positions for the "from_voter" that we are moving away from
-    stance_we_are_looking_for = ANY_STANCE
-    friends_vs_public = FRIENDS_ONLY
-    from_position_private_list_results = position_list_manager.retrieve_all_positions_for_voter(
-        from_voter_id, from_voter_we_vote_id,
-        stance_we_are_looking_for, friends_vs_public)
-    from_position_private_list = from_position_private_list_results['position_list']
-
-    position_we_vote_id = ""
-    # We don't want the organization_id to affect the retrieve
-    empty_organization_id = 0
-    empty_organization_we_vote_id = 0
-    for from_position_entry in from_position_private_list:
-        # See if the "to_voter" already has the same entry
-        results = position_manager.retrieve_position_table_unknown(
-            position_we_vote_id, empty_organization_id, empty_organization_we_vote_id,
-            to_voter_id,
-            from_position_entry.contest_office_id, from_position_entry.candidate_campaign_id,
-            from_position_entry.contest_measure_id,
-            to_voter_we_vote_id,
-            from_position_entry.contest_office_we_vote_id,
-            from_position_entry.candidate_campaign_we_vote_id, from_position_entry.contest_measure_we_vote_id)
-
-        if results['position_found']:
-            # Look to see if there is a statement that can be preserved (i.e., moved from from_position to to_position
-            to_position_entry = results['position']
-            if not positive_value_exists(to_position_entry.statement_html):
-                # If the "to_position" does NOT have a statement_html, we look to see if the "from_position" has one
-                # we can use
-                if positive_value_exists(from_position_entry.statement_html):
-                    to_position_entry.statement_html = from_position_entry.statement_html
-            if not positive_value_exists(to_position_entry.statement_text):
-                # If the "to_position" does NOT have a statement_html, we look to see if the "from_position" has one
-                # we can use
-                if positive_value_exists(from_position_entry.statement_text):
-                    to_position_entry.statement_text = from_position_entry.statement_text
-            # Update the organization values
-            to_position_entry.organization_we_vote_id = to_voter_linked_organization_we_vote_id
-            to_position_entry.organization_id = to_voter_linked_organization_id
-            # Update cached organization information
-            if positive_value_exists(to_organization_name):
-                to_position_entry.speaker_display_name = to_organization_name
-            if positive_value_exists(to_organization_type):
-                to_position_entry.speaker_type = to_organization_type
-            if positive_value_exists(to_twitter_followers_count):
-                to_position_entry.twitter_followers_count = to_twitter_followers_count
-            try:
-                to_position_entry.save()
-            except Exception as e:
-                status += "MOVE_TO_ANOTHER_VOTER-UNABLE_TO_SAVE_FRIENDS_ONLY_ORGANIZATION_UPDATE: " + str(e) + " "
-        else:
-            # Change the position values to the new values
-            try:
-                from_position_entry.organization_id = to_voter_linked_organization_id
-                from_position_entry.organization_we_vote_id = to_voter_linked_organization_we_vote_id
-                from_position_entry.voter_id = to_voter_id
-                from_position_entry.voter_we_vote_id = to_voter_we_vote_id
-                # Update cached organization information
-                if positive_value_exists(to_organization_name):
-                    from_position_entry.speaker_display_name = to_organization_name
-                if positive_value_exists(to_organization_type):
-                    from_position_entry.speaker_type = to_organization_type
-                if positive_value_exists(to_twitter_followers_count):
-                    from_position_entry.twitter_followers_count = to_twitter_followers_count
-
-                from_position_entry.save()
-                position_entries_moved += 1
-            except Exception as e:
-                status += "MOVE_TO_ANOTHER_VOTER-UNABLE_TO_SAVE_FRIENDS_ONLY_ORGANIZATION_UPDATE2: " + str(e) + " "
-                position_entries_not_moved += 1
-
-    from_position_private_list_remaining_results = position_list_manager.retrieve_all_positions_for_voter(
-        from_voter_id, from_voter_we_vote_id,
-        stance_we_are_looking_for, friends_vs_public)
-    from_position_private_list_remaining = from_position_private_list_remaining_results['position_list']
-    for from_position_entry in from_position_private_list_remaining:
-        # Delete the remaining position values
-        try:
-            from_position_entry.delete()
-        except Exception as e:
-            pass
-
-    # Find public positions for the "from_voter" that we are moving away from
-    stance_we_are_looking_for = ANY_STANCE
-    friends_vs_public = PUBLIC_ONLY
-    from_position_public_results = position_list_manager.retrieve_all_positions_for_voter(
-        from_voter_id, from_voter_we_vote_id,
-        stance_we_are_looking_for, friends_vs_public)
-    from_position_public_list = from_position_public_results['position_list']
-
-    position_we_vote_id = ""
-    # We don't want the organization_id to affect the retrieve
-    empty_organization_id = 0
-    empty_organization_we_vote_id = 0
-    for from_position_entry in from_position_public_list:
-        # See if the "to_voter" already has the same entry
-        results = position_manager.retrieve_position_table_unknown(
-            position_we_vote_id, empty_organization_id, empty_organization_we_vote_id,
-            to_voter_id,
-            from_position_entry.contest_office_id, from_position_entry.candidate_campaign_id,
-            from_position_entry.contest_measure_id,
-            to_voter_we_vote_id,
-            from_position_entry.contest_office_we_vote_id,
-            from_position_entry.candidate_campaign_we_vote_id, from_position_entry.contest_measure_we_vote_id)
-
-        if results['position_found']:
-            # Look to see if there is a statement that can be preserved
-            to_position_entry = results['position']
-            if not positive_value_exists(to_position_entry.statement_html):
-                # If the "to_position" does NOT have a statement_html, we look to see if the "from_position" has one
-                # we can use
-                if positive_value_exists(from_position_entry.statement_html):
-                    to_position_entry.statement_html = from_position_entry.statement_html
-            if not positive_value_exists(to_position_entry.statement_text):
-                # If the "to_position" does NOT have a statement_html, we look to see if the "from_position" has one
-                # we can use
-                if positive_value_exists(from_position_entry.statement_text):
-                    to_position_entry.statement_text = from_position_entry.statement_text
-            # Update the organization values
-            to_position_entry.organization_we_vote_id = to_voter_linked_organization_we_vote_id
-            to_position_entry.organization_id = to_voter_linked_organization_id
-            try:
-                to_position_entry.save()
-            except Exception as e:
-                status += "MOVE_TO_ANOTHER_VOTER-UNABLE_TO_SAVE_PUBLIC_ORGANIZATION_UPDATE "
-        else:
-            # Change the position values to the new we_vote_id
-            try:
-                from_position_entry.organization_id = to_voter_linked_organization_id
-                from_position_entry.organization_we_vote_id = to_voter_linked_organization_we_vote_id
-                from_position_entry.voter_id = to_voter_id
-                from_position_entry.voter_we_vote_id = to_voter_we_vote_id
-                # Update cached organization information
-                if positive_value_exists(to_organization_name):
-                    from_position_entry.speaker_display_name = to_organization_name
-                if positive_value_exists(to_organization_type):
-                    from_position_entry.speaker_type = to_organization_type
-                if positive_value_exists(to_twitter_followers_count):
-                    from_position_entry.twitter_followers_count = to_twitter_followers_count
-
-                from_position_entry.save()
-                position_entries_moved += 1
-            except Exception as e:
-                position_entries_not_moved += 1
-                status += "MOVE_TO_ANOTHER_VOTER-UNABLE_TO_SAVE_PUBLIC_ORGANIZATION_UPDATE2 "
-
-    from_position_public_results = position_list_manager.retrieve_all_positions_for_voter(
-        from_voter_id, from_voter_we_vote_id,
-        stance_we_are_looking_for, friends_vs_public)
-    from_position_public_list_remaining = from_position_public_results['position_list']
-    for from_position_entry in from_position_public_list_remaining:
-        # Delete the remaining position values
-        try:
-            from_position_entry.delete()
-        except Exception as e:
-            pass
+    speaker_values = generate_speaker_values_from_organization(to_voter_linked_organization_we_vote_id)
+
+    # Update the organization values
+    existing_position_values = dict(speaker_values)
+    existing_position_values['organization_id'] = to_voter_linked_organization_id
+    existing_position_values['organization_we_vote_id'] = to_voter_linked_organization_we_vote_id
+    # Change the position values to the new values
+    moved_position_values = dict(existing_position_values)
+    moved_position_values['voter_id'] = to_voter_id
+    moved_position_values['voter_we_vote_id'] = to_voter_we_vote_id
+
+    move_results = move_positions_to_another_owner(
+        owner_field_name='voter',
+        from_owner_id=from_voter_id,
+        from_owner_we_vote_id=from_voter_we_vote_id,
+        to_owner_id=to_voter_id,
+        to_owner_we_vote_id=to_voter_we_vote_id,
+        moved_position_values=moved_position_values,
+        existing_position_values=existing_position_values,
+        status_prefix="MOVE_TO_ANOTHER_VOTER")
+    status += move_results['status']
+    success = move_results['success']
+    position_entries_moved = move_results['position_entries_moved']
+    position_entries_not_moved = move_results['position_entries_not_moved']
 
     results = {
         'status':                       status,
@@ -4440,23 +4159,31 @@ def refresh_cached_position_info_for_election(google_civic_election_id, state_co
     position_list_manager = PositionListManager()
 
     results = position_list_manager.refresh_cached_position_info_for_election(google_civic_election_id, state_code)
+    public_positions_scanned = results['public_positions_scanned']
     public_positions_updated = results['public_positions_updated']
+    friends_only_positions_scanned = results['friends_only_positions_scanned']
     friends_only_positions_updated = results['friends_only_positions_updated']
 
     status = "REFRESH_CACHED_POSITION_INFO_FOR_ELECTION-public:" + str(public_positions_updated) + \
-             ",friends_only:" + str(friends_only_positions_updated)
+             " of " + str(public_positions_scanned) + \
+             ",friends_only:" + str(friends_only_positions_updated) + " of " + str(friends_only_positions_scanned) + \
+             " " + results['status']
     results = {
-        'success':                          True,
+        'success':                          results['success'],
         'status':                           status,
+        'public_positions_scanned':         public_positions_scanned,
         'public_positions_updated':         public_positions_updated,
+        'friends_only_positions_scanned':   friends_only_positions_scanned,
         'friends_only_positions_updated':   friends_only_positions_updated,
     }
     return results
 
 
 def refresh_positions_with_candidate_details_for_election(google_civic_election_id, state_code):
-    update_all_positions_results = []
+    positions_scanned_count = 0
     positions_updated_count = 0
+    status = ""
+    success = True
     google_civic_election_id = convert_to_int(google_civic_election_id)
 
     candidate_list_manager = CandidateListManager()
@@ -4469,24 +4196,29 @@ def refresh_positions_with_candidate_details_for_election(google_civic_election_
     if candidates_results['candidate_list_found']:
         candidate_list = candidates_results['candidate_list_objects']
 
-        for candidate in candidate_list:
-            update_position_results = update_all_position_details_from_candidate(candidate)
-            positions_updated_count += update_position_results['positions_updated_count']
-            update_all_positions_results.append(update_position_results)
+        position_list_manager = PositionListManager()
+        update_results = position_list_manager.update_all_positions_from_ballot_item_list(
+            'candidate_campaign_id', candidate_list, apply_candidate_details_to_position)
+        positions_scanned_count = update_results['positions_scanned']
+        positions_updated_count = update_results['positions_updated']
+        status += update_results['status']
+        success = update_results['success']
 
-    status = "POSITION_WITH_CANDIDATE_DETAILS_UPATED"
+    status += "POSITION_WITH_CANDIDATE_DETAILS_UPATED"
     results = {
-        'success':                      True,
+        'success':                      success,
         'status':                       status,
+        'positions_scanned_count':      positions_scanned_count,
         'positions_updated_count':      positions_updated_count,
-        'update_all_positions_results': update_all_positions_results,
     }
     return results
 
 
 def refresh_positions_with_contest_office_details_for_election(google_civic_election_id, state_code):
-    update_all_positions_results = []
+    positions_scanned_count = 0
     positions_updated_count = 0
+    status = ""
+    success = True
     google_civic_election_id = convert_to_int(google_civic_election_id)
 
     contest_office_list_manager = ContestOfficeListManager()
@@ -4496,24 +4228,29 @@ def refresh_positions_with_contest_office_details_for_election(google_civic_elec
     if contest_offices_results['office_list_found']:
         office_list = contest_offices_results['office_list_objects']
 
-        for office in office_list:
-            update_position_results = update_all_position_details_from_contest_office(office)
-            positions_updated_count += update_position_results['positions_updated_count']
-            update_all_positions_results.append(update_position_results)
+        position_list_manager = PositionListManager()
+        update_results = position_list_manager.update_all_positions_from_ballot_item_list(
+            'contest_office_id', office_list, apply_contest_office_details_to_position)
+        positions_scanned_count = update_results['positions_scanned']
+        positions_updated_count = update_results['positions_updated']
+        status += update_results['status']
+        success = update_results['success']
 
-    status = "POSITION_WITH_CONTEST_OFFICE_DETAILS_UPATED"
+    status += "POSITION_WITH_CONTEST_OFFICE_DETAILS_UPATED"
     results = {
-        'success':                      True,
+        'success':                      success,
         'status':                       status,
+        'positions_scanned_count':      positions_scanned_count,
         'positions_updated_count':      positions_updated_count,
-        'update_all_positions_results': update_all_positions_results,
     }
     return results
 
 
 def refresh_positions_with_contest_measure_details_for_election(google_civic_election_id, state_code):
-    update_all_positions_results = []
+    positions_scanned_count = 0
     positions_updated_count = 0
+    status = ""
+    success = True
     google_civic_election_id = convert_to_int(google_civic_election_id)
 
     contest_measure_list_manager = ContestMeasureListManager()
@@ -4526,17 +4263,20 @@ def refresh_positions_with_contest_measure_details_for_election(google_civic_ele
     if contest_measures_results['measure_list_found']:
         measure_list = contest_measures_results['measure_list_objects']
 
-        for measure in measure_list:
-            update_position_results = update_all_position_details_from_contest_measure(measure)
-            positions_updated_count += update_position_results['positions_updated_count']
-            update_all_positions_results.append(update_position_results)
+        position_list_manager = PositionListManager()
+        update_results = position_list_manager.update_all_positions_from_ballot_item_list(
+            'contest_measure_id', measure_list, apply_contest_measure_details_to_position)
+        positions_scanned_count = update_results['positions_scanned']
+        positions_updated_count = update_results['positions_updated']
+        status += update_results['status']
+        success = update_results['success']
 
-    status = "POSITION_WITH_CONTEST_MEASURE_DETAILS_UPATED"
+    status += "POSITION_WITH_CONTEST_MEASURE_DETAILS_UPATED"
     results = {
-        'success':                      True,
+        'success':                      success,
         'status':                       status,
+        'positions_scanned_count':      positions_scanned_count,
         'positions_updated_count':      positions_updated_count,
-        'update_all_positions_results': update_all_positions_results,
     }
     return results
 
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from position.models import PositionTallyManager
+
+
+class Command(BaseCommand):
+    help = 'Recounts PositionTally for every candidate and measure with positions. ' \
+           'Run once after PositionTally is added, so the position counts start reading from it.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk_size', type=int, default=1000,
+                            help='Number of ballot items recounted per pass')
+
+    def handle(self, *args, **options):
+        position_tally_manager = PositionTallyManager()
+        results = position_tally_manager.rebuild_all_position_tallies(chunk_size=options['chunk_size'])
+        self.stdout.write('Recounted {number} ballot items, {failed} failed. {status}'.format(
+            number=results['number_of_ballot_items'],
+            failed=results['number_of_ballot_items_failed'],
+            status=results['status']))
@@ -9,8 +9,10 @@ from candidate.models import CandidateCampaign, CandidateListManager, CandidateM
 from ballot.controllers import figure_out_google_civic_election_id_voter_is_watching, \
     figure_out_google_civic_election_id_voter_is_watching_by_voter_we_vote_id
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.timezone import now
 from election.models import Election
 from exception.models import handle_exception, handle_record_found_more_than_one_exception,\
@@ -22,13 +24,16 @@ from office.models import ContestOffice, ContestOfficeManager
 from organization.models import Organization, OrganizationManager, \
     INDIVIDUAL, PUBLIC_FIGURE, UNKNOWN, ORGANIZATION_TYPE_CHOICES
 import robot_detection
+import threading
+import time
 from share.models import ShareManager
-from twitter.models import TwitterUser
+from twitter.models import TwitterLinkToOrganization, TwitterLinkToVoter, TwitterUser
 from voter.models import fetch_voter_id_from_voter_we_vote_id, fetch_voter_we_vote_id_from_voter_id, Voter, VoterManager
 from voter_guide.models import VoterGuideManager
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, positive_value_exists
-from wevote_settings.models import fetch_next_we_vote_id_position_integer, fetch_site_unique_id_prefix
+from wevote_settings.models import fetch_next_we_vote_id_position_integer, fetch_site_unique_id_prefix, \
+    WeVoteSetting, WeVoteSettingsManager
 
 
 ANY_STANCE = 'ANY_STANCE'  # This is a way to indicate when we want to return any stance (support, oppose, no_stance)
@@ -61,8 +66,22 @@ ALL_ELECTIONS = 'ALL_ELECTIONS'
 
 POSITION = 'POSITION'
 
+# WeVoteSetting set by PositionTallyManager.rebuild_all_position_tallies once PositionTally covers every ballot item
+POSITION_TALLIES_READY_SETTING_NAME = 'position_tallies_ready'
+POSITION_TALLIES_READY_RECHECK_SECONDS = 60
+# Positions loaded and bulk updated at a time by PositionListManager.bulk_refresh_positions
+POSITION_REFRESH_CHUNK_SIZE = 1000
+
 logger = wevote_functions.admin.get_logger(__name__)
 
+position_tallies_ready_cache = {
+    'position_tallies_ready':   False,
+    'date_checked':             None,
+}
+
+# Per-thread set of ballot item we_vote_ids waiting to be recounted, while inside DeferPositionTallyUpdates
+position_tally_deferral = threading.local()
+
 
 # TODO DALE Consider adding vote_smart_sig_id and vote_smart_candidate_id fields so we can export them and to prevent
 # duplicate position entries from Vote Smart
@@ -274,6 +293,13 @@ class PositionEntered(models.Model):
             self.generate_new_we_vote_id()
         super(PositionEntered, self).save(*args, **kwargs)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(PositionEntered, cls).from_db(db, field_names, values)
+        # Remember what was loaded, so the PositionTally signals only recount when stance or ballot item changes
+        instance.loaded_position_tally_values = generate_position_tally_values(instance)
+        return instance
+
     def generate_new_we_vote_id(self):
         # ...generate a new id
         site_unique_id_prefix = fetch_site_unique_id_prefix()
@@ -687,6 +713,13 @@ class PositionForFriends(models.Model):
             self.generate_new_we_vote_id()
         super(PositionForFriends, self).save(*args, **kwargs)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(PositionForFriends, cls).from_db(db, field_names, values)
+        # Remember what was loaded, so the PositionTally signals only recount when stance or ballot item changes
+        instance.loaded_position_tally_values = generate_position_tally_values(instance)
+        return instance
+
     def generate_new_we_vote_id(self):
         # ...generate a new id
         site_unique_id_prefix = fetch_site_unique_id_prefix()
@@ -940,6 +973,502 @@ class PositionNetworkScore(models.Model):
         return ""
 
 
+class PositionTally(models.Model):
+    """
+    Number of positions taken on one ballot item (candidate or measure), per stance. Kept up to date from the
+    PositionEntered and PositionForFriends save/delete signals, so showing support/oppose counts for a full ballot
+    doesn't need a COUNT query per ballot item, stance and visibility.
+    Rebuild everything with: python manage.py rebuild_position_tallies
+    """
+    # Lower case candidate_campaign_we_vote_id or contest_measure_we_vote_id
+    ballot_item_we_vote_id = models.CharField(max_length=255, null=False, unique=False, db_index=True)
+    # SUPPORT, STILL_DECIDING, INFO_ONLY, NO_STANCE, OPPOSE, PERCENT_RATING (upper case)
+    stance = models.CharField(max_length=15, null=False, unique=False)
+    # Positions in PositionEntered
+    public_count = models.PositiveIntegerField(default=0, null=False)
+    # Positions in PositionEntered with a voter_we_vote_id (for fetch_voter_positions_count_...)
+    public_voter_count = models.PositiveIntegerField(default=0, null=False)
+    # Positions in PositionForFriends
+    friends_only_count = models.PositiveIntegerField(default=0, null=False)
+    # Positions in PositionForFriends with a voter_we_vote_id
+    friends_only_voter_count = models.PositiveIntegerField(default=0, null=False)
+    date_last_updated = models.DateTimeField(null=True, auto_now=True)
+
+    class Meta:
+        unique_together = ('ballot_item_we_vote_id', 'stance')
+
+
+class PositionTallyManager(models.Manager):
+    """
+    Maintain and read PositionTally entries
+    """
+
+    def __unicode__(self):
+        return "PositionTallyManager"
+
+    @staticmethod
+    def update_position_tallies_for_ballot_items(ballot_item_we_vote_id_list):
+        """
+        Recount the positions for these candidates and measures, and replace their PositionTally entries
+        :param ballot_item_we_vote_id_list: candidate and/or measure we_vote_ids
+        :return:
+        """
+        status = ""
+        success = True
+        ballot_item_we_vote_id_list = \
+            list(set(one_we_vote_id.lower() for one_we_vote_id in ballot_item_we_vote_id_list
+                     if positive_value_exists(one_we_vote_id)))
+        if not len(ballot_item_we_vote_id_list):
+            results = {
+                'success':  success,
+                'status':   "UPDATE_POSITION_TALLIES-NO_BALLOT_ITEMS ",
+            }
+            return results
+
+        # Positions are matched with __iexact elsewhere, so cover the common spellings
+        we_vote_id_variant_list = list(set(ballot_item_we_vote_id_list +
+                                           [one_we_vote_id.upper() for one_we_vote_id in ballot_item_we_vote_id_list]))
+        position_tally_dict = {}
+        try:
+            for position_model, count_name in ((PositionEntered, 'public'), (PositionForFriends, 'friends_only')):
+                for ballot_item_field_name in ('candidate_campaign_we_vote_id', 'contest_measure_we_vote_id'):
+                    count_query = position_model.objects.filter(
+                        **{ballot_item_field_name + '__in': we_vote_id_variant_list})
+                    count_query = count_query.values(ballot_item_field_name, 'stance').annotate(
+                        total_count=Count('id'),
+                        voter_count=Count('id', filter=Q(voter_we_vote_id__isnull=False)))
+                    for one_count in count_query:
+                        key = (one_count[ballot_item_field_name].lower(), str(one_count['stance']).upper())
+                        if key not in position_tally_dict:
+                            position_tally_dict[key] = PositionTally(
+                                ballot_item_we_vote_id=key[0],
+                                stance=key[1])
+                        position_tally = position_tally_dict[key]
+                        setattr(position_tally, count_name + '_count',
+                                getattr(position_tally, count_name + '_count') + one_count['total_count'])
+                        setattr(position_tally, count_name + '_voter_count',
+                                getattr(position_tally, count_name + '_voter_count') + one_count['voter_count'])
+
+            with transaction.atomic():
+                PositionTally.objects.filter(ballot_item_we_vote_id__in=ballot_item_we_vote_id_list).delete()
+                # ignore_conflicts: a concurrent recount of the same ballot item may have just written its entries
+                PositionTally.objects.bulk_create(list(position_tally_dict.values()), ignore_conflicts=True)
+            status += "POSITION_TALLIES_UPDATED "
+        except Exception as e:
+            success = False
+            status += "POSITION_TALLIES_NOT_UPDATED: " + str(e) + " "
+            handle_exception(e, logger=logger, exception_message=status)
+
+        results = {
+            'success':  success,
+            'status':   status,
+        }
+        return results
+
+    def rebuild_all_position_tallies(self, chunk_size=1000):
+        """
+        Recount every ballot item which has positions, then mark the tallies as ready to be used
+        :param chunk_size: number of ballot items recounted per pass
+        :return:
+        """
+        status = ""
+        success = True
+        ballot_item_we_vote_id_set = set()
+        for position_model in (PositionEntered, PositionForFriends):
+            for ballot_item_field_name in ('candidate_campaign_we_vote_id', 'contest_measure_we_vote_id'):
+                ballot_item_query = position_model.objects.exclude(**{ballot_item_field_name + '__isnull': True})
+                ballot_item_query = ballot_item_query.exclude(**{ballot_item_field_name: ''})
+                for one_we_vote_id in ballot_item_query.values_list(ballot_item_field_name, flat=True).distinct():
+                    ballot_item_we_vote_id_set.add(one_we_vote_id.lower())
+
+        ballot_item_we_vote_id_list = sorted(ballot_item_we_vote_id_set)
+        number_of_ballot_items_failed = 0
+        for start in range(0, len(ballot_item_we_vote_id_list), chunk_size):
+            results = self.update_position_tallies_for_ballot_items(
+                ballot_item_we_vote_id_list[start:start + chunk_size])
+            if not results['success']:
+                number_of_ballot_items_failed += len(ballot_item_we_vote_id_list[start:start + chunk_size])
+                status += results['status']
+
+        try:
+            # Tallies left from ballot items which no longer have any positions
+            PositionTally.objects.exclude(ballot_item_we_vote_id__in=ballot_item_we_vote_id_list).delete()
+        except Exception as e:
+            status += "COULD_NOT_DELETE_STALE_POSITION_TALLIES: " + str(e) + " "
+
+        if number_of_ballot_items_failed:
+            success = False
+        else:
+            we_vote_settings_manager = WeVoteSettingsManager()
+            we_vote_settings_manager.save_setting(
+                setting_name=POSITION_TALLIES_READY_SETTING_NAME,
+                setting_value=True,
+                value_type=WeVoteSetting.BOOLEAN)
+        status += "POSITION_TALLIES_REBUILT "
+
+        results = {
+            'success':                          success,
+            'status':                           status,
+            'number_of_ballot_items':           len(ballot_item_we_vote_id_list),
+            'number_of_ballot_items_failed':    number_of_ballot_items_failed,
+        }
+        return results
+
+    @staticmethod
+    def retrieve_position_tally_counts(ballot_item_we_vote_id_list):
+        """
+        :param ballot_item_we_vote_id_list:
+        :return: dict of lower case ballot_item_we_vote_id -> dict of stance -> PositionTally.
+          None if the tallies haven't been built yet (see fetch_position_tallies_ready), or can't be read.
+        """
+        if not fetch_position_tallies_ready():
+            return None
+        ballot_item_we_vote_id_list = \
+            [one_we_vote_id.lower() for one_we_vote_id in ballot_item_we_vote_id_list
+             if positive_value_exists(one_we_vote_id)]
+        position_tally_counts = {one_we_vote_id: {} for one_we_vote_id in ballot_item_we_vote_id_list}
+        try:
+            position_tally_query = PositionTally.objects.using('readonly').filter(
+                ballot_item_we_vote_id__in=ballot_item_we_vote_id_list)
+            for position_tally in position_tally_query:
+                position_tally_counts[position_tally.ballot_item_we_vote_id][position_tally.stance] = position_tally
+        except Exception as e:
+            handle_exception(e, logger=logger, exception_message="COULD_NOT_RETRIEVE_POSITION_TALLIES ")
+            return None
+        return position_tally_counts
+
+    def fetch_position_tally_count(self, ballot_item_we_vote_id, stance_we_are_looking_for=ANY_STANCE,
+                                   count_name='public_count'):
+        """
+        :param ballot_item_we_vote_id:
+        :param stance_we_are_looking_for: One stance, or ANY_STANCE for all of them except PERCENT_RATING
+        :param count_name: public_count, public_voter_count, friends_only_count or friends_only_voter_count
+        :return: the count, or None if the caller should count the positions itself
+        """
+        position_tally_counts = self.retrieve_position_tally_counts([ballot_item_we_vote_id])
+        if position_tally_counts is None:
+            return None
+        return sum_position_tally_counts(
+            position_tally_counts[ballot_item_we_vote_id.lower()], stance_we_are_looking_for, count_name)
+
+
+class PositionCachedInfoLookups(object):
+    """
+    The candidates, offices, measures, organizations, voters and twitter handles which a batch of positions caches
+    information from. Each kind is loaded with one query per batch, and kept for the batches which follow.
+    refresh_position applies the same values as PositionManager.refresh_cached_position_info(force_update=True),
+    without any per-position queries.
+    """
+    def __init__(self):
+        self.candidates_by_we_vote_id = {}
+        self.candidates_by_id = {}
+        self.contest_measures_by_we_vote_id = {}
+        self.contest_measures_by_id = {}
+        self.contest_offices_by_we_vote_id = {}
+        self.contest_offices_by_id = {}
+        self.organizations_by_we_vote_id = {}
+        self.organization_twitter_handles = {}
+        self.voters_by_we_vote_id = {}
+        self.voters_by_id = {}
+        self.voters_by_linked_organization_we_vote_id = {}
+        self.voter_twitter_handles = {}
+
+    @staticmethod
+    def load_missing(model, we_vote_id_set, id_set, by_we_vote_id, by_id):
+        we_vote_id_set = set(one_we_vote_id.lower() for one_we_vote_id in we_vote_id_set) - set(by_we_vote_id)
+        id_set = set(id_set) - set(by_id)
+        if not len(we_vote_id_set) and not len(id_set):
+            return
+        for one_object in model.objects.filter(Q(we_vote_id__in=list(we_vote_id_set)) | Q(id__in=list(id_set))):
+            by_we_vote_id[one_object.we_vote_id.lower()] = one_object
+            by_id[one_object.id] = one_object
+        # Remember what we could not find, so we do not look for it again
+        for one_we_vote_id in we_vote_id_set:
+            by_we_vote_id.setdefault(one_we_vote_id, None)
+        for one_id in id_set:
+            by_id.setdefault(one_id, None)
+
+    @staticmethod
+    def load_twitter_handles(twitter_link_model, owner_field_name, owner_we_vote_id_set, twitter_handles):
+        """
+        Only twitter handles we have stored locally. None means linked to a twitter account we have not cached,
+        in which case refresh_position leaves the position's twitter handle as it is.
+        """
+        owner_we_vote_id_set = set(owner_we_vote_id_set) - set(twitter_handles)
+        if not len(owner_we_vote_id_set):
+            return
+        twitter_id_by_owner = {}
+        for owner_we_vote_id, twitter_id in twitter_link_model.objects \
+                .filter(**{owner_field_name + '__in': list(owner_we_vote_id_set)}) \
+                .values_list(owner_field_name, 'twitter_id'):
+            if positive_value_exists(twitter_id):
+                twitter_id_by_owner[owner_we_vote_id.lower()] = twitter_id
+        twitter_handle_by_twitter_id = dict(
+            TwitterUser.objects.filter(twitter_id__in=list(twitter_id_by_owner.values()))
+            .values_list('twitter_id', 'twitter_handle'))
+        for owner_we_vote_id in owner_we_vote_id_set:
+            if owner_we_vote_id in twitter_id_by_owner:
+                twitter_handles[owner_we_vote_id] = \
+                    twitter_handle_by_twitter_id.get(twitter_id_by_owner[owner_we_vote_id])
+            else:
+                twitter_handles[owner_we_vote_id] = ''
+
+    def load_for_positions(self, position_list):
+        self.load_missing(
+            CandidateCampaign,
+            [position.candidate_campaign_we_vote_id for position in position_list
+             if positive_value_exists(position.candidate_campaign_we_vote_id)],
+            [position.candidate_campaign_id for position in position_list
+             if positive_value_exists(position.candidate_campaign_id)
+             and not positive_value_exists(position.candidate_campaign_we_vote_id)],
+            self.candidates_by_we_vote_id, self.candidates_by_id)
+        self.load_missing(
+            ContestMeasure,
+            [position.contest_measure_we_vote_id for position in position_list
+             if positive_value_exists(position.contest_measure_we_vote_id)],
+            [position.contest_measure_id for position in position_list
+             if positive_value_exists(position.contest_measure_id)
+             and not positive_value_exists(position.contest_measure_we_vote_id)],
+            self.contest_measures_by_we_vote_id, self.contest_measures_by_id)
+        # Candidate positions take their office from the candidate
+        office_we_vote_id_list = [position.contest_office_we_vote_id for position in position_list
+                                  if positive_value_exists(position.contest_office_we_vote_id)]
+        for position in position_list:
+            candidate = self.fetch_candidate(position)
+            if candidate is not None and positive_value_exists(candidate.contest_office_we_vote_id):
+                office_we_vote_id_list.append(candidate.contest_office_we_vote_id)
+        self.load_missing(
+            ContestOffice,
+            office_we_vote_id_list,
+            [position.contest_office_id for position in position_list
+             if positive_value_exists(position.contest_office_id)],
+            self.contest_offices_by_we_vote_id, self.contest_offices_by_id)
+
+        organization_we_vote_id_set = set(position.organization_we_vote_id.lower() for position in position_list
+                                          if positive_value_exists(position.organization_we_vote_id))
+        self.load_missing(
+            Organization, organization_we_vote_id_set, [],
+            self.organizations_by_we_vote_id, {})
+        self.load_twitter_handles(
+            TwitterLinkToOrganization, 'organization_we_vote_id', organization_we_vote_id_set,
+            self.organization_twitter_handles)
+
+        linked_organization_we_vote_id_set = \
+            organization_we_vote_id_set - set(self.voters_by_linked_organization_we_vote_id)
+        if len(linked_organization_we_vote_id_set):
+            voter_query = Voter.objects.filter(
+                linked_organization_we_vote_id__in=list(linked_organization_we_vote_id_set))
+            for voter in voter_query:
+                self.voters_by_linked_organization_we_vote_id[voter.linked_organization_we_vote_id.lower()] = voter
+            for one_we_vote_id in linked_organization_we_vote_id_set:
+                self.voters_by_linked_organization_we_vote_id.setdefault(one_we_vote_id, None)
+
+        # Voters are only needed for positions without an organization
+        voter_position_list = [position for position in position_list if self.fetch_organization(position) is None]
+        self.load_missing(
+            Voter,
+            [position.voter_we_vote_id for position in voter_position_list
+             if positive_value_exists(position.voter_we_vote_id)],
+            [position.voter_id for position in voter_position_list
+             if positive_value_exists(position.voter_id) and not positive_value_exists(position.voter_we_vote_id)],
+            self.voters_by_we_vote_id, self.voters_by_id)
+        voter_we_vote_id_set = set()
+        for position in voter_position_list:
+            voter = self.fetch_voter(position)
+            if voter is not None:
+                voter_we_vote_id_set.add(voter.we_vote_id.lower())
+        self.load_twitter_handles(
+            TwitterLinkToVoter, 'voter_we_vote_id', voter_we_vote_id_set, self.voter_twitter_handles)
+
+    @staticmethod
+    def fetch_from(by_we_vote_id, by_id, we_vote_id, object_id):
+        if positive_value_exists(we_vote_id):
+            return by_we_vote_id.get(we_vote_id.lower())
+        if positive_value_exists(object_id):
+            return by_id.get(object_id)
+        return None
+
+    def fetch_candidate(self, position):
+        return self.fetch_from(self.candidates_by_we_vote_id, self.candidates_by_id,
+                               position.candidate_campaign_we_vote_id, position.candidate_campaign_id)
+
+    def fetch_contest_measure(self, position):
+        return self.fetch_from(self.contest_measures_by_we_vote_id, self.contest_measures_by_id,
+                               position.contest_measure_we_vote_id, position.contest_measure_id)
+
+    def fetch_organization(self, position):
+        return self.fetch_from(self.organizations_by_we_vote_id, {}, position.organization_we_vote_id, 0)
+
+    def fetch_voter(self, position):
+        voter = self.fetch_from(self.voters_by_we_vote_id, {}, position.voter_we_vote_id, 0)
+        if voter is None and positive_value_exists(position.voter_id):
+            voter = self.voters_by_id.get(position.voter_id)
+        return voter
+
+    def refresh_position(self, position):
+        """
+        Copy the latest cached information onto this position, without saving it
+        :param position:
+        :return: list of the field names which changed
+        """
+        cached_values = {}
+
+        # Start with "speaker" information (Organization, Voter, or Public Figure)
+        organization = self.fetch_organization(position)
+        if organization is not None:
+            cached_values['speaker_display_name'] = organization.organization_name
+            cached_values['speaker_image_url_https'] = organization.organization_photo_url()
+            cached_values['speaker_image_url_https_large'] = organization.we_vote_hosted_profile_image_url_large
+            cached_values['speaker_image_url_https_medium'] = organization.we_vote_hosted_profile_image_url_medium
+            cached_values['speaker_image_url_https_tiny'] = organization.we_vote_hosted_profile_image_url_tiny
+            twitter_handle = self.organization_twitter_handles.get(organization.we_vote_id.lower())
+            if twitter_handle is not None:
+                cached_values['speaker_twitter_handle'] = twitter_handle
+            cached_values['speaker_type'] = organization.organization_type
+            if organization.organization_type in (PUBLIC_FIGURE, INDIVIDUAL):
+                linked_voter = self.voters_by_linked_organization_we_vote_id.get(organization.we_vote_id.lower())
+                if linked_voter is not None:
+                    cached_values['voter_we_vote_id'] = linked_voter.we_vote_id
+            cached_values['is_private_citizen'] = organization.is_private_citizen()
+            cached_values['organization_id'] = organization.id
+            cached_values['twitter_followers_count'] = organization.twitter_followers_count
+        else:
+            cached_values['is_private_citizen'] = True
+            voter = self.fetch_voter(position)
+            if voter is not None:
+                cached_values['speaker_display_name'] = voter.get_full_name()
+                cached_values['voter_we_vote_id'] = voter.we_vote_id
+                cached_values['voter_id'] = voter.id
+                cached_values['speaker_image_url_https'] = voter.voter_photo_url()
+                cached_values['speaker_image_url_https_large'] = voter.we_vote_hosted_profile_image_url_large
+                cached_values['speaker_image_url_https_medium'] = voter.we_vote_hosted_profile_image_url_medium
+                cached_values['speaker_image_url_https_tiny'] = voter.we_vote_hosted_profile_image_url_tiny
+                twitter_handle = self.voter_twitter_handles.get(voter.we_vote_id.lower())
+                if twitter_handle is not None:
+                    cached_values['speaker_twitter_handle'] = twitter_handle
+                cached_values['speaker_type'] = INDIVIDUAL
+
+        # Now move onto "ballot_item" information
+        check_for_missing_office_data = False
+        if positive_value_exists(position.candidate_campaign_id) or \
+                positive_value_exists(position.candidate_campaign_we_vote_id):
+            check_for_missing_office_data = True
+            candidate = self.fetch_candidate(position)
+            if candidate is not None:
+                cached_values['contest_office_id'] = candidate.contest_office_id
+                cached_values['contest_office_we_vote_id'] = candidate.contest_office_we_vote_id
+                cached_values['ballot_item_display_name'] = candidate.display_candidate_name()
+                cached_values['ballot_item_image_url_https'] = candidate.candidate_photo_url()
+                cached_values['ballot_item_image_url_https_large'] = candidate.we_vote_hosted_profile_image_url_large
+                cached_values['ballot_item_image_url_https_medium'] = \
+                    candidate.we_vote_hosted_profile_image_url_medium
+                cached_values['ballot_item_image_url_https_tiny'] = candidate.we_vote_hosted_profile_image_url_tiny
+                cached_values['ballot_item_twitter_handle'] = candidate.candidate_twitter_handle
+                cached_values['state_code'] = candidate.get_candidate_state()
+                # Sorting dates generated from the candidate's elections are left to refresh_cached_position_info
+                if positive_value_exists(candidate.candidate_year):
+                    cached_values['position_year'] = candidate.candidate_year
+                if positive_value_exists(candidate.candidate_ultimate_election_date):
+                    cached_values['position_ultimate_election_date'] = candidate.candidate_ultimate_election_date
+                cached_values['political_party'] = candidate.political_party_display()
+                cached_values['politician_id'] = candidate.politician_id
+                cached_values['politician_we_vote_id'] = candidate.politician_we_vote_id
+        elif positive_value_exists(position.contest_measure_id) or \
+                positive_value_exists(position.contest_measure_we_vote_id):
+            contest_measure = self.fetch_contest_measure(position)
+            if contest_measure is not None:
+                cached_values['ballot_item_display_name'] = contest_measure.measure_title
+                # These should not exist for measures
+                cached_values['ballot_item_image_url_https'] = ""
+                cached_values['ballot_item_twitter_handle'] = ""
+                if positive_value_exists(contest_measure.measure_year):
+                    cached_values['position_year'] = contest_measure.measure_year
+                if positive_value_exists(contest_measure.measure_ultimate_election_date):
+                    cached_values['position_ultimate_election_date'] = \
+                        contest_measure.measure_ultimate_election_date
+                cached_values['state_code'] = contest_measure.state_code
+        elif positive_value_exists(position.contest_office_id) or \
+                positive_value_exists(position.contest_office_we_vote_id):
+            check_for_missing_office_data = True
+
+        if check_for_missing_office_data:
+            contest_office = self.fetch_from(
+                self.contest_offices_by_we_vote_id, self.contest_offices_by_id,
+                cached_values.get('contest_office_we_vote_id', position.contest_office_we_vote_id),
+                cached_values.get('contest_office_id', position.contest_office_id))
+            if contest_office is not None:
+                cached_values['contest_office_id'] = contest_office.id
+                cached_values['contest_office_we_vote_id'] = contest_office.we_vote_id
+                cached_values['contest_office_name'] = contest_office.office_name
+                cached_values['race_office_level'] = contest_office.ballotpedia_race_office_level
+
+        return apply_changed_values_to_position(position, cached_values)
+
+
+def apply_changed_values_to_position(position, new_values):
+    changed_field_list = []
+    for field_name, value in new_values.items():
+        if getattr(position, field_name) != value:
+            setattr(position, field_name, value)
+            changed_field_list.append(field_name)
+    return changed_field_list
+
+
+def apply_candidate_details_to_position(position, candidate):
+    """
+    In-memory version of PositionManager.update_position_image_urls_from_candidate and
+    update_position_ballot_data_from_candidate
+    :return: list of the field names which changed
+    """
+    new_values = {}
+    if positive_value_exists(candidate.candidate_photo_url()):
+        new_values['ballot_item_image_url_https'] = candidate.candidate_photo_url()
+    if positive_value_exists(candidate.we_vote_hosted_profile_image_url_large):
+        new_values['ballot_item_image_url_https_large'] = candidate.we_vote_hosted_profile_image_url_large
+    if positive_value_exists(candidate.we_vote_hosted_profile_image_url_medium):
+        new_values['ballot_item_image_url_https_medium'] = candidate.we_vote_hosted_profile_image_url_medium
+    if positive_value_exists(candidate.we_vote_hosted_profile_image_url_tiny):
+        new_values['ballot_item_image_url_https_tiny'] = candidate.we_vote_hosted_profile_image_url_tiny
+    if positive_value_exists(candidate.candidate_name):
+        new_values['ballot_item_display_name'] = candidate.candidate_name
+    if positive_value_exists(candidate.candidate_twitter_handle):
+        new_values['ballot_item_twitter_handle'] = candidate.candidate_twitter_handle
+    return apply_changed_values_to_position(position, new_values)
+
+
+def apply_contest_measure_details_to_position(position, contest_measure):
+    """
+    In-memory version of PositionManager.update_position_measure_data_from_contest_measure
+    :return: list of the field names which changed
+    """
+    new_values = {}
+    if positive_value_exists(contest_measure.google_civic_election_id):
+        new_values['google_civic_election_id'] = contest_measure.google_civic_election_id
+    if positive_value_exists(contest_measure.google_civic_measure_title):
+        new_values['google_civic_measure_title'] = contest_measure.google_civic_measure_title
+    if positive_value_exists(contest_measure.we_vote_id):
+        new_values['contest_measure_we_vote_id'] = contest_measure.we_vote_id
+    if positive_value_exists(contest_measure.id):
+        new_values['contest_measure_id'] = contest_measure.id
+    return apply_changed_values_to_position(position, new_values)
+
+
+def apply_contest_office_details_to_position(position, contest_office):
+    """
+    In-memory version of PositionManager.update_position_office_data_from_contest_office
+    :return: list of the field names which changed
+    """
+    new_values = {}
+    if positive_value_exists(contest_office.office_name):
+        new_values['contest_office_name'] = contest_office.office_name
+    if positive_value_exists(contest_office.we_vote_id):
+        new_values['contest_office_we_vote_id'] = contest_office.we_vote_id
+    if positive_value_exists(contest_office.id):
+        new_values['contest_office_id'] = contest_office.id
+    new_values['race_office_level'] = contest_office.ballotpedia_race_office_level
+    return apply_changed_values_to_position(position, new_values)
+
+
 class PositionListManager(models.Manager):
     # 2018-05 We now have an "is_public_position()" function
     # def add_is_public_position(self, incoming_position_list, is_public_position):
@@ -962,6 +1491,9 @@ class PositionListManager(models.Manager):
         """
 
         positions_followed_by_voter = []
+        # Set lookups, since voters can follow hundreds of organizations and ballots have thousands of positions
+        organizations_followed_by_voter_by_id = frozenset(organizations_followed_by_voter_by_id)
+        voter_friend_list = frozenset(voter_friend_list)
         # Only return the positions if they are from organizations the voter follows
         for position in all_positions_list:
             if position.voter_id == voter_id:  # We include the voter currently viewing the ballot in this list
@@ -984,6 +1516,9 @@ class PositionListManager(models.Manager):
         :return:
         """
         positions_not_followed_by_voter = []
+        # Set lookups, since voters can follow hundreds of organizations and ballots have thousands of positions
+        organizations_followed_by_voter = frozenset(organizations_followed_by_voter)
+        voter_friend_list = frozenset(voter_friend_list)
         # Only return the positions if they are from organizations the voter follows
         for position in all_positions_list:
             # Some positions are for individual voters, so we want to filter those out
@@ -1020,6 +1555,15 @@ class PositionListManager(models.Manager):
                 positive_value_exists(candidate_we_vote_id):
             return 0
 
+        if positive_value_exists(candidate_we_vote_id):
+            position_tally_counts = PositionTallyManager.retrieve_position_tally_counts([candidate_we_vote_id])
+            if position_tally_counts is not None:
+                position_tally_by_stance = position_tally_counts[candidate_we_vote_id.lower()]
+                return sum_position_tally_counts(position_tally_by_stance, stance_we_are_looking_for,
+                                                 'public_voter_count') + \
+                    sum_position_tally_counts(position_tally_by_stance, stance_we_are_looking_for,
+                                              'friends_only_voter_count')
+
         # Retrieve the support positions for this candidate
         total_count = 0
         # Public Positions
@@ -1135,6 +1679,15 @@ class PositionListManager(models.Manager):
                 positive_value_exists(contest_measure_we_vote_id):
             return 0
 
+        if positive_value_exists(contest_measure_we_vote_id):
+            position_tally_counts = PositionTallyManager.retrieve_position_tally_counts([contest_measure_we_vote_id])
+            if position_tally_counts is not None:
+                position_tally_by_stance = position_tally_counts[contest_measure_we_vote_id.lower()]
+                return sum_position_tally_counts(position_tally_by_stance, stance_we_are_looking_for,
+                                                 'public_voter_count') + \
+                    sum_position_tally_counts(position_tally_by_stance, stance_we_are_looking_for,
+                                              'friends_only_voter_count')
+
         # Retrieve the support positions for this contest_measure
         total_count = 0
         # Public Positions
@@ -2406,72 +2959,156 @@ class PositionListManager(models.Manager):
             position_list_filtered = []
             return position_list_filtered
 
+    @staticmethod
+    def bulk_refresh_positions(position_model, position_query, refresh_position_function,
+                               load_for_positions_function=None):
+        """
+        Walk through position_query in chunks, run refresh_position_function on each position (which returns the
+        list of fields it changed), and write only the positions which changed, with bulk_update.
+        :param position_model: PositionEntered or PositionForFriends
+        :param position_query:
+        :param refresh_position_function:
+        :param load_for_positions_function: Called with each chunk before refreshing, to load what it needs
+        :return:
+        """
+        status = ""
+        success = True
+        positions_scanned = 0
+        positions_updated = 0
+        position_id_list = list(position_query.values_list('id', flat=True))
+        with DeferPositionTallyUpdates() as position_tally_updates:
+            for start in range(0, len(position_id_list), POSITION_REFRESH_CHUNK_SIZE):
+                position_list = list(position_model.objects.filter(
+                    id__in=position_id_list[start:start + POSITION_REFRESH_CHUNK_SIZE]))
+                if load_for_positions_function is not None:
+                    load_for_positions_function(position_list)
+                changed_position_list = []
+                changed_field_set = set()
+                for position in position_list:
+                    changed_field_list = refresh_position_function(position)
+                    if len(changed_field_list):
+                        changed_position_list.append(position)
+                        changed_field_set.update(changed_field_list)
+                positions_scanned += len(position_list)
+                if not len(changed_position_list):
+                    continue
+                try:
+                    position_model.objects.bulk_update(changed_position_list, list(changed_field_set))
+                    positions_updated += len(changed_position_list)
+                except Exception as e:
+                    status += "BULK_REFRESH_POSITIONS_FAILED: " + str(e) + " "
+                    success = False
+                    continue
+                if 'voter_we_vote_id' in changed_field_set:
+                    # bulk_update() does not send post_save, and PositionTally counts positions from voters
+                    for position in changed_position_list:
+                        position_tally_updates.add_ballot_items(
+                            [position.candidate_campaign_we_vote_id, position.contest_measure_we_vote_id])
+
+        results = {
+            'success':              success,
+            'status':               status,
+            'positions_scanned':    positions_scanned,
+            'positions_updated':    positions_updated,
+        }
+        return results
+
     # TODO Upgrade to not count on position.google_civic_election_id for candidates
     def refresh_cached_position_info_for_election(self, google_civic_election_id, state_code=''):
-        position_manager = PositionManager()
+        """
+        Bulk version of PositionManager.refresh_cached_position_info(force_update=True), for every position about a
+        candidate or measure in this election. For each chunk of positions, the candidates, offices, measures,
+        organizations and voters are loaded with one query each, and only the positions which changed are saved.
+        :param google_civic_election_id:
+        :param state_code:
+        :return:
+        """
         success = True
         status = ""
-        force_update = True
+        public_positions_scanned = 0
         public_positions_updated = 0
+        friends_only_positions_scanned = 0
         friends_only_positions_updated = 0
-        offices_dict = {}
-        candidates_dict = {}
-        measures_dict = {}
-        organizations_dict = {}
-        voters_by_linked_org_dict = {}
-        voters_dict = {}
 
         if positive_value_exists(google_civic_election_id):
+            # Measures still use google_civic_election_id in the position table, but candidates don't
+            candidate_list_manager = CandidateListManager()
+            candidate_we_vote_id_list = candidate_list_manager.fetch_candidate_we_vote_id_list_from_election_list(
+                google_civic_election_id_list=[google_civic_election_id])
+            election_filter = Q(google_civic_election_id=google_civic_election_id)
+            if len(candidate_we_vote_id_list):
+                election_filter |= Q(candidate_campaign_we_vote_id__in=candidate_we_vote_id_list)
+
+            position_cached_info_lookups = PositionCachedInfoLookups()
             # Visible to the Public
-            public_positions_list = PositionEntered.objects.all()
-            public_positions_list = public_positions_list.filter(
-                google_civic_election_id=google_civic_election_id)
-            for one_position in public_positions_list:
-                results = position_manager.refresh_cached_position_info(
-                    one_position, force_update,
-                    offices_dict=offices_dict,
-                    candidates_dict=candidates_dict,
-                    measures_dict=measures_dict,
-                    organizations_dict=organizations_dict,
-                    voters_by_linked_org_dict=voters_by_linked_org_dict,
-                    voters_dict=voters_dict)
-                offices_dict = results['offices_dict']
-                candidates_dict = results['candidates_dict']
-                measures_dict = results['measures_dict']
-                organizations_dict = results['organizations_dict']
-                voters_by_linked_org_dict = results['voters_by_linked_org_dict']
-                voters_dict = results['voters_dict']
-                public_positions_updated += 1
+            results = self.bulk_refresh_positions(
+                PositionEntered, PositionEntered.objects.filter(election_filter),
+                position_cached_info_lookups.refresh_position,
+                load_for_positions_function=position_cached_info_lookups.load_for_positions)
+            status += results['status']
+            success = success and results['success']
+            public_positions_scanned = results['positions_scanned']
+            public_positions_updated = results['positions_updated']
 
             # Visible to We Vote friends only
-            friends_only_positions_list = PositionForFriends.objects.all()
-            friends_only_positions_list = friends_only_positions_list.filter(
-                google_civic_election_id=google_civic_election_id)
-            for one_position in friends_only_positions_list:
-                results = position_manager.refresh_cached_position_info(
-                    one_position, force_update,
-                    offices_dict=offices_dict,
-                    candidates_dict=candidates_dict,
-                    measures_dict=measures_dict,
-                    organizations_dict=organizations_dict,
-                    voters_by_linked_org_dict=voters_by_linked_org_dict,
-                    voters_dict=voters_dict)
-                offices_dict = results['offices_dict']
-                candidates_dict = results['candidates_dict']
-                measures_dict = results['measures_dict']
-                organizations_dict = results['organizations_dict']
-                voters_by_linked_org_dict = results['voters_by_linked_org_dict']
-                voters_dict = results['voters_dict']
-                friends_only_positions_updated += 1
+            results = self.bulk_refresh_positions(
+                PositionForFriends, PositionForFriends.objects.filter(election_filter),
+                position_cached_info_lookups.refresh_position,
+                load_for_positions_function=position_cached_info_lookups.load_for_positions)
+            status += results['status']
+            success = success and results['success']
+            friends_only_positions_scanned = results['positions_scanned']
+            friends_only_positions_updated = results['positions_updated']
 
         results = {
             'success':                          success,
             'status':                           status,
+            'public_positions_scanned':         public_positions_scanned,
             'public_positions_updated':         public_positions_updated,
+            'friends_only_positions_scanned':   friends_only_positions_scanned,
             'friends_only_positions_updated':   friends_only_positions_updated,
         }
         return results
 
+    def update_all_positions_from_ballot_item_list(self, ballot_item_id_field_name, ballot_item_list,
+                                                   apply_ballot_item_details_function):
+        """
+        Bulk version of the update_all_position_details_from_... controllers, for a whole list of candidates,
+        offices or measures at once
+        :param ballot_item_id_field_name: candidate_campaign_id, contest_office_id or contest_measure_id
+        :param ballot_item_list: CandidateCampaign, ContestOffice or ContestMeasure objects
+        :param apply_ballot_item_details_function: apply_candidate_details_to_position,
+         apply_contest_office_details_to_position or apply_contest_measure_details_to_position
+        :return:
+        """
+        success = True
+        status = ""
+        positions_scanned = 0
+        positions_updated = 0
+        ballot_item_by_id = {ballot_item.id: ballot_item for ballot_item in ballot_item_list}
+
+        def refresh_position(position):
+            return apply_ballot_item_details_function(
+                position, ballot_item_by_id[getattr(position, ballot_item_id_field_name)])
+
+        if len(ballot_item_by_id):
+            for position_model in (PositionEntered, PositionForFriends):
+                position_query = position_model.objects.filter(
+                    **{ballot_item_id_field_name + '__in': list(ballot_item_by_id)})
+                results = self.bulk_refresh_positions(position_model, position_query, refresh_position)
+                status += results['status']
+                success = success and results['success']
+                positions_scanned += results['positions_scanned']
+                positions_updated += results['positions_updated']
+
+        results = {
+            'success':              success,
+            'status':               status,
+            'positions_scanned':    positions_scanned,
+            'positions_updated':    positions_updated,
+        }
+        return results
+
     def refresh_cached_position_info_for_organization(self, organization_we_vote_id):
         position_manager = PositionManager()
         force_update = True
@@ -2983,6 +3620,82 @@ class PositionListManager(models.Manager):
             position_list = []
             return position_list
 
+    def retrieve_ballot_item_we_vote_ids_for_organizations_by_stance(
+            self, organization_id_list=[], organization_voter_id_list=[], google_civic_election_id_list=[]):
+        """
+        Bulk version of retrieve_ballot_item_we_vote_ids_for_organization_static, for the SUPPORT, INFORMATION_ONLY
+        and OPPOSE positions of many organizations across many elections. The public positions are found by
+        organization_id, and the positions shown to friends by the voter_id of each organization's voter. Each of
+        these takes one query, however many organizations or elections are asked for.
+        :param organization_id_list: Organizations whose public positions we want
+        :param organization_voter_id_list: Voters (linked to organizations) whose friends-only positions we want
+        :param google_civic_election_id_list:
+        :return: public_ballot_item_we_vote_ids_dict keyed by (organization_id, google_civic_election_id, stance),
+         and friends_ballot_item_we_vote_ids_dict keyed by (voter_id, google_civic_election_id, stance)
+        """
+        status = ""
+        success = True
+        public_ballot_item_we_vote_ids_dict = {}
+        friends_ballot_item_we_vote_ids_dict = {}
+        google_civic_election_id_string_list = [
+            str(convert_to_int(google_civic_election_id)) for google_civic_election_id in google_civic_election_id_list]
+
+        # A position about a candidate belongs to every election the candidate is running in, whatever
+        #  google_civic_election_id the position itself was saved with
+        election_id_set_by_candidate_we_vote_id = {}
+        if len(google_civic_election_id_string_list):
+            candidate_list_manager = CandidateListManager()
+            results = candidate_list_manager.retrieve_candidate_to_office_link_list(
+                google_civic_election_id_list=google_civic_election_id_string_list)
+            if not results['success']:
+                status += results['status']
+                success = False
+            for candidate_to_office_link in results['candidate_to_office_link_list']:
+                election_id_set_by_candidate_we_vote_id.setdefault(
+                    candidate_to_office_link.candidate_we_vote_id, set()).add(
+                    candidate_to_office_link.google_civic_election_id)
+
+        election_filter = Q(google_civic_election_id__in=google_civic_election_id_string_list)
+        if len(election_id_set_by_candidate_we_vote_id):
+            election_filter |= Q(candidate_campaign_we_vote_id__in=list(election_id_set_by_candidate_we_vote_id))
+
+        for position_model, owner_field_name, owner_id_list, ballot_item_we_vote_ids_dict in (
+                (PositionEntered, 'organization_id', organization_id_list, public_ballot_item_we_vote_ids_dict),
+                (PositionForFriends, 'voter_id', organization_voter_id_list, friends_ballot_item_we_vote_ids_dict)):
+            if not len(owner_id_list) or not len(google_civic_election_id_string_list):
+                continue
+            try:
+                position_query = position_model.objects.using('readonly').filter(
+                    election_filter,
+                    stance__in=[SUPPORT, INFORMATION_ONLY, OPPOSE],
+                    **{owner_field_name + '__in': owner_id_list})
+                position_value_list = list(position_query.values_list(
+                    owner_field_name, 'stance', 'google_civic_election_id', 'candidate_campaign_we_vote_id',
+                    'contest_measure_we_vote_id', 'contest_office_we_vote_id'))
+            except Exception as e:
+                status += "RETRIEVE_BALLOT_ITEM_WE_VOTE_IDS_FOR_ORGANIZATIONS_FAILED: " + str(e) + " "
+                success = False
+                continue
+            for owner_id, stance, position_google_civic_election_id, candidate_we_vote_id, \
+                    contest_measure_we_vote_id, contest_office_we_vote_id in position_value_list:
+                ballot_item_we_vote_id = candidate_we_vote_id or contest_measure_we_vote_id or contest_office_we_vote_id
+                if not positive_value_exists(ballot_item_we_vote_id):
+                    continue
+                election_id_set = set(election_id_set_by_candidate_we_vote_id.get(candidate_we_vote_id, []))
+                if str(position_google_civic_election_id) in google_civic_election_id_string_list:
+                    election_id_set.add(convert_to_int(position_google_civic_election_id))
+                for google_civic_election_id in election_id_set:
+                    ballot_item_we_vote_ids_dict.setdefault(
+                        (owner_id, google_civic_election_id, stance), []).append(ballot_item_we_vote_id)
+
+        results = {
+            'success':                                  success,
+            'status':                                   status,
+            'public_ballot_item_we_vote_ids_dict':      public_ballot_item_we_vote_ids_dict,
+            'friends_ballot_item_we_vote_ids_dict':     friends_ballot_item_we_vote_ids_dict,
+        }
+        return results
+
     def retrieve_all_positions_for_public_figure(self, public_figure_id, public_figure_we_vote_id,
                                                  stance_we_are_looking_for,
                                                  filter_for_voter, voter_device_id,
@@ -3665,6 +4378,15 @@ class PositionListManager(models.Manager):
         retrieve_public_positions = False
         if public_or_private not in (PUBLIC_ONLY, FRIENDS_ONLY):
             public_or_private = PUBLIC_ONLY
+
+        if friends_we_vote_id_list is False and organizations_followed_we_vote_id_list is False \
+                and positive_value_exists(candidate_we_vote_id):
+            position_count = PositionTallyManager().fetch_position_tally_count(
+                candidate_we_vote_id, stance_we_are_looking_for,
+                'friends_only_count' if public_or_private == FRIENDS_ONLY else 'public_count')
+            if position_count is not None:
+                return position_count
+
         if public_or_private == FRIENDS_ONLY:
             retrieve_friends_positions = True
             position_list_query = PositionForFriends.objects.using('readonly').all()
@@ -3804,6 +4526,12 @@ class PositionListManager(models.Manager):
         for one_candidate in candidate_list:
             candidate_we_vote_id_list.append(one_candidate.we_vote_id)
 
+        position_tally_counts = PositionTallyManager.retrieve_position_tally_counts(candidate_we_vote_id_list)
+        if position_tally_counts is not None:
+            count_name = 'friends_only_count' if public_or_private == FRIENDS_ONLY else 'public_count'
+            return sum(sum_position_tally_counts(position_tally_by_stance, stance_we_are_looking_for, count_name)
+                       for position_tally_by_stance in position_tally_counts.values())
+
         # As of Aug 2018 we are no longer using PERCENT_RATING
         position_list_query = position_list_query.exclude(stance__iexact=PERCENT_RATING)
 
@@ -3873,6 +4601,14 @@ class PositionListManager(models.Manager):
 
         if public_or_private not in (PUBLIC_ONLY, FRIENDS_ONLY):
             public_or_private = PUBLIC_ONLY
+
+        if positive_value_exists(contest_measure_we_vote_id):
+            position_count = PositionTallyManager().fetch_position_tally_count(
+                contest_measure_we_vote_id, stance_we_are_looking_for,
+                'friends_only_count' if public_or_private == FRIENDS_ONLY else 'public_count')
+            if position_count is not None:
+                return position_count
+
         if public_or_private == FRIENDS_ONLY:
             position_list_query = PositionForFriends.objects.using('readonly').all()
         else:
@@ -8214,6 +8950,63 @@ class PositionManager(models.Manager):
         }
         return results
 
+    @staticmethod
+    def generate_cached_ballot_item_values(candidate=None, contest_measure=None, contest_office=None):
+        """
+        The ballot item values which refresh_cached_position_info(force_update=True) copies onto every position
+        about this candidate, measure or office. Used when many positions are moved onto one ballot item at once.
+        :param candidate:
+        :param contest_measure:
+        :param contest_office:
+        :return: dict of position field name -> value
+        """
+        cached_values = {}
+        # Unsaved position, only used to collect the sorting dates
+        position_sorting_dates = PositionEntered()
+        if candidate is not None:
+            candidate_manager = CandidateManager()
+            date_results = candidate_manager.add_candidate_position_sorting_dates_if_needed(
+                position_object=position_sorting_dates,
+                candidate=candidate)
+            cached_values = {
+                'ballot_item_display_name':             candidate.display_candidate_name(),
+                'ballot_item_image_url_https':          candidate.candidate_photo_url(),
+                'ballot_item_image_url_https_large':    candidate.we_vote_hosted_profile_image_url_large,
+                'ballot_item_image_url_https_medium':   candidate.we_vote_hosted_profile_image_url_medium,
+                'ballot_item_image_url_https_tiny':     candidate.we_vote_hosted_profile_image_url_tiny,
+                'ballot_item_twitter_handle':           candidate.candidate_twitter_handle,
+                'contest_office_id':                    candidate.contest_office_id,
+                'contest_office_we_vote_id':            candidate.contest_office_we_vote_id,
+                'political_party':                      candidate.political_party_display(),
+                'politician_id':                        candidate.politician_id,
+                'politician_we_vote_id':                candidate.politician_we_vote_id,
+                'state_code':                           candidate.get_candidate_state(),
+            }
+        elif contest_measure is not None:
+            contest_measure_manager = ContestMeasureManager()
+            date_results = contest_measure_manager.add_measure_position_sorting_dates_if_needed(
+                position_object=position_sorting_dates,
+                contest_measure=contest_measure)
+            cached_values = {
+                'ballot_item_display_name':     contest_measure.measure_title,
+                # These should not exist for measures
+                'ballot_item_image_url_https':  "",
+                'ballot_item_twitter_handle':   "",
+                'state_code':                   contest_measure.state_code,
+            }
+        else:
+            date_results = {'position_object_updated': False}
+        if positive_value_exists(date_results['position_object_updated']):
+            if positive_value_exists(position_sorting_dates.position_year):
+                cached_values['position_year'] = position_sorting_dates.position_year
+            if positive_value_exists(position_sorting_dates.position_ultimate_election_date):
+                cached_values['position_ultimate_election_date'] = \
+                    position_sorting_dates.position_ultimate_election_date
+        if contest_office is not None:
+            cached_values['contest_office_name'] = contest_office.office_name
+            cached_values['race_office_level'] = contest_office.ballotpedia_race_office_level
+        return cached_values
+
     def count_positions_for_election(self, google_civic_election_id, retrieve_public_positions=True):
         """
         Return count of positions for a given election
@@ -8501,3 +9294,118 @@ class PositionMetricsManager(models.Manager):
         total_positions_count = position_entered_count + position_for_friends_count
 
         return total_positions_count
+
+
+def fetch_position_tallies_ready():
+    """
+    PositionTally is only complete after "python manage.py rebuild_position_tallies" has run once. Until then the
+    fetch_positions_count_... functions keep counting positions directly. Once ready, it stays ready for the life of
+    this process.
+    """
+    if position_tallies_ready_cache['position_tallies_ready']:
+        return True
+    if position_tallies_ready_cache['date_checked'] is not None and \
+            time.monotonic() - position_tallies_ready_cache['date_checked'] < POSITION_TALLIES_READY_RECHECK_SECONDS:
+        return False
+    we_vote_settings_manager = WeVoteSettingsManager()
+    position_tallies_ready = we_vote_settings_manager.fetch_setting(POSITION_TALLIES_READY_SETTING_NAME)
+    position_tallies_ready_cache['position_tallies_ready'] = positive_value_exists(position_tallies_ready)
+    position_tallies_ready_cache['date_checked'] = time.monotonic()
+    return position_tallies_ready_cache['position_tallies_ready']
+
+
+def sum_position_tally_counts(position_tally_by_stance, stance_we_are_looking_for=ANY_STANCE,
+                              count_name='public_count'):
+    """
+    :param position_tally_by_stance: dict of stance -> PositionTally for one ballot item
+    :param stance_we_are_looking_for: One stance, or ANY_STANCE for all of them except PERCENT_RATING
+    :param count_name: public_count, public_voter_count, friends_only_count or friends_only_voter_count
+    :return:
+    """
+    if stance_we_are_looking_for == ANY_STANCE:
+        # As of Aug 2018 we are no longer using PERCENT_RATING
+        return sum(getattr(position_tally, count_name) for stance, position_tally in position_tally_by_stance.items()
+                   if stance != PERCENT_RATING)
+    if stance_we_are_looking_for.upper() == PERCENT_RATING:
+        return 0
+    position_tally = position_tally_by_stance.get(stance_we_are_looking_for.upper())
+    return getattr(position_tally, count_name) if position_tally is not None else 0
+
+
+def fetch_position_tally_ballot_item_we_vote_id_list(position_tally_values):
+    return [one_we_vote_id for one_we_vote_id in position_tally_values[:2] if positive_value_exists(one_we_vote_id)]
+
+
+def generate_position_tally_values(position):
+    """
+    The fields of a PositionEntered or PositionForFriends entry which PositionTally depends on
+    """
+    return (
+        position.__dict__.get('candidate_campaign_we_vote_id'),
+        position.__dict__.get('contest_measure_we_vote_id'),
+        position.__dict__.get('stance'),
+        position.__dict__.get('voter_we_vote_id') is None,
+    )
+
+
+class DeferPositionTallyUpdates(object):
+    """
+    Bulk position changes run inside "with DeferPositionTallyUpdates() as position_tally_updates:" so the receivers
+    below collect the ballot items they touch, and each one is recounted once when the outermost block exits.
+    QuerySet.update() and bulk_update() send no signals, so callers add those ballot items with add_ballot_items().
+    """
+    def __init__(self):
+        self.outermost = False
+
+    def __enter__(self):
+        if getattr(position_tally_deferral, 'ballot_item_we_vote_id_set', None) is None:
+            position_tally_deferral.ballot_item_we_vote_id_set = set()
+            self.outermost = True
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.outermost:
+            return False
+        ballot_item_we_vote_id_set = position_tally_deferral.ballot_item_we_vote_id_set
+        position_tally_deferral.ballot_item_we_vote_id_set = None
+        if len(ballot_item_we_vote_id_set):
+            PositionTallyManager.update_position_tallies_for_ballot_items(list(ballot_item_we_vote_id_set))
+        return False
+
+    @staticmethod
+    def add_ballot_items(ballot_item_we_vote_id_list):
+        position_tally_deferral.ballot_item_we_vote_id_set.update(
+            one_we_vote_id for one_we_vote_id in ballot_item_we_vote_id_list if positive_value_exists(one_we_vote_id))
+
+
+def queue_position_tally_update(ballot_item_we_vote_id_list):
+    if getattr(position_tally_deferral, 'ballot_item_we_vote_id_set', None) is not None:
+        DeferPositionTallyUpdates.add_ballot_items(ballot_item_we_vote_id_list)
+    else:
+        PositionTallyManager.update_position_tallies_for_ballot_items(ballot_item_we_vote_id_list)
+
+
+@receiver(post_save, sender=PositionEntered)
+@receiver(post_save, sender=PositionForFriends)
+def update_position_tally_on_save_signal(sender, instance, created=False, **kwargs):
+    position_tally_values = generate_position_tally_values(instance)
+    loaded_position_tally_values = getattr(instance, 'loaded_position_tally_values', None)
+    if not created and position_tally_values == loaded_position_tally_values:
+        return
+    ballot_item_we_vote_id_list = fetch_position_tally_ballot_item_we_vote_id_list(position_tally_values)
+    if loaded_position_tally_values is not None:
+        # This position may have moved from another candidate or measure
+        ballot_item_we_vote_id_list += fetch_position_tally_ballot_item_we_vote_id_list(loaded_position_tally_values)
+    queue_position_tally_update(ballot_item_we_vote_id_list)
+    instance.loaded_position_tally_values = position_tally_values
+
+
+@receiver(post_delete, sender=PositionEntered)
+@receiver(post_delete, sender=PositionForFriends)
+def update_position_tally_on_delete_signal(sender, instance, **kwargs):
+    ballot_item_we_vote_id_list = \
+        fetch_position_tally_ballot_item_we_vote_id_list(generate_position_tally_values(instance))
+    loaded_position_tally_values = getattr(instance, 'loaded_position_tally_values', None)
+    if loaded_position_tally_values is not None:
+        ballot_item_we_vote_id_list += fetch_position_tally_ballot_item_we_vote_id_list(loaded_position_tally_values)
+    queue_position_tally_update(ballot_item_we_vote_id_list)
@@ -789,8 +789,10 @@ def refresh_positions_with_candidate_details_for_election_view(request):
     else:
         positions_updated_count = results['positions_updated_count']
         messages.add_message(request, messages.INFO,
-                             "Social media retrieved. Positions refreshed: {update_all_positions_results_count},"
-                             .format(update_all_positions_results_count=positions_updated_count))
+                             "Social media retrieved. Positions refreshed: {update_all_positions_results_count} "
+                             "of {positions_scanned_count} checked,"
+                             .format(update_all_positions_results_count=positions_updated_count,
+                                     positions_scanned_count=results['positions_scanned_count']))
 
     return HttpResponseRedirect(reverse('candidate:candidate_list', args=()) +
                                 '?google_civic_election_id=' + str(google_civic_election_id) +
@@ -1,7 +1,13 @@
+import codecs
+import concurrent.futures
 import csv
+import io
 import json
 import os
+import queue
 import re
+import threading
+import zlib
 
 import psycopg2
 import requests
@@ -9,7 +15,7 @@ import time
 from config.base import get_environment_variable
 from django.http import HttpResponse
 import wevote_functions.admin
-from wevote_functions.functions import positive_value_exists
+from wevote_functions.functions import convert_to_int, positive_value_exists
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -54,9 +60,17 @@ allowable_tables = [
     'ballot_ballotreturned',
 ]
 
-dummy_unique_id = 10000000
 LOCAL_TMP_PATH = get_environment_variable('PATH_FOR_TEMP_FILES') or '.'
 
+MASTER_SERVER_STREAM_URL = "https://api.wevoteusa.org/apis/v1/retrieveSQLTablesStream/"
+RETRIEVE_TABLES_PROGRESS_FILE = os.path.join(LOCAL_TMP_PATH, 'retrieve_tables_progress.json')
+RETRIEVE_TABLES_STREAM_CHUNK_SIZE = 65536
+RETRIEVE_TABLES_STREAM_QUEUE_DEPTH = 8  # Chunks waiting to be sent, per streamed table
+RETRIEVE_TABLES_STREAM_TIMEOUT_SECONDS = 300
+RETRIEVE_TABLES_SYNC_MAXIMUM_ATTEMPTS = 3
+RETRIEVE_TABLES_SYNC_RANGE_SIZE = 250000
+RETRIEVE_TABLES_SYNC_WORKERS = 4
+
 
 def retrieve_sql_tables_as_csv(table_name, start, end):
     """
@@ -129,6 +143,144 @@ def retrieve_sql_tables_as_csv(table_name, start, end):
         return results
 
 
+def connect_to_local_database():
+    return psycopg2.connect(
+        database=get_environment_variable('DATABASE_NAME'),
+        user=get_environment_variable('DATABASE_USER'),
+        password=get_environment_variable('DATABASE_PASSWORD'),
+        host=get_environment_variable('DATABASE_HOST'),
+        port=get_environment_variable('DATABASE_PORT')
+    )
+
+
+def fetch_sql_table_max_id(table_name):
+    if table_name not in allowable_tables:
+        return 0
+    conn = connect_to_local_database()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT MAX(id) FROM public." + table_name)
+        data_tuple = cur.fetchone()
+        return convert_to_int(data_tuple[0])
+    finally:
+        conn.close()
+
+
+class CopyToQueueWriter(object):
+    """
+    File-like object handed to psycopg2's copy_expert. COPY output is (optionally) gzip compressed as it arrives,
+    and handed to the HTTP response in RETRIEVE_TABLES_STREAM_CHUNK_SIZE pieces through a small bounded queue,
+    so the server never holds more than a few chunks of the table in memory.
+    """
+    def __init__(self, chunk_queue, cancelled, compress=True):
+        self.chunk_queue = chunk_queue
+        self.cancelled = cancelled
+        # wbits=31 produces a gzip (rather than raw zlib) stream
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        self.buffer = []
+        self.buffer_size = 0
+
+    def _put(self, chunk):
+        while True:
+            if self.cancelled.is_set():
+                # The client went away. Raising here aborts the COPY.
+                raise IOError("RETRIEVE_TABLES_STREAM_CANCELLED")
+            try:
+                self.chunk_queue.put(chunk, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        if data:
+            self.buffer.append(data)
+            self.buffer_size += len(data)
+        if self.buffer_size >= RETRIEVE_TABLES_STREAM_CHUNK_SIZE:
+            self._put(b''.join(self.buffer))
+            self.buffer = []
+            self.buffer_size = 0
+        return len(data)
+
+    def close(self):
+        if self.compressor is not None:
+            self.buffer.append(self.compressor.flush())
+        remaining = b''.join(self.buffer)
+        self.buffer = []
+        self.buffer_size = 0
+        if remaining:
+            self._put(remaining)
+
+
+def stream_sql_table_as_csv(table_name, start=0, end=0, compress=True):
+    """
+    Generator version of retrieve_sql_tables_as_csv, for StreamingHttpResponse. COPY runs on a worker thread and
+    its output is yielded (gzip compressed by default) as it is produced, instead of being read back into a string
+    and wrapped in JSON.
+    :param table_name: must be in allowable_tables
+    :param start: first id to return (inclusive)
+    :param end: last id to return (inclusive), or 0 for the whole table
+    :param compress:
+    :return:
+    """
+    start = convert_to_int(start)
+    end = convert_to_int(end)
+    if positive_value_exists(end):
+        sql = "COPY (SELECT * FROM public." + table_name + " WHERE id BETWEEN " + str(start) + " AND " + str(end) + \
+              " ORDER BY id) TO STDOUT WITH DELIMITER '|' CSV HEADER NULL '\\N'"
+    else:
+        sql = "COPY (SELECT * FROM public." + table_name + " WHERE id >= " + str(start) + \
+              " ORDER BY id) TO STDOUT WITH DELIMITER '|' CSV HEADER NULL '\\N'"
+
+    chunk_queue = queue.Queue(maxsize=RETRIEVE_TABLES_STREAM_QUEUE_DEPTH)
+    cancelled = threading.Event()
+    end_of_stream = object()
+
+    def copy_table_to_queue():
+        t0 = time.time()
+        writer = CopyToQueueWriter(chunk_queue, cancelled, compress=compress)
+        conn = None
+        try:
+            conn = connect_to_local_database()
+            cur = conn.cursor()
+            cur.copy_expert(sql, writer, size=RETRIEVE_TABLES_STREAM_CHUNK_SIZE)
+            writer.close()
+            conn.commit()
+            logger.error('Streaming the "' + table_name + '" table took ' + "{:.3f}".format(time.time() - t0) +
+                         ' seconds.  start = ' + str(start) + ', end = ' + str(end))
+        except Exception as e:
+            logger.error("retrieve_tables stream_sql_table_as_csv caught " + str(e))
+        finally:
+            if conn is not None:
+                conn.close()
+            while not cancelled.is_set():
+                try:
+                    chunk_queue.put(end_of_stream, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+
+    if table_name not in allowable_tables:
+        logger.error("the table_name '" + table_name + "' is not in the table list, therefore no table was streamed")
+        return
+
+    copy_thread = threading.Thread(name='retrieve_tables_copy_' + table_name, target=copy_table_to_queue)
+    copy_thread.daemon = True
+    copy_thread.start()
+    try:
+        while True:
+            chunk = chunk_queue.get()
+            if chunk is end_of_stream:
+                break
+            yield chunk
+    finally:
+        # Runs when the response finishes, or when the client disconnects and the generator is closed
+        cancelled.set()
+
+
 def clean_row(row, index):
     newstring = row[index].replace('\n', ' ').replace(',', ' ')
     newstring = ''.join(ch for ch in newstring if ch.isdigit() or ch.isalnum() or ch == ' ' or ch == '.' or ch == '_')
@@ -169,18 +321,47 @@ def check_for_non_ascii(table_name, row):
         field_no += 1
 
 
-def get_dummy_unique_id():
-    global dummy_unique_id
-    dummy_unique_id += 1
-    return str(dummy_unique_id)
-
-
 def save_off_database():
     file = "WeVoteServerDB-{:.0f}.pgsql".format(time.time())
     os.system('pg_dump WeVoteServerDB > ' + file)
     time.sleep(20)
 
 
+def update_table_id_sequence(table_name):
+    """
+    Update the last_value for this table so creating new entries doesn't throw "django Key (id)= already exists" error
+    """
+    status = ''
+    try:
+        conn = psycopg2.connect(
+            database=get_environment_variable('DATABASE_NAME'),
+            user=get_environment_variable('DATABASE_USER'),
+            password=get_environment_variable('DATABASE_PASSWORD'),
+            host=get_environment_variable('DATABASE_HOST'),
+            port=get_environment_variable('DATABASE_PORT')
+        )
+
+        cur = conn.cursor()
+        command = "SELECT setval('" + table_name + "_id_seq', (SELECT MAX(id) FROM \"" + table_name + "\"))"
+        cur.execute(command)
+        data_tuple = cur.fetchone()
+        print("... SQL executed: " + command + " and returned " + str(data_tuple[0]))
+        conn.commit()
+        if str(data_tuple[0]) != 'None':
+            command = "ALTER SEQUENCE " + table_name + "_id_seq START WITH " + str(data_tuple[0])
+            cur.execute(command)
+            conn.commit()
+        conn.close()
+        print("... SQL executed: " + command)
+        # To confirm:  SELECT * FROM information_schema.sequences where sequence_name like 'org%'
+
+    except Exception as e:
+        status += "... SQL FAILED: SELECT setval('" + \
+                  table_name + "_id_seq', (SELECT MAX(id) FROM \"" + table_name + "\")): " + str(e)
+        logger.error(status)
+    return status
+
+
 def retrieve_sql_files_from_master_server(request):
     """
     Get the json data, and create new entries in the developers local database
@@ -270,33 +451,7 @@ def retrieve_sql_files_from_master_server(request):
 
         # Update the last_value for this table so creating new entries doesn't
         #  throw "django Key (id)= already exists" error
-        try:
-            conn = psycopg2.connect(
-                database=get_environment_variable('DATABASE_NAME'),
-                user=get_environment_variable('DATABASE_USER'),
-                password=get_environment_variable('DATABASE_PASSWORD'),
-                host=get_environment_variable('DATABASE_HOST'),
-                port=get_environment_variable('DATABASE_PORT')
-            )
-
-            cur = conn.cursor()
-            command = "SELECT setval('" + table_name + "_id_seq', (SELECT MAX(id) FROM \"" + table_name + "\"))"
-            cur.execute(command)
-            data_tuple = cur.fetchone()
-            print("... SQL executed: " + command + " and returned " + str(data_tuple[0]))
-            conn.commit()
-            if str(data_tuple[0]) != 'None':
-                command = "ALTER SEQUENCE " + table_name + "_id_seq START WITH " + str(data_tuple[0])
-                cur.execute(command)
-                conn.commit()
-            conn.close()
-            print("... SQL executed: " + command)
-            # To confirm:  SELECT * FROM information_schema.sequences where sequence_name like 'org%'
-
-        except Exception as e:
-            status += "... SQL FAILED: SELECT setval('" + \
-                      table_name + "_id_seq', (SELECT MAX(id) FROM \"" + table_name + "\")): " + str(e)
-            logger.error(status)
+        status += update_table_id_sequence(table_name)
 
         status += ", " + " loaded " + table_name
         stat = 'Processing and loading table: ' + table_name + '  took ' + str(int(dt)) + ' seconds'
@@ -315,6 +470,544 @@ def retrieve_sql_files_from_master_server(request):
     return HttpResponse(json.dumps(results), content_type='application/json')
 
 
+class IterableToFileAdapter(object):
+    """
+    Minimal read-only file interface over an iterator of strings, so psycopg2's copy_from can pull rows
+    while they are still arriving from the master server.
+    """
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+        self.pending = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.pending) < size:
+            try:
+                self.pending += next(self.iterator)
+            except StopIteration:
+                break
+        if size < 0:
+            data, self.pending = self.pending, ''
+        else:
+            data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+    def readline(self):
+        while '\n' not in self.pending:
+            try:
+                self.pending += next(self.iterator)
+            except StopIteration:
+                break
+        if '\n' in self.pending:
+            index = self.pending.index('\n') + 1
+        else:
+            index = len(self.pending)
+        data, self.pending = self.pending[:index], self.pending[index:]
+        return data
+
+
+def iterate_lines_from_streamed_response(response, compressed=True):
+    """
+    Turn the (gzip compressed) body of a retrieveSQLTablesStream response into text lines, newline included,
+    without ever holding more than one network chunk in memory.
+    """
+    decompressor = zlib.decompressobj(31) if compressed else None
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    remainder = ''
+    for chunk in response.iter_content(chunk_size=RETRIEVE_TABLES_STREAM_CHUNK_SIZE):
+        if decompressor is not None:
+            chunk = decompressor.decompress(chunk)
+        text = remainder + decoder.decode(chunk)
+        lines = text.split('\n')
+        remainder = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    if decompressor is not None:
+        remainder += decoder.decode(decompressor.flush())
+        if not decompressor.eof:
+            # The master server stops the gzip stream early (without its trailer) if COPY fails part way through
+            raise IOError("RETRIEVE_TABLES_STREAM_TRUNCATED")
+    remainder += decoder.decode(b'', final=True)
+    if remainder:
+        yield remainder
+
+
+def iterate_clean_csv_rows(table_name, line_iterator, skipped_row_ids):
+    """
+    Streaming equivalent of csv_file_to_clean_csv_file2: yields the header first, then cleaned rows.
+    """
+    header = None
+    for row in csv.reader(line_iterator, delimiter='|'):
+        try:
+            if header is None:
+                header = row
+                yield header
+                continue
+            if len(header) != len(row) or '|' in str(row):  # Messed up records with '|' in them
+                skipped_row_ids.append(row[0])
+                continue
+            row = clean_csv_row(table_name, row)
+            if row is None:
+                continue
+            yield row
+        except Exception as e:
+            logger.error("iterate_clean_csv_rows (" + table_name + ") caught " + str(e))
+
+
+def load_sql_table_range_from_master_server(table_name, start, end, delete_existing=False, session=None):
+    """
+    Stream one id range of one table from the master server straight into COPY FROM STDIN on the local database.
+    :param table_name:
+    :param start: first id (inclusive)
+    :param end: last id (inclusive)
+    :param delete_existing: Delete every existing row in the local table (in the same transaction) before loading
+    :param session: Optional requests.Session, so callers can reuse connections to the master server
+    :return:
+    """
+    status = ''
+    success = False
+    rows_loaded = 0
+    table_max_id = 0
+    skipped_row_ids = []
+    http = session if session is not None else requests
+
+    try:
+        response = http.get(MASTER_SERVER_STREAM_URL,
+                            params={'table': table_name, 'start': start, 'end': end, 'compress': 'gzip'},
+                            stream=True, timeout=RETRIEVE_TABLES_STREAM_TIMEOUT_SECONDS)
+    except Exception as e:
+        status += "RETRIEVE_TABLES_STREAM_REQUEST_FAILED: " + str(e) + " "
+        return {
+            'success':      False,
+            'status':       status,
+            'rows_loaded':  0,
+            'table_max_id': 0,
+        }
+
+    try:
+        if response.status_code != 200 or response.headers.get('Content-Type', '').startswith('application/json'):
+            status += "RETRIEVE_TABLES_STREAM_NOT_RECEIVED: " + str(response.status_code) + " " + \
+                      response.text[:200] + " "
+        else:
+            table_max_id = convert_to_int(response.headers.get('X-Table-Max-Id', 0))
+            compressed = response.headers.get('Content-Type', '') == 'application/gzip'
+            row_iterator = iterate_clean_csv_rows(
+                table_name, iterate_lines_from_streamed_response(response, compressed=compressed), skipped_row_ids)
+            header = next(row_iterator, None)
+            if header is None:
+                status += "RETRIEVE_TABLES_STREAM_EMPTY "
+            else:
+                row_counter = [0]
+
+                def iterate_copy_lines():
+                    # copy_from reads the (cleaned) rows as pipe delimited text, as in csv_file_to_clean_csv_file2
+                    line_buffer = io.StringIO()
+                    csv_writer = csv.writer(line_buffer, delimiter='|')
+                    for row in row_iterator:
+                        csv_writer.writerow(row)
+                        row_counter[0] += 1
+                        yield line_buffer.getvalue()
+                        line_buffer.seek(0)
+                        line_buffer.truncate(0)
+
+                conn = connect_to_local_database()
+                try:
+                    cur = conn.cursor()
+                    if delete_existing:
+                        cur.execute("DELETE FROM " + table_name)  # Delete all existing data in this table
+                        print("... SQL executed: DELETE (all) FROM " + table_name)
+                    cur.copy_from(IterableToFileAdapter(iterate_copy_lines()), table_name, sep='|',
+                                  size=RETRIEVE_TABLES_STREAM_CHUNK_SIZE, columns=header)
+                    conn.commit()
+                    rows_loaded = row_counter[0]
+                    success = True
+                    status += "LOADED " + table_name + "(" + str(start) + "," + str(end) + "): " + \
+                              str(rows_loaded) + " "
+                except Exception as e:
+                    conn.rollback()
+                    status += "FAILED_TABLE_INSERT: " + table_name + " -- " + str(e) + " "
+                finally:
+                    conn.close()
+            if len(skipped_row_ids):
+                print('... Skipped rows in ' + table_name + ': ' + ', '.join(skipped_row_ids) +
+                      ' were skipped since they had pipe characters in the data')
+    finally:
+        response.close()
+
+    return {
+        'success':      success,
+        'status':       status,
+        'rows_loaded':  rows_loaded,
+        'table_max_id': table_max_id,
+    }
+
+
+def retrieve_sync_progress():
+    try:
+        with open(RETRIEVE_TABLES_PROGRESS_FILE, 'r') as progress_file:
+            return json.loads(progress_file.read())
+    except Exception:
+        return {}
+
+
+def save_sync_progress(progress):
+    # Write then rename, so an interrupted sync never leaves a half written progress file
+    temp_file_name = RETRIEVE_TABLES_PROGRESS_FILE + '.tmp'
+    with open(temp_file_name, 'w') as progress_file:
+        progress_file.write(json.dumps(progress))
+    os.replace(temp_file_name, RETRIEVE_TABLES_PROGRESS_FILE)
+
+
+def fetch_master_table_max_id(table_name, session=None):
+    http = session if session is not None else requests
+    response = http.get(MASTER_SERVER_STREAM_URL, params={'table': table_name, 'max_id_only': 1},
+                        timeout=RETRIEVE_TABLES_STREAM_TIMEOUT_SECONDS)
+    structured_json = json.loads(response.text)
+    if not structured_json.get('success'):
+        raise IOError("MASTER_TABLE_MAX_ID_NOT_RECEIVED: " + str(structured_json.get('status')))
+    return convert_to_int(structured_json.get('table_max_id'))
+
+
+def delete_local_table_rows(table_name):
+    conn = connect_to_local_database()
+    try:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM " + table_name)  # Delete all existing data in this table
+        conn.commit()
+        print("... SQL executed: DELETE (all) FROM " + table_name)
+    finally:
+        conn.close()
+
+
+def sync_tables_from_master_server(
+        table_name_list=None,
+        number_of_workers=RETRIEVE_TABLES_SYNC_WORKERS,
+        incremental=False,
+        resume=False,
+        range_size=RETRIEVE_TABLES_SYNC_RANGE_SIZE,
+        maximum_attempts=RETRIEVE_TABLES_SYNC_MAXIMUM_ATTEMPTS):
+    """
+    Split each table into id ranges, and stream the ranges from the master server into the local database on a
+    bounded pool of threads (the work is almost all network and COPY wait). Failed ranges are retried, and the
+    ranges completed for each table are saved as they finish, so an interrupted sync can be resumed.
+    :param table_name_list: Defaults to allowable_tables
+    :param number_of_workers: How many ranges are loaded at the same time
+    :param incremental: Only load rows with an id greater than the largest id already in the local table.
+        (Existing local rows are not deleted, and changes to them on the master server are not picked up.)
+    :param resume: Skip the ranges recorded as completed in retrieve_tables_progress.json
+    :param range_size: Number of ids in each range
+    :param maximum_attempts: How many times one range is tried before the table is marked as failed
+    :return:
+    """
+    status = ''
+    t0 = time.time()
+    if table_name_list is None:
+        table_name_list = allowable_tables
+    table_name_list = [table_name for table_name in table_name_list if table_name in allowable_tables]
+    progress = retrieve_sync_progress() if resume else {}
+    thread_local = threading.local()
+
+    def get_session():
+        # requests.Session is not thread safe, so each worker keeps its own (and its pooled connections)
+        if not hasattr(thread_local, 'session'):
+            thread_local.session = requests.Session()
+        return thread_local.session
+
+    def load_range_with_retry(table_name, start, end):
+        results = {}
+        for attempt in range(1, maximum_attempts + 1):
+            results = load_sql_table_range_from_master_server(table_name, start, end, session=get_session())
+            if results['success']:
+                break
+            logger.error("retrieve_tables range " + table_name + "(" + str(start) + "," + str(end) + ") attempt " +
+                         str(attempt) + " failed: " + results['status'])
+            if attempt < maximum_attempts:
+                time.sleep(2 ** attempt)
+        return results
+
+    # Plan the id ranges for every table before starting the pool
+    ranges_by_table = {}
+    session = get_session()
+    for table_name in table_name_list:
+        table_progress = progress.get(table_name, {})
+        if table_progress.get('finished') and not incremental:
+            print('Skipping the ' + table_name + ' table, already loaded')
+            continue
+        try:
+            master_max_id = fetch_master_table_max_id(table_name, session=session)
+            if incremental:
+                first_id = fetch_sql_table_max_id(table_name) + 1
+                completed_range_starts = []
+            else:
+                first_id = 0
+                completed_range_starts = table_progress.get('completed_range_starts', []) \
+                    if table_progress.get('range_size') == range_size else []
+                if not len(completed_range_starts):
+                    delete_local_table_rows(table_name)
+        except Exception as e:
+            status += "RETRIEVE_TABLES_SYNC_PLAN_FAILED " + table_name + ": " + str(e) + " "
+            logger.error(status)
+            continue
+        range_list = [(start, start + range_size - 1) for start in range(first_id, master_max_id + 1, range_size)
+                      if start not in completed_range_starts]
+        ranges_by_table[table_name] = range_list
+        progress[table_name] = {
+            'completed_range_starts':   completed_range_starts,
+            'number_of_ranges':         len(range_list) + len(completed_range_starts),
+            'range_size':               range_size,
+            'rows_loaded':              convert_to_int(table_progress.get('rows_loaded', 0))
+            if len(completed_range_starts) else 0,
+            'failed':                   False,
+            'finished':                 False,
+        }
+        print('Planned ' + str(len(range_list)) + ' id ranges for the ' + table_name + ' table (ids ' +
+              str(first_id) + ' through ' + str(master_max_id) + ')')
+    save_sync_progress(progress)
+
+    remaining_by_table = {table_name: len(range_list) for table_name, range_list in ranges_by_table.items()}
+    tables_finished = []
+    tables_failed = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, number_of_workers)) as executor:
+        future_to_range = {}
+        for table_name, range_list in ranges_by_table.items():
+            for start, end in range_list:
+                future = executor.submit(load_range_with_retry, table_name, start, end)
+                future_to_range[future] = (table_name, start, end)
+
+        for future in concurrent.futures.as_completed(future_to_range):
+            table_name, start, end = future_to_range[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                results = {'success': False, 'status': str(e), 'rows_loaded': 0}
+            # Progress is only updated here, on the calling thread
+            table_progress = progress[table_name]
+            remaining_by_table[table_name] -= 1
+            if results['success']:
+                table_progress['completed_range_starts'].append(start)
+                table_progress['rows_loaded'] += results['rows_loaded']
+            else:
+                table_progress['failed'] = True
+                status += results['status']
+            print('... ' + table_name + ': ' + str(len(table_progress['completed_range_starts'])) + ' of ' +
+                  str(table_progress['number_of_ranges']) + ' ranges, ' + str(table_progress['rows_loaded']) +
+                  ' rows, cumulative ' + str(int(time.time() - t0)) + ' seconds')
+            save_sync_progress(progress)
+            if not remaining_by_table[table_name]:
+                if table_progress['failed']:
+                    tables_failed.append(table_name)
+                    status += "TABLE_SYNC_FAILED " + table_name + " (resume to retry the failed ranges) "
+                else:
+                    status += update_table_id_sequence(table_name)
+                    table_progress['finished'] = True
+                    save_sync_progress(progress)
+                    tables_finished.append(table_name)
+                    status += "loaded " + table_name + " "
+
+    # Tables without any ranges to load (ex/ nothing new in an incremental sync) still count as finished
+    for table_name, range_list in ranges_by_table.items():
+        if not len(range_list):
+            status += update_table_id_sequence(table_name)
+            progress[table_name]['finished'] = True
+            tables_finished.append(table_name)
+    save_sync_progress(progress)
+
+    minutes = (time.time() - t0)/60
+    print("Syncing " + str(len(tables_finished)) + " tables with " + str(number_of_workers) +
+          " workers took {:.1f}".format(minutes) + ' minutes')
+    return {
+        'success':          not len(tables_failed),
+        'status':           status,
+        'tables_finished':  tables_finished,
+        'tables_failed':    tables_failed,
+    }
+
+
+def retrieve_sql_files_from_master_server_streaming(request):
+    """
+    Like retrieve_sql_files_from_master_server, but the tables are split into id ranges which are streamed
+    (gzip compressed) from the master server directly into COPY FROM STDIN, several at a time, so memory use
+    does not depend on the size of the tables.
+    Optional parameters: "resume=1" to continue an interrupted sync, "incremental=1" to only load rows newer
+    than the ones already in the local tables, "workers=N", and "table=<table_name>" (repeatable).
+    :return:
+    """
+    resume = positive_value_exists(request.GET.get('resume', False))
+    incremental = positive_value_exists(request.GET.get('incremental', False))
+    number_of_workers = convert_to_int(request.GET.get('workers', RETRIEVE_TABLES_SYNC_WORKERS))
+    table_name_list = request.GET.getlist('table') or None
+
+    if not resume and not incremental:
+        save_off_database()
+
+    results = sync_tables_from_master_server(
+        table_name_list=table_name_list,
+        number_of_workers=number_of_workers,
+        incremental=incremental,
+        resume=resume)
+
+    results = {
+        'success':          results['success'],
+        'status':           results['status'],
+        'status_code':      results['status'],
+        'tables_finished':  results['tables_finished'],
+        'tables_failed':    results['tables_failed'],
+    }
+    return HttpResponse(json.dumps(results), content_type='application/json')
+
+
+def clean_csv_row(table_name, row):
+    """
+    Fix up one row received from the master server, so it can be loaded with COPY into the local database.
+    Returns None if the row should be skipped.
+    """
+    if table_name == "ballot_ballotitem":
+        clean_row(row, 10)                      # ballot_item_display_name
+        clean_row(row, 12)                      # measure_subtitle
+        clean_row(row, 14)                      # measure_text
+        clean_row(row, 16)                      # no_vote_description
+        clean_row(row, 17)                      # yes_vote_description
+        # dump_row_col_labels_and_errors(table_name, header, row, '3000150')
+    elif table_name == "ballot_ballotreturned":
+        clean_row(row, 6)                       # text_for_map_search
+        substitute_null(row, 7, '0.0')          # latitude
+        substitute_null(row, 8, '0.0')          # longitude
+        # dump_row_col_labels_and_errors(table_name, header, row, '50490')
+    elif table_name == "candidate_candidatetoofficelink":
+        if row[1] == '':                        # candidate_we_vote_id
+            return None
+    elif table_name == "election_election":
+        substitute_null(row, 2, '0')  # google_civic_election_id_new is an integer
+        if row[8] == '0':
+            row[8] = '\\N'
+        substitute_null(row, 8, '\\N')          # ballotpedia_election_id is unique, so NULL instead of 0
+        clean_row(row, 10)                      # internal_notes
+        substitute_null(row, 2, 'f')            # election_preparation_finished
+    elif table_name == "politician_politician":
+        row[2] = row[2].replace("\\", "")       # middle_name
+        substitute_null(row, 7, 'U')            # gender
+        substitute_null(row, 8, '\\N')          # birth_date
+        row[9] = '\\N'                          # bioguide_id, looks like we don't even use this anymore
+        row[10] = '\\N'                         # thomas_id, looks like we don't even use this anymore
+        row[11] = '\\N'                         # lis_id, looks like we don't even use this anymore
+        row[12] = '\\N'                         # govtrack_id, looks like we don't even use this anymore
+        row[15] = '\\N'                         # fec_id, looks like we don't even use this anymore
+        row[19] = '\\N'                         # maplight_id, looks like we don't even use this anymore
+    elif table_name == "polling_location_pollinglocation":
+        clean_row(row, 2)                       # location_name
+        row[2] = row[2].replace("\\", "")       # 'BIG BONE STATE PARK GARAGE BLDG\\'
+        clean_row(row, 3)                       # polling_hours_text
+        clean_row(row, 4)                       # directions_text
+        clean_row(row, 5)                       # line1
+        clean_row(row, 6)                       # line2
+        substitute_null(row, 11, '0.00001')     # latitude
+        substitute_null(row, 12, '0.00001')     # longitude
+        substitute_null(row, 14, '\\N')         # google_response_address_not_found
+    elif table_name == "office_contestoffice":
+        substitute_null(row, 4, '0')            # google_civic_election_id_new is an integer
+        row[6] = '\\N'                          # maplight_id, looks like we don't even use this anymore
+        substitute_null(row, 24, '0')           # ballotpedia_office_id is an integer
+        substitute_null(row, 28, '0')           # ballotpedia_district_id is an integer
+        substitute_null(row, 29, '0')           # ballotpedia_election_id is an integer
+        substitute_null(row, 30, '0')           # ballotpedia_race_id is an integer
+        substitute_null(row, 33, '0')           # google_ballot_placement is an integer
+        substitute_null(row, 40, 'f')           # ballotpedia_is_marquee is a bool
+        substitute_null(row, 41, 'f')           # is_battleground_race is a bool
+    elif table_name == "candidate_candidatecampaign":
+        row[2] = '\\N'                          # maplight_id, looks like we don't even use this anymore
+        substitute_null(row, 6, '0')            # politician_id
+        clean_row(row, 8)                       # candidate_name |"Elizabeth Nelson ""Liz"" Johnson"|
+        clean_row(row, 9)                       # google_civic_candidate_name
+        clean_row(row, 24)                      # candidate_email
+        substitute_null(row, 28, '0')           # wikipedia_page_id
+        clean_row(row, 32)                      # twitter_description
+        substitute_null(row, 33, '0')           # twitter_followers_count
+        clean_row(row, 34)                      # twitter_location
+        clean_row(row, 35)                      # twitter_name
+        clean_row(row, 36)                      # twitter_profile_background_image_url_https
+        substitute_null(row, 39, '0')           # twitter_user_id
+        clean_row(row, 40)                      # ballot_guide_official_statement
+        clean_row(row, 41)                      # contest_office_name
+        substitute_null(row, 53, '0')           # ballotpedia_candidate_id
+        clean_row(row, 57)                      # ballotpedia_candidate_summary
+        substitute_null(row, 58, '0')           # ballotpedia_election_id
+        substitute_null(row, 59, '0')           # ballotpedia_image_id
+        substitute_null(row, 60, '0')           # ballotpedia_office_id
+        substitute_null(row, 61, '0')           # ballotpedia_person_id
+        substitute_null(row, 62, '0')           # ballotpedia_race_id
+        substitute_null(row, 65, '0')           # crowdpac_candidate_id
+        substitute_null(row, 71, '\\N')         # withdrawal_date
+        substitute_null(row, 75, '0')           # candidate_year
+        substitute_null(row, 76, '0')           # candidate_ultimate_election_date
+        # dump_row_col_labels_and_errors(table_name, header, row, '4441')
+    elif table_name == "measure_contestmeasure":
+        row[3] = row[3].replace('\n', '  ')     # measure_title
+        clean_row(row, 4)                       #
+        clean_row(row, 5)                       #
+        clean_row(row, 6)                       # measure_url
+        substitute_null(row, 17, '0')           # wikipedia_page_id is a bigint
+        clean_row(row, 26)                      # ballotpedia_measure_name
+        clean_row(row, 28)                      # ballotpedia_measure_summ
+        clean_row(row, 29)                      # ballotpedia_measure_text
+        clean_row(row, 32)                      # ballotpedia_no_vote_desc
+        clean_row(row, 33)                      # ballotpedia_yes_vote_des
+        substitute_null(row, 34, '0')           # google_ballot_placement is a bigint
+        substitute_null(row, 39, '0')           # measure_year is an integer
+        substitute_null(row, 40, '0')           # measure_ultimate_election_date is an integer
+    # elif table_name == 'office_contestofficevisitingotherelection':
+    #     pass   # no fixes needed
+    elif table_name == 'organization_organization':
+        clean_row(row, 11)                      # organization_description
+        clean_row(row, 12)                      # organization_address
+        substitute_null(row, 23, '0')           # twitter_followers_count
+        clean_row(row, 22)                      # twitter_description
+        substitute_null(row, 31, '0')           # wikipedia_thumbnail_height
+        substitute_null(row, 33, '0')           # wikipedia_thumbnail_width
+        clean_row(row, 47)                      # issue_analysis_admin_notes
+        # dump_row_col_labels_and_errors(table_name, header, row, '1')
+    elif table_name == 'position_positionentered':
+        clean_row(row, 4)                       # ballot_item_display_name
+        substitute_null(row, 5, '1970-01-01 00:00:00+00')
+        clean_row(row, 15)                      #
+        clean_row(row, 16)                      # vote_smart_rating_name
+        clean_bigint_row(row, 18)               # contest_office_id
+        clean_row(row, 22)                      # google_civic_candidate_name
+        clean_row(row, 28)                      # statement_text
+        clean_url(row, 30)                      # more_info_url
+        clean_row(row, 37)                      # speaker_display_name
+        clean_row(row, 43)                      # google_civic_measure_title
+        clean_row(row, 44)                      # contest_office_name
+        clean_row(row, 45)                      # political_party
+        # dump_row_col_labels_and_errors(table_name, header, row, '33083')
+    elif table_name == 'voter_guide_voterguidepossibility':
+        clean_url(row, 1)                       # voter_guide_possibility_url
+        clean_row(row, 5)                       # ballot_items_raw
+        clean_row(row, 6)                       # organization_name
+        clean_row(row, 7)                       # organization_twitter_handle
+        clean_row(row, 11)                      # internal_notes
+        clean_row(row, 20)                      # contributor_comments
+        clean_row(row, 22)                      # candidate_name
+        # dump_row_col_labels_and_errors(table_name, header, row, '4')
+    elif table_name == 'voter_guide_voterguidepossibilityposition':
+        substitute_null(row, 1, '0')            # voter_guide_possibility_parent_id
+        substitute_null(row, 2, '0')            # possibility_position_number
+        clean_row(row, 3)                       # ballot_item_name
+        clean_row(row, 4)                       # candidate_we_vote_id
+        clean_row(row, 5)                       # position_we_vote_id
+        clean_row(row, 6)                       # measure_we_vote_id
+        clean_row(row, 7)                       # statement_text
+        substitute_null(row, 8, '0')            # google_civic_election_id
+        clean_url(row, 10)                      # more_info_url
+        clean_row(row, 13)                      # candidate_twitter_handle
+        clean_row(row, 14)                      # organization_name
+        clean_row(row, 15)                      # organization_twitter_handle
+        clean_row(row, 16)                      # organization_we_vote_id
+        # dump_row_col_labels_and_errors(table_name, header, row, '4')
+    elif table_name == 'voter_guide_voterguide':
+        clean_row(row, 14)                      # twitter_description
+        # dump_row_col_labels_and_errors(table_name, header, row, '3482')
+    return row
+
+
 # We don't check every field for garbage, although maybe we should...
 # Since the error reporting in the python console is pretty good, you should be able to figure out what field has
 # garbage in it.
@@ -344,151 +1037,9 @@ def csv_file_to_clean_csv_file2(table_name):
                     skipped_rows += row[0] + ", "
                     continue
 
-                if table_name == "ballot_ballotitem":
-                    clean_row(row, 10)                      # ballot_item_display_name
-                    clean_row(row, 12)                      # measure_subtitle
-                    clean_row(row, 14)                      # measure_text
-                    clean_row(row, 16)                      # no_vote_description
-                    clean_row(row, 17)                      # yes_vote_description
-                    # dump_row_col_labels_and_errors(table_name, header, row, '3000150')
-                elif table_name == "ballot_ballotreturned":
-                    clean_row(row, 6)                       # text_for_map_search
-                    substitute_null(row, 7, '0.0')          # latitude
-                    substitute_null(row, 8, '0.0')          # longitude
-                    # dump_row_col_labels_and_errors(table_name, header, row, '50490')
-                elif table_name == "candidate_candidatetoofficelink":
-                    if row[1] == '':                        # candidate_we_vote_id
-                        continue
-                elif table_name == "election_election":
-                    substitute_null(row, 2, '0')  # google_civic_election_id_new is an integer
-                    if row[8] == '' or row[8] == '\\N' or row[8] == '0':
-                        row[8] = get_dummy_unique_id()       # ballotpedia_election_id
-                    substitute_null(row, 8, '0')            #
-                    clean_row(row, 10)                      # internal_notes
-                    substitute_null(row, 2, 'f')            # election_preparation_finished
-                elif table_name == "politician_politician":
-                    row[2] = row[2].replace("\\", "")       # middle_name
-                    substitute_null(row, 7, 'U')            # gender
-                    substitute_null(row, 8, '\\N')          # birth_date
-                    row[9] = get_dummy_unique_id()          # bioguide_id, looks like we don't even use this anymore
-                    row[10] = get_dummy_unique_id()         # thomas_id, looks like we don't even use this anymore
-                    row[11] = get_dummy_unique_id()         # lis_id, looks like we don't even use this anymore
-                    row[12] = get_dummy_unique_id()         # govtrack_id, looks like we don't even use this anymore
-                    row[15] = get_dummy_unique_id()         # fec_id, looks like we don't even use this anymore
-                    row[19] = get_dummy_unique_id()         # maplight_id, looks like we don't even use this anymore
-                elif table_name == "polling_location_pollinglocation":
-                    clean_row(row, 2)                       # location_name
-                    row[2] = row[2].replace("\\", "")       # 'BIG BONE STATE PARK GARAGE BLDG\\'
-                    clean_row(row, 3)                       # polling_hours_text
-                    clean_row(row, 4)                       # directions_text
-                    clean_row(row, 5)                       # line1
-                    clean_row(row, 6)                       # line2
-                    substitute_null(row, 11, '0.00001')     # latitude
-                    substitute_null(row, 12, '0.00001')     # longitude
-                    substitute_null(row, 14, '\\N')         # google_response_address_not_found
-                elif table_name == "office_contestoffice":
-                    substitute_null(row, 4, '0')            # google_civic_election_id_new is an integer
-                    row[6] = get_dummy_unique_id()          # maplight_id, looks like we don't even use this anymore
-                    substitute_null(row, 24, '0')           # ballotpedia_office_id is an integer
-                    substitute_null(row, 28, '0')           # ballotpedia_district_id is an integer
-                    substitute_null(row, 29, '0')           # ballotpedia_election_id is an integer
-                    substitute_null(row, 30, '0')           # ballotpedia_race_id is an integer
-                    substitute_null(row, 33, '0')           # google_ballot_placement is an integer
-                    substitute_null(row, 40, 'f')           # ballotpedia_is_marquee is a bool
-                    substitute_null(row, 41, 'f')           # is_battleground_race is a bool
-                elif table_name == "candidate_candidatecampaign":
-                    row[2] = get_dummy_unique_id()          # maplight_id, looks like we don't even use this anymore
-                    substitute_null(row, 6, '0')            # politician_id
-                    clean_row(row, 8)                       # candidate_name |"Elizabeth Nelson ""Liz"" Johnson"|
-                    clean_row(row, 9)                       # google_civic_candidate_name
-                    clean_row(row, 24)                      # candidate_email
-                    substitute_null(row, 28, '0')           # wikipedia_page_id
-                    clean_row(row, 32)                      # twitter_description
-                    substitute_null(row, 33, '0')           # twitter_followers_count
-                    clean_row(row, 34)                      # twitter_location
-                    clean_row(row, 35)                      # twitter_name
-                    clean_row(row, 36)                      # twitter_profile_background_image_url_https
-                    substitute_null(row, 39, '0')           # twitter_user_id
-                    clean_row(row, 40)                      # ballot_guide_official_statement
-                    clean_row(row, 41)                      # contest_office_name
-                    substitute_null(row, 53, '0')           # ballotpedia_candidate_id
-                    clean_row(row, 57)                      # ballotpedia_candidate_summary
-                    substitute_null(row, 58, '0')           # ballotpedia_election_id
-                    substitute_null(row, 59, '0')           # ballotpedia_image_id
-                    substitute_null(row, 60, '0')           # ballotpedia_office_id
-                    substitute_null(row, 61, '0')           # ballotpedia_person_id
-                    substitute_null(row, 62, '0')           # ballotpedia_race_id
-                    substitute_null(row, 65, '0')           # crowdpac_candidate_id
-                    substitute_null(row, 71, '\\N')         # withdrawal_date
-                    substitute_null(row, 75, '0')           # candidate_year
-                    substitute_null(row, 76, '0')           # candidate_ultimate_election_date
-                    # dump_row_col_labels_and_errors(table_name, header, row, '4441')
-                elif table_name == "measure_contestmeasure":
-                    row[3] = row[3].replace('\n', '  ')     # measure_title
-                    clean_row(row, 4)                       #
-                    clean_row(row, 5)                       #
-                    clean_row(row, 6)                       # measure_url
-                    substitute_null(row, 17, '0')           # wikipedia_page_id is a bigint
-                    clean_row(row, 26)                      # ballotpedia_measure_name
-                    clean_row(row, 28)                      # ballotpedia_measure_summ
-                    clean_row(row, 29)                      # ballotpedia_measure_text
-                    clean_row(row, 32)                      # ballotpedia_no_vote_desc
-                    clean_row(row, 33)                      # ballotpedia_yes_vote_des
-                    substitute_null(row, 34, '0')           # google_ballot_placement is a bigint
-                    substitute_null(row, 39, '0')           # measure_year is an integer
-                    substitute_null(row, 40, '0')           # measure_ultimate_election_date is an integer
-                # elif table_name == 'office_contestofficevisitingotherelection':
-                #     pass   # no fixes needed
-                elif table_name == 'organization_organization':
-                    clean_row(row, 11)                      # organization_description
-                    clean_row(row, 12)                      # organization_address
-                    substitute_null(row, 23, '0')           # twitter_followers_count
-                    clean_row(row, 22)                      # twitter_description
-                    substitute_null(row, 31, '0')           # wikipedia_thumbnail_height
-                    substitute_null(row, 33, '0')           # wikipedia_thumbnail_width
-                    clean_row(row, 47)                      # issue_analysis_admin_notes
-                    # dump_row_col_labels_and_errors(table_name, header, row, '1')
-                elif table_name == 'position_positionentered':
-                    clean_row(row, 4)                       # ballot_item_display_name
-                    substitute_null(row, 5, '1970-01-01 00:00:00+00')
-                    clean_row(row, 15)                      #
-                    clean_row(row, 16)                      # vote_smart_rating_name
-                    clean_bigint_row(row, 18)               # contest_office_id
-                    clean_row(row, 22)                      # google_civic_candidate_name
-                    clean_row(row, 28)                      # statement_text
-                    clean_url(row, 30)                      # more_info_url
-                    clean_row(row, 37)                      # speaker_display_name
-                    clean_row(row, 43)                      # google_civic_measure_title
-                    clean_row(row, 44)                      # contest_office_name
-                    clean_row(row, 45)                      # political_party
-                    # dump_row_col_labels_and_errors(table_name, header, row, '33083')
-                elif table_name == 'voter_guide_voterguidepossibility':
-                    clean_url(row, 1)                       # voter_guide_possibility_url
-                    clean_row(row, 5)                       # ballot_items_raw
-                    clean_row(row, 6)                       # organization_name
-                    clean_row(row, 7)                       # organization_twitter_handle
-                    clean_row(row, 11)                      # internal_notes
-                    clean_row(row, 20)                      # contributor_comments
-                    clean_row(row, 22)                      # candidate_name
-                    # dump_row_col_labels_and_errors(table_name, header, row, '4')
-                elif table_name == 'voter_guide_voterguidepossibilityposition':
-                    substitute_null(row, 1, '0')            # voter_guide_possibility_parent_id
-                    substitute_null(row, 2, '0')            # possibility_position_number
-                    clean_row(row, 3)                       # ballot_item_name
-                    clean_row(row, 4)                       # candidate_we_vote_id
-                    clean_row(row, 5)                       # position_we_vote_id
-                    clean_row(row, 6)                       # measure_we_vote_id
-                    clean_row(row, 7)                       # statement_text
-                    substitute_null(row, 8, '0')            # google_civic_election_id
-                    clean_url(row, 10)                      # more_info_url
-                    clean_row(row, 13)                      # candidate_twitter_handle
-                    clean_row(row, 14)                      # organization_name
-                    clean_row(row, 15)                      # organization_twitter_handle
-                    clean_row(row, 16)                      # organization_we_vote_id
-                    # dump_row_col_labels_and_errors(table_name, header, row, '4')
-                elif table_name == 'voter_guide_voterguide':
-                    clean_row(row, 14)                      # twitter_description
-                    # dump_row_col_labels_and_errors(table_name, header, row, '3482')
+                row = clean_csv_row(table_name, row)
+                if row is None:
+                    continue
                 csv_rows.append(row)
             except Exception as e:
                 logger.error("csv_file_to_clean_csv_file2 (" + table_name + ") caught " + str(e))
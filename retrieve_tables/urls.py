@@ -10,4 +10,7 @@ urlpatterns = [
     # views_admin
     re_path(r'^import/$',
         controllers.retrieve_sql_files_from_master_server, name='retrieve_sql_files_from_master_server'),
+    re_path(r'^import_streaming/$',
+        controllers.retrieve_sql_files_from_master_server_streaming,
+        name='retrieve_sql_files_from_master_server_streaming'),
 ]
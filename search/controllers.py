@@ -7,6 +7,8 @@ from config.base import get_environment_variable
 from elasticsearch import Elasticsearch
 from organization.models import OrganizationManager
 from politician.models import PoliticianManager
+from search.models import generate_politician_display_full_name, get_politician_search_index, \
+    POLITICIAN_SEARCH_RESULT_LIMIT
 from voter.models import fetch_voter_id_from_voter_device_link
 import wevote_functions.admin
 from wevote_functions.functions import is_voter_device_id_valid, positive_value_exists
@@ -63,30 +65,45 @@ def search_all_for_api(text_from_search_field='', voter_device_id='', search_sco
     search_results = []
     search_count = 0
     status = ""
-    politician_manager = PoliticianManager()
     try:
-        results = politician_manager.search_politicians(name_search_terms=text_from_search_field)
-        politician_search_results_list = results['politician_search_results_list']
-        success = results['success']
-        if not positive_value_exists(success):
-            status += results['status']
-        for one_politician in politician_search_results_list:
+        politician_search_results_list = []
+        try:
+            politician_search_results_list = get_politician_search_index().search(
+                text_from_search_field, limit=POLITICIAN_SEARCH_RESULT_LIMIT)
+        except Exception as e:
+            # Fall back to searching the database, if the index could not be built
+            status += "POLITICIAN_SEARCH_INDEX_FAILED: " + str(e) + " "
+            politician_manager = PoliticianManager()
+            results = politician_manager.search_politicians(
+                name_search_terms=text_from_search_field, limit=POLITICIAN_SEARCH_RESULT_LIMIT)
+            if not positive_value_exists(results['success']):
+                status += results['status']
+            for one_politician in results['politician_search_results_list']:
+                politician_search_results_list.append((0, one_politician.id, {
+                    'we_vote_id':                               one_politician.we_vote_id,
+                    'display_full_name':                        generate_politician_display_full_name(one_politician),
+                    'politician_twitter_handle':                one_politician.politician_twitter_handle,
+                    'state_code':                               one_politician.state_code,
+                    'we_vote_hosted_profile_image_url_medium':
+                        one_politician.we_vote_hosted_profile_image_url_medium,
+                }))
+        for score, politician_id, one_politician in politician_search_results_list:
             # link_internal = "/office/" + one_search_result_dict['we_vote_id']
             link_internal = ''
 
             one_search_result = {
-                'result_title':             one_politician.display_full_name(),
-                'result_image':             one_politician.we_vote_hosted_profile_image_url_medium,
+                'result_title':             one_politician['display_full_name'],
+                'result_image':             one_politician['we_vote_hosted_profile_image_url_medium'],
                 'result_subtitle':          "",
                 'result_summary':           "",
-                'result_score':             0,
+                'result_score':             round(score, 3),
                 'link_internal':            link_internal,
                 'kind_of_owner':            "POLITICIAN",
                 'google_civic_election_id': 0,
-                'state_code':               one_politician.state_code,
-                'twitter_handle':           one_politician.politician_twitter_handle,
-                'we_vote_id':               one_politician.we_vote_id,
-                'local_id':                 one_politician.id,
+                'state_code':               one_politician['state_code'],
+                'twitter_handle':           one_politician['politician_twitter_handle'],
+                'we_vote_id':               one_politician['we_vote_id'],
+                'local_id':                 politician_id,
             }
             search_results.append(one_search_result)
             search_count += 1
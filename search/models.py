@@ -3,17 +3,28 @@
 # -*- coding: UTF-8 -*-
 
 from ballot.models import BallotReturnedManager
-from config.base import get_environment_variable
+import bisect
+from config.base import get_environment_variable, get_environment_variable_default
 from candidate.models import CandidateCampaign
+from django.db import connections
+from django.db.models import Count, Max
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from elasticsearch import Elasticsearch
 from election.models import Election
 from measure.models import ContestMeasure
 from office.models import ContestOffice
+import heapq
+import itertools
+import math
 from organization.models import Organization
+from politician.models import Politician
+import re
+import threading
+import time
+import unicodedata
 import wevote_functions.admin
-from wevote_functions.functions import positive_value_exists
+from wevote_functions.functions import convert_to_int, positive_value_exists
 
 logger = wevote_functions.admin.get_logger(__name__)
 STATE_CODE_MAP = {
@@ -95,6 +106,266 @@ if positive_value_exists(ELASTIC_SEARCH_CONNECTION_STRING):
     )
 
 
+# Politician search
+# Politicians are searched in memory, in each worker, instead of with a chain of icontains filters over the table.
+#  Saves and deletes in this worker update the index right away, and it is rebuilt from the database this often to
+#  pick up changes made by other workers.
+POLITICIAN_SEARCH_INDEX_REFRESH_SECONDS = \
+    convert_to_int(get_environment_variable_default("POLITICIAN_SEARCH_INDEX_REFRESH_SECONDS", 3600))
+# After a build fails, searches go to the database for this long before the index is built again
+POLITICIAN_SEARCH_INDEX_RETRY_SECONDS = \
+    convert_to_int(get_environment_variable_default("POLITICIAN_SEARCH_INDEX_RETRY_SECONDS", 300))
+POLITICIAN_SEARCH_RESULT_LIMIT = 25
+# A query word shorter than this is only matched as a prefix, since it has too few trigrams to compare
+POLITICIAN_SEARCH_MINIMUM_TRIGRAM_WORD_LENGTH = 3
+POLITICIAN_SEARCH_MINIMUM_SIMILARITY = 0.3
+# Most indexed words one query word can match as a prefix, so "j" doesn't score every politician
+POLITICIAN_SEARCH_MAXIMUM_PREFIX_WORDS = 2000
+
+POLITICIAN_SEARCH_INDEX_FIELD_NAMES = [
+    'id', 'we_vote_id', 'politician_name', 'first_name', 'last_name', 'google_civic_candidate_name',
+    'politician_twitter_handle', 'state_code', 'we_vote_hosted_profile_image_url_medium']
+
+politician_search_index = None
+politician_search_index_lock = threading.Lock()
+politician_search_index_date_build_failed = None
+politician_search_index_refreshing = False
+
+
+def generate_popularity(twitter_followers_count, candidate_count):
+    # From 0 to about 1: ten million Twitter followers, or a long record of candidacies
+    return min(1.0, math.log10(1 + twitter_followers_count) / 7 + 0.02 * min(candidate_count, 10))
+
+
+def generate_politician_display_full_name(politician):
+    # Politician.display_full_name() raises TypeError when it falls through to a missing first or last name
+    if positive_value_exists(politician.politician_name):
+        return politician.politician_name
+    full_name = " ".join(name for name in (politician.first_name, politician.last_name) if positive_value_exists(name))
+    if positive_value_exists(full_name):
+        return full_name
+    return politician.google_civic_candidate_name or ""
+
+
+def generate_search_words(text):
+    if not positive_value_exists(text):
+        return []
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+
+def generate_word_trigrams(word):
+    # Padded the same way as pg_trgm, so the start of a word counts for more than its end
+    padded_word = "  " + word + " "
+    return set(padded_word[position:position + 3] for position in range(len(padded_word) - 2))
+
+
+class PoliticianSearchIndex(object):
+    """
+    An in-memory index of politician names and Twitter handles. Each query word is scored against the indexed
+    words by exact match, then prefix, then (for misspellings) trigram similarity. A politician has to match every
+    query word, and the best matches, with more popular politicians ranked higher, are returned.
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.date_built = 0
+        self.politician_dict = {}
+        self.word_politician_id_sets = {}
+        self.sorted_word_list = []
+        self.trigram_word_sets = {}
+
+    def build(self):
+        """
+        Load every politician, with popularity taken from the Twitter followers of their candidates
+        """
+        twitter_followers_dict = {}
+        candidate_query = CandidateCampaign.objects.using('readonly').exclude(politician_we_vote_id__isnull=True)
+        candidate_query = candidate_query.values('politician_we_vote_id').annotate(
+            twitter_followers_count=Max('twitter_followers_count'),
+            candidate_count=Count('id'),
+        ).order_by()
+        for candidate_values in candidate_query:
+            twitter_followers_dict[candidate_values['politician_we_vote_id']] = \
+                (candidate_values['twitter_followers_count'] or 0, candidate_values['candidate_count'])
+
+        politician_query = Politician.objects.using('readonly').only(*POLITICIAN_SEARCH_INDEX_FIELD_NAMES)
+        new_index = PoliticianSearchIndex()
+        for politician in politician_query.order_by('id').iterator(chunk_size=2000):
+            twitter_followers_count, candidate_count = twitter_followers_dict.get(politician.we_vote_id, (0, 0))
+            try:
+                new_index.add_politician(politician, generate_popularity(twitter_followers_count, candidate_count))
+            except Exception as e:
+                # One bad row shouldn't stop the whole index from being built
+                logger.error("POLITICIAN_SEARCH_INDEX_SKIPPED_POLITICIAN " + str(politician.we_vote_id) + ": " + str(e))
+        with self.lock:
+            self.politician_dict = new_index.politician_dict
+            self.word_politician_id_sets = new_index.word_politician_id_sets
+            self.sorted_word_list = new_index.sorted_word_list
+            self.trigram_word_sets = new_index.trigram_word_sets
+            self.date_built = time.monotonic()
+
+    def add_politician(self, politician, popularity=None):
+        with self.lock:
+            if popularity is None:
+                # Keep the popularity from the last build, since the candidates haven't changed
+                popularity = self.politician_dict[politician.id]['popularity'] \
+                    if politician.id in self.politician_dict else 0
+            self.remove_politician(politician.id)
+            display_full_name = generate_politician_display_full_name(politician)
+            word_set = set(generate_search_words(display_full_name))
+            word_set.update(generate_search_words(politician.politician_name))
+            word_set.update(generate_search_words(politician.politician_twitter_handle))
+            self.politician_dict[politician.id] = {
+                'we_vote_id':                               politician.we_vote_id,
+                'display_full_name':                        display_full_name,
+                'politician_twitter_handle':                politician.politician_twitter_handle,
+                'state_code':                               politician.state_code,
+                'we_vote_hosted_profile_image_url_medium':  politician.we_vote_hosted_profile_image_url_medium,
+                'popularity':                               popularity,
+                'word_set':                                 word_set,
+            }
+            for word in word_set:
+                if word not in self.word_politician_id_sets:
+                    self.word_politician_id_sets[word] = set()
+                    bisect.insort(self.sorted_word_list, word)
+                    for trigram in generate_word_trigrams(word):
+                        self.trigram_word_sets.setdefault(trigram, set()).add(word)
+                self.word_politician_id_sets[word].add(politician.id)
+
+    def remove_politician(self, politician_id):
+        with self.lock:
+            politician_values = self.politician_dict.pop(politician_id, None)
+            if politician_values is None:
+                return
+            for word in politician_values['word_set']:
+                politician_id_set = self.word_politician_id_sets.get(word)
+                if politician_id_set is None:
+                    continue
+                politician_id_set.discard(politician_id)
+                if len(politician_id_set):
+                    continue
+                del self.word_politician_id_sets[word]
+                del self.sorted_word_list[bisect.bisect_left(self.sorted_word_list, word)]
+                for trigram in generate_word_trigrams(word):
+                    word_set = self.trigram_word_sets.get(trigram)
+                    if word_set is not None:
+                        word_set.discard(word)
+                        if not len(word_set):
+                            del self.trigram_word_sets[trigram]
+
+    def score_words_matching(self, query_word):
+        """
+        :return: dict of indexed word -> how well it matches query_word, from 0 to 1
+        """
+        word_score_dict = {}
+        if query_word in self.word_politician_id_sets:
+            word_score_dict[query_word] = 1.0
+        start = bisect.bisect_left(self.sorted_word_list, query_word)
+        for word in itertools.islice(self.sorted_word_list, start, start + POLITICIAN_SEARCH_MAXIMUM_PREFIX_WORDS):
+            if not word.startswith(query_word):
+                break
+            if word != query_word:
+                # "jon" is a closer prefix of "jones" than of "jonathan"
+                word_score_dict[word] = 0.6 + 0.3 * len(query_word) / len(word)
+        if not len(word_score_dict) and len(query_word) >= POLITICIAN_SEARCH_MINIMUM_TRIGRAM_WORD_LENGTH:
+            # Only look for misspellings when nothing matches the way it was typed
+            query_trigram_set = generate_word_trigrams(query_word)
+            shared_trigram_counts = {}
+            for trigram in query_trigram_set:
+                for word in self.trigram_word_sets.get(trigram, ()):
+                    shared_trigram_counts[word] = shared_trigram_counts.get(word, 0) + 1
+            for word, shared_trigram_count in shared_trigram_counts.items():
+                similarity = shared_trigram_count / \
+                    (len(query_trigram_set) + len(generate_word_trigrams(word)) - shared_trigram_count)
+                if similarity >= POLITICIAN_SEARCH_MINIMUM_SIMILARITY:
+                    word_score_dict[word] = 0.6 * similarity
+        return word_score_dict
+
+    def search(self, name_search_terms, limit=POLITICIAN_SEARCH_RESULT_LIMIT):
+        """
+        :param name_search_terms:
+        :param limit:
+        :return: list of (score, politician_id, politician_values), best first
+        """
+        query_word_list = list(dict.fromkeys(generate_search_words(name_search_terms)))
+        if not len(query_word_list):
+            return []
+        with self.lock:
+            score_dict = None
+            for query_word in query_word_list:
+                query_word_score_dict = {}
+                for word, word_score in self.score_words_matching(query_word).items():
+                    for politician_id in self.word_politician_id_sets[word]:
+                        if word_score > query_word_score_dict.get(politician_id, 0):
+                            query_word_score_dict[politician_id] = word_score
+                if score_dict is None:
+                    score_dict = query_word_score_dict
+                else:
+                    # Every query word has to match
+                    score_dict = {politician_id: score + query_word_score_dict[politician_id]
+                                  for politician_id, score in score_dict.items()
+                                  if politician_id in query_word_score_dict}
+                if not len(score_dict):
+                    return []
+            ranked_list = heapq.nlargest(
+                limit,
+                ((score / len(query_word_list) + 0.1 * self.politician_dict[politician_id]['popularity'],
+                  politician_id)
+                 for politician_id, score in score_dict.items()))
+            return [(score, politician_id, self.politician_dict[politician_id])
+                    for score, politician_id in ranked_list]
+
+
+def politician_search_index_build_failed_recently():
+    return politician_search_index_date_build_failed is not None and \
+        time.monotonic() - politician_search_index_date_build_failed < POLITICIAN_SEARCH_INDEX_RETRY_SECONDS
+
+
+def refresh_politician_search_index():
+    """
+    Rebuild the index in a background thread. Searches keep using the index as it is until the new one is ready.
+    """
+    global politician_search_index_date_build_failed, politician_search_index_refreshing
+    try:
+        politician_search_index.build()
+    except Exception as e:
+        politician_search_index_date_build_failed = time.monotonic()
+        logger.error("POLITICIAN_SEARCH_INDEX_REFRESH_FAILED: " + str(e))
+    finally:
+        politician_search_index_refreshing = False
+        connections.close_all()
+
+
+def get_politician_search_index():
+    """
+    The first search in each worker builds the index. It is then refreshed in the background once it is older than
+    POLITICIAN_SEARCH_INDEX_REFRESH_SECONDS. If a build fails, it isn't tried again for
+    POLITICIAN_SEARCH_INDEX_RETRY_SECONDS, and while there is no index this raises, so the caller searches the
+    database instead.
+    """
+    global politician_search_index, politician_search_index_date_build_failed, politician_search_index_refreshing
+    if politician_search_index is None:
+        with politician_search_index_lock:
+            if politician_search_index is None:
+                if politician_search_index_build_failed_recently():
+                    raise RuntimeError("POLITICIAN_SEARCH_INDEX_BUILD_FAILED_RECENTLY")
+                new_politician_search_index = PoliticianSearchIndex()
+                try:
+                    new_politician_search_index.build()
+                except Exception:
+                    politician_search_index_date_build_failed = time.monotonic()
+                    raise
+                politician_search_index = new_politician_search_index
+    elif time.monotonic() - politician_search_index.date_built > POLITICIAN_SEARCH_INDEX_REFRESH_SECONDS \
+            and not politician_search_index_refreshing and not politician_search_index_build_failed_recently():
+        with politician_search_index_lock:
+            if not politician_search_index_refreshing:
+                politician_search_index_refreshing = True
+                threading.Thread(name='politician_search_index_refresh', target=refresh_politician_search_index,
+                                 daemon=True).start()
+    return politician_search_index
+
+
 # CandidateCampaign
 @receiver(post_save, sender=CandidateCampaign)
 def save_candidate_campaign_signal(sender, instance, **kwargs):
@@ -278,6 +549,28 @@ def delete_organization_signal(sender, instance, **kwargs):
             logger.error(status)
 
 
+# Politician
+@receiver(post_save, sender=Politician)
+def save_politician_signal(sender, instance, **kwargs):
+    # Only keep an index this worker has already built up to date
+    if politician_search_index is not None:
+        try:
+            politician_search_index.add_politician(instance)
+        except Exception as err:
+            status = "SAVE_POLITICIAN_SIGNAL, err: " + str(err)
+            logger.error(status)
+
+
+@receiver(post_delete, sender=Politician)
+def delete_politician_signal(sender, instance, **kwargs):
+    if politician_search_index is not None:
+        try:
+            politician_search_index.remove_politician(instance.id)
+        except Exception as err:
+            status = "DELETE_POLITICIAN_SIGNAL, err: " + str(err)
+            logger.error(status)
+
+
 # @receiver(post_save)
 # def save_signal(sender, **kwargs):
 #     print("### save")
@@ -111,7 +111,7 @@ def positions_count_for_candidate(voter_id, candidate_id, candidate_we_vote_id,
     if len(public_positions_list_for_candidate):
         follow_organization_list_manager = FollowOrganizationList()
         organizations_followed_by_voter_by_id = \
-            follow_organization_list_manager.retrieve_follow_organization_by_voter_id_simple_id_array(voter_id)
+            follow_organization_list_manager.retrieve_follow_organization_by_voter_id_simple_id_set(voter_id)
 
     if show_positions_this_voter_follows:
         position_objects = position_list_manager.calculate_positions_followed_by_voter(
@@ -214,7 +214,7 @@ def positions_count_for_contest_measure(voter_id, measure_id, measure_we_vote_id
     if len(public_positions_list_for_contest_measure):
         follow_organization_list_manager = FollowOrganizationList()
         organizations_followed_by_voter_by_id = \
-            follow_organization_list_manager.retrieve_follow_organization_by_voter_id_simple_id_array(voter_id)
+            follow_organization_list_manager.retrieve_follow_organization_by_voter_id_simple_id_set(voter_id)
 
     if show_positions_this_voter_follows:
         position_objects = position_list_manager.calculate_positions_followed_by_voter(
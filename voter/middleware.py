@@ -0,0 +1,21 @@
+# voter/middleware.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+"""Voter middleware"""
+
+from voter.models import VoterDeviceRequestMemo
+
+
+class VoterDeviceCacheMiddleware(object):
+    """
+    Each API call looks up the voter for its voter_device_id several times (in the view, and again in each
+    controller it calls). Inside a request, fetch_voter_id_from_voter_device_link and the functions built on it only
+    ask the caches or the database the first time.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with VoterDeviceRequestMemo():
+            return self.get_response(request)
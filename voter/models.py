@@ -2,8 +2,14 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
-from django.db import (models, IntegrityError)
-from django.db.models import Q
+from config.base import get_environment_variable_default
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import (models, IntegrityError, transaction)
+from django.db.models import OuterRef, Q, Subquery
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import (BaseUserManager, AbstractBaseUser)  # PermissionsMixin
 from django.core.validators import RegexValidator
 from django.utils.timezone import now
@@ -11,11 +17,13 @@ from datetime import datetime, timedelta
 from apple.models import AppleUser
 from exception.models import handle_exception, handle_record_found_more_than_one_exception,\
     handle_record_not_saved_exception
+import hashlib
 from import_export_facebook.models import FacebookManager
 import pytz
 from sms.models import SMSManager
 import string
 import sys
+import threading
 from twitter.models import TwitterUserManager
 from validate_email import validate_email
 import wevote_functions.admin
@@ -1765,6 +1773,34 @@ class VoterManager(BaseUserManager):
         }
         return result
 
+    def retrieve_voter_list_by_linked_organization_we_vote_id_list(
+            self, organization_we_vote_id_list=[], read_only=True):
+        status = ''
+        voter_list = []
+
+        try:
+            if read_only:
+                query = Voter.objects.using('readonly').all()
+            else:
+                query = Voter.objects.all()
+            query = query.filter(linked_organization_we_vote_id__in=organization_we_vote_id_list)
+            voter_list = list(query)
+            success = True
+            voter_list_found = positive_value_exists(len(voter_list))
+            status += "VOTER_LIST_RETRIEVED_BY_LINKED_ORGANIZATION_WE_VOTE_ID_LIST "
+        except Exception as e:
+            success = False
+            voter_list_found = False
+            status += "VOTER_LIST_NOT_RETRIEVED_BY_LINKED_ORGANIZATION_WE_VOTE_ID_LIST: " + str(e) + " "
+
+        result = {
+            'status':           status,
+            'success':          success,
+            'voter_list':       voter_list,
+            'voter_list_found': voter_list_found,
+        }
+        return result
+
     def retrieve_voter_plan_list(self, google_civic_election_id=0, voter_we_vote_id='', read_only=True):
         success = True
         status = ""
@@ -3958,14 +3994,184 @@ class VoterDeviceLinkManager(models.Manager):
         return results
 
 
+# voter_device_id -> voter lookups
+# Nearly every API call starts by looking up the voter for its voter_device_id. Inside a request opened by
+#  VoterDeviceCacheMiddleware, each lookup is remembered until the request ends. Lookups can also be kept across
+#  requests in a shared cache, which is kept current when a VoterDeviceLink is saved or deleted (ex/ on sign in, merge
+#  and sign out). They are not cached in each worker, since a sign out in one worker could not clear the others.
+# Optional shared tier: the alias of an entry in settings.CACHES which all workers share (ex/ "shared", configured
+#  with SHARED_CACHE_BACKEND and SHARED_CACHE_LOCATION). Blank to disable. Per-worker backends (LocMemCache) and
+#  DummyCache are refused.
+VOTER_DEVICE_CACHE_SHARED_TIER_ALIAS = get_environment_variable_default("VOTER_DEVICE_CACHE_SHARED_TIER_ALIAS", "")
+# Saves and deletes keep the shared tier current, so this only limits how long a missed update can be served
+VOTER_DEVICE_CACHE_SHARED_TIER_TIMEOUT_SECONDS = \
+    convert_to_int(get_environment_variable_default("VOTER_DEVICE_CACHE_SHARED_TIER_TIMEOUT_SECONDS", 30))
+VOTER_DEVICE_CACHE_SHARED_TIER_KEY_PREFIX = "voter_device"
+voter_device_cache_shared_tier = {
+    'checked':  False,
+    'cache':    None,
+}
+voter_device_request_memo = threading.local()
+
+
+class VoterDeviceRequestMemo(object):
+    """
+    VoterDeviceCacheMiddleware runs each request inside "with VoterDeviceRequestMemo():" so that the voter for a
+    voter_device_id is only looked up once per request, however many controllers ask for it.
+    """
+    def __init__(self):
+        self.outermost = False
+
+    def __enter__(self):
+        if getattr(voter_device_request_memo, 'voter_device_values_dict', None) is None:
+            voter_device_request_memo.voter_device_values_dict = {}
+            self.outermost = True
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.outermost:
+            voter_device_request_memo.voter_device_values_dict = None
+        return False
+
+
+def get_voter_device_cache_shared_tier():
+    if voter_device_cache_shared_tier['checked']:
+        return voter_device_cache_shared_tier['cache']
+    shared_tier = None
+    if positive_value_exists(VOTER_DEVICE_CACHE_SHARED_TIER_ALIAS):
+        try:
+            shared_tier = caches[VOTER_DEVICE_CACHE_SHARED_TIER_ALIAS]
+        except Exception as e:
+            logger.error("VOTER_DEVICE_CACHE_SHARED_TIER_NOT_AVAILABLE: " + str(e))
+        if isinstance(shared_tier, (DummyCache, LocMemCache)):
+            # A sign out handled by one worker could not clear what another worker holds in its own memory
+            logger.error("VOTER_DEVICE_CACHE_SHARED_TIER_NOT_SHARED_BY_WORKERS: " +
+                         VOTER_DEVICE_CACHE_SHARED_TIER_ALIAS + " uses " + type(shared_tier).__name__)
+            shared_tier = None
+    voter_device_cache_shared_tier['cache'] = shared_tier
+    voter_device_cache_shared_tier['checked'] = True
+    return shared_tier
+
+
+def generate_voter_device_cache_shared_tier_key(voter_device_id):
+    # Keep the key short and free of characters memcached doesn't allow
+    return VOTER_DEVICE_CACHE_SHARED_TIER_KEY_PREFIX + ":" + \
+        hashlib.sha256(str(voter_device_id).encode('utf-8')).hexdigest()
+
+
+def store_voter_device_values(voter_device_id, voter_device_values):
+    """
+    Remember what voter_device_id points to, in the request memo and in the shared cache
+    :param voter_device_id:
+    :param voter_device_values: dict with voter_id, voter_we_vote_id and state_code. voter_id is 0 when the
+     VoterDeviceLink was deleted.
+    :return:
+    """
+    voter_device_values_dict = getattr(voter_device_request_memo, 'voter_device_values_dict', None)
+    if voter_device_values_dict is not None:
+        voter_device_values_dict[voter_device_id] = voter_device_values
+    shared_tier = get_voter_device_cache_shared_tier()
+    if shared_tier is not None:
+        try:
+            shared_tier.set(generate_voter_device_cache_shared_tier_key(voter_device_id), voter_device_values,
+                            VOTER_DEVICE_CACHE_SHARED_TIER_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.error("VOTER_DEVICE_CACHE_SHARED_TIER_SET_FAILED: " + str(e))
+
+
+def invalidate_voter_device_cache(voter_device_id):
+    voter_device_values_dict = getattr(voter_device_request_memo, 'voter_device_values_dict', None)
+    if voter_device_values_dict is not None:
+        voter_device_values_dict.pop(voter_device_id, None)
+    shared_tier = get_voter_device_cache_shared_tier()
+    if shared_tier is not None:
+        try:
+            shared_tier.delete(generate_voter_device_cache_shared_tier_key(voter_device_id))
+        except Exception as e:
+            logger.error("VOTER_DEVICE_CACHE_SHARED_TIER_DELETE_FAILED: " + str(e))
+
+
+def retrieve_voter_device_values(voter_device_id):
+    """
+    Look up the voter_id, voter_we_vote_id and state_code for a voter_device_id, from the request memo, then the
+    shared cache, and finally the database (with one query)
+    :param voter_device_id:
+    :return: dict with voter_id, voter_we_vote_id and state_code, or None if there is no VoterDeviceLink
+    """
+    if not positive_value_exists(voter_device_id):
+        return None
+    voter_device_values_dict = getattr(voter_device_request_memo, 'voter_device_values_dict', None)
+    if voter_device_values_dict is not None and voter_device_id in voter_device_values_dict:
+        voter_device_values = voter_device_values_dict[voter_device_id]
+        return voter_device_values if voter_device_values and voter_device_values['voter_id'] else None
+
+    voter_device_values = None
+    shared_tier = get_voter_device_cache_shared_tier()
+    if shared_tier is not None:
+        try:
+            voter_device_values = shared_tier.get(generate_voter_device_cache_shared_tier_key(voter_device_id))
+        except Exception as e:
+            logger.error("VOTER_DEVICE_CACHE_SHARED_TIER_GET_FAILED: " + str(e))
+
+    if voter_device_values is None:
+        if 'test' in sys.argv:
+            voter_device_link_query = VoterDeviceLink.objects.all()
+        else:
+            voter_device_link_query = VoterDeviceLink.objects.using('readonly').all()
+        voter_device_link_query = voter_device_link_query.filter(voter_device_id=voter_device_id).annotate(
+            voter_we_vote_id=Subquery(Voter.objects.filter(id=OuterRef('voter_id')).values('we_vote_id')[:1]))
+        try:
+            voter_device_values = voter_device_link_query.values('voter_id', 'voter_we_vote_id', 'state_code').first()
+        except Exception as e:
+            logger.error("RETRIEVE_VOTER_DEVICE_VALUES_FAILED: " + str(e))
+        if voter_device_values is not None:
+            # A link which isn't found isn't cached across requests, since it may not have reached the read replica
+            store_voter_device_values(voter_device_id, voter_device_values)
+    if voter_device_values_dict is not None:
+        voter_device_values_dict[voter_device_id] = voter_device_values
+    return voter_device_values if voter_device_values and voter_device_values['voter_id'] else None
+
+
+@receiver(post_save, sender=VoterDeviceLink)
+def store_voter_device_values_on_save_signal(sender, instance, **kwargs):
+    invalidate_voter_device_cache(instance.voter_device_id)
+    # Once committed, store the new values (rather than only dropping the old ones), so the next lookup can't read a
+    #  read replica which hasn't caught up yet
+    transaction.on_commit(lambda: store_saved_voter_device_link_values(instance))
+
+
+def store_saved_voter_device_link_values(instance):
+    try:
+        voter_we_vote_id = Voter.objects.filter(id=instance.voter_id).values_list('we_vote_id', flat=True).first()
+        if voter_we_vote_id is None:
+            invalidate_voter_device_cache(instance.voter_device_id)
+        else:
+            store_voter_device_values(instance.voter_device_id, {
+                'voter_id':         instance.voter_id,
+                'voter_we_vote_id': voter_we_vote_id,
+                'state_code':       instance.state_code,
+            })
+    except Exception as e:
+        logger.error("STORE_VOTER_DEVICE_VALUES_ON_SAVE_SIGNAL_FAILED: " + str(e))
+        invalidate_voter_device_cache(instance.voter_device_id)
+
+
+@receiver(post_delete, sender=VoterDeviceLink)
+def store_voter_device_values_on_delete_signal(sender, instance, **kwargs):
+    invalidate_voter_device_cache(instance.voter_device_id)
+    # On sign out. voter_id 0 remembers the device has no voter, until it is linked again
+    transaction.on_commit(lambda: store_voter_device_values(instance.voter_device_id, {
+        'voter_id':         0,
+        'voter_we_vote_id': '',
+        'state_code':       '',
+    }))
+
+
 # This method *just* returns the voter_id or 0
 def fetch_voter_id_from_voter_device_link(voter_device_id):
-    voter_device_link_manager = VoterDeviceLinkManager()
-    results = voter_device_link_manager.retrieve_voter_device_link_from_voter_device_id(
-        voter_device_id, read_only=True)
-    if results['voter_device_link_found']:
-        voter_device_link = results['voter_device_link']
-        return voter_device_link.voter_id
+    voter_device_values = retrieve_voter_device_values(voter_device_id)
+    if voter_device_values is not None:
+        return voter_device_values['voter_id']
     return 0
 
 
@@ -4023,18 +4229,10 @@ def fetch_api_voter_from_request(request):
 
 
 def fetch_voter_we_vote_id_from_voter_device_link(voter_device_id):
-    voter_device_link_manager = VoterDeviceLinkManager()
-    results = voter_device_link_manager.retrieve_voter_device_link_from_voter_device_id(voter_device_id,
-                                                                                        read_only=True)
-    if results['voter_device_link_found']:
-        voter_device_link = results['voter_device_link']
-        voter_id = voter_device_link.voter_id
-        voter_manager = VoterManager()
-        results = voter_manager.retrieve_voter_by_id(voter_id, read_only=True)
-        if results['voter_found']:
-            voter = results['voter']
-            return voter.we_vote_id
-        return ""
+    voter_device_values = retrieve_voter_device_values(voter_device_id)
+    if voter_device_values is not None and positive_value_exists(voter_device_values['voter_we_vote_id']):
+        return voter_device_values['voter_we_vote_id']
+    return ""
 
 
 def retrieve_voter_authority(request):
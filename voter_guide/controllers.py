@@ -28,8 +28,7 @@ from organization.controllers import organization_follow_or_unfollow_or_ignore,
     refresh_organization_data_from_master_tables, retrieve_organization_list_for_all_upcoming_elections
 from organization.models import OrganizationManager, OrganizationListManager, INDIVIDUAL
 from pledge_to_vote.models import PledgeToVoteManager
-from position.controllers import retrieve_ballot_item_we_vote_ids_for_organizations_to_follow, \
-    retrieve_ballot_item_we_vote_ids_for_organization_static
+from position.controllers import retrieve_ballot_item_we_vote_ids_for_organizations_to_follow
 from position.models import ANY_STANCE, FRIENDS_AND_PUBLIC, FRIENDS_ONLY, INFORMATION_ONLY, OPPOSE, \
     PositionEntered, PositionManager, PositionListManager, PUBLIC_ONLY, SUPPORT
 import pytz
@@ -3109,8 +3108,7 @@ def retrieve_voter_guides_to_follow_by_ballot_item(voter_id, kind_of_ballot_item
 
     follow_organization_list_manager = FollowOrganizationList()
     organizations_followed_by_voter = \
-        follow_organization_list_manager.retrieve_follow_organization_by_voter_id_simple_id_array(voter_id,
-                                                                                                  read_only=True)
+        follow_organization_list_manager.retrieve_follow_organization_by_voter_id_simple_id_set(voter_id)
 
     positions_list = position_list_manager.calculate_positions_not_followed_by_voter(
         all_positions_list, organizations_followed_by_voter)
@@ -3235,8 +3233,8 @@ def retrieve_voter_guides_to_follow_by_election_for_api(voter_id, google_civic_e
     follow_organization_list_manager = FollowOrganizationList()
     return_we_vote_id = True
     organization_we_vote_ids_followed_by_voter = \
-        follow_organization_list_manager.retrieve_follow_organization_by_voter_id_simple_id_array(
-            voter_id, return_we_vote_id, read_only=True)
+        list(follow_organization_list_manager.retrieve_follow_organization_by_voter_id_simple_id_set(
+            voter_id, return_we_vote_id))
     organization_we_vote_ids_ignored_by_voter = \
         follow_organization_list_manager.retrieve_ignore_organization_by_voter_id_simple_id_array(
             voter_id, return_we_vote_id, read_only=True)
@@ -3351,11 +3349,195 @@ def retrieve_voter_guides_to_follow_by_election_for_api(voter_id, google_civic_e
     return results
 
 
+def generate_voter_guides_upcoming_json_list(
+        voter_guide_list=[], friends_vs_public=PUBLIC_ONLY, voter_we_vote_id=''):
+    """
+    Assemble the voterGuidesUpcomingRetrieve json for voter_guide_list. The organizations, their positions in all
+    of these elections (grouped by organization and stance), and the issues they are linked to are each retrieved
+    for the whole list at once, instead of with five or six queries per voter guide.
+    :param voter_guide_list:
+    :param friends_vs_public: Voter guides from SharedItems use their own friends_vs_public instead
+    :param voter_we_vote_id: The voter who may be shown positions that are only visible to friends
+    :return:
+    """
+    status = ""
+    success = True
+    voter_guides = []
+
+    # We can't use a voter_guide that doesn't have both of these values
+    voter_guide_list = [voter_guide for voter_guide in voter_guide_list
+                        if positive_value_exists(voter_guide.organization_we_vote_id) and
+                        positive_value_exists(voter_guide.google_civic_election_id)]
+    if not len(voter_guide_list):
+        results = {
+            'success':      success,
+            'status':       status,
+            'voter_guides': voter_guides,
+        }
+        return results
+
+    organization_id_by_we_vote_id = {}
+    organization_list_manager = OrganizationListManager()
+    results = organization_list_manager.retrieve_organizations_by_organization_we_vote_id_list(
+        list({voter_guide.organization_we_vote_id for voter_guide in voter_guide_list}), read_only=True)
+    status += results['status'] + " "
+    if results['organization_list_found']:
+        for organization in results['organization_list']:
+            organization_id_by_we_vote_id[organization.we_vote_id] = organization.id
+
+    friends_vs_public_by_voter_guide_id = {}
+    public_organization_id_set = set()
+    friends_organization_we_vote_id_set = set()
+    google_civic_election_id_set = set()
+    for voter_guide in voter_guide_list:
+        if voter_guide.organization_we_vote_id not in organization_id_by_we_vote_id:
+            # We can't use a voter_guide that does not have a valid organization attached
+            continue
+        if hasattr(voter_guide, 'from_shared_item') and positive_value_exists(voter_guide.from_shared_item):
+            if hasattr(voter_guide, 'friends_vs_public') \
+                    and voter_guide.friends_vs_public in (FRIENDS_AND_PUBLIC, FRIENDS_ONLY):
+                friends_vs_public_for_this_voter_guide = voter_guide.friends_vs_public
+            else:
+                friends_vs_public_for_this_voter_guide = PUBLIC_ONLY
+        else:
+            friends_vs_public_for_this_voter_guide = friends_vs_public
+        friends_vs_public_by_voter_guide_id[voter_guide.id] = friends_vs_public_for_this_voter_guide
+        if friends_vs_public_for_this_voter_guide in (PUBLIC_ONLY, FRIENDS_AND_PUBLIC):
+            public_organization_id_set.add(organization_id_by_we_vote_id[voter_guide.organization_we_vote_id])
+        if friends_vs_public_for_this_voter_guide in (FRIENDS_ONLY, FRIENDS_AND_PUBLIC):
+            friends_organization_we_vote_id_set.add(voter_guide.organization_we_vote_id)
+        google_civic_election_id_set.add(convert_to_int(voter_guide.google_civic_election_id))
+
+    # Friends-only positions are shown when the organization's voter is the viewer, a friend of the viewer,
+    #  or has shared them with the viewer
+    organization_voter_id_by_organization_we_vote_id = {}
+    if positive_value_exists(voter_we_vote_id) and len(friends_organization_we_vote_id_set):
+        friend_manager = FriendManager()
+        friend_results = friend_manager.retrieve_friends_we_vote_id_list(voter_we_vote_id)
+        if friend_results['friends_we_vote_id_list_found']:
+            friends_we_vote_id_set = set(friend_results['friends_we_vote_id_list'])
+        else:
+            friends_we_vote_id_set = set()
+
+        # Like retrieve_shared_permissions_granted, only the most recent permissions from each voter count
+        include_friends_only_positions_by_voter_we_vote_id = {}
+        share_manager = ShareManager()
+        results = share_manager.retrieve_shared_permissions_granted_list(
+            shared_to_voter_we_vote_id=voter_we_vote_id,
+            current_year_only=True,
+            read_only=True)
+        status += results['status']
+        for shared_permissions_granted in results['shared_permissions_granted_list']:
+            if positive_value_exists(shared_permissions_granted.shared_by_voter_we_vote_id):
+                include_friends_only_positions_by_voter_we_vote_id.setdefault(
+                    shared_permissions_granted.shared_by_voter_we_vote_id.lower(),
+                    shared_permissions_granted.include_friends_only_positions)
+
+        voter_manager = VoterManager()
+        results = voter_manager.retrieve_voter_list_by_linked_organization_we_vote_id_list(
+            organization_we_vote_id_list=list(friends_organization_we_vote_id_set), read_only=True)
+        status += results['status']
+        for organization_voter in results['voter_list']:
+            organization_voter_we_vote_id = organization_voter.we_vote_id
+            if organization_voter_we_vote_id.lower() == voter_we_vote_id.lower() \
+                    or organization_voter_we_vote_id in friends_we_vote_id_set \
+                    or positive_value_exists(include_friends_only_positions_by_voter_we_vote_id.get(
+                        organization_voter_we_vote_id.lower())):
+                organization_voter_id_by_organization_we_vote_id[organization_voter.linked_organization_we_vote_id] = \
+                    organization_voter.id
+
+    position_list_manager = PositionListManager()
+    results = position_list_manager.retrieve_ballot_item_we_vote_ids_for_organizations_by_stance(
+        organization_id_list=list(public_organization_id_set),
+        organization_voter_id_list=list(organization_voter_id_by_organization_we_vote_id.values()),
+        google_civic_election_id_list=list(google_civic_election_id_set))
+    status += results['status']
+    if not results['success']:
+        success = False
+    public_ballot_item_we_vote_ids_dict = results['public_ballot_item_we_vote_ids_dict']
+    friends_ballot_item_we_vote_ids_dict = results['friends_ballot_item_we_vote_ids_dict']
+
+    voter_guide_and_ballot_item_we_vote_ids_list = []
+    for voter_guide in voter_guide_list:
+        if voter_guide.id not in friends_vs_public_by_voter_guide_id:
+            continue
+        friends_vs_public_for_this_voter_guide = friends_vs_public_by_voter_guide_id[voter_guide.id]
+        organization_id = organization_id_by_we_vote_id[voter_guide.organization_we_vote_id]
+        organization_voter_id = \
+            organization_voter_id_by_organization_we_vote_id.get(voter_guide.organization_we_vote_id)
+        google_civic_election_id = convert_to_int(voter_guide.google_civic_election_id)
+        ballot_item_we_vote_ids_by_stance = {}
+        for stance in (SUPPORT, INFORMATION_ONLY, OPPOSE):
+            ballot_item_we_vote_ids = []
+            if friends_vs_public_for_this_voter_guide in (PUBLIC_ONLY, FRIENDS_AND_PUBLIC):
+                ballot_item_we_vote_ids += public_ballot_item_we_vote_ids_dict.get(
+                    (organization_id, google_civic_election_id, stance), [])
+            if friends_vs_public_for_this_voter_guide in (FRIENDS_ONLY, FRIENDS_AND_PUBLIC) \
+                    and organization_voter_id is not None:
+                ballot_item_we_vote_ids += friends_ballot_item_we_vote_ids_dict.get(
+                    (organization_voter_id, google_civic_election_id, stance), [])
+            ballot_item_we_vote_ids_by_stance[stance] = ballot_item_we_vote_ids
+
+        # If there aren't any opinions in the voter guide, skip it and don't return it
+        if not any(ballot_item_we_vote_ids_by_stance.values()):
+            continue
+        voter_guide_and_ballot_item_we_vote_ids_list.append((voter_guide, ballot_item_we_vote_ids_by_stance))
+
+    organization_link_to_issue_list = OrganizationLinkToIssueList()
+    issue_we_vote_id_list_by_organization_we_vote_id = \
+        organization_link_to_issue_list.fetch_issue_we_vote_id_lists_for_organization_we_vote_id_list(
+            list({voter_guide.organization_we_vote_id for voter_guide, ballot_item_we_vote_ids_by_stance
+                  in voter_guide_and_ballot_item_we_vote_ids_list}))
+
+    for voter_guide, ballot_item_we_vote_ids_by_stance in voter_guide_and_ballot_item_we_vote_ids_list:
+        if voter_guide.last_updated:
+            last_updated = voter_guide.last_updated.strftime('%Y-%m-%d %H:%M')
+        else:
+            last_updated = ''
+        one_voter_guide = {
+            'ballot_item_we_vote_ids_this_org_supports':    ballot_item_we_vote_ids_by_stance[SUPPORT],
+            'ballot_item_we_vote_ids_this_org_info_only':   ballot_item_we_vote_ids_by_stance[INFORMATION_ONLY],
+            'ballot_item_we_vote_ids_this_org_opposes':     ballot_item_we_vote_ids_by_stance[OPPOSE],
+            'election_day_text':            voter_guide.election_day_text,
+            'from_shared_item':             hasattr(voter_guide, 'from_shared_item'),
+            'google_civic_election_id':     voter_guide.google_civic_election_id,
+            'issue_we_vote_ids_linked':     issue_we_vote_id_list_by_organization_we_vote_id.get(
+                voter_guide.organization_we_vote_id.lower(), []),
+            'last_updated':                 last_updated,
+            'organization_we_vote_id':      voter_guide.organization_we_vote_id,
+            'linked_voter_we_vote_id':      voter_guide.voter_we_vote_id,
+            'owner_voter_id':               voter_guide.owner_voter_id,
+            'pledge_goal':                  voter_guide.pledge_goal,
+            'pledge_count':                 voter_guide.pledge_count,
+            'public_figure_we_vote_id':     voter_guide.public_figure_we_vote_id,
+            'time_span':                    voter_guide.vote_smart_time_span,
+            'twitter_description':          voter_guide.twitter_description
+            if positive_value_exists(voter_guide.twitter_description) and
+            len(voter_guide.twitter_description) > 1 else '',
+            'twitter_followers_count':      voter_guide.twitter_followers_count,
+            'twitter_handle':               voter_guide.twitter_handle,
+            'voter_guide_display_name':     voter_guide.voter_guide_display_name(),
+            'voter_guide_image_url_large':  voter_guide.we_vote_hosted_profile_image_url_large
+            if positive_value_exists(voter_guide.we_vote_hosted_profile_image_url_large)
+            else voter_guide.voter_guide_image_url(),
+            'voter_guide_image_url_medium': voter_guide.we_vote_hosted_profile_image_url_medium,
+            'voter_guide_image_url_tiny':   voter_guide.we_vote_hosted_profile_image_url_tiny,
+            'voter_guide_owner_type':       voter_guide.voter_guide_owner_type,
+            'we_vote_id':                   voter_guide.we_vote_id,
+        }
+        voter_guides.append(one_voter_guide)
+
+    results = {
+        'success':      success,
+        'status':       status,
+        'voter_guides': voter_guides,
+    }
+    return results
+
+
 def voter_guides_upcoming_retrieve_for_api(  # voterGuidesUpcomingRetrieve && voterGuidesFromFriendsUpcomingRetrieve
         google_civic_election_id_list=[], friends_vs_public=PUBLIC_ONLY, voter_we_vote_id=''):
     status = ""
-
-    voter_guides = []
     status += "RETRIEVING_VOTER_GUIDES_UPCOMING " + friends_vs_public + " "
 
     if not positive_value_exists(google_civic_election_id_list) or \
@@ -3416,121 +3598,10 @@ def voter_guides_upcoming_retrieve_for_api(  # voterGuidesUpcomingRetrieve && vo
     success = voter_guide_results['success']
     status += voter_guide_results['status']
 
-    organization_manager = OrganizationManager()
-    for voter_guide in voter_guide_list:
-        organization_we_vote_id = voter_guide.organization_we_vote_id
-        google_civic_election_id = voter_guide.google_civic_election_id
-
-        if not positive_value_exists(organization_we_vote_id) or not positive_value_exists(google_civic_election_id):
-            # We can't use a voter_guide that doesn't have both of these values
-            continue
-
-        results = organization_manager.retrieve_organization_from_we_vote_id(organization_we_vote_id, read_only=True)
-
-        if not results['organization_found']:
-            # We can't use a voter_guide that does not have a valid organization attached
-            continue
-
-        organization = results['organization']
-
-        if hasattr(voter_guide, 'from_shared_item') and positive_value_exists(voter_guide.from_shared_item):
-            if hasattr(voter_guide, 'friends_vs_public') \
-                    and voter_guide.friends_vs_public in (FRIENDS_AND_PUBLIC, FRIENDS_ONLY):
-                friends_vs_public_for_this_voter_guide = voter_guide.friends_vs_public
-            else:
-                friends_vs_public_for_this_voter_guide = PUBLIC_ONLY
-        else:
-            friends_vs_public_for_this_voter_guide = friends_vs_public
-
-        # Augment the voter guide with a list of ballot_item we_vote_id's that this org supports
-        stance_we_are_looking_for = SUPPORT
-        ballot_item_support_results = retrieve_ballot_item_we_vote_ids_for_organization_static(
-            organization,
-            google_civic_election_id,
-            stance_we_are_looking_for,
-            friends_vs_public=friends_vs_public_for_this_voter_guide,
-            voter_we_vote_id=voter_we_vote_id)
-        if ballot_item_support_results['count']:
-            ballot_item_we_vote_ids_this_org_supports = ballot_item_support_results[
-                'ballot_item_we_vote_ids_list']
-        else:
-            ballot_item_we_vote_ids_this_org_supports = []
-        voter_guide.ballot_item_we_vote_ids_this_org_supports = ballot_item_we_vote_ids_this_org_supports
-
-        # Augment the voter guide with a list of ballot_item we_vote_id's that this org has info about
-        stance_we_are_looking_for = INFORMATION_ONLY
-        ballot_item_info_only_results = retrieve_ballot_item_we_vote_ids_for_organization_static(
-            organization,
-            google_civic_election_id,
-            stance_we_are_looking_for,
-            friends_vs_public=friends_vs_public_for_this_voter_guide,
-            voter_we_vote_id=voter_we_vote_id)
-        if ballot_item_info_only_results['count']:
-            ballot_item_we_vote_ids_this_org_info_only = ballot_item_info_only_results['ballot_item_we_vote_ids_list']
-        else:
-            ballot_item_we_vote_ids_this_org_info_only = []
-        voter_guide.ballot_item_we_vote_ids_this_org_info_only = ballot_item_we_vote_ids_this_org_info_only
-
-        # Augment the voter guide with a list of ballot_item we_vote_id's that this org opposes
-        stance_we_are_looking_for = OPPOSE
-        ballot_item_oppose_results = retrieve_ballot_item_we_vote_ids_for_organization_static(
-            organization,
-            google_civic_election_id,
-            stance_we_are_looking_for,
-            friends_vs_public=friends_vs_public_for_this_voter_guide,
-            voter_we_vote_id=voter_we_vote_id)
-        if ballot_item_oppose_results['count']:
-            ballot_item_we_vote_ids_this_org_opposes = ballot_item_oppose_results['ballot_item_we_vote_ids_list']
-        else:
-            ballot_item_we_vote_ids_this_org_opposes = []
-        voter_guide.ballot_item_we_vote_ids_this_org_opposes = ballot_item_we_vote_ids_this_org_opposes
-
-        # If there aren't any opinions in the voter guide, skip it and don't return it
-        if not len(ballot_item_we_vote_ids_this_org_supports) and \
-                not len(ballot_item_we_vote_ids_this_org_info_only) and \
-                not len(ballot_item_we_vote_ids_this_org_opposes):
-            continue
-
-        organization_link_to_issue_list = OrganizationLinkToIssueList()
-        issue_we_vote_ids_linked = \
-            organization_link_to_issue_list.fetch_issue_we_vote_id_list_by_organization_we_vote_id(
-                voter_guide.organization_we_vote_id)
-        if voter_guide.last_updated:
-            last_updated = voter_guide.last_updated.strftime('%Y-%m-%d %H:%M')
-        else:
-            last_updated = ''
-        one_voter_guide = {
-            'ballot_item_we_vote_ids_this_org_supports':    ballot_item_we_vote_ids_this_org_supports,
-            'ballot_item_we_vote_ids_this_org_info_only':   ballot_item_we_vote_ids_this_org_info_only,
-            'ballot_item_we_vote_ids_this_org_opposes':     ballot_item_we_vote_ids_this_org_opposes,
-            'election_day_text':            voter_guide.election_day_text,
-            'from_shared_item':             hasattr(voter_guide, 'from_shared_item'),
-            'google_civic_election_id':     voter_guide.google_civic_election_id,
-            'issue_we_vote_ids_linked':     issue_we_vote_ids_linked,
-            'last_updated':                 last_updated,
-            'organization_we_vote_id':      voter_guide.organization_we_vote_id,
-            'linked_voter_we_vote_id':      voter_guide.voter_we_vote_id,
-            'owner_voter_id':               voter_guide.owner_voter_id,
-            'pledge_goal':                  voter_guide.pledge_goal,
-            'pledge_count':                 voter_guide.pledge_count,
-            'public_figure_we_vote_id':     voter_guide.public_figure_we_vote_id,
-            'time_span':                    voter_guide.vote_smart_time_span,
-            'twitter_description':          voter_guide.twitter_description
-            if positive_value_exists(voter_guide.twitter_description) and
-            len(voter_guide.twitter_description) > 1 else '',
-            'twitter_followers_count':      voter_guide.twitter_followers_count,
-            'twitter_handle':               voter_guide.twitter_handle,
-            'voter_guide_display_name':     voter_guide.voter_guide_display_name(),
-            'voter_guide_image_url_large':  voter_guide.we_vote_hosted_profile_image_url_large
-            if positive_value_exists(voter_guide.we_vote_hosted_profile_image_url_large)
-            else voter_guide.voter_guide_image_url(),
-            'voter_guide_image_url_medium': voter_guide.we_vote_hosted_profile_image_url_medium,
-            'voter_guide_image_url_tiny':   voter_guide.we_vote_hosted_profile_image_url_tiny,
-            'voter_guide_owner_type':       voter_guide.voter_guide_owner_type,
-            'we_vote_id':                   voter_guide.we_vote_id,
-        }
-
-        voter_guides.append(one_voter_guide.copy())
+    results = generate_voter_guides_upcoming_json_list(
+        voter_guide_list=voter_guide_list, friends_vs_public=friends_vs_public, voter_we_vote_id=voter_we_vote_id)
+    status += results['status']
+    voter_guides = results['voter_guides']
 
     number_retrieved = len(voter_guides)
     json_data = {
@@ -3601,8 +3672,8 @@ def retrieve_voter_guides_to_follow_generic_for_api(voter_id, search_string, fil
     else:
         read_only = True
         organization_we_vote_ids_followed_by_voter = \
-            follow_organization_list_manager.retrieve_follow_organization_by_voter_id_simple_id_array(
-                voter_id, return_we_vote_id, read_only=read_only)
+            list(follow_organization_list_manager.retrieve_follow_organization_by_voter_id_simple_id_set(
+                voter_id, return_we_vote_id))
         organization_we_vote_ids_ignored_by_voter = \
             follow_organization_list_manager.retrieve_ignore_organization_by_voter_id_simple_id_array(
                 voter_id, return_we_vote_id, read_only=read_only)
@@ -376,6 +376,21 @@ def fetch_next_we_vote_id_integer(we_vote_id_last_setting_name):
     return we_vote_id_next_integer
 
 
+def fetch_next_we_vote_id_integer_list(we_vote_id_last_setting_name, number_of_integers):
+    """
+    Reserve number_of_integers we_vote_id integers at once, for objects saved with bulk_create (which skips save())
+    :param we_vote_id_last_setting_name:
+    :param number_of_integers:
+    :return:
+    """
+    if number_of_integers < 1:
+        return []
+    we_vote_settings_manager = WeVoteSettingsManager()
+    we_vote_id_last_integer = convert_to_int(we_vote_settings_manager.fetch_setting(we_vote_id_last_setting_name))
+    we_vote_settings_manager.save_setting(we_vote_id_last_setting_name, we_vote_id_last_integer + number_of_integers)
+    return list(range(we_vote_id_last_integer + 1, we_vote_id_last_integer + number_of_integers + 1))
+
+
 def fetch_next_we_vote_id_activity_comment_integer():
     return fetch_next_we_vote_id_integer('we_vote_id_last_activity_comment_integer')
 
@@ -384,6 +399,10 @@ def fetch_next_we_vote_id_activity_notice_seed_integer():
     return fetch_next_we_vote_id_integer('we_vote_id_last_activity_notice_seed_integer')
 
 
+def fetch_next_we_vote_id_activity_notice_seed_integer_list(number_of_integers):
+    return fetch_next_we_vote_id_integer_list('we_vote_id_last_activity_notice_seed_integer', number_of_integers)
+
+
 def fetch_next_we_vote_id_activity_post_integer():
     return fetch_next_we_vote_id_integer('we_vote_id_last_activity_post_integer')
 